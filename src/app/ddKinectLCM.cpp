@@ -16,6 +16,8 @@
 ddKinectLCM::ddKinectLCM(QObject* parent) : QObject(parent)
 {
   mPolyData = vtkSmartPointer<vtkPolyData>::New();
+  mUtime = 0;
+  mNumberOfFrames = 0;
 }
 
 
@@ -340,6 +342,7 @@ void ddKinectLCM::onKinectFrame(const QByteArray& data, const QString& channel)
   QMutexLocker locker(&this->mPolyDataMutex);
   this->mPolyData = polyData;
   this->mUtime = message.timestamp;
+  this->mNumberOfFrames++;
 }
 
 
@@ -351,3 +354,17 @@ qint64 ddKinectLCM::getPointCloudFromKinect(vtkPolyData* polyDataRender)
   return this->mUtime;
 }
 
+//-----------------------------------------------------------------------------
+qint64 ddKinectLCM::getCurrentUtime()
+{
+  QMutexLocker locker(&this->mPolyDataMutex);
+  return this->mUtime;
+}
+
+//-----------------------------------------------------------------------------
+qint64 ddKinectLCM::getNumberOfFrames()
+{
+  QMutexLocker locker(&this->mPolyDataMutex);
+  return this->mNumberOfFrames;
+}
+
@@ -34,6 +34,8 @@ public:
   
   void init(ddLCMThread* lcmThread, const QString& botConfigFile);
   qint64 getPointCloudFromKinect(vtkPolyData* polyDataRender);
+  qint64 getCurrentUtime();
+  qint64 getNumberOfFrames();
 
 protected slots:
 
@@ -51,6 +53,7 @@ protected:
 
   vtkSmartPointer<vtkPolyData> mPolyData;
   int64_t mUtime;
+  qint64 mNumberOfFrames;
   QMutex mPolyDataMutex;
 
 };
@@ -33,6 +33,8 @@ ddPointCloudLCM::ddPointCloudLCM(QObject* parent) : QObject(parent)
   mBotParam = 0;
 
   mPolyData = vtkSmartPointer<vtkPolyData>::New();
+  mUtime = 0;
+  mNumberOfFrames = 0;
 }
 
 
@@ -226,6 +228,7 @@ void ddPointCloudLCM::onPointCloud2Frame(const QByteArray& data, const QString&
   QMutexLocker locker(&this->mPolyDataMutex);
   this->mPolyData = polyData;
   this->mUtime = message.utime;
+  this->mNumberOfFrames++;
 }
 
 
@@ -241,6 +244,7 @@ void ddPointCloudLCM::onPointCloudFrame(const QByteArray& data, const QString& c
   QMutexLocker locker(&this->mPolyDataMutex);
   this->mPolyData = polyData;
   this->mUtime = message.utime;
+  this->mNumberOfFrames++;
 }
 
 
@@ -252,6 +256,20 @@ qint64 ddPointCloudLCM::getPointCloudFromPointCloud(vtkPolyData* polyDataRender)
   return this->mUtime;
 }
 
+//-----------------------------------------------------------------------------
+qint64 ddPointCloudLCM::getCurrentUtime()
+{
+  QMutexLocker locker(&this->mPolyDataMutex);
+  return this->mUtime;
+}
+
+//-----------------------------------------------------------------------------
+qint64 ddPointCloudLCM::getNumberOfFrames()
+{
+  QMutexLocker locker(&this->mPolyDataMutex);
+  return this->mNumberOfFrames;
+}
+
 //-----------------------------------------------------------------------------
 QStringList ddPointCloudLCM::getLidarNames() const {
   char** lidarNames = bot_param_get_all_planar_lidar_names(mBotParam);
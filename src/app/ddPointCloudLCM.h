@@ -33,6 +33,8 @@ public:
   
   void init(ddLCMThread* lcmThread, const QString& botConfigFile);
   qint64 getPointCloudFromPointCloud(vtkPolyData* polyDataRender);
+  qint64 getCurrentUtime();
+  qint64 getNumberOfFrames();
 
   QStringList getLidarNames() const;
   QString getLidarFriendlyName(const QString& lidarName);
@@ -56,6 +58,7 @@ protected:
 
   vtkSmartPointer<vtkPolyData> mPolyData;
   int64_t mUtime;
+  qint64 mNumberOfFrames;
   QMutex mPolyDataMutex;
 
 };
@@ -0,0 +1,136 @@
+'''
+Per-bin reductions over labelled point arrays.
+
+A BinReducer groups values by an integer bin label and computes count,
+sum, mean, min, max, argmin and argmax for every bin in one pass, instead of looping
+over the bins and scanning the whole label array with labels == i.
+'''
+
+import numpy as np
+
+
+class BinReducer(object):
+
+    def __init__(self, labels, numberOfBins=None):
+        '''
+        labels is an array of integer bin labels, one per value.  Labels
+        outside [0, numberOfBins) are ignored by all reductions.  If
+        numberOfBins is None it is set to labels.max() + 1.
+        '''
+        labels = np.asarray(labels)
+        if numberOfBins is None:
+            numberOfBins = int(labels.max()) + 1 if len(labels) else 0
+
+        self.numberOfBins = numberOfBins
+        self.valid = (labels >= 0) & (labels < numberOfBins)
+        self.allValid = self.valid.all()
+        self.labels = labels[self.valid].astype(np.int64)
+        self.counts = np.bincount(self.labels, minlength=numberOfBins)
+        self._order = None
+
+    def getCounts(self):
+        return self.counts
+
+    def getNonEmptyBins(self):
+        return np.flatnonzero(self.counts)
+
+    def sum(self, values):
+        '''
+        Returns the per-bin sum of values.  values may be 1D or NxM.
+        '''
+        values = np.asarray(values)[self.valid]
+        if values.ndim == 1:
+            return np.bincount(self.labels, weights=values, minlength=self.numberOfBins)
+        return np.column_stack([np.bincount(self.labels, weights=values[:,i], minlength=self.numberOfBins)
+                                for i in xrange(values.shape[1])])
+
+    def mean(self, values):
+        '''
+        Returns the per-bin mean of values.  Empty bins are nan.
+        '''
+        sums = self.sum(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if sums.ndim == 1:
+                return sums / self.counts
+            return sums / self.counts[:,np.newaxis]
+
+    def min(self, values):
+        '''
+        Returns the per-bin minimum of values.  values may be 1D or NxM.
+        Empty bins are nan.
+        '''
+        return self._reduce(np.minimum, values)
+
+    def max(self, values):
+        '''
+        Returns the per-bin maximum of values.  Empty bins are nan.
+        '''
+        return self._reduce(np.maximum, values)
+
+    def _getOrder(self):
+        '''
+        Returns the permutation that sorts the values by label, or None if
+        the labels are already sorted.
+        '''
+        if self._order is None:
+            if len(self.labels) < 2 or (self.labels[1:] >= self.labels[:-1]).all():
+                self._order = False
+            else:
+                self._order = np.argsort(self.labels, kind='mergesort')
+        return self._order if self._order is not False else None
+
+    def _reduce(self, ufunc, values):
+        # values sorted by label are contiguous per bin, so reduceat at the
+        # bin starts reduces every non-empty bin at once
+        values = np.asarray(values, dtype=np.float64)
+        if not self.allValid:
+            values = values[self.valid]
+        result = np.empty((self.numberOfBins,) + values.shape[1:])
+        result.fill(np.nan)
+
+        nonEmpty = self.counts > 0
+        if not nonEmpty.any():
+            return result
+
+        order = self._getOrder()
+        if order is not None:
+            values = values[order]
+
+        starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))[nonEmpty]
+        if values.ndim == 1:
+            result[nonEmpty] = ufunc.reduceat(values, starts)
+        else:
+            # reducing contiguous columns one at a time is much faster than reduceat with axis=0
+            result[nonEmpty] = np.column_stack([ufunc.reduceat(np.ascontiguousarray(values[:,i]), starts)
+                                                for i in xrange(values.shape[1])])
+        return result
+
+    def argmax(self, values):
+        '''
+        Returns for each bin the index into the original values of the bin's
+        maximum value, or -1 for empty bins.  Ties resolve to the first
+        occurrence, matching np.argmax.
+        '''
+        return self._argFirst(-np.asarray(values, dtype=np.float64))
+
+    def argmin(self, values):
+        '''
+        Returns for each bin the index into the original values of the bin's
+        minimum value, or -1 for empty bins.
+        '''
+        return self._argFirst(np.asarray(values, dtype=np.float64))
+
+    def _argFirst(self, keys):
+        # a stable sort by label then key puts each bin's minimum key first
+        validIds = np.flatnonzero(self.valid)
+        order = np.lexsort((keys[validIds], self.labels))
+
+        result = -np.ones(self.numberOfBins, dtype=np.int64)
+        if not len(validIds):
+            return result
+
+        nonEmpty = self.counts > 0
+        firstInBin = np.concatenate(([0], np.cumsum(self.counts)[:-1]))[nonEmpty]
+        result[nonEmpty] = validIds[order[firstInBin]]
+        return result
+
@@ -0,0 +1,219 @@
+'''
+2D convex hulls and minimum area bounding rectangles.
+
+convexHull is Andrew's monotone chain.  Before the chain is built, points
+inside the octagon spanned by the extreme points along the axes and the
+diagonals are discarded with one vectorized test, so the sequential part
+only sees the few points near the hull.
+
+minimumAreaRectangle is the rotating calipers search: the minimum area
+rectangle has a side collinear with a hull edge, so the hull is projected
+onto the directions of all of its edges at once and the rectangle with the
+smallest area is kept.  minimumAreaRectangles does the same for a list of
+point sets, evaluating the edge directions of all hulls in one segmented
+array operation.
+
+The results match thirdparty.min_bounding_rect.minBoundingRect: the
+rectangle angle is in [0, pi/2), width is the extent along
+(cos(angle), sin(angle)) and height the extent along the perpendicular.
+'''
+
+import numpy as np
+
+from director.fieldcontainer import FieldContainer
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0])*(b[1] - o[1]) - (a[1] - o[1])*(b[0] - o[0])
+
+
+# extreme point directions in counter clockwise order
+_octagonDirections = np.array([[1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1], [1, -1]], dtype=np.float64)
+
+
+def _getHullCandidates(points, segmentIds, segmentStarts):
+    '''
+    Returns a mask of the points that are not strictly inside the octagon
+    spanned by the extreme points of their segment along x, y, x+y and x-y.
+    The points are sorted by segment.
+    '''
+    projections = np.dot(points, _octagonDirections.T)
+    maxima = np.maximum.reduceat(projections, segmentStarts, axis=0)
+
+    # index of an extreme point for every segment and direction
+    rows, cols = np.nonzero(projections == maxima[segmentIds])
+    extremeIds = np.zeros(maxima.shape, dtype=np.int64)
+    extremeIds[segmentIds[rows], cols] = rows
+    extremes = points[extremeIds]
+
+    # repeated extreme points give zero length edges, which do not constrain the octagon
+    edges = np.roll(extremes, -1, axis=1) - extremes
+    degenerate = (edges == 0).all(axis=2)
+    area = (extremes[:,:,0]*np.roll(extremes, -1, axis=1)[:,:,1] - extremes[:,:,1]*np.roll(extremes, -1, axis=1)[:,:,0]).sum(axis=1)
+
+    relative = points[:,np.newaxis,:] - extremes[segmentIds]
+    pointEdges = edges[segmentIds]
+    crosses = pointEdges[:,:,0]*relative[:,:,1] - pointEdges[:,:,1]*relative[:,:,0]
+    inside = ((crosses > 0) | degenerate[segmentIds]).all(axis=1) & (area[segmentIds] > 0)
+    return ~inside
+
+
+def _monotoneChain(sortedPoints):
+    '''
+    Returns the hull vertices of a list of distinct [x, y] points sorted
+    by x and then y.
+    '''
+    if len(sortedPoints) < 3:
+        return sortedPoints
+
+    lower = []
+    for p in sortedPoints:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+
+    upper = []
+    for p in reversed(sortedPoints):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    return lower[:-1] + upper[:-1]
+
+
+def convexHulls(pointSets):
+    '''
+    Returns a list with the convexHull of each of the given Nx2 point
+    arrays.  Interior points of all sets are discarded and the remaining
+    points sorted in one batch, only the monotone chains run per set.
+    '''
+    if not len(pointSets):
+        return []
+
+    points = np.vstack([np.asarray(p, dtype=np.float64)[:,:2] for p in pointSets])
+    segmentIds = np.repeat(np.arange(len(pointSets)), [len(p) for p in pointSets])
+
+    finite = np.isfinite(points).all(axis=1)
+    points, segmentIds = points[finite], segmentIds[finite]
+    segmentSizes = np.bincount(segmentIds, minlength=len(pointSets)) if len(segmentIds) else np.zeros(len(pointSets), dtype=np.int64)
+    assert segmentSizes.all(), 'no points'
+
+    segmentStarts = np.concatenate(([0], np.cumsum(segmentSizes)[:-1]))
+    candidates = _getHullCandidates(points, segmentIds, segmentStarts)
+    points, segmentIds = points[candidates], segmentIds[candidates]
+
+    order = np.lexsort((points[:,1], points[:,0], segmentIds))
+    points, segmentIds = points[order], segmentIds[order]
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = (np.diff(points, axis=0) != 0).any(axis=1) | (np.diff(segmentIds) != 0)
+    points, segmentIds = points[distinct], segmentIds[distinct]
+
+    splits = np.cumsum(np.bincount(segmentIds, minlength=len(pointSets)))[:-1]
+    return [np.array(_monotoneChain(p.tolist())).reshape(-1, 2) for p in np.split(points, splits)]
+
+
+def convexHull(points):
+    '''
+    Returns the vertices of the convex hull of the Nx2 points in counter
+    clockwise order, without repeating the first vertex.  Collinear points
+    on the hull edges are dropped.
+    '''
+    return convexHulls([points])[0]
+
+
+def _edgeAngles(hull):
+    '''
+    Returns the sorted unique angles of the hull edges, modulo pi/2.
+    '''
+    if len(hull) < 2:
+        return np.zeros(1)
+    edges = np.roll(hull, -1, axis=0) - hull
+    return np.unique(np.abs(np.arctan2(edges[:,1], edges[:,0]) % (np.pi/2)))
+
+
+def _makeRectangles(angles, lower, upper, hulls):
+    '''
+    Returns rectangle FieldContainers from the angles and the lower and
+    upper extents of the hulls in the rotated frames.
+    '''
+    c, s = np.cos(angles), np.sin(angles)
+    u = np.column_stack([c, s])
+    v = np.column_stack([-s, c])
+
+    def toWorld(a, b):
+        return a[:,np.newaxis]*u + b[:,np.newaxis]*v
+
+    corners = np.array([toWorld(upper[:,0], lower[:,1]),
+                        toWorld(lower[:,0], lower[:,1]),
+                        toWorld(lower[:,0], upper[:,1]),
+                        toWorld(upper[:,0], upper[:,1])]).transpose(1, 0, 2)
+    centers = toWorld(*((lower + upper)/2.0).T)
+    dims = upper - lower
+
+    return [FieldContainer(angle=angles[i], area=dims[i,0]*dims[i,1], width=dims[i,0], height=dims[i,1],
+                           center=centers[i], corners=corners[i], hull=hulls[i]) for i in xrange(len(hulls))]
+
+
+def minimumAreaRectangle(points, isHull=False):
+    '''
+    Returns the minimum area rectangle of the Nx2 points as a FieldContainer
+    with fields angle, area, width, height, center, corners and hull.  The
+    corners are in the order of minBoundingRect.  Pass isHull=True if the
+    points are already the vertices of a convex hull.
+    '''
+    hull = np.asarray(points, dtype=np.float64)[:,:2] if isHull else convexHull(points)
+    assert len(hull), 'no points'
+
+    angles = _edgeAngles(hull)
+    c, s = np.cos(angles), np.sin(angles)
+
+    # hull points projected on every candidate direction at once, one row per angle
+    u = np.outer(c, hull[:,0]) + np.outer(s, hull[:,1])
+    v = np.outer(c, hull[:,1]) - np.outer(s, hull[:,0])
+    lower = np.column_stack([u.min(axis=1), v.min(axis=1)])
+    upper = np.column_stack([u.max(axis=1), v.max(axis=1)])
+
+    best = np.prod(upper - lower, axis=1).argmin()
+    return _makeRectangles(angles[best:best+1], lower[best:best+1], upper[best:best+1], [hull])[0]
+
+
+def minimumAreaRectangles(pointSets):
+    '''
+    Returns a list with the minimumAreaRectangle of each of the given Nx2
+    point arrays.  The hull edge directions of all point sets are searched
+    in one batch.
+    '''
+    hulls = convexHulls(pointSets)
+    if not hulls:
+        return []
+
+    angles = [_edgeAngles(hull) for hull in hulls]
+
+    # one segment per (point set, angle) pair holding the hull points of the set
+    numberOfAngles = np.array([len(a) for a in angles])
+    hullSizes = np.array([len(hull) for hull in hulls])
+    segmentSizes = np.repeat(hullSizes, numberOfAngles)
+    pairAngles = np.concatenate(angles)
+
+    hullStarts = np.concatenate(([0], np.cumsum(hullSizes)[:-1]))
+    segmentStarts = np.concatenate(([0], np.cumsum(segmentSizes)[:-1]))
+    pointIds = np.arange(segmentSizes.sum()) - np.repeat(segmentStarts, segmentSizes) + np.repeat(np.repeat(hullStarts, numberOfAngles), segmentSizes)
+    allHullPoints = np.vstack(hulls)[pointIds]
+
+    c = np.repeat(np.cos(pairAngles), segmentSizes)
+    s = np.repeat(np.sin(pairAngles), segmentSizes)
+    u = c*allHullPoints[:,0] + s*allHullPoints[:,1]
+    v = c*allHullPoints[:,1] - s*allHullPoints[:,0]
+
+    lower = np.column_stack([np.minimum.reduceat(u, segmentStarts), np.minimum.reduceat(v, segmentStarts)])
+    upper = np.column_stack([np.maximum.reduceat(u, segmentStarts), np.maximum.reduceat(v, segmentStarts)])
+    areas = np.prod(upper - lower, axis=1)
+
+    # smallest area of each point set, ties going to the smallest angle
+    pairStarts = np.concatenate(([0], np.cumsum(numberOfAngles)[:-1]))
+    pairSetIds = np.repeat(np.arange(len(hulls)), numberOfAngles)
+    isBest = areas == np.minimum.reduceat(areas, pairStarts)[pairSetIds]
+    best = np.flatnonzero(isBest)
+    best = best[np.concatenate(([True], np.diff(pairSetIds[best]) != 0))]
+
+    return _makeRectangles(pairAngles[best], lower[best], upper[best], hulls)
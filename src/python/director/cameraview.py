@@ -16,6 +16,8 @@ from PythonQt import QtCore, QtGui
 import numpy as np
 from director.simpletimer import SimpleTimer
 from director import ioUtils
+from director import pointcolorizer
+from director import imagehistory
 import sys
 
 
@@ -53,7 +55,12 @@ def makeSphere(radius, resolution):
 
 
 def colorizePoints(polyData, cameraName='MULTISENSE_CAMERA_LEFT'):
-    imageManager.queue.colorizePoints(cameraName, polyData)
+    '''
+    Adds an rgb array to polyData from the current image of the camera, or
+    blended from the images of a list of cameras, see pointcolorizer.
+    '''
+    cameraNames = [cameraName] if isinstance(cameraName, str) else cameraName
+    imageManager.pointColorizer.colorizePolyData(polyData, cameraNames)
 
 
 
@@ -112,9 +119,12 @@ class ImageManager(object):
         self.imageUtimes = {}
         self.textures = {}
         self.imageRotations180 = {}
+        self.imageHistories = {}
+        self.textureCache = imagehistory.TextureCache()
 
         self.queue = PythonQt.dd.ddBotImageQueue(lcmUtils.getGlobalLCMThread())
         self.queue.init(lcmUtils.getGlobalLCMThread(), drcargs.args().config_file)
+        self.pointColorizer = pointcolorizer.PointColorizer(self.queue)
 
 
     def addImage(self, name):
@@ -122,16 +132,10 @@ class ImageManager(object):
         if name in self.images:
             return
 
-        image = vtk.vtkImageData()
-        tex = vtk.vtkTexture()
-        tex.SetInputData(image)
-        tex.EdgeClampOn()
-        tex.RepeatOff()
-
         self.imageUtimes[name] = 0
-        self.images[name] = image
-        self.textures[name] = tex
+        self.images[name] = vtk.vtkImageData()
         self.imageRotations180[name] = False
+        self.imageHistories[name] = imagehistory.ImageHistory()
 
     def writeImage(self, imageName, outFile):
         writer = vtk.vtkPNGWriter()
@@ -142,11 +146,15 @@ class ImageManager(object):
     def updateImage(self, imageName):
         imageUtime = self.queue.getCurrentImageTime(imageName)
         if imageUtime != self.imageUtimes[imageName]:
-            image = self.images[imageName]
+            image = vtk.vtkImageData()
             self.imageUtimes[imageName] = self.queue.getImage(imageName, image)
 
             if self.imageRotations180[imageName]:
-                self.images[imageName].ShallowCopy(filterUtils.rotateImage180(image))
+                image = filterUtils.rotateImage180(image)
+
+            # the current image shares its scalars with the newest history image
+            self.images[imageName].ShallowCopy(image)
+            self.imageHistories[imageName].addImage(self.imageUtimes[imageName], image)
 
         return imageUtime
 
@@ -167,8 +175,38 @@ class ImageManager(object):
     def getUtime(self, imageName):
         return self.imageUtimes[imageName]
 
-    def getTexture(self, imageName):
-        return self.textures[imageName]
+    def getImageHistory(self, imageName):
+        return self.imageHistories[imageName]
+
+    def getImageAtTime(self, imageName, utime, maxDelta=None):
+        '''
+        Returns (imageUtime, image) of the stored image nearest to utime, or
+        (None, None), see ImageHistory.getNearest.
+        '''
+        return self.imageHistories[imageName].getNearest(utime, maxDelta)
+
+    def getImageBracket(self, imageName, utime):
+        '''
+        Returns the ImageBracket of the stored images around utime, or None.
+        '''
+        return self.imageHistories[imageName].getBracket(utime)
+
+    def getTexture(self, imageName, utime=None):
+        '''
+        Returns the texture of the current image, or of the stored image
+        nearest to utime.  Textures are created on first use, and textures
+        of stored images are evicted by the texture cache.
+        '''
+        if utime is None:
+            tex = self.textures.get(imageName)
+            if tex is None:
+                tex = self.textures[imageName] = imagehistory.createTexture(self.images[imageName])
+            return tex
+
+        imageUtime, image = self.getImageAtTime(imageName, utime)
+        if image is None:
+            return None
+        return self.textureCache.getTexture((imageName, imageUtime), image)
 
 
 def disableCameraTexture(obj):
@@ -176,9 +214,17 @@ def disableCameraTexture(obj):
     obj.actor.GetProperty().LightingOn()
     obj.actor.GetProperty().SetColor(obj.getProperty('Color'))
 
-def applyCameraTexture(obj, imageManager, imageName='MULTISENSE_CAMERA_LEFT'):
-
-    imageUtime = imageManager.getUtime(imageName)
+def applyCameraTexture(obj, imageManager, imageName='MULTISENSE_CAMERA_LEFT', imageUtime=None):
+    '''
+    Textures obj with the current image of the camera, or with the stored
+    image nearest to imageUtime.
+    '''
+    texture = None
+    if imageUtime is not None:
+        imageUtime, _ = imageManager.getImageAtTime(imageName, imageUtime)
+        texture = imageManager.getTexture(imageName, imageUtime) if imageUtime else None
+    else:
+        imageUtime = imageManager.getUtime(imageName)
     if not imageUtime:
         return
 
@@ -198,7 +244,7 @@ def applyCameraTexture(obj, imageManager, imageName='MULTISENSE_CAMERA_LEFT'):
     obj.polyData.GetPointData().SetTCoords(tcoords)
     obj._updateColorByProperty()
 
-    obj.actor.SetTexture(imageManager.getTexture(imageName))
+    obj.actor.SetTexture(texture or imageManager.getTexture(imageName))
     obj.actor.GetProperty().LightingOff()
     obj.actor.GetProperty().SetColor([1,1,1])
 
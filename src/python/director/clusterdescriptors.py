@@ -0,0 +1,168 @@
+'''
+Batched shape descriptors for labelled point clusters.
+
+computeClusterDescriptors takes a cloud with integer cluster labels and
+computes, for every cluster at once, the point count, centroid, principal
+axes, oriented bounding box and the minimum area rectangle of the points
+projected to the XY plane.  All reductions are segmented numpy operations
+over the labels (see BinReducer) and the rectangles of all clusters are
+found in one batch (see boundingrectangle), so the cost does not grow with
+the number of clusters.
+
+The descriptors are stored in a numpy structured array with one record per
+cluster, so clusters can be filtered with array expressions.  The box frame
+of a cluster is only converted to a vtkTransform when getTransform is
+called.
+
+The box axes follow segmentation.makePolyDataFields: the principal axis
+nearest to the up vector becomes the z axis and points up, and the x and
+y axes are the other two principal axes in cyclic order.
+'''
+
+import numpy as np
+
+from director.binreducer import BinReducer
+from director import boundingrectangle
+from director import transformUtils
+from director import vtkNumpy as vnp
+
+
+descriptorDataType = np.dtype([
+    ('label', np.int32),
+    ('numberOfPoints', np.int64),
+    ('centroid', np.float64, (3,)),
+    ('axes', np.float64, (3, 3)),
+    ('dims', np.float64, (3,)),
+    ('center', np.float64, (3,)),
+    ('rectCenter', np.float64, (2,)),
+    ('rectDims', np.float64, (2,)),
+    ('rectAngle', np.float64),
+    ])
+
+
+class ClusterDescriptors(object):
+
+    def __init__(self, data):
+        self.data = data
+        self._transforms = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, field):
+        return self.data[field]
+
+    def getTransform(self, i):
+        '''
+        Returns a vtkTransform with the box axes of cluster i, positioned at the box center.
+        '''
+        t = self._transforms.get(i)
+        if t is None:
+            axes = self.data['axes'][i]
+            t = transformUtils.getTransformFromAxesAndOrigin(axes[0], axes[1], axes[2], self.data['center'][i])
+            self._transforms[i] = t
+        return t
+
+    def select(self, mask):
+        '''
+        Returns the descriptors of the clusters selected by a boolean mask or index array.
+        '''
+        return ClusterDescriptors(self.data[mask])
+
+
+def _computeRectangles(points, counts):
+    '''
+    Returns (centers, dims, angles) of the minimum area rectangles of the
+    XY coordinates of each cluster.  The points are sorted by cluster and
+    counts holds the number of points of each cluster.
+    '''
+    rects = boundingrectangle.minimumAreaRectangles(np.split(points[:,:2], np.cumsum(counts)[:-1]))
+    centers = np.array([rect.center for rect in rects])
+    dims = np.array([[rect.width, rect.height] for rect in rects])
+    angles = np.array([rect.angle for rect in rects])
+    return centers, dims, angles
+
+
+def computeClusterDescriptors(points, labels, upVector=(0.0, 0.0, 1.0), numberOfClusters=None):
+    '''
+    Returns ClusterDescriptors for the clusters of the Nx3 points.  Points
+    with label <= 0 are ignored.  Clusters are ordered by label.  If
+    numberOfClusters is given, there is one record for each of the labels
+    1 to numberOfClusters, and clusters without points have zero
+    numberOfPoints and zero dims.
+    '''
+    descriptors = _computeDescriptors(points, labels, upVector)
+    if numberOfClusters is None:
+        return descriptors
+
+    data = np.zeros(numberOfClusters, dtype=descriptorDataType)
+    data['label'] = np.arange(1, numberOfClusters + 1)
+    present = descriptors['label'] <= numberOfClusters
+    data[descriptors['label'][present] - 1] = descriptors.data[present]
+    return ClusterDescriptors(data)
+
+
+def _computeDescriptors(points, labels, upVector):
+    points = np.asarray(points, dtype=np.float64)
+    labels = np.asarray(labels)
+    upVector = np.asarray(upVector, dtype=np.float64)
+
+    # sorting by label once lets every segmented reduction below skip its own sort
+    valid = (labels > 0) & np.isfinite(points).all(axis=1)
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(labels[order], kind='mergesort')]
+    points, labels = points[order], labels[order]
+
+    reducer = BinReducer(labels, int(labels.max()) + 1 if len(labels) else 0)
+    clusterBins = reducer.getNonEmptyBins()
+    data = np.zeros(len(clusterBins), dtype=descriptorDataType)
+    if not len(clusterBins):
+        return ClusterDescriptors(data)
+
+    counts = reducer.getCounts()[clusterBins]
+    centroids = reducer.mean(points)
+
+    # covariance from the segmented sums of the centered outer products
+    centered = points - centroids[labels]
+    outer = (centered[:,:,np.newaxis] * centered[:,np.newaxis,:]).reshape(-1, 9)
+    covariances = (reducer.sum(outer)[clusterBins] / counts[:,np.newaxis]).reshape(-1, 3, 3)
+
+    # eigh sorts eigenvalues ascending, take the principal axes largest first
+    _, eigenvectors = np.linalg.eigh(covariances)
+    axes = eigenvectors[:,:,::-1].transpose(0, 2, 1).copy()
+    axes[:,2] = np.cross(axes[:,0], axes[:,1])
+
+    zAxisIndex = np.abs(np.dot(axes, upVector)).argmax(axis=1)
+    axisOrder = np.column_stack([(zAxisIndex + 1) % 3, (zAxisIndex + 2) % 3, zAxisIndex])
+    axes = axes[np.arange(len(axes))[:,np.newaxis], axisOrder]
+    flip = np.dot(axes[:,2], upVector) < 0
+    axes[flip, 1:] *= -1
+
+    # box extents along the axes of each point's cluster
+    binToCluster = np.zeros(reducer.numberOfBins, dtype=np.int64)
+    binToCluster[clusterBins] = np.arange(len(clusterBins))
+    pointAxes = axes[binToCluster[labels]]
+    projected = np.einsum('nij,nj->ni', pointAxes, centered)
+    lower = reducer.min(projected)[clusterBins]
+    upper = reducer.max(projected)[clusterBins]
+
+    data['label'] = clusterBins
+    data['numberOfPoints'] = counts
+    data['centroid'] = centroids[clusterBins]
+    data['axes'] = axes
+    data['dims'] = upper - lower
+    data['center'] = data['centroid'] + np.einsum('nij,ni->nj', axes, (lower + upper) / 2.0)
+    data['rectCenter'], data['rectDims'], data['rectAngle'] = _computeRectangles(points, counts)
+
+    return ClusterDescriptors(data)
+
+
+def computeClusterDescriptorsFromPolyData(polyDataList, **kwargs):
+    '''
+    Returns ClusterDescriptors with one record for each polydata in the
+    list, cluster i having label i + 1.
+    '''
+    # the leading empty arrays keep vstack valid for an empty list
+    points = [np.zeros((0, 3))] + [vnp.getNumpyFromVtk(polyData, 'Points') for polyData in polyDataList if polyData.GetNumberOfPoints()]
+    labels = [np.zeros(0, dtype=np.int64)] + [np.repeat(i + 1, polyData.GetNumberOfPoints()) for i, polyData in enumerate(polyDataList)]
+    return computeClusterDescriptors(np.vstack(points), np.concatenate(labels), numberOfClusters=len(polyDataList), **kwargs)
@@ -25,8 +25,7 @@ def setVisProperties(obj, colorModeEnabled):
 
 def colorizePoints(polyData):
     cameras = ['CAMERACHEST_RIGHT', 'CAMERACHEST_LEFT', 'CAMERA_LEFT']
-    for camera in cameras:
-        cameraview.colorizePoints(polyData, camera)
+    cameraview.colorizePoints(polyData, cameras)
 
 
 def colorizeSegmentationLidar(enabled):
@@ -10,6 +10,7 @@ import ihmc
 from director import lcmUtils
 from director import ioUtils
 from director import segmentation
+from director import segmentationprofile
 from director import objectmodel as om
 from director import visualization as vis
 from director.debugVis import DebugData
@@ -28,8 +29,6 @@ import drc as lcmdrc
 import bot_core
 import atlas
 
-from thirdparty import qhull_2d
-from thirdparty import min_bounding_rect
 
 from PythonQt import QtCore,QtGui
 
@@ -148,37 +147,23 @@ class ContinousWalkingDemo(object):
         self.footstepsPanel.driver.applyDefaults('BDI')
 
 
+    @segmentationprofile.profiled
     def getRecedingTerrainRegion(self, polyData, linkFrame):
         ''' Find the point cloud in front of the foot frame'''
 
-        #polyData = shallowCopy(polyData)
-        points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
-        #vtkNumpy.addNumpyToVtk(polyData, points[:,0].copy(), 'x')
-        #vtkNumpy.addNumpyToVtk(polyData, points[:,1].copy(), 'y')
-        #vtkNumpy.addNumpyToVtk(polyData, points[:,2].copy(), 'z')
-
-        viewOrigin = linkFrame.TransformPoint([0.0, 0.0, 0.0])
-        viewX = linkFrame.TransformVector([1.0, 0.0, 0.0])
-        viewY = linkFrame.TransformVector([0.0, 1.0, 0.0])
-        viewZ = linkFrame.TransformVector([0.0, 0.0, 1.0])
-        polyData = segmentation.labelPointDistanceAlongAxis(polyData, viewX, origin=viewOrigin, resultArrayName='distance_along_foot_x')
-        polyData = segmentation.labelPointDistanceAlongAxis(polyData, viewY, origin=viewOrigin, resultArrayName='distance_along_foot_y')
-        polyData = segmentation.labelPointDistanceAlongAxis(polyData, viewZ, origin=viewOrigin, resultArrayName='distance_along_foot_z')
-
         if self.chosenTerrain == 'stairs':
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_x', [0.30, 1.6])
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_y', [-0.45, 0.45])
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_z', [-0.4, 0.9])
+            bounds = [[0.30, 1.6], [-0.45, 0.45], [-0.4, 0.9]]
         else:
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_x', [0.12, 1.6])
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_y', [-0.4, 0.4])
-            polyData = segmentation.thresholdPoints(polyData, 'distance_along_foot_z', [-0.4, 0.4])
+            bounds = [[0.12, 1.6], [-0.4, 0.4], [-0.4, 0.4]]
+
+        polyData = segmentation.cropToBounds(polyData, linkFrame, bounds)
 
         vis.updatePolyData( polyData, 'walking snapshot trimmed', parent='cont debug', visible=True)
         return polyData
 
 
 
+    @segmentationprofile.profiled
     def extractBlocksFromSurfaces(self, clusters, linkFrame):
         ''' find the corners of the minimum bounding rectangles '''
         om.removeFromObjectModel(om.findObjectByName('block corners'))
@@ -192,8 +177,7 @@ class ContinousWalkingDemo(object):
 
         # get the rectangles from the clusters:
         blocks = []
-        for i, cluster in enumerate(clusters):
-                cornerTransform, rectDepth, rectWidth, rectArea = segmentation.findMinimumBoundingRectangle( cluster, linkFrame )
+        for cornerTransform, rectDepth, rectWidth, rectArea in segmentation.findMinimumBoundingRectangles(clusters, linkFrame):
                 #print 'min bounding rect:', rectDepth, rectWidth, rectArea, cornerTransform.GetPosition()
 
                 block = BlockTop(cornerTransform, rectDepth, rectWidth, rectArea)
@@ -317,6 +301,7 @@ class ContinousWalkingDemo(object):
         return blocks,match_idx,groundPlane
 
 
+    @segmentationprofile.profiled
     def placeStepsOnBlocks(self, blocks, groundPlane, standingFootName, standingFootFrame, removeFirstLeftStep = True):
 
         footsteps = []
@@ -388,6 +373,7 @@ class ContinousWalkingDemo(object):
 
 
 
+    @segmentationprofile.profiled
     def computeFootstepPlanSafeRegions(self, blocks, robotPose, standingFootName):
 
         print 'planning with safe regions.  %d blocks.' % len(blocks)
@@ -492,6 +478,7 @@ class ContinousWalkingDemo(object):
             obj.safe_region = r
 
 
+    @segmentationprofile.profiled
     def replanFootsteps(self, polyData, standingFootName, removeFirstLeftStep=True, doStereoFiltering=True, nextDoubleSupportPose=None):
 
         obj = om.getOrCreateContainer('continuous')
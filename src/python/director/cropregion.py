@@ -0,0 +1,111 @@
+'''
+Crop region expressions for point clouds.
+
+A CropRegion collects box, bounds, sphere, half-space and line segment
+constraints and evaluates all of them in a single vectorized pass over the
+point array.  The linear constraints are stacked into one matrix so a box
+crop costs one matrix product instead of one labelling and thresholding
+pass per axis.
+
+Example:
+
+    region = CropRegion()
+    region.addBox(frame, [1.0, 0.5, 0.5])
+    region.addSphere(searchPoint, 2.0)
+    polyData = region.crop(polyData)
+'''
+
+from director import transformUtils
+from director import vtkNumpy as vnp
+from director.filterUtils import extractPointsByMask
+import numpy as np
+
+
+class CropRegion(object):
+
+    def __init__(self):
+        self.linearAxes = []
+        self.linearOffsets = []
+        self.linearRanges = []
+        self.spheres = []
+
+    def addLinearConstraint(self, axis, origin, valueRange):
+        '''
+        Keep points p where dot(p - origin, axis) is inside the closed range.
+        Use -np.inf or np.inf for an open ended range.
+        '''
+        axis = np.asarray(axis, dtype=float)
+        self.linearAxes.append(axis)
+        self.linearOffsets.append(np.dot(origin, axis))
+        self.linearRanges.append([valueRange[0], valueRange[1]])
+        return self
+
+    def addLineSegment(self, point1, point2):
+        '''
+        Keep points whose projection onto the line falls between point1 and point2.
+        This is the slab constraint used by segmentation.cropToLineSegment.
+        '''
+        line = np.array(point2, dtype=float) - np.array(point1, dtype=float)
+        length = np.linalg.norm(line)
+        return self.addLinearConstraint(line / length, point1, [0.0, length])
+
+    def addHalfSpace(self, origin, normal, offset=0.0):
+        '''
+        Keep points on the side of the plane that the normal points to,
+        with signed distance to the plane >= offset.
+        '''
+        normal = np.asarray(normal, dtype=float)
+        return self.addLinearConstraint(normal / np.linalg.norm(normal), origin, [offset, np.inf])
+
+    def addBounds(self, transform, bounds):
+        '''
+        bounds is a 3x2 containing the min/max values along the transform axes.
+        '''
+        origin = np.array(transform.GetPosition())
+        axes = transformUtils.getAxesFromTransform(transform)
+        for axis, bound in zip(axes, bounds):
+            axis = np.array(axis)/np.linalg.norm(axis)
+            self.addLinearConstraint(axis, origin, bound)
+        return self
+
+    def addBox(self, transform, dimensions):
+        '''
+        dimensions is length 3 describing box dimensions centered at the transform origin.
+        '''
+        return self.addBounds(transform, [[-length/2.0, length/2.0] for length in dimensions])
+
+    def addSphere(self, origin, radius):
+        self.spheres.append((np.array(origin, dtype=float), float(radius)))
+        return self
+
+    def isEmpty(self):
+        return not (self.linearAxes or self.spheres)
+
+    def computeMask(self, points):
+        '''
+        Returns a boolean array that is True for the points inside every constraint.
+        Points with non-finite coordinates are always rejected.
+        '''
+        mask = np.isfinite(points).all(axis=1)
+
+        if self.linearAxes:
+            axes = np.array(self.linearAxes)
+            ranges = np.array(self.linearRanges, dtype=float)
+            values = np.dot(points, axes.T) - np.array(self.linearOffsets)
+            mask &= ((values >= ranges[:,0]) & (values <= ranges[:,1])).all(axis=1)
+
+        for origin, radius in self.spheres:
+            delta = points - origin
+            mask &= np.einsum('ij,ij->i', delta, delta) <= radius*radius
+
+        return mask
+
+    def crop(self, polyData):
+        '''
+        Returns a new polydata containing the points inside the region.
+        '''
+        if not polyData.GetNumberOfPoints():
+            return extractPointsByMask(polyData, np.zeros(0, dtype=bool))
+
+        points = vnp.getNumpyFromVtk(polyData, 'Points')
+        return extractPointsByMask(polyData, self.computeMask(points))
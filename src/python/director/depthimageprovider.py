@@ -1,16 +1,84 @@
 import director.vtkAll as vtk
 import director.vtkNumpy as vnp
+from director import transformUtils
 import drc as lcmdrc
 import maps as lcmmaps
 import numpy as np
+import collections
+import threading
 import time
 
+
+class DepthMapCache(object):
+    '''
+    Decoded depth maps of a vtkMapServerSource, keyed by (viewId, mapId).
+
+    A map is decoded once, the first time it is requested.  The depth image
+    is returned as a read-only numpy view of the vtk image scalars, without
+    a copy, and the transform as a read-only 4x4 array, so callers share the
+    cached arrays and must copy them before modifying them.
+    '''
+
+    def __init__(self, source, maxEntries=20):
+        self.source = source
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _decode(self, viewId, mapId):
+        depthImage = vtk.vtkImageData()
+        transform = vtk.vtkTransform()
+        self.source.GetDataForMapId(viewId, mapId, depthImage, transform)
+
+        dims = depthImage.GetDimensions()
+        if not depthImage.GetNumberOfPoints():
+            return None, None
+
+        # the numpy array references the vtk scalars, which keeps them alive
+        d = vnp.getNumpyFromVtk(depthImage, 'ImageScalars')
+        d = d.reshape(dims[1], dims[0])
+        d.flags.writeable = False
+        t = transformUtils.getNumpyFromTransform(transform)
+        t.flags.writeable = False
+        return d, t
+
+    def getDepthMapData(self, viewId, mapId=None):
+        '''
+        Returns (depthImage, transform) for the map, by default the current
+        map of the view, or (None, None) if the map is not available.
+        '''
+        if mapId is None:
+            mapId = self.source.GetCurrentMapId(viewId)
+        if mapId < 0:
+            return None, None
+
+        key = (viewId, mapId)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+
+        if entry is None:
+            entry = self._decode(viewId, mapId)
+            if entry[0] is None:
+                return entry
+
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 class DepthImageProvider(object):
 
     def __init__(self):
 
         self.source = vtk.vtkMapServerSource()
         self.source.Start()
+        self.depthMaps = DepthMapCache(self.source)
 
     def waitForSceneHeight(self):
         viewId = lcmmaps.data_request_t.HEIGHT_MAP_SCENE
@@ -20,20 +88,5 @@ class DepthImageProvider(object):
     def getSceneHeightData(self):
         return self.getDepthMapData(lcmmaps.data_request_t.HEIGHT_MAP_SCENE)
 
-    def getDepthMapData(self, viewId):
-
-        mapId = self.source.GetCurrentMapId(viewId)
-        if mapId < 0:
-            return None, None
-
-        depthImage = vtk.vtkImageData()
-        transform = vtk.vtkTransform()
-        # print "getting depth image for viewId {:d} mapId {:d}".format(viewId, mapId)
-        self.source.GetDataForMapId(viewId, mapId, depthImage, transform)
-
-        dims = depthImage.GetDimensions()
-        d = vnp.getNumpyFromVtk(depthImage, 'ImageScalars')
-        d = d.reshape(dims[1], dims[0])
-        t = np.array([[transform.GetMatrix().GetElement(r, c) for c in xrange(4)] for r in xrange(4)])
-
-        return d, t
+    def getDepthMapData(self, viewId, mapId=None):
+        return self.depthMaps.getDepthMapData(viewId, mapId)
@@ -4,10 +4,14 @@ from director import transformUtils
 from director import visualization as vis
 from director import viewbehaviors
 from director import vtkNumpy as vnp
+from director import ioUtils
 from director.debugVis import DebugData
 from director.timercallback import TimerCallback
+from director.fieldcontainer import FieldContainer
 import PythonQt
 import numpy as np
+import math
+import os
 
 
 def computeDepthImageAndPointCloud(depthBuffer, colorBuffer, camera):
@@ -136,6 +140,214 @@ class DepthScanner(object):
 
 
 
+class CameraIntrinsics(object):
+
+    def __init__(self, width, height, focalLength, cx=None, cy=None):
+        '''
+        Pinhole intrinsics in pixels with square pixels, since vtk cameras
+        have a single view angle.  The principal point defaults to the
+        image center.
+        '''
+        self.width = width
+        self.height = height
+        self.focalLength = focalLength
+        self.cx = (width - 1) / 2.0 if cx is None else cx
+        self.cy = (height - 1) / 2.0 if cy is None else cy
+
+    def getViewAngle(self):
+        return math.degrees(2.0 * math.atan(self.height / (2.0 * self.focalLength)))
+
+    def getWindowCenter(self):
+        '''
+        Returns the vtkCamera window center that moves the optical axis to
+        the principal point.
+        '''
+        return (1.0 - 2.0 * (self.cx + 0.5) / self.width, 2.0 * (self.cy + 0.5) / self.height - 1.0)
+
+
+def getCameraPose(position, target, up=(0.0, 0.0, 1.0)):
+    '''
+    Returns the 4x4 camera to local transform of a camera at position
+    looking at target, with the camera z axis forward and y axis down.
+    '''
+    position = np.asarray(position, dtype=np.float64)
+    zaxis = np.asarray(target, dtype=np.float64) - position
+    zaxis /= np.linalg.norm(zaxis)
+    xaxis = np.cross(zaxis, up)
+    if np.linalg.norm(xaxis) < 1e-9:
+        xaxis = np.cross(zaxis, [1.0, 0.0, 0.0] if abs(zaxis[0]) < 0.9 else [0.0, 1.0, 0.0])
+    xaxis /= np.linalg.norm(xaxis)
+    pose = np.eye(4)
+    pose[:3,0] = xaxis
+    pose[:3,1] = np.cross(zaxis, xaxis)
+    pose[:3,2] = zaxis
+    pose[:3,3] = position
+    return pose
+
+
+def depthBufferToDepth(zbuffer, near, far):
+    '''
+    Converts OpenGL depth buffer values in [0, 1] to metric depth along the
+    optical axis.  Pixels without geometry are nan.
+    '''
+    depth = (2.0 * near * far) / (far + near - (2.0 * zbuffer - 1.0) * (far - near))
+    depth[zbuffer >= 1.0] = np.nan
+    return depth
+
+
+class BatchDepthScanner(object):
+    '''
+    Renders depth scans of a scene from many camera poses in an offscreen
+    render window, without the Qt event loop or an on-screen view.  The
+    depth and color buffers are read into arrays that are reused between
+    scans, and depth pixels are unprojected with numpy.
+
+        scanner = BatchDepthScanner()
+        scanner.addActorsFromView(view)
+        intrinsics = CameraIntrinsics(640, 480, 525.0)
+        for scan in scanner.scan(poses, intrinsics):
+            segment(scan.polyData)
+
+    or scanner.writeScans(poses, intrinsics, outputDir) to save them.
+    '''
+
+    def __init__(self, view=None, near=0.1, far=30.0):
+        self.near = near
+        self.far = far
+
+        self.renderer = vtk.vtkRenderer()
+        self.renderer.SetBackground(0.0, 0.0, 0.0)
+        self.renderWindow = vtk.vtkRenderWindow()
+        self.renderWindow.SetOffScreenRendering(1)
+        self.renderWindow.SetMultiSamples(0)
+        self.renderWindow.AddRenderer(self.renderer)
+
+        self.zbuffer = vtk.vtkFloatArray()
+        self.pixels = vtk.vtkUnsignedCharArray()
+        self.pixelGrids = {}
+
+        if view is not None:
+            self.addActorsFromView(view)
+
+    def addActorsFromView(self, view):
+        '''
+        Adds the visible actors of the view.  The actors are shared, so they
+        follow later changes to the view objects.
+        '''
+        props = view.renderer().GetViewProps()
+        props.InitTraversal()
+        for i in xrange(props.GetNumberOfItems()):
+            prop = props.GetNextProp()
+            if isinstance(prop, vtk.vtkActor) and prop.GetVisibility():
+                self.renderer.AddActor(prop)
+
+    def addPolyData(self, polyData, color=(1.0, 1.0, 1.0)):
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(polyData)
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        actor.GetProperty().SetColor(color)
+        self.renderer.AddActor(actor)
+        return actor
+
+    def _getPixelGrid(self, intrinsics):
+        '''
+        Returns the normalized image coordinates (u - cx)/f and (v - cy)/f
+        of every pixel, cached per intrinsics.
+        '''
+        key = (intrinsics.width, intrinsics.height, intrinsics.focalLength, intrinsics.cx, intrinsics.cy)
+        grid = self.pixelGrids.get(key)
+        if grid is None:
+            u = (np.arange(intrinsics.width) - intrinsics.cx) / intrinsics.focalLength
+            v = (np.arange(intrinsics.height) - intrinsics.cy) / intrinsics.focalLength
+            grid = self.pixelGrids[key] = np.meshgrid(u, v)
+        return grid
+
+    def _setCamera(self, cameraToLocal, intrinsics):
+        pose = cameraToLocal if isinstance(cameraToLocal, np.ndarray) else transformUtils.getNumpyFromTransform(cameraToLocal)
+        camera = self.renderer.GetActiveCamera()
+        camera.SetPosition(pose[:3,3])
+        camera.SetFocalPoint(pose[:3,3] + pose[:3,2])
+        camera.SetViewUp(-pose[:3,1])
+        camera.SetViewAngle(intrinsics.getViewAngle())
+        camera.SetWindowCenter(*intrinsics.getWindowCenter())
+        camera.SetClippingRange(self.near, self.far)
+        return pose
+
+    def render(self, cameraToLocal, intrinsics):
+        '''
+        Renders one scan and returns (depth, rgb, pose): the HxW depth image
+        in meters, nan where nothing was hit, the HxWx3 color image, both
+        with row 0 at the top, and the 4x4 camera to local transform.
+        '''
+        width, height = intrinsics.width, intrinsics.height
+        if tuple(self.renderWindow.GetSize()) != (width, height):
+            self.renderWindow.SetSize(width, height)
+
+        pose = self._setCamera(cameraToLocal, intrinsics)
+        self.renderWindow.Render()
+
+        self.renderWindow.GetZbufferData(0, 0, width - 1, height - 1, self.zbuffer)
+        self.renderWindow.GetPixelData(0, 0, width - 1, height - 1, 1, self.pixels)
+
+        # the buffers are reused, so the flipped images are copied out of them
+        zbuffer = vnp.numpy_support.vtk_to_numpy(self.zbuffer).reshape(height, width)[::-1]
+        rgb = vnp.numpy_support.vtk_to_numpy(self.pixels).reshape(height, width, 3)[::-1].copy()
+        depth = depthBufferToDepth(zbuffer.astype(np.float64), self.near, self.far)
+        return depth, rgb, pose
+
+    def unproject(self, depth, intrinsics, pose=None):
+        '''
+        Returns the points of the valid depth pixels, in the local frame if
+        the camera pose is given, and the flat indices of those pixels.
+        '''
+        u, v = self._getPixelGrid(intrinsics)
+        ids = np.flatnonzero(np.isfinite(depth))
+        z = depth.ravel()[ids]
+        points = np.column_stack([u.ravel()[ids] * z, v.ravel()[ids] * z, z])
+        if pose is not None:
+            points = np.dot(points, pose[:3,:3].T) + pose[:3,3]
+        return points, ids
+
+    def scanPose(self, cameraToLocal, intrinsics):
+        '''
+        Returns a FieldContainer with the depth image, rgb image, camera pose,
+        the local points with their colors and the point cloud as polydata.
+        '''
+        depth, rgb, pose = self.render(cameraToLocal, intrinsics)
+        points, ids = self.unproject(depth, intrinsics, pose)
+        colors = rgb.reshape(-1, 3)[ids]
+        polyData = vnp.numpyToPolyData(points, pointData={'rgb' : colors}, copy=False)
+        return FieldContainer(depth=depth, rgb=rgb, cameraToLocal=pose, points=points, colors=colors, polyData=polyData)
+
+    def scan(self, cameraPoses, intrinsics):
+        '''
+        Yields a scan, see scanPose, for each camera pose.  intrinsics is a
+        CameraIntrinsics or a list with one per pose.
+        '''
+        for i, pose in enumerate(cameraPoses):
+            yield self.scanPose(pose, intrinsics[i] if isinstance(intrinsics, (list, tuple)) else intrinsics)
+
+    def writeScans(self, cameraPoses, intrinsics, outputDir, writePolyData=False):
+        '''
+        Writes each scan as scan_NNNNN.npz with the depth, rgb and pose
+        arrays, and optionally the point cloud as scan_NNNNN.vtp.  Returns
+        the list of written npz files.
+        '''
+        if not os.path.isdir(outputDir):
+            os.makedirs(outputDir)
+
+        filenames = []
+        for i, scan in enumerate(self.scan(cameraPoses, intrinsics)):
+            filename = os.path.join(outputDir, 'scan_%05d' % i)
+            np.savez_compressed(filename + '.npz', depth=scan.depth.astype(np.float32), rgb=scan.rgb, cameraToLocal=scan.cameraToLocal)
+            if writePolyData:
+                ioUtils.writePolyData(scan.polyData, filename + '.vtp')
+            filenames.append(filename + '.npz')
+        return filenames
+
+
+
 def main(globalsDict=None):
 
     from director import mainwindowapp
@@ -0,0 +1,149 @@
+'''
+Euclidean clustering by voxel hashing and union-find.
+
+Points are hashed into voxels whose diagonal equals the cluster tolerance,
+so all points in a voxel are within the tolerance of each other and belong
+to the same cluster.  Two voxels are linked only if they contain a pair of
+points within the tolerance, which a k-d tree finds, so the clusters are
+exactly those of PCL Euclidean clustering: the connected components of the
+graph linking points closer than the tolerance.  The pairs are queried in
+chunks of points and reduced to unique voxel links per chunk, which bounds
+the memory used on dense clouds.
+
+The connected components are found with a vectorized union-find: each
+round hooks the larger root of every linked pair onto the smaller one with
+np.minimum.at and then compresses the paths by pointer jumping, so the
+whole cloud is labelled in a few passes over the voxel links regardless of
+the number of clusters.
+
+Cluster labels follow vtkPCLEuclideanClusterExtraction: clusters are
+numbered from 1 in decreasing size and points that are not in a cluster
+within the size limits have label 0.
+'''
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _queryPairs(tree, otherTree, radius):
+    '''
+    Returns (i, j) arrays of the index pairs of points of tree and otherTree
+    within radius of each other.
+    '''
+    try:
+        pairs = tree.sparse_distance_matrix(otherTree, radius, output_type='ndarray')
+        return pairs['i'], pairs['j']
+    except TypeError:
+        # older scipy versions only return a sparse matrix
+        pairs = np.array(tree.sparse_distance_matrix(otherTree, radius).keys(), dtype=np.int64).reshape(-1, 2)
+        return pairs[:,0], pairs[:,1]
+
+
+def _linkCloseVoxels(points, voxelIds, numberOfVoxels, tolerance, chunkSize=16384):
+    '''
+    Returns (u, v) arrays of the distinct voxel pairs, u < v, that contain a
+    pair of points within tolerance of each other.
+    '''
+    tree = cKDTree(points)
+    links = []
+    for start in xrange(0, len(points), chunkSize):
+        chunkTree = cKDTree(points[start:start + chunkSize])
+        i, j = _queryPairs(chunkTree, tree, tolerance)
+        u, v = voxelIds[i + start], voxelIds[j]
+
+        # every pair is found from both of its points, keep one direction
+        forward = u < v
+        links.append(np.unique(u[forward] * numberOfVoxels + v[forward]))
+
+    links = np.unique(np.concatenate(links)) if links else np.zeros(0, dtype=np.int64)
+    return links // numberOfVoxels, links % numberOfVoxels
+
+
+def _findComponents(numberOfNodes, u, v):
+    '''
+    Returns the root node of every node, where nodes linked by (u, v) share
+    a root.  The root of a component is its smallest node.
+    '''
+    parent = np.arange(numberOfNodes)
+
+    while True:
+        pu, pv = parent[u], parent[v]
+        lo, hi = np.minimum(pu, pv), np.maximum(pu, pv)
+        linked = lo != hi
+        if not linked.any():
+            return parent
+
+        # hooking the larger root keeps parent[i] <= i, so there are no cycles
+        np.minimum.at(parent, hi[linked], lo[linked])
+
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+class ClusterResult(object):
+
+    def __init__(self, labels, clusterSizes):
+        self.labels = labels
+        self.clusterSizes = clusterSizes
+        self._clusterIndices = None
+
+    def getNumberOfClusters(self):
+        return len(self.clusterSizes)
+
+    def getClusterIndices(self):
+        '''
+        Returns a list with the sorted point ids of every cluster, largest
+        cluster first.
+        '''
+        if self._clusterIndices is None:
+            order = np.argsort(self.labels, kind='mergesort')
+            order = order[self.labels[order] > 0]
+            self._clusterIndices = np.split(order, np.cumsum(self.clusterSizes)[:-1]) if len(order) else []
+        return self._clusterIndices
+
+
+def clusterPoints(points, clusterTolerance=0.05, minClusterSize=100, maxClusterSize=1e6, clusterInXY=False):
+    '''
+    Clusters the Nx3 points and returns a ClusterResult.  With clusterInXY
+    the z coordinate is ignored, so points that are separated only in z
+    belong to the same cluster.
+    '''
+    points = np.asarray(points)
+    labels = np.zeros(len(points), dtype=np.int32)
+
+    finite = np.isfinite(points).all(axis=1)
+    finiteIds = np.flatnonzero(finite)
+    if not len(finiteIds):
+        return ClusterResult(labels, np.zeros(0, dtype=np.int64))
+
+    finitePoints = np.array(points[finiteIds], dtype=np.float64)
+    if clusterInXY:
+        finitePoints[:,2] = 0.0
+
+    # the voxel diagonal is the cluster tolerance
+    voxelSize = clusterTolerance / np.sqrt(2.0 if clusterInXY else 3.0)
+    keys = np.floor(finitePoints / voxelSize).astype(np.int64)
+    keys -= keys.min(axis=0)
+    extent = keys.max(axis=0) + 1
+    packed = (keys[:,0] * extent[1] + keys[:,1]) * extent[2] + keys[:,2]
+    packedKeys, voxelIds = np.unique(packed, return_inverse=True)
+
+    u, v = _linkCloseVoxels(finitePoints, voxelIds, len(packedKeys), clusterTolerance)
+    roots = _findComponents(len(packedKeys), u, v)
+
+    _, components = np.unique(roots, return_inverse=True)
+    pointComponents = components[voxelIds]
+    componentSizes = np.bincount(pointComponents)
+
+    keep = (componentSizes >= minClusterSize) & (componentSizes <= maxClusterSize)
+    keptComponents = np.flatnonzero(keep)
+    keptComponents = keptComponents[np.argsort(-componentSizes[keptComponents], kind='mergesort')]
+
+    componentLabels = np.zeros(len(componentSizes), dtype=np.int32)
+    componentLabels[keptComponents] = np.arange(1, len(keptComponents) + 1)
+    labels[finiteIds] = componentLabels[pointComponents]
+
+    return ClusterResult(labels, componentSizes[keptComponents])
@@ -2,12 +2,72 @@
 
 import director.vtkAll as vtk
 import director.vtkNumpy as vnp
+from vtk.util import numpy_support
 from director.shallowCopy import shallowCopy
 import numpy as np
 
 
 def thresholdPoints(polyData, arrayName, thresholdRange):
     assert(polyData.GetPointData().GetArray(arrayName))
+
+    if _canUseNumpyThreshold(polyData, polyData.GetPointData(), arrayName):
+        return _thresholdPointsNumpy(polyData, arrayName, thresholdRange)
+    return _thresholdPointsVtk(polyData, arrayName, thresholdRange)
+
+
+def thresholdCells(polyData, arrayName, thresholdRange, arrayType='cells'):
+
+    assert arrayType in ('points', 'cells')
+
+    if arrayType == 'cells':
+        assert(polyData.GetCellData().GetArray(arrayName))
+        attributes = polyData.GetCellData()
+    else:
+        assert(polyData.GetPointData().GetArray(arrayName))
+        attributes = polyData.GetPointData()
+
+    if _canUseNumpyThreshold(polyData, attributes, arrayName) and _hasOneVertexPerPoint(polyData):
+        return _thresholdCellsNumpy(polyData, arrayName, thresholdRange, arrayType)
+    return _thresholdCellsVtk(polyData, arrayName, thresholdRange, arrayType)
+
+
+def extractPointsByMask(polyData, mask):
+    '''
+    Returns a vertex cloud containing the points of polyData where the boolean
+    mask is True, along with their point data.  This produces the same output
+    as thresholdPoints on a mask array without adding the array to the input.
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    assert mask.shape == (polyData.GetNumberOfPoints(),)
+
+    if _isNumpyCompatiblePointCloud(polyData):
+        return _extractPointsByMask(polyData, mask)
+
+    polyData = shallowCopy(polyData)
+    vnp.addNumpyToVtk(polyData, mask.astype(np.uint8), 'extract_mask')
+    polyData = _thresholdPointsVtk(polyData, 'extract_mask', [1, 1])
+    polyData.GetPointData().RemoveArray('extract_mask')
+    return polyData
+
+
+def extractPointsByIds(polyData, ids):
+    '''
+    Returns a vertex cloud containing the points of polyData with the given
+    sorted, unique ids, along with their point data.  This costs O(len(ids))
+    for point clouds, so it is the cheap way to extract many small subsets
+    such as the clusters of euclideanclustering.ClusterResult.
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+
+    if _isNumpyCompatiblePointCloud(polyData):
+        return _extractPointsByIds(polyData, ids)
+
+    mask = np.zeros(polyData.GetNumberOfPoints(), dtype=bool)
+    mask[ids] = True
+    return extractPointsByMask(polyData, mask)
+
+
+def _thresholdPointsVtk(polyData, arrayName, thresholdRange):
     f = vtk.vtkThresholdPoints()
     f.SetInputData(polyData)
     f.ThresholdBetween(thresholdRange[0], thresholdRange[1])
@@ -15,19 +75,16 @@ def thresholdPoints(polyData, arrayName, thresholdRange):
     f.Update()
     return shallowCopy(f.GetOutput())
 
-def thresholdCells(polyData, arrayName, thresholdRange, arrayType='cells'):
 
-    assert arrayType in ('points', 'cells')
+def _thresholdCellsVtk(polyData, arrayName, thresholdRange, arrayType='cells'):
 
     f = vtk.vtkThreshold()
     f.SetInputData(polyData)
     f.ThresholdBetween(thresholdRange[0], thresholdRange[1])
 
     if arrayType == 'cells':
-        assert(polyData.GetCellData().GetArray(arrayName))
         f.SetInputArrayToProcess(0,0,0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS, arrayName)
     else:
-        assert(polyData.GetPointData().GetArray(arrayName))
         f.SetInputArrayToProcess(0,0,0, vtk.vtkDataObject.FIELD_ASSOCIATION_POINTS, arrayName)
 
     f.Update()
@@ -37,6 +94,129 @@ def thresholdCells(polyData, arrayName, thresholdRange, arrayType='cells'):
     return shallowCopy(g.GetOutput())
 
 
+def _thresholdPointsNumpy(polyData, arrayName, thresholdRange):
+    '''
+    Equivalent to vtkThresholdPoints.  The output contains the points whose
+    array value is inside the closed threshold range, all of their point data
+    arrays and one vertex cell per point.
+    '''
+    mask = _getThresholdMask(polyData.GetPointData(), arrayName, thresholdRange)
+    return _extractPointsByMask(polyData, mask)
+
+
+def _thresholdCellsNumpy(polyData, arrayName, thresholdRange, arrayType='cells'):
+    '''
+    Equivalent to vtkThreshold followed by vtkGeometryFilter for point clouds
+    where vertex cell i references point i.  The cell data is gathered with
+    the same mask as the point data.
+    '''
+    if arrayType == 'cells':
+        mask = _getThresholdMask(polyData.GetCellData(), arrayName, thresholdRange)
+    else:
+        mask = _getThresholdMask(polyData.GetPointData(), arrayName, thresholdRange)
+    return _extractPointsByMask(polyData, mask, passCellData=True)
+
+
+def _getThresholdMask(attributes, arrayName, thresholdRange):
+    values = numpy_support.vtk_to_numpy(attributes.GetArray(arrayName))
+    return (values >= thresholdRange[0]) & (values <= thresholdRange[1])
+
+
+def _isNumpyCompatiblePointCloud(polyData):
+    if not polyData.GetNumberOfPoints():
+        return False
+    if polyData.GetNumberOfLines() or polyData.GetNumberOfPolys() or polyData.GetNumberOfStrips():
+        return False
+    return _hasNumpyCompatibleArrays(polyData.GetPointData())
+
+
+def _canUseNumpyThreshold(polyData, attributes, arrayName):
+    '''
+    The numpy threshold path handles point clouds without lines, polys or
+    strips, with a single component threshold array and point data that can
+    be converted to numpy.  Everything else goes through the vtk filters.
+    '''
+    if attributes.GetArray(arrayName).GetNumberOfComponents() != 1:
+        return False
+    return _isNumpyCompatiblePointCloud(polyData)
+
+
+def _hasNumpyCompatibleArrays(attributes):
+    for i in xrange(attributes.GetNumberOfArrays()):
+        array = attributes.GetArray(i)
+        if array is None or array.GetDataType() == vtk.VTK_BIT:
+            return False
+    return True
+
+
+def _hasOneVertexPerPoint(polyData):
+    '''
+    Returns True if the polydata has exactly one vertex cell per point and
+    vertex cell i references point i.
+    '''
+    numberOfPoints = polyData.GetNumberOfPoints()
+    verts = polyData.GetVerts()
+    if verts.GetNumberOfCells() != numberOfPoints:
+        return False
+    if not _hasNumpyCompatibleArrays(polyData.GetCellData()):
+        return False
+
+    if hasattr(verts, 'GetConnectivityArray'):
+        connectivity = numpy_support.vtk_to_numpy(verts.GetConnectivityArray())
+        return np.array_equal(connectivity, np.arange(numberOfPoints))
+
+    connectivity = numpy_support.vtk_to_numpy(verts.GetData())
+    if connectivity.size != 2*numberOfPoints:
+        return False
+    connectivity = connectivity.reshape(-1, 2)
+    return (connectivity[:,0] == 1).all() and np.array_equal(connectivity[:,1], np.arange(numberOfPoints))
+
+
+def _copyArraysByMask(inputAttributes, outputAttributes, mask):
+    _copyArrays(inputAttributes, outputAttributes, lambda values: np.compress(mask, values, axis=0))
+
+
+def _copyArraysByIds(inputAttributes, outputAttributes, ids):
+    _copyArrays(inputAttributes, outputAttributes, lambda values: np.take(values, ids, axis=0))
+
+
+def _copyArrays(inputAttributes, outputAttributes, select):
+    for i in xrange(inputAttributes.GetNumberOfArrays()):
+        array = inputAttributes.GetArray(i)
+        values = select(numpy_support.vtk_to_numpy(array))
+        vtkArray = vnp.getVtkFromNumpy(values)
+        vtkArray.SetName(array.GetName())
+        outputAttributes.AddArray(vtkArray)
+
+        attributeType = inputAttributes.IsArrayAnAttribute(i)
+        if attributeType >= 0:
+            outputAttributes.SetActiveAttribute(array.GetName(), attributeType)
+
+
+def _extractPointsByMask(polyData, mask, passCellData=False):
+    '''
+    Returns a new vertex cloud containing the points selected by mask.
+    Point data arrays are gathered with np.compress, preserving their order
+    and active attributes.  If passCellData is True, the cell data arrays are
+    gathered with the same mask; this requires vertex cell i to reference point i.
+    '''
+    points = vnp.getNumpyFromVtk(polyData, 'Points')
+    outputPolyData = vnp.numpyToPolyData(np.compress(mask, points, axis=0), copy=False)
+
+    _copyArraysByMask(polyData.GetPointData(), outputPolyData.GetPointData(), mask)
+    if passCellData:
+        _copyArraysByMask(polyData.GetCellData(), outputPolyData.GetCellData(), mask)
+
+    return outputPolyData
+
+
+def _extractPointsByIds(polyData, ids):
+    points = vnp.getNumpyFromVtk(polyData, 'Points')
+    outputPolyData = vnp.numpyToPolyData(np.take(points, ids, axis=0), copy=False)
+    _copyArraysByIds(polyData.GetPointData(), outputPolyData.GetPointData(), ids)
+    return outputPolyData
+
+
 def transformPolyData(polyData, transform):
 
     t = vtk.vtkTransformPolyDataFilter()
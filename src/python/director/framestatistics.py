@@ -0,0 +1,137 @@
+'''
+Frame statistics and poll rate control for sensor sources that keep only
+their latest frame.
+
+The C++ point cloud queues store the newest message and drop the older ones,
+so a source that polls them converts at most one frame per tick however far
+behind it is.  The queues count the messages they receive, so FrameStatistics
+takes the frames received between two polls from that count and counts all
+but the latest as dropped.  AdaptiveRate lowers the poll rate when the
+measured cost of a frame, conversion and rendering, would use more than a
+budget of the main thread time.
+
+    statistics.addFrame(queue.getCurrentUtime(), queue.getNumberOfFrames())
+    ...convert and show the frame...
+    statistics.addConversion(utime)
+    rate.addCost(conversionSeconds + renderSeconds)
+    timer.targetFps = rate.getFps()
+'''
+
+from director import objectmodel as om
+from director.utime import getUtime
+
+
+class FrameStatistics(object):
+
+    def __init__(self, alpha=0.1):
+        '''
+        alpha is the weight of a new sample in the moving average latency.
+        '''
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.framesReceived = 0
+        self.framesDropped = 0
+        self.framesConverted = 0
+        self.averageLatency = 0.0
+        self.lastUtime = None
+        self.lastFrameCount = None
+
+    def addFrame(self, utime, frameCount=None):
+        '''
+        Records the utime of the latest frame in the queue and returns True if
+        it is a new frame.  frameCount is the number of frames the queue has
+        received, when given the frames received since the last poll are
+        taken from it and all but the latest are counted as dropped.
+        '''
+        if utime == self.lastUtime:
+            return False
+
+        frames = 1
+        if frameCount is not None and self.lastFrameCount is not None:
+            frames = max(frameCount - self.lastFrameCount, 1)
+
+        self.framesReceived += frames
+        self.framesDropped += frames - 1
+        self.lastUtime = utime
+        self.lastFrameCount = frameCount
+        return True
+
+    def skipFrames(self):
+        '''
+        Called while the source is not polling, so the frames the queue
+        receives in the meantime are not counted as dropped.
+        '''
+        self.lastFrameCount = None
+
+    def addConversion(self, utime, nowUtime=None):
+        '''
+        Records the conversion of the frame with this utime.  The latency is
+        the time from the frame utime to nowUtime, by default the current time.
+        '''
+        latency = ((nowUtime if nowUtime is not None else getUtime()) - utime) * 1e-6
+        self.framesConverted += 1
+        if self.framesConverted == 1:
+            self.averageLatency = latency
+        else:
+            self.averageLatency += self.alpha * (latency - self.averageLatency)
+
+
+class AdaptiveRate(object):
+
+    def __init__(self, minimumFps=1.0, maximumFps=30.0, budget=0.5, alpha=0.2):
+        '''
+        budget is the fraction of the main thread time that the frames of a
+        source may use, alpha is the weight of a new sample in the moving
+        average cost.
+        '''
+        self.minimumFps = minimumFps
+        self.maximumFps = maximumFps
+        self.budget = budget
+        self.alpha = alpha
+        self.averageCost = None
+
+    def reset(self):
+        self.averageCost = None
+
+    def addCost(self, seconds):
+        '''
+        Records the cost in seconds of converting and rendering a frame.
+        '''
+        if self.averageCost is None:
+            self.averageCost = seconds
+        else:
+            self.averageCost += self.alpha * (seconds - self.averageCost)
+
+    def getFps(self):
+        '''
+        Returns the highest poll rate between minimumFps and maximumFps at
+        which the average frame cost stays within the budget.
+        '''
+        if not self.averageCost:
+            return self.maximumFps
+        fps = self.budget / self.averageCost
+        return max(self.minimumFps, min(fps, self.maximumFps))
+
+
+statisticsPropertyNames = ('Frames Received', 'Frames Dropped', 'Frames Converted', 'Average Latency (ms)', 'Poll Rate')
+
+
+def addStatisticsProperties(obj):
+    '''
+    Adds read-only properties for the statistics of a source to an object
+    model item.
+    '''
+    for name in statisticsPropertyNames[:3]:
+        obj.addProperty(name, 0, attributes=om.PropertyAttributes(decimals=0, minimum=0, maximum=1e9, readOnly=True))
+    obj.addProperty('Average Latency (ms)', 0.0, attributes=om.PropertyAttributes(decimals=1, minimum=0.0, maximum=1e9, readOnly=True))
+    obj.addProperty('Poll Rate', 0.0, attributes=om.PropertyAttributes(decimals=1, minimum=0.0, maximum=1e3, readOnly=True))
+
+
+def updateStatisticsProperties(obj, statistics, pollRate):
+    values = (statistics.framesReceived, statistics.framesDropped, statistics.framesConverted,
+              round(statistics.averageLatency * 1e3, 1), round(pollRate, 1))
+    for name, value in zip(statisticsPropertyNames, values):
+        if obj.getProperty(name) != value:
+            obj.setProperty(name, value)
@@ -0,0 +1,144 @@
+'''
+Incremental ground plane tracking across point cloud updates.
+
+The ground barely moves between lidar revolutions, so instead of running
+RANSAC on every cloud the tracker keeps the current plane and refines it
+with a weighted least squares fit to the points near the previous plane.
+The weights fall off with the distance to the plane (Cauchy weights with
+the scale of the inlier threshold), so objects standing on the ground do
+not pull the estimate.
+
+A full RANSAC fit on a slab around the 5th percentile height is only run
+when there is no estimate yet, or when the refined plane is not trusted:
+too few inliers, a normal too far from the up axis, or a mean residual
+that jumps above residualRatio times its running average, as happens when
+the robot steps onto a different level.
+'''
+
+import threading
+import numpy as np
+
+from director import planeransac
+from director.fieldcontainer import FieldContainer
+
+
+class GroundPlaneTracker(object):
+
+    def __init__(self, distanceThreshold=0.02, searchDistance=0.1, searchRegionThickness=0.5,
+                 upAxis=(0.0, 0.0, 1.0), angleEpsilon=0.2, minInliers=100, residualRatio=2.0,
+                 refineIterations=2, residualSmoothing=0.3):
+
+        self.distanceThreshold = distanceThreshold
+        self.searchDistance = searchDistance
+        self.searchRegionThickness = searchRegionThickness
+        self.upAxis = np.asarray(upAxis, dtype=np.float64) / np.linalg.norm(upAxis)
+        self.angleEpsilon = angleEpsilon
+        self.minInliers = minInliers
+        self.residualRatio = residualRatio
+        self.refineIterations = refineIterations
+        self.residualSmoothing = residualSmoothing
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.origin = None
+            self.normal = None
+            self.meanResidual = None
+            self.numberOfUpdates = 0
+            self.numberOfRefits = 0
+
+    def hasEstimate(self):
+        return self.normal is not None
+
+    def _orient(self, normal):
+        return -normal if np.dot(normal, self.upAxis) < 0 else normal
+
+    def _isUpright(self, normal):
+        return np.dot(normal, self.upAxis) >= np.cos(self.angleEpsilon)
+
+    def _refine(self, points, origin, normal):
+        '''
+        Iteratively reweighted least squares fit to the points within
+        searchDistance of the given plane.  Returns (origin, normal,
+        numberOfInliers, meanResidual), or None if there are fewer than
+        minInliers points near the plane.
+        '''
+        points = points[np.abs(np.dot(points - origin, normal)) <= self.searchDistance]
+        if len(points) < max(self.minInliers, 3):
+            return None
+
+        for i in xrange(self.refineIterations):
+            dist = np.dot(points - origin, normal)
+            weights = 1.0 / (1.0 + (dist / self.distanceThreshold)**2)
+            origin = np.dot(weights, points) / weights.sum()
+            centered = points - origin
+            _, eigenvectors = np.linalg.eigh(np.dot(centered.T * weights, centered))
+            normal = self._orient(eigenvectors[:,0])
+
+        dist = np.abs(np.dot(points - origin, normal))
+        return origin, normal, int(np.count_nonzero(dist <= self.distanceThreshold)), dist.mean()
+
+    def _fitRansac(self, points):
+        '''
+        Full RANSAC fit in a slab around the 5th percentile height.  Returns
+        (origin, normal) or None.
+        '''
+        heights = np.dot(points, self.upAxis)
+        groundHeight = np.percentile(heights, 5)
+        searchRegion = np.abs(heights - groundHeight) <= self.searchRegionThickness/2.0
+
+        plane = planeransac.fitPlane(points, self.distanceThreshold, perpendicularAxis=self.upAxis,
+                                     angleEpsilon=self.angleEpsilon, mask=searchRegion)
+        if plane is None:
+            return None
+        return plane.origin, self._orient(np.array(plane.normal))
+
+    def _isTrusted(self, numberOfInliers, meanResidual, normal):
+        if numberOfInliers < self.minInliers or not self._isUpright(normal):
+            return False
+        if self.meanResidual is None:
+            return True
+        return meanResidual <= self.residualRatio * max(self.meanResidual, self.distanceThreshold/4.0)
+
+    def update(self, points):
+        '''
+        Updates the ground estimate from the Nx3 points and returns a
+        FieldContainer with fields origin, normal, numberOfInliers,
+        meanResidual and refit, which is True if RANSAC was run.  Returns
+        None if no ground plane could be found; the previous estimate is
+        then kept.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points) < 3:
+            return None
+
+        with self.lock:
+
+            refit = True
+            if self.hasEstimate():
+                result = self._refine(points, self.origin, self.normal)
+                if result is not None:
+                    origin, normal, numberOfInliers, meanResidual = result
+                    refit = not self._isTrusted(numberOfInliers, meanResidual, normal)
+
+            if refit:
+                plane = self._fitRansac(points)
+                result = self._refine(points, *plane) if plane is not None else None
+                if result is None:
+                    return None
+                origin, normal, numberOfInliers, meanResidual = result
+                self.meanResidual = None
+                self.numberOfRefits += 1
+
+            self.origin, self.normal = origin, normal
+            self.numberOfUpdates += 1
+            if self.meanResidual is None:
+                self.meanResidual = meanResidual
+            else:
+                self.meanResidual += self.residualSmoothing * (meanResidual - self.meanResidual)
+
+            return FieldContainer(origin=origin.copy(), normal=normal.copy(), numberOfInliers=numberOfInliers,
+                                  meanResidual=meanResidual, refit=refit)
+
@@ -0,0 +1,283 @@
+'''
+Point-to-plane ICP registration with numpy.
+
+The source points are registered to the target cloud coarse to fine: at
+each level the source is downsampled with a voxel grid of the level leaf
+size (see voxelpyramid) and correspondences are searched within
+correspondenceScale leaf sizes, so the coarse levels converge from a
+rough initial pose with few points and the fine levels only polish the
+result.  Correspondences are the nearest target points from the spatial
+index of the target, which is cached for polydata targets and shared
+with the other segmentation routines (see spatialindex).
+
+Each iteration minimizes the point-to-plane distances (p - q) . n to the
+target normals n, linearized for a small rotation, as one 6x6 least
+squares solve.  Degenerate directions, such as sliding along a planar
+target, are left unchanged by the minimum norm solution.  Only the
+trimFraction closest correspondences are used, which rejects outliers
+and partial overlap.  Target normals are estimated on demand for the
+target points that become correspondences from their normalNeighbors
+nearest neighbors, see normalestimation.
+
+The result reports the residual, the number of correspondences and the
+elapsed time of every iteration.
+'''
+
+import time
+import numpy as np
+
+from director import filterUtils
+from director import spatialindex
+from director import transformUtils
+from director import voxelpyramid
+from director import vtkNumpy as vnp
+from director.normalestimation import NormalEstimator
+from director.fieldcontainer import FieldContainer
+from vtk.util import numpy_support
+
+
+def _rotationFromVector(w):
+    '''
+    Returns the rotation matrix of the rotation vector w (Rodrigues formula).
+    '''
+    angle = np.linalg.norm(w)
+    if angle < 1e-12:
+        return np.eye(3)
+    k = w / angle
+    K = np.array([[0, -k[2], k[1]], [k[2], 0, -k[0]], [-k[1], k[0], 0]])
+    return np.eye(3) + np.sin(angle)*K + (1 - np.cos(angle))*np.dot(K, K)
+
+
+class _TargetNormals(object):
+    '''
+    Target normals computed once per target point on first use.
+    '''
+
+    def __init__(self, index, targetPoints, k, normals=None):
+        self.index = index
+        self.targetPoints = targetPoints
+        self.estimator = NormalEstimator(k=k)
+        self.normals = normals
+        self.knownIds = np.zeros(0, dtype=np.int64)
+        self.knownNormals = np.zeros((0, 3))
+
+    def get(self, ids):
+        if self.normals is not None:
+            return self.normals[ids]
+
+        uniqueIds = np.unique(ids)
+        pos = np.minimum(np.searchsorted(self.knownIds, uniqueIds), max(len(self.knownIds) - 1, 0))
+        missing = uniqueIds[self.knownIds[pos] != uniqueIds] if len(self.knownIds) else uniqueIds
+
+        if len(missing):
+            normals, _ = self.estimator.computeWithIndex(self.targetPoints[missing], self.index, self.targetPoints)
+            allIds = np.concatenate([self.knownIds, missing])
+            order = np.argsort(allIds)
+            self.knownIds = allIds[order]
+            self.knownNormals = np.vstack([self.knownNormals, normals])[order]
+
+        return self.knownNormals[np.searchsorted(self.knownIds, ids)]
+
+
+class PointToPlaneICP(object):
+
+    def __init__(self, leafSizes=(0.04, 0.02, 0.01), maxIterations=20, correspondenceScale=4.0,
+                 trimFraction=0.9, normalNeighbors=10, maxSourcePoints=1000, tolerance=1e-4,
+                 relativeTolerance=0.01, minCorrespondences=10):
+        '''
+        leafSizes are the voxel sizes of the source levels, coarse to fine.
+        A leaf size of None uses the source points without downsampling,
+        with the correspondence distance of the previous level.  Levels
+        with more than maxSourcePoints points are randomly subsampled.  A
+        level ends when the step is below tolerance, in radians and meters,
+        or when the residual improves by less than relativeTolerance.
+        '''
+        self.leafSizes = leafSizes
+        self.maxIterations = maxIterations
+        self.correspondenceScale = correspondenceScale
+        self.trimFraction = trimFraction
+        self.normalNeighbors = normalNeighbors
+        self.maxSourcePoints = maxSourcePoints
+        self.tolerance = tolerance
+        self.relativeTolerance = relativeTolerance
+        self.minCorrespondences = minCorrespondences
+
+    def _getCorrespondences(self, points, index, maxDistance):
+        '''
+        Returns (sourceIds, targetIds, distances) of the trimmed nearest neighbor correspondences.
+        '''
+        ids, dists = index.nearestBatch(points, 1, maxDistance)
+        ids, dists = ids[:,0], dists[:,0]
+        sourceIds = np.flatnonzero(ids >= 0)
+        dists = dists[sourceIds]
+
+        numberToKeep = int(np.ceil(self.trimFraction * len(sourceIds)))
+        if numberToKeep < len(sourceIds):
+            keep = np.argsort(dists)[:numberToKeep]
+            sourceIds = sourceIds[keep]
+            dists = dists[keep]
+
+        return sourceIds, ids[sourceIds], dists
+
+    def _solve(self, p, q, n, sourceNormals):
+        '''
+        Returns the rotation vector and translation that minimize the
+        linearized point-to-plane distances, and the rms distance before the
+        step.  With sourceNormals the normals n rotate with the source points.
+        '''
+        r = np.einsum('ij,ij->i', p - q, n)
+        J = np.hstack([np.cross(q if sourceNormals else p, n), n])
+        x = np.linalg.lstsq(np.dot(J.T, J), -np.dot(J.T, r), rcond=-1)[0]
+        return x[:3], x[3:], np.sqrt(np.mean(r**2))
+
+    def register(self, sourcePoints, targetPoints, targetIndex=None, initialTransform=None, targetNormals=None, sourceNormals=None):
+        '''
+        Registers the Nx3 sourcePoints to targetPoints.  targetIndex is a
+        SpatialIndex over targetPoints, built if not given.  initialTransform
+        is a 4x4 matrix applied to the source before the first iteration.
+        The planes are taken from targetNormals if given, otherwise from
+        sourceNormals, such as the face normals of a mesh, and otherwise
+        from normals estimated on the target.
+        Returns a FieldContainer with fields:
+
+            matrix:    4x4 transform that maps the source onto the target
+            residual:  rms point-to-plane distance of the last iteration
+            fitness:   fraction of the finest level source points with a correspondence
+            converged: True if the last level converged within maxIterations
+            iterations: list of (leafSize, numberOfCorrespondences, residual, elapsed) tuples
+            elapsed:   total time in seconds
+        '''
+        startTime = time.time()
+
+        sourcePoints = np.asarray(sourcePoints, dtype=np.float64)
+        finite = np.isfinite(sourcePoints).all(axis=1)
+        sourcePoints = sourcePoints[finite]
+        if targetNormals is None and sourceNormals is not None:
+            sourceNormals = np.asarray(sourceNormals, dtype=np.float64)[finite]
+        else:
+            sourceNormals = None
+
+        targetPoints = np.asarray(targetPoints)
+        if targetIndex is None:
+            targetIndex = spatialindex.SpatialIndex(targetPoints)
+
+        normals = _TargetNormals(targetIndex, targetPoints, self.normalNeighbors, targetNormals)
+        pyramid = voxelpyramid.VoxelPyramid(sourcePoints)
+        random = np.random.RandomState(0)
+
+        matrix = np.eye(4) if initialTransform is None else np.array(initialTransform, dtype=np.float64)
+        iterations = []
+        residual, fitness, converged = np.inf, 0.0, False
+        maxDistance = self.correspondenceScale * 0.01
+
+        for leafSize in self.leafSizes:
+
+            if leafSize is None:
+                points, pointNormals = sourcePoints, sourceNormals
+            else:
+                level = pyramid.getLevel(leafSize)
+                points = level.getCentroids()
+                pointNormals = sourceNormals[level.firstPointIds] if sourceNormals is not None else None
+
+            if len(points) > self.maxSourcePoints:
+                sample = random.choice(len(points), self.maxSourcePoints, replace=False)
+                points = points[sample]
+                pointNormals = pointNormals[sample] if pointNormals is not None else None
+
+            if leafSize is not None:
+                maxDistance = self.correspondenceScale * leafSize
+            converged = False
+            previousResidual = np.inf
+
+            for iteration in xrange(self.maxIterations):
+                iterationStart = time.time()
+
+                transformed = np.dot(points, matrix[:3,:3].T) + matrix[:3,3]
+                sourceIds, targetIds, _ = self._getCorrespondences(transformed, targetIndex, maxDistance)
+
+                if pointNormals is not None:
+                    n = np.dot(pointNormals[sourceIds], matrix[:3,:3].T)
+                else:
+                    n = normals.get(targetIds)
+                valid = np.isfinite(n).all(axis=1)
+                sourceIds, targetIds, n = sourceIds[valid], targetIds[valid], n[valid]
+                fitness = len(sourceIds) / float(max(len(points), 1))
+                if len(sourceIds) < self.minCorrespondences:
+                    break
+
+                w, t, residual = self._solve(transformed[sourceIds], targetPoints[targetIds], n, pointNormals is not None)
+
+                step = np.eye(4)
+                step[:3,:3] = _rotationFromVector(w)
+                step[:3,3] = t
+                matrix = np.dot(step, matrix)
+
+                iterations.append((leafSize, len(sourceIds), residual, time.time() - iterationStart))
+
+                smallStep = np.linalg.norm(w) < self.tolerance and np.linalg.norm(t) < self.tolerance
+                if smallStep or residual > (1.0 - self.relativeTolerance) * previousResidual:
+                    converged = True
+                    break
+                previousResidual = residual
+
+        return FieldContainer(matrix=matrix, residual=residual, fitness=fitness, converged=converged,
+                              iterations=iterations, elapsed=time.time() - startTime)
+
+
+def sampleSurface(polyData, spacing):
+    '''
+    Returns (points, normals) of points sampled uniformly on the triangles
+    of polyData, about one point per spacing x spacing area, and their face
+    normals.  For polyData without polygons the points are returned with
+    normals None.
+    '''
+    points = vnp.getNumpyFromVtk(polyData, 'Points').astype(np.float64) if polyData.GetNumberOfPoints() else np.zeros((0, 3))
+    if not polyData.GetNumberOfPolys():
+        return points, None
+
+    triangles = filterUtils.triangulatePolyData(polyData)
+    cells = numpy_support.vtk_to_numpy(triangles.GetPolys().GetData()).reshape(-1, 4)[:,1:]
+    a, b, c = points[cells[:,0]], points[cells[:,1]], points[cells[:,2]]
+    faceNormals = np.cross(b - a, c - a)
+    areas = np.linalg.norm(faceNormals, axis=1)
+    valid = areas > 0
+    a, b, c = a[valid], b[valid], c[valid]
+    faceNormals = faceNormals[valid] / areas[valid][:,np.newaxis]
+
+    counts = np.ceil(areas[valid] / 2.0 / spacing**2).astype(np.int64)
+    triangleIds = np.repeat(np.arange(len(a)), counts)
+
+    random = np.random.RandomState(0)
+    u, v = random.random_sample(len(triangleIds)), random.random_sample(len(triangleIds))
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+
+    samples = a[triangleIds] + u[:,np.newaxis]*(b - a)[triangleIds] + v[:,np.newaxis]*(c - a)[triangleIds]
+    return samples, faceNormals[triangleIds]
+
+
+def registerPolyData(source, target, initialTransform=None, **kwargs):
+    '''
+    Registers source to the points of target and returns the result of
+    PointToPlaneICP.register with an extra transform field holding the
+    result as a vtkTransform.  Meshes are sampled on their surface at the
+    finest leaf size and registered with their face normals.
+    initialTransform is an optional vtkTransform.  The spatial index of
+    target is cached, so repeated registrations against the same snapshot
+    do not rebuild it.
+    '''
+    registration = PointToPlaneICP(**kwargs)
+    leafSizes = [leafSize for leafSize in registration.leafSizes if leafSize is not None]
+    spacing = min(leafSizes) if leafSizes else 0.01
+    sourcePoints, sourceNormals = sampleSurface(source, spacing)
+
+    targetIndex = spatialindex.getSpatialIndex(target)
+    targetPoints = vnp.getNumpyFromVtk(target, 'Points') if target.GetNumberOfPoints() else np.zeros((0, 3))
+    targetNormals = vnp.getNumpyFromVtk(target, 'normals') if target.GetPointData().GetArray('normals') else None
+
+    if initialTransform is not None:
+        initialTransform = transformUtils.getNumpyFromTransform(initialTransform)
+
+    result = registration.register(sourcePoints, targetPoints, targetIndex, initialTransform, targetNormals, sourceNormals)
+    result._add_fields(transform=transformUtils.getTransformFromNumpy(result.matrix))
+    return result
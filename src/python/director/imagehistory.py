@@ -0,0 +1,172 @@
+'''
+Bounded history of decoded camera images.
+
+An ImageHistory keeps the last images of a camera sorted by utime, up to a
+number of images and a byte budget, and answers time queries:
+
+    utime, image = history.getNearest(revolutionUtime)
+    bracket = history.getBracket(pickUtime)   # images before and after
+
+A TextureCache creates vtkTextures for history images on first use and
+drops the least recently used ones when their images exceed a byte budget.
+'''
+
+import bisect
+import collections
+
+import director.vtkAll as vtk
+
+
+def getImageBytes(image):
+    return image.GetActualMemorySize() * 1024
+
+
+def createTexture(image):
+    tex = vtk.vtkTexture()
+    tex.SetInputData(image)
+    tex.EdgeClampOn()
+    tex.RepeatOff()
+    return tex
+
+
+class ImageBracket(object):
+
+    def __init__(self, utime0, image0, utime1, image1, alpha):
+        '''
+        alpha is the position of the query time between utime0 and utime1,
+        0 at utime0 and 1 at utime1.
+        '''
+        self.utime0 = utime0
+        self.image0 = image0
+        self.utime1 = utime1
+        self.image1 = image1
+        self.alpha = alpha
+
+
+class ImageHistory(object):
+
+    def __init__(self, maxImages=30, maxBytes=64*1024*1024):
+        self.maxImages = maxImages
+        self.maxBytes = maxBytes
+        self.clear()
+
+    def clear(self):
+        self.utimes = []
+        self.images = []
+        self.sizes = []
+        self.numberOfBytes = 0
+
+    def _remove(self, index):
+        self.numberOfBytes -= self.sizes[index]
+        del self.utimes[index]
+        del self.images[index]
+        del self.sizes[index]
+
+    def addImage(self, utime, image):
+        '''
+        Adds an image, replacing an image with the same utime.  The oldest
+        images are dropped to stay within the limits, but the newest image
+        is always kept.
+        '''
+        index = bisect.bisect_left(self.utimes, utime)
+        if index < len(self.utimes) and self.utimes[index] == utime:
+            self._remove(index)
+
+        size = getImageBytes(image)
+        self.utimes.insert(index, utime)
+        self.images.insert(index, image)
+        self.sizes.insert(index, size)
+        self.numberOfBytes += size
+
+        while len(self.utimes) > 1 and (len(self.utimes) > self.maxImages or self.numberOfBytes > self.maxBytes):
+            self._remove(0)
+
+    def getNumberOfImages(self):
+        return len(self.utimes)
+
+    def getNumberOfBytes(self):
+        return self.numberOfBytes
+
+    def getUtimes(self):
+        return list(self.utimes)
+
+    def getImage(self, utime):
+        '''
+        Returns the image with exactly this utime, or None.
+        '''
+        index = bisect.bisect_left(self.utimes, utime)
+        if index < len(self.utimes) and self.utimes[index] == utime:
+            return self.images[index]
+        return None
+
+    def getLatest(self):
+        if not self.utimes:
+            return None, None
+        return self.utimes[-1], self.images[-1]
+
+    def getNearest(self, utime, maxDelta=None):
+        '''
+        Returns (utime, image) of the image nearest in time, or (None, None)
+        if the history is empty or the nearest image is more than maxDelta
+        microseconds away.
+        '''
+        if not self.utimes:
+            return None, None
+
+        index = bisect.bisect_left(self.utimes, utime)
+        if index == len(self.utimes) or (index > 0 and utime - self.utimes[index-1] <= self.utimes[index] - utime):
+            index -= 1
+
+        if maxDelta is not None and abs(self.utimes[index] - utime) > maxDelta:
+            return None, None
+        return self.utimes[index], self.images[index]
+
+    def getBracket(self, utime):
+        '''
+        Returns an ImageBracket with the images just before and just after
+        utime, or None if utime is outside the history.  At an image utime
+        both images of the bracket are that image.
+        '''
+        index = bisect.bisect_left(self.utimes, utime)
+        if index == len(self.utimes):
+            return None
+        if self.utimes[index] == utime:
+            return ImageBracket(utime, self.images[index], utime, self.images[index], 0.0)
+        if index == 0:
+            return None
+
+        utime0, utime1 = self.utimes[index-1], self.utimes[index]
+        alpha = float(utime - utime0) / (utime1 - utime0)
+        return ImageBracket(utime0, self.images[index-1], utime1, self.images[index], alpha)
+
+
+class TextureCache(object):
+
+    def __init__(self, maxBytes=128*1024*1024):
+        self.maxBytes = maxBytes
+        self.textures = collections.OrderedDict()
+        self.numberOfBytes = 0
+
+    def getTexture(self, key, image):
+        '''
+        Returns the texture for the key, creating it from image if needed.
+        '''
+        entry = self.textures.pop(key, None)
+        if entry is None or entry[0].GetInput() is not image:
+            if entry is not None:
+                self.numberOfBytes -= entry[1]
+            entry = (createTexture(image), getImageBytes(image))
+            self.numberOfBytes += entry[1]
+
+        self.textures[key] = entry
+
+        # keep the texture just requested even if it exceeds the budget alone
+        while len(self.textures) > 1 and self.numberOfBytes > self.maxBytes:
+            _, (_, size) = self.textures.popitem(last=False)
+            self.numberOfBytes -= size
+
+        return entry[0]
+
+    def clear(self):
+        self.textures.clear()
+        self.numberOfBytes = 0
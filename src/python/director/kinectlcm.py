@@ -6,6 +6,8 @@ from director import drcargs
 from director.shallowCopy import shallowCopy
 from director.timercallback import TimerCallback
 from director import objectmodel as om
+from director import framestatistics
+from director.simpletimer import SimpleTimer
 import director.vtkAll as vtk
 import PythonQt
 from PythonQt import QtCore, QtGui
@@ -25,16 +27,30 @@ class KinectItem(om.ObjectModelItem):
         self.addProperty('Framerate', model.targetFps,
                          attributes=om.PropertyAttributes(decimals=0, minimum=1.0, maximum=30.0, singleStep=1, hidden=False))
         self.addProperty('Visible', model.visible)
+        framestatistics.addStatisticsProperties(self)
         #self.addProperty('Point Size', model.pointSize,
         #                 attributes=om.PropertyAttributes(decimals=0, minimum=1, maximum=20, singleStep=1, hidden=False))
         #self.addProperty('Alpha', model.alpha,
         #                 attributes=om.PropertyAttributes(decimals=2, minimum=0, maximum=1.0, singleStep=0.1, hidden=False))
         #self.addProperty('Color', QtGui.QColor(255,255,255))
         
+        self.statisticsTimer = TimerCallback(targetFps=1, callback=self._updateStatistics)
+        self.statisticsTimer.start()
+
+    def _updateStatistics(self):
+        framestatistics.updateStatisticsProperties(self, self.model.statistics, self.model.timerCallback.targetFps)
+
+    def onRemoveFromObjectModel(self):
+        om.ObjectModelItem.onRemoveFromObjectModel(self)
+        self.statisticsTimer.stop()
+
     def _onPropertyChanged(self, propertySet, propertyName):
         om.ObjectModelItem._onPropertyChanged(self, propertySet, propertyName)
 
-        if propertyName == 'Updates Enabled':
+        if propertyName in framestatistics.statisticsPropertyNames:
+            return
+
+        elif propertyName == 'Updates Enabled':
             if self.getProperty('Updates Enabled'):
                 self.model.start()
             else:
@@ -91,7 +107,11 @@ class KinectSource(TimerCallback):
         self.queue = PythonQt.dd.ddBotImageQueue(lcmUtils.getGlobalLCMThread())
         self.queue.init(lcmUtils.getGlobalLCMThread(), drcargs.args().config_file)
 
+        self.statistics = framestatistics.FrameStatistics()
+        self.convertedUtime = None
+
         self.targetFps = 30
+        self.rate = framestatistics.AdaptiveRate(maximumFps=self.targetFps)
         self.timerCallback = TimerCallback(targetFps=self.targetFps)
         self.timerCallback.callback = self._updateSource
         #self.timerCallback.start()
@@ -103,25 +123,56 @@ class KinectSource(TimerCallback):
         self.timerCallback.stop()
 
     def setFPS(self, framerate):
+        '''
+        Sets the maximum poll rate, the poll rate is lowered when converting
+        and rendering the frames takes too long.
+        '''
         self.targetFps = framerate
-        self.timerCallback.stop()
-        self.timerCallback.targetFps = framerate
-        self.timerCallback.start()
+        self.rate.maximumFps = framerate
+        self._updateRate()
+
+    def _updateRate(self):
+        if self.polyDataObj.getProperty('Visible'):
+            self.timerCallback.targetFps = self.rate.getFps()
+        else:
+            self.timerCallback.targetFps = self.rate.minimumFps
 
     def setVisible(self, visible):
         self.polyDataObj.setProperty('Visible', visible)
+        self._updateRate()
 
     def _updateSource(self):
+
+        # the queue keeps only the newest frame, fetch it once and only if it is shown
+        if not self.polyDataObj.getProperty('Visible'):
+            self.statistics.skipFrames()
+            self._updateRate()
+            return
+
+        utime = self.KinectQueue.getCurrentUtime()
+        if not utime:
+            return
+
+        self.statistics.addFrame(utime, self.KinectQueue.getNumberOfFrames())
+        if utime == self.convertedUtime:
+            self._updateRate()
+            return
+
         p = vtk.vtkPolyData()
         utime = self.KinectQueue.getPointCloudFromKinect(p)
 
         if not p.GetNumberOfPoints():
             return
 
+        timer = SimpleTimer()
         cameraToLocalFused = vtk.vtkTransform()
         self.queue.getTransform('KINECT_RGB', 'local', utime, cameraToLocalFused)
         p = filterUtils.transformPolyData(p, cameraToLocalFused)
         self.polyDataObj.setPolyData(p)
+        self.convertedUtime = utime
+        self.statistics.addConversion(utime)
+        self.rate.addCost(timer.elapsed() + self.view.renderer().GetLastRenderTimeInSeconds())
+        self._updateRate()
 
         if not self.polyDataObj.initialized:
             self.polyDataObj.setProperty('Color By', 'rgb_colors')
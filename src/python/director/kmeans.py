@@ -0,0 +1,173 @@
+'''
+Mini-batch k-means for large point arrays.
+
+The centroids are seeded with k-means++ on a random subsample and then
+refined with mini-batch updates (Sculley, "Web-scale k-means clustering"):
+every iteration assigns a random batch to the nearest centroids and moves
+each centroid towards the mean of its batch points with a step that decays
+with the number of points it has seen.  Only the final assignment touches
+every point, and it is done in chunks so the distance matrix stays small.
+
+Centroids from a previous labelling can be passed as a warm start, which
+converges in a few batches when the same object is labelled again.
+Centroids that receive no points are reseeded from the subsample.
+'''
+
+import numpy as np
+
+
+def _squaredDistances(data, centroids):
+    '''
+    Returns the NxK squared distances between the rows of data and the centroids.
+    '''
+    dists = np.dot(data, -2.0*centroids.T)
+    dists += (centroids**2).sum(axis=1)
+    dists += (data**2).sum(axis=1)[:,np.newaxis]
+    return dists
+
+
+def seedCentroids(data, numberOfClusters, random):
+    '''
+    Returns k-means++ seed centroids for the rows of data.
+    '''
+    centroids = np.empty((numberOfClusters, data.shape[1]))
+    centroids[0] = data[random.randint(len(data))]
+    minDists = _squaredDistances(data, centroids[:1])[:,0]
+
+    for i in xrange(1, numberOfClusters):
+        total = minDists.sum()
+        if total > 0:
+            index = np.searchsorted(np.cumsum(minDists), random.random_sample() * total)
+            index = min(index, len(data) - 1)
+        else:
+            index = random.randint(len(data))
+        centroids[i] = data[index]
+        minDists = np.minimum(minDists, _squaredDistances(data, centroids[i:i+1])[:,0])
+
+    return centroids
+
+
+class MiniBatchKMeans(object):
+
+    def __init__(self, numberOfClusters, batchSize=10000, maxIterations=100, seedSampleSize=20000,
+                 chunkSize=200000, tolerance=1e-4, maxNoImprovement=10, seed=0):
+        '''
+        Stops when the centroids move less than tolerance, relative to the
+        spread of the data, or when the smoothed batch inertia has not
+        improved for maxNoImprovement batches.
+        '''
+        self.numberOfClusters = numberOfClusters
+        self.batchSize = batchSize
+        self.maxIterations = maxIterations
+        self.seedSampleSize = seedSampleSize
+        self.chunkSize = chunkSize
+        self.tolerance = tolerance
+        self.maxNoImprovement = maxNoImprovement
+        self.random = np.random.RandomState(seed)
+        self.centroids = None
+        self.iterations = 0
+
+    def _sample(self, data, size):
+        '''
+        Returns up to size random finite rows of data as float64.
+        '''
+        sample = data if len(data) <= size else data[self.random.randint(0, len(data), size)]
+        sample = np.asarray(sample, dtype=np.float64)
+        return sample[np.isfinite(sample).all(axis=1)]
+
+    def fit(self, data, initialCentroids=None):
+        '''
+        Computes the centroids of the NxD data and returns them as a KxD
+        array.  initialCentroids are used as a warm start if given.
+        '''
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data[:,np.newaxis]
+
+        seedSample = self._sample(data, self.seedSampleSize)
+        assert len(seedSample), 'no finite data'
+        if initialCentroids is not None and np.shape(initialCentroids) == (self.numberOfClusters, data.shape[1]):
+            centroids = np.array(initialCentroids, dtype=np.float64)
+        else:
+            centroids = seedCentroids(seedSample, self.numberOfClusters, self.random)
+
+        # convergence is measured relative to the spread of the data
+        scale = max(seedSample.std(axis=0).max(), 1e-12)
+        counts = np.zeros(self.numberOfClusters)
+        smoothedInertia, bestInertia, noImprovement = None, np.inf, 0
+
+        for self.iterations in xrange(1, self.maxIterations + 1):
+
+            batch = self._sample(data, self.batchSize)
+            if not len(batch):
+                continue
+            dists = _squaredDistances(batch, centroids)
+            labels = dists.argmin(axis=1)
+            inertia = dists[np.arange(len(labels)), labels].mean()
+            batchCounts = np.bincount(labels, minlength=self.numberOfClusters).astype(np.float64)
+            batchSums = np.column_stack([np.bincount(labels, weights=batch[:,i], minlength=self.numberOfClusters)
+                                         for i in xrange(batch.shape[1])])
+
+            empty = batchCounts == 0
+            if empty.any() and not counts[empty].any():
+                # centroids that never received a point are reseeded
+                centroids[empty] = seedSample[self.random.randint(0, len(seedSample), np.count_nonzero(empty))]
+
+            counts += batchCounts
+            updated = batchCounts > 0
+            step = batchCounts[updated] / counts[updated]
+            newCentroids = centroids.copy()
+            newCentroids[updated] += step[:,np.newaxis] * (batchSums[updated] / batchCounts[updated][:,np.newaxis] - centroids[updated])
+
+            shift = np.abs(newCentroids - centroids).max() / scale
+            centroids = newCentroids
+            if shift < self.tolerance:
+                break
+
+            smoothedInertia = inertia if smoothedInertia is None else 0.7*smoothedInertia + 0.3*inertia
+            if smoothedInertia < bestInertia:
+                bestInertia, noImprovement = smoothedInertia, 0
+            else:
+                noImprovement += 1
+                if noImprovement >= self.maxNoImprovement:
+                    break
+
+        self.centroids = centroids
+        return centroids
+
+    def predict(self, data, centroids=None):
+        '''
+        Returns (labels, squaredDistances) of the nearest centroid for each
+        row of data, computed in chunks.  Non-finite rows get label -1.
+        '''
+        centroids = self.centroids if centroids is None else centroids
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data[:,np.newaxis]
+
+        labels = np.empty(len(data), dtype=np.int32)
+        labels.fill(-1)
+        dists = np.empty(len(data))
+        dists.fill(np.inf)
+
+        for start in xrange(0, len(data), self.chunkSize):
+            chunk = np.asarray(data[start:start + self.chunkSize], dtype=np.float64)
+            finite = np.isfinite(chunk).all(axis=1)
+            chunkDists = _squaredDistances(chunk[finite], centroids)
+            chunkLabels = chunkDists.argmin(axis=1)
+            ids = np.flatnonzero(finite) + start
+            labels[ids] = chunkLabels
+            dists[ids] = chunkDists[np.arange(len(chunkLabels)), chunkLabels]
+
+        return labels, dists
+
+
+def computeLabels(data, numberOfClusters, initialCentroids=None, **kwargs):
+    '''
+    Returns (labels, centroids) of the mini-batch k-means clustering of the
+    rows of data.  See MiniBatchKMeans for the keyword arguments.
+    '''
+    kmeans = MiniBatchKMeans(numberOfClusters, **kwargs)
+    centroids = kmeans.fit(data, initialCentroids)
+    labels, _ = kmeans.predict(data)
+    return labels, centroids
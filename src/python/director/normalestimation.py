@@ -0,0 +1,120 @@
+'''
+Point cloud normal estimation with numpy.
+
+The neighbourhood of every point is gathered from a spatial index as a
+fixed size block of neighbor ids, either the k nearest neighbors or the
+neighbors within a search radius (capped at maxNeighbors).  The covariance
+matrices of a chunk of neighbourhoods are formed in one batched operation
+and solved with np.linalg.eigh.  The normal is the eigenvector of the
+smallest eigenvalue and the curvature is the surface variation
+l0 / (l0 + l1 + l2), as in PCL.  Points with fewer than three neighbors
+get nan normals and curvature.
+
+Normals are flipped to face the viewPoint, or to point against the
+viewDirection if one is given, see flipNormalsWithViewDirection.  Chunks
+can be solved in parallel threads by passing processes > 1.
+'''
+
+import multiprocessing.pool
+import numpy as np
+
+from director import spatialindex
+from director import vtkNumpy as vnp
+
+
+class NormalEstimator(object):
+
+    def __init__(self, searchRadius=0.05, k=None, maxNeighbors=100, chunkSize=10000, processes=None):
+        '''
+        Uses radius neighbourhoods of searchRadius when k is None,
+        otherwise the k nearest neighbors.
+        '''
+        self.searchRadius = searchRadius
+        self.k = k
+        self.maxNeighbors = maxNeighbors
+        self.chunkSize = chunkSize
+        self.processes = processes
+
+    def compute(self, points, searchPolyData, viewPoint=(0.0, 0.0, 0.0), viewDirection=None, cacheIndex=True):
+        '''
+        Returns (normals, curvature) for the Nx3 points, using neighbors
+        from the points of searchPolyData.  Set cacheIndex to False when
+        searchPolyData is a temporary cloud.
+        '''
+        index = spatialindex.getSpatialIndex(searchPolyData, cache=cacheIndex)
+        searchPoints = vnp.getNumpyFromVtk(searchPolyData, 'Points') if index.numberOfPoints else np.zeros((0, 3))
+        return self.computeWithIndex(points, index, searchPoints, viewPoint, viewDirection)
+
+    def computeWithIndex(self, points, index, searchPoints, viewPoint=(0.0, 0.0, 0.0), viewDirection=None):
+        '''
+        Returns (normals, curvature) like compute, using a SpatialIndex built
+        over searchPoints.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        searchPoints = np.vstack([searchPoints, np.zeros((1, 3))])
+
+        chunks = [(start, min(start + self.chunkSize, len(points))) for start in xrange(0, len(points), self.chunkSize)]
+        args = [(index, searchPoints, points[start:end]) for start, end in chunks]
+
+        if self.processes and self.processes > 1 and len(chunks) > 1:
+            pool = multiprocessing.pool.ThreadPool(self.processes)
+            try:
+                results = pool.map(self._computeChunk, args)
+            finally:
+                pool.close()
+        else:
+            results = [self._computeChunk(arg) for arg in args]
+
+        normals = np.vstack([r[0] for r in results]) if results else np.zeros((0, 3))
+        curvature = np.concatenate([r[1] for r in results]) if results else np.zeros(0)
+
+        if viewDirection is not None:
+            flip = np.dot(normals, viewDirection) > 0
+        else:
+            flip = np.einsum('ij,ij->i', np.asarray(viewPoint) - points, normals) < 0
+        normals[flip] *= -1
+
+        return normals, curvature
+
+    def _computeChunk(self, args):
+
+        index, searchPoints, points = args
+
+        if self.k is None:
+            ids, dists = index.nearestBatch(points, self.maxNeighbors, self.searchRadius)
+        else:
+            ids, dists = index.nearestBatch(points, self.k)
+
+        # missing neighbors have id -1, which picks the padding row of searchPoints
+        weights = np.isfinite(dists).astype(np.float64)
+        counts = weights.sum(axis=1)
+        neighbors = searchPoints[ids]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.einsum('nk,nki->ni', weights, neighbors) / counts[:,np.newaxis]
+            centered = (neighbors - means[:,np.newaxis,:]) * weights[:,:,np.newaxis]
+            covariances = np.einsum('nki,nkj->nij', centered, centered) / counts[:,np.newaxis,np.newaxis]
+
+        valid = counts >= 3
+        normals = np.empty((len(points), 3))
+        normals.fill(np.nan)
+        curvature = np.empty(len(points))
+        curvature.fill(np.nan)
+
+        if valid.any():
+            eigenvalues, eigenvectors = np.linalg.eigh(covariances[valid])
+            normals[valid] = eigenvectors[:,:,0]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                curvature[valid] = eigenvalues[:,0] / eigenvalues.sum(axis=1)
+
+        return normals, curvature
+
+
+def computeNormals(polyData, searchPolyData=None, searchRadius=0.05, k=None, viewPoint=(0.0, 0.0, 0.0), viewDirection=None, cacheIndex=True, **kwargs):
+    '''
+    Returns (normals, curvature) for the points of polyData.  Neighbors are
+    taken from searchPolyData if given, otherwise from polyData itself.
+    '''
+    points = vnp.getNumpyFromVtk(polyData, 'Points') if polyData.GetNumberOfPoints() else np.zeros((0, 3))
+    estimator = NormalEstimator(searchRadius, k, **kwargs)
+    return estimator.compute(points, searchPolyData if searchPolyData is not None else polyData, viewPoint, viewDirection, cacheIndex)
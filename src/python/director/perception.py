@@ -14,6 +14,10 @@ import vtkDRCFiltersPython as drc
 from director.debugVis import DebugData
 import director.visualization as vis
 from director import vtkNumpy as vnp
+from director import revolutionhistory
+from director import transformUtils
+from director import depthimageprovider
+from director import callbacks
 import numpy as np
 
 import drc as lcmdrc
@@ -287,6 +291,7 @@ class MultiSenseSource(TimerCallback):
         self.initScanLines()
 
         self.revPolyData = vtk.vtkPolyData()
+        self.revolutionHistory = revolutionhistory.RevolutionHistory()
         self.polyDataObj = vis.PolyDataItem('Multisense Sweep', self.revPolyData, view)
         self.polyDataObj.actor.SetPickable(1)
 
@@ -319,6 +324,7 @@ class MultiSenseSource(TimerCallback):
 
         self.reader.GetDataForRevolution(revId, self.revPolyData)
         self.displayedRevolution = revId
+        self.addRevolutionToHistory(revId)
 
         if self.showRevolutionCallback:
             self.showRevolutionCallback()
@@ -331,6 +337,27 @@ class MultiSenseSource(TimerCallback):
         if self.polyDataObj.getProperty('Visible'):
             self.view.render()
 
+    def addRevolutionToHistory(self, revId):
+        '''
+        Stores the displayed revolution in the revolution history.  A new
+        revolution is shown as soon as it completes, so it is stamped with
+        the current scan time and scan to local transform.  A revolution
+        shown again after a filter change replaces its entry and keeps the
+        time and transform it was first stored with.
+        '''
+        if not self.revPolyData.GetNumberOfPoints():
+            return
+        points = vnp.getNumpyFromVtk(self.revPolyData, 'Points')
+        intensity = vnp.getNumpyFromVtk(self.revPolyData, 'intensity') if self.revPolyData.GetPointData().GetArray('intensity') else None
+
+        info = self.revolutionHistory.getRevolutionInfo(revId)
+        if info is not None:
+            utime, scanToLocal = info.utime, info.scanToLocal
+        else:
+            utime = self.reader.GetCurrentScanTime()
+            scanToLocal = transformUtils.getNumpyFromTransform(self.getFrame('MULTISENSE_SCAN'))
+        self.revolutionHistory.addRevolution(revId, points, intensity, utime, scanToLocal)
+
 
     def setPointSize(self, pointSize):
         for scanLine in self.scanLines:
@@ -700,19 +727,39 @@ class SpindleMonitor(object):
         return self.spindleSpinRateAverager.getAverage()
 
 
-class MapServerSource(TimerCallback):
+class MapServerSource(object):
+    '''
+    Displays the maps received by a vtkMapServerSource.
+
+    The reader receives and decodes the maps on its own lcm thread and
+    writes a byte to a notification pipe after storing each map.  The
+    source watches the pipe with a QSocketNotifier, so the main thread
+    shows new maps as soon as they are stored without polling the reader
+    and without subscribing to the map channels itself.  Functions
+    connected with connectNewMap are called with the view id and map id of
+    each new map.
+    '''
+
+    NEW_MAP_SIGNAL = 'NEW_MAP_SIGNAL'
 
     def __init__(self, view, callbackFunc=None):
-        TimerCallback.__init__(self)
         self.reader = None
         self.folder = None
         self.view = view
         self.displayedMapIds = {}
         self.polyDataObjects = {}
-        self.targetFps = 10
         self.callbackFunc = callbackFunc
         self.colorizeCallback = None
         self.useMeshes = True
+        self.depthMaps = None
+        self.notifier = None
+        self.callbacks = callbacks.CallbackRegistry([self.NEW_MAP_SIGNAL])
+
+    def connectNewMap(self, func):
+        return self.callbacks.connect(self.NEW_MAP_SIGNAL, func)
+
+    def disconnectNewMap(self, callbackId):
+        self.callbacks.disconnect(callbackId)
 
     def getNameForViewId(self, viewId):
 
@@ -722,6 +769,32 @@ class MapServerSource(TimerCallback):
 
         return 'Map View ' + str(viewId)
 
+    def initFolder(self, folder):
+
+        if folder.hasProperty('Min Range'):
+            return
+
+        folder.addProperty('Min Range', self.reader.GetDistanceRange()[0],
+                         attributes=om.PropertyAttributes(decimals=2, minimum=0.0, maximum=100.0, singleStep=0.25, hidden=False))
+        folder.addProperty('Max Range', self.reader.GetDistanceRange()[1],
+                         attributes=om.PropertyAttributes(decimals=2, minimum=0.0, maximum=100.0, singleStep=0.25, hidden=False))
+        folder.addProperty('Edge Filter Angle', self.reader.GetEdgeAngleThreshold(),
+                     attributes=om.PropertyAttributes(decimals=0, minimum=0.0, maximum=60.0, singleStep=1, hidden=False))
+        folder.addProperty('Min Height', self.reader.GetHeightRange()[0],
+                         attributes=om.PropertyAttributes(decimals=2, minimum=-80.0, maximum=80.0, singleStep=0.25, hidden=False))
+        folder.addProperty('Max Height', self.reader.GetHeightRange()[1],
+                         attributes=om.PropertyAttributes(decimals=2, minimum=-80.0, maximum=80.0, singleStep=0.25, hidden=False))
+        folder.properties.connectPropertyChanged(self._onFolderPropertyChanged)
+
+    def _onFolderPropertyChanged(self, propertySet, propertyName):
+        self.updateReaderSettings()
+
+    def updateReaderSettings(self):
+        if self.folder:
+            self.reader.SetDistanceRange(self.folder.getProperty('Min Range'), self.folder.getProperty('Max Range'))
+            self.reader.SetEdgeAngleThreshold(self.folder.getProperty('Edge Filter Angle'))
+            self.reader.SetHeightRange(self.folder.getProperty('Min Height'), self.folder.getProperty('Max Height'))
+
     def updatePolyData(self, viewId, polyData):
 
         obj = self.polyDataObjects.get(viewId)
@@ -743,16 +816,7 @@ class MapServerSource(TimerCallback):
                 obj.setProperty('Surface Mode', 'Wireframe')
 
             folder = om.findObjectByName('Map Server')
-            folder.addProperty('Min Range', self.reader.GetDistanceRange()[0],
-                             attributes=om.PropertyAttributes(decimals=2, minimum=0.0, maximum=100.0, singleStep=0.25, hidden=False))
-            folder.addProperty('Max Range', self.reader.GetDistanceRange()[1],
-                             attributes=om.PropertyAttributes(decimals=2, minimum=0.0, maximum=100.0, singleStep=0.25, hidden=False))
-            folder.addProperty('Edge Filter Angle', self.reader.GetEdgeAngleThreshold(),
-                         attributes=om.PropertyAttributes(decimals=0, minimum=0.0, maximum=60.0, singleStep=1, hidden=False))
-            folder.addProperty('Min Height', self.reader.GetHeightRange()[0],
-                             attributes=om.PropertyAttributes(decimals=2, minimum=-80.0, maximum=80.0, singleStep=0.25, hidden=False))
-            folder.addProperty('Max Height', self.reader.GetHeightRange()[1],
-                             attributes=om.PropertyAttributes(decimals=2, minimum=-80.0, maximum=80.0, singleStep=0.25, hidden=False))
+            self.initFolder(folder)
             om.addToObjectModel(obj, folder)
             om.expand(folder)
             self.folder = folder
@@ -780,45 +844,54 @@ class MapServerSource(TimerCallback):
     def getSceneHeightData(self):
         return self.getDepthMapData(lcmmaps.data_request_t.HEIGHT_MAP_SCENE)
 
-    def getDepthMapData(self, viewId):
-
-        mapId = self.reader.GetCurrentMapId(viewId)
-        if mapId < 0:
-            return None, None
-
-        depthImage = vtk.vtkImageData()
-        transform = vtk.vtkTransform()
-        self.reader.GetDataForMapId(viewId, mapId, depthImage, transform)
-
-        dims = depthImage.GetDimensions()
-        d = vnp.getNumpyFromVtk(depthImage, 'ImageScalars')
-        d = d.reshape(dims[1], dims[0])
-        t = np.array([[transform.GetMatrix().GetElement(r, c) for c in xrange(4)] for r in xrange(4)])
-
-        return d, t
+    def getDepthMapData(self, viewId, mapId=None):
+        '''
+        Returns (depthImage, transform) of the current map of the view, or of
+        the given map id.  The arrays are cached read-only views, see
+        depthimageprovider.DepthMapCache.
+        '''
+        return self.depthMaps.getDepthMapData(viewId, mapId)
 
     def start(self):
         if self.reader is None:
             self.reader = drc.vtkMapServerSource()
             self.reader.Start()
+            self.depthMaps = depthimageprovider.DepthMapCache(self.reader)
 
-        TimerCallback.start(self)
+        if self.notifier is None:
+            self.notifier = QtCore.QSocketNotifier(self.reader.GetNotificationFileDescriptor(), QtCore.QSocketNotifier.Read)
+            self.notifier.connect('activated(int)', self._onNotification)
+        self.notifier.setEnabled(True)
+
+        # show the maps stored before the source was started
+        self.reader.ClearNotifications()
+        self.updateMap()
+
+    def stop(self):
+        '''
+        Stops showing new maps.  The reader keeps receiving them.
+        '''
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+
+    def _onNotification(self, fileDescriptor):
+        self.reader.ClearNotifications()
+        self.updateMap()
 
     def updateMap(self):
-        if (self.folder):
-            self.reader.SetDistanceRange(self.folder.getProperty('Min Range'), self.folder.getProperty('Max Range'))
-            self.reader.SetEdgeAngleThreshold(self.folder.getProperty('Edge Filter Angle'))
-            self.reader.SetHeightRange(self.folder.getProperty('Min Height'), self.folder.getProperty('Max Height'))
-            
+        '''
+        Shows the maps with new ids and returns the number of new maps.
+        '''
         viewIds = self.reader.GetViewIds()
         viewIds = vnp.numpy_support.vtk_to_numpy(viewIds) if viewIds.GetNumberOfTuples() else []
+        newMaps = 0
         for viewId in viewIds:
             mapId = self.reader.GetCurrentMapId(viewId)
             if viewId not in self.displayedMapIds or mapId != self.displayedMapIds[viewId]:
                 self.showMap(viewId, mapId)
-
-    def tick(self):
-        self.updateMap()
+                self.callbacks.process(self.NEW_MAP_SIGNAL, viewId, mapId)
+                newMaps += 1
+        return newMaps
 
 
 def init(view):
@@ -0,0 +1,178 @@
+'''
+Batched RANSAC plane fitting with numpy.
+
+Plane hypotheses are generated in batches from random point triples and
+scored all at once as a matrix product against a random subsample of the
+cloud.  The best hypothesis is refined with a least squares fit to its
+inliers on the full cloud.  fitPlanes extracts the dominant planes of a
+scene one after the other in a single call.
+
+The constraints of the PCL plane segmentation filters are supported:
+perpendicularAxis/angleEpsilon restricts the plane normal to be within
+angleEpsilon radians of the axis, and fit masks can be used to restrict
+the search region, see segmentation.applyPlaneFit.
+'''
+
+import numpy as np
+
+from director.fieldcontainer import FieldContainer
+
+
+def _scoreHypotheses(samplePoints, normals, offsets, distanceThreshold):
+    '''
+    Returns the number of sample points within distanceThreshold of each plane.
+    '''
+    dists = np.abs(np.dot(samplePoints, normals.T) - offsets)
+    return (dists <= distanceThreshold).sum(axis=0)
+
+
+class PlaneRansac(object):
+
+    def __init__(self, distanceThreshold=0.02, perpendicularAxis=None, angleEpsilon=0.2,
+                 maxIterations=1000, batchSize=128, maxSamplePoints=20000,
+                 probability=0.99, refineIterations=2, seed=None):
+
+        self.distanceThreshold = distanceThreshold
+        self.perpendicularAxis = None
+        if perpendicularAxis is not None:
+            self.perpendicularAxis = np.asarray(perpendicularAxis, dtype=float)
+            self.perpendicularAxis /= np.linalg.norm(self.perpendicularAxis)
+        self.angleEpsilon = angleEpsilon
+        self.maxIterations = maxIterations
+        self.batchSize = batchSize
+        self.maxSamplePoints = maxSamplePoints
+        self.probability = probability
+        self.refineIterations = refineIterations
+        self.random = np.random.RandomState(seed)
+
+    def _satisfiesConstraint(self, normals):
+        if self.perpendicularAxis is None:
+            return np.ones(len(normals), dtype=bool)
+        return np.abs(np.dot(normals, self.perpendicularAxis)) >= np.cos(self.angleEpsilon)
+
+    def _generateHypotheses(self, points):
+        '''
+        Returns (normals, offsets) for a batch of planes through random point
+        triples.  Degenerate triples and planes that violate the constraint are dropped.
+        '''
+        ids = self.random.randint(0, len(points), size=(self.batchSize, 3))
+        p0, p1, p2 = points[ids[:,0]], points[ids[:,1]], points[ids[:,2]]
+        normals = np.cross(p1 - p0, p2 - p0)
+        norms = np.linalg.norm(normals, axis=1)
+
+        valid = norms > 1e-9
+        normals = normals[valid] / norms[valid][:,np.newaxis]
+        p0 = p0[valid]
+
+        valid = self._satisfiesConstraint(normals)
+        normals, p0 = normals[valid], p0[valid]
+        return normals, np.einsum('ij,ij->i', normals, p0)
+
+    def _requiredIterations(self, inlierRatio):
+        if inlierRatio <= 0.0:
+            return self.maxIterations
+        if inlierRatio >= 1.0:
+            return 1
+        return np.log(1.0 - self.probability) / np.log(1.0 - inlierRatio**3)
+
+    def _refine(self, points, normal, offset):
+        '''
+        Least squares refinement of the plane to its inliers on the full cloud.
+        '''
+        for i in xrange(self.refineIterations):
+            inliers = np.abs(np.dot(points, normal) - offset) <= self.distanceThreshold
+            if np.count_nonzero(inliers) < 3:
+                break
+            inlierPoints = points[inliers]
+            centroid = inlierPoints.mean(axis=0)
+            _, _, vt = np.linalg.svd(inlierPoints - centroid, full_matrices=False)
+            newNormal = vt[2]
+            if np.dot(newNormal, normal) < 0:
+                newNormal = -newNormal
+            if not self._satisfiesConstraint(newNormal[np.newaxis,:])[0]:
+                break
+            normal, offset = newNormal, np.dot(newNormal, centroid)
+
+        return normal, offset
+
+    def fit(self, points, mask=None):
+        '''
+        Fits a plane to points, or to points[mask] if a boolean mask is given.
+        Returns a FieldContainer with fields:
+
+            normal:    unit plane normal
+            origin:    centroid of the inliers
+            inliers:   boolean array over all of the input points
+            numberOfInliers: inlier count
+            iterations: number of hypotheses scored
+
+        Returns None if no plane satisfying the constraints was found.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        finite = np.isfinite(points).all(axis=1)
+        if mask is not None:
+            finite &= mask
+        candidates = points[finite]
+
+        if len(candidates) < 3:
+            return None
+
+        samplePoints = candidates
+        if len(candidates) > self.maxSamplePoints:
+            samplePoints = candidates[self.random.randint(0, len(candidates), self.maxSamplePoints)]
+
+        bestScore, bestNormal, bestOffset = -1, None, None
+        iterations = 0
+        requiredIterations = self.maxIterations
+
+        while iterations < min(requiredIterations, self.maxIterations):
+
+            normals, offsets = self._generateHypotheses(candidates)
+            iterations += self.batchSize
+            if not len(normals):
+                continue
+
+            scores = _scoreHypotheses(samplePoints, normals, offsets, self.distanceThreshold)
+            best = scores.argmax()
+            if scores[best] > bestScore:
+                bestScore, bestNormal, bestOffset = scores[best], normals[best], offsets[best]
+
+            requiredIterations = self._requiredIterations(bestScore / float(len(samplePoints)))
+
+        if bestNormal is None:
+            return None
+
+        normal, offset = self._refine(candidates, bestNormal, bestOffset)
+
+        inliers = np.zeros(len(points), dtype=bool)
+        inliers[finite] = np.abs(np.dot(candidates, normal) - offset) <= self.distanceThreshold
+        origin = points[inliers].mean(axis=0) if inliers.any() else normal*offset
+
+        return FieldContainer(normal=normal, origin=origin, inliers=inliers,
+                              numberOfInliers=int(np.count_nonzero(inliers)), iterations=iterations)
+
+    def fitPlanes(self, points, maxPlanes=25, minInliers=100, mask=None):
+        '''
+        Extracts up to maxPlanes planes, largest first.  Each plane is fit to
+        the points not claimed by the previous planes.  Stops when the best
+        remaining plane has fewer than minInliers inliers.  Returns a list of
+        the FieldContainer results of fit.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        remaining = np.isfinite(points).all(axis=1)
+        if mask is not None:
+            remaining &= mask
+
+        planes = []
+        while len(planes) < maxPlanes:
+            plane = self.fit(points, remaining)
+            if plane is None or plane.numberOfInliers < minInliers:
+                break
+            planes.append(plane)
+            remaining &= ~plane.inliers
+
+        return planes
+
+
+def fitPlane(points, distanceThreshold=0.02, perpendicularAxis=None, angleEpsilon=0.2, mask=None, **kwargs):
+    return PlaneRansac(distanceThreshold, perpendicularAxis, angleEpsilon, **kwargs).fit(points, mask)
@@ -8,6 +8,7 @@ from director.shallowCopy import shallowCopy
 from director.timercallback import TimerCallback
 from director import vtkNumpy
 from director import objectmodel as om
+from director import framestatistics
 import director.vtkAll as vtk
 from director.debugVis import DebugData
 
@@ -36,11 +37,25 @@ class PointCloudItem(om.ObjectModelItem):
         self.addProperty('Framerate', model.targetFps,
                          attributes=om.PropertyAttributes(decimals=0, minimum=1.0, maximum=30.0, singleStep=1, hidden=False))
         self.addProperty('Visible', model.visible)
+        framestatistics.addStatisticsProperties(self)
         
+        self.statisticsTimer = TimerCallback(targetFps=1, callback=self._updateStatistics)
+        self.statisticsTimer.start()
+
+    def _updateStatistics(self):
+        framestatistics.updateStatisticsProperties(self, self.model.statistics, self.model.timerCallback.targetFps)
+
+    def onRemoveFromObjectModel(self):
+        om.ObjectModelItem.onRemoveFromObjectModel(self)
+        self.statisticsTimer.stop()
+
     def _onPropertyChanged(self, propertySet, propertyName):
         om.ObjectModelItem._onPropertyChanged(self, propertySet, propertyName)
 
-        if propertyName == 'Updates Enabled':
+        if propertyName in framestatistics.statisticsPropertyNames:
+            return
+
+        elif propertyName == 'Updates Enabled':
             if self.getProperty('Updates Enabled'):
                 self.model.start()
             else:
@@ -90,7 +105,11 @@ class PointCloudSource(TimerCallback):
         self.queue = PythonQt.dd.ddBotImageQueue(lcmUtils.getGlobalLCMThread())
         self.queue.init(lcmUtils.getGlobalLCMThread(), drcargs.args().config_file)
 
+        self.statistics = framestatistics.FrameStatistics()
+        self.convertedUtime = None
+
         self.targetFps = 30
+        self.rate = framestatistics.AdaptiveRate(maximumFps=self.targetFps)
         self.timerCallback = TimerCallback(targetFps=self.targetFps)
         self.timerCallback.callback = self._updateSource
         #self.timerCallback.start()
@@ -102,25 +121,56 @@ class PointCloudSource(TimerCallback):
         self.timerCallback.stop()
 
     def setFPS(self, framerate):
+        '''
+        Sets the maximum poll rate, the poll rate is lowered when converting
+        and rendering the frames takes too long.
+        '''
         self.targetFps = framerate
-        self.timerCallback.stop()
-        self.timerCallback.targetFps = framerate
-        self.timerCallback.start()
+        self.rate.maximumFps = framerate
+        self._updateRate()
+
+    def _updateRate(self):
+        if self.polyDataObj.getProperty('Visible'):
+            self.timerCallback.targetFps = self.rate.getFps()
+        else:
+            self.timerCallback.targetFps = self.rate.minimumFps
 
     def setVisible(self, visible):
         self.polyDataObj.setProperty('Visible', visible)
+        self._updateRate()
 
     def _updateSource(self):
+
+        # the queue keeps only the newest frame, fetch it once and only if it is shown
+        if not self.polyDataObj.getProperty('Visible'):
+            self.statistics.skipFrames()
+            self._updateRate()
+            return
+
+        utime = self.PointCloudQueue.getCurrentUtime()
+        if not utime:
+            return
+
+        self.statistics.addFrame(utime, self.PointCloudQueue.getNumberOfFrames())
+        if utime == self.convertedUtime:
+            self._updateRate()
+            return
+
         p = vtk.vtkPolyData()
         utime = self.PointCloudQueue.getPointCloudFromPointCloud(p)
 
         if not p.GetNumberOfPoints():
             return
 
+        timer = SimpleTimer()
         sensorToLocalFused = vtk.vtkTransform()
         self.queue.getTransform('local', 'local', utime, sensorToLocalFused)
         p = filterUtils.transformPolyData(p,sensorToLocalFused)
         self.polyDataObj.setPolyData(p)
+        self.convertedUtime = utime
+        self.statistics.addConversion(utime)
+        self.rate.addCost(timer.elapsed() + self.view.renderer().GetLastRenderTimeInSeconds())
+        self._updateRate()
 
         if not self.polyDataObj.initialized:
             self.polyDataObj.initialized = True
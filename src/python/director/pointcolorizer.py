@@ -0,0 +1,258 @@
+'''
+Colorizes point clouds from several camera images with numpy.
+
+The camera model is sampled once per camera into a projection table: a
+grid of normalized image plane coordinates (x/z, y/z) is projected through
+the camera calibration, including its distortion model, and later
+projections interpolate the table bilinearly.  The image and the local to
+camera transform are cached per image utime, so a cloud is projected into
+all cameras with one matrix multiply followed by table lookups.
+
+Points hidden behind nearer points are not colored by a camera: a coarse
+depth image keeps the nearest depth in each cell of cellSize pixels and
+only points within a tolerance of it are visible.  When several cameras see
+a point, their colors are blended with weights that fall off towards the
+image border, and points seen by no camera are white.
+
+The colors are cached per cloud and image utimes, so colorizing an
+unchanged cloud again, for example when Color By is set back to rgb, does
+not project the points again.
+'''
+
+import collections
+import numpy as np
+
+import director.vtkAll as vtk
+from director import vtkNumpy as vnp
+from director import transformUtils
+from director.fieldcontainer import FieldContainer
+
+
+class ProjectionTable(object):
+
+    def __init__(self, width, height, xRange, yRange, pixels, valid):
+        '''
+        pixels is a rows x cols x 2 array of the image coordinates of the normalized
+        image plane points on a regular grid spanning xRange and yRange, and
+        valid flags the grid points that project into the image.
+        '''
+        self.width = width
+        self.height = height
+        self.xRange = xRange
+        self.yRange = yRange
+        self.pixels = pixels
+        self.valid = valid
+
+        # flat tables for the lookups, a cell is valid if its four corners are
+        rows, cols = valid.shape
+        self._u = np.ascontiguousarray(pixels[:,:,0]).ravel()
+        self._v = np.ascontiguousarray(pixels[:,:,1]).ravel()
+        cellValid = np.zeros((rows, cols), dtype=bool)
+        cellValid[:-1,:-1] = valid[:-1,:-1] & valid[:-1,1:] & valid[1:,:-1] & valid[1:,1:]
+        self._cellValid = cellValid.ravel()
+
+    def project(self, x, y):
+        '''
+        Returns (u, v, valid) image coordinates of the normalized image
+        plane coordinates x and y.
+        '''
+        rows, cols = self.valid.shape
+        gx = (x - self.xRange[0]) * ((cols - 1) / (self.xRange[1] - self.xRange[0]))
+        gy = (y - self.yRange[0]) * ((rows - 1) / (self.yRange[1] - self.yRange[0]))
+        inside = (gx >= 0) & (gx <= cols - 1) & (gy >= 0) & (gy <= rows - 1)
+
+        ix = np.clip(gx, 0, cols - 2).astype(np.intp)
+        iy = np.clip(gy, 0, rows - 2).astype(np.intp)
+        wx = gx - ix
+        wy = gy - iy
+        index = iy * cols + ix
+
+        def interpolate(table):
+            top = table.take(index) * (1 - wx) + table.take(index + 1) * wx
+            bottom = table.take(index + cols) * (1 - wx) + table.take(index + cols + 1) * wx
+            return top * (1 - wy) + bottom * wy
+
+        valid = inside & self._cellValid.take(index)
+        return interpolate(self._u), interpolate(self._v), valid
+
+
+def computeProjectionTable(projectFunction, width, height, xRange, yRange, gridSize=65):
+    '''
+    Returns a ProjectionTable for a camera.  projectFunction maps Nx3 points
+    in the camera frame to (Nx2 image coordinates, valid flags).
+    '''
+    xs = np.linspace(xRange[0], xRange[1], gridSize)
+    ys = np.linspace(yRange[0], yRange[1], gridSize)
+    gx, gy = np.meshgrid(xs, ys)
+    points = np.column_stack([gx.ravel(), gy.ravel(), np.ones(gx.size)])
+    pixels, valid = projectFunction(points)
+    return ProjectionTable(width, height, xRange, yRange, pixels.reshape(gridSize, gridSize, 2), valid.reshape(gridSize, gridSize))
+
+
+def computeQueueProjectionTable(queue, cameraName, width, height, gridSize=65, margin=0.02):
+    '''
+    Returns the ProjectionTable of a camera of a ddBotImageQueue, or None if
+    the camera has no calibration.  The table covers the image plane region
+    of the rays through the image border pixels.
+    '''
+    border = [(u, 0) for u in np.linspace(0, width - 1, 17)] + [(u, height - 1) for u in np.linspace(0, width - 1, 17)]
+    border += [(0, v) for v in np.linspace(0, height - 1, 17)] + [(width - 1, v) for v in np.linspace(0, height - 1, 17)]
+    rays = [queue.unprojectPixel(cameraName, int(u), int(v)) for u, v in border]
+    rays = np.array([ray for ray in rays if len(ray) == 3 and ray[2] > 0])
+    if not len(rays):
+        return None
+
+    x = rays[:,0] / rays[:,2]
+    y = rays[:,1] / rays[:,2]
+    xPad = (x.max() - x.min()) * margin
+    yPad = (y.max() - y.min()) * margin
+
+    def projectFunction(points):
+        polyData = vnp.numpyToPolyData(points)
+        if queue.projectPoints(cameraName, polyData) < 0:
+            return np.zeros((len(points), 2)), np.zeros(len(points), dtype=bool)
+        pixels = vnp.getNumpyFromVtk(polyData, 'Points')
+        # points that fail to project are left unchanged
+        valid = (pixels != points).any(axis=1)
+        return pixels[:,:2].copy(), valid
+
+    return computeProjectionTable(projectFunction, width, height, (x.min() - xPad, x.max() + xPad),
+                                  (y.min() - yPad, y.max() + yPad), gridSize)
+
+
+def computeColors(points, cameras, cellSize=8, depthTolerance=0.05):
+    '''
+    Returns Nx3 uint8 colors for the Nx3 local points.  cameras is a list of
+    objects with fields image (HxWx3 uint8), localToCamera (4x4),
+    projection (ProjectionTable) and maxRadius, the largest distance from
+    the image center, in image widths and heights, of the pixels used.
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    colorSums = np.zeros((len(points), 3))
+    weightSums = np.zeros(len(points))
+
+    if cameras:
+        # all cameras in one multiply, the columns of camera i are 3i:3i+3
+        matrices = np.vstack([camera.localToCamera[:3] for camera in cameras])
+        cameraPoints = np.dot(points, matrices[:,:3].T) + matrices[:,3]
+
+    for i, camera in enumerate(cameras):
+
+        xyz = cameraPoints[:,3*i:3*i+3]
+        ids = np.flatnonzero(xyz[:,2] > 1e-3)
+        z = xyz[ids,2]
+        u, v, valid = camera.projection.project(xyz[ids,0] / z, xyz[ids,1] / z)
+
+        height, width = camera.image.shape[:2]
+        valid &= (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        du = u / (width - 1) - 0.5
+        dv = v / (height - 1) - 0.5
+        r2 = du**2 + dv**2
+        valid &= r2 <= camera.maxRadius**2
+
+        ids, z, r2 = ids[valid], z[valid], r2[valid]
+        px, py = u[valid].astype(np.intp), v[valid].astype(np.intp)
+        if not len(ids):
+            continue
+
+        # coarse depth image, the nearest depth wins each cell
+        cellColumns = (width + cellSize - 1) // cellSize
+        cells = (py // cellSize) * cellColumns + px // cellSize
+        depth = np.empty(cellColumns * ((height + cellSize - 1) // cellSize))
+        depth.fill(np.inf)
+        order = np.lexsort((z, cells))
+        occupied, first = np.unique(cells[order], return_index=True)
+        depth[occupied] = z[order[first]]
+        visible = z <= depth[cells] * (1.0 + depthTolerance) + depthTolerance
+
+        ids, px, py = ids[visible], px[visible], py[visible]
+        weights = camera.maxRadius**2 - r2[visible] + 1e-6
+        colorSums[ids] += camera.image[py, px] * weights[:,np.newaxis]
+        weightSums[ids] += weights
+
+    colors = np.empty((len(points), 3), dtype=np.uint8)
+    colors.fill(255)
+    seen = weightSums > 0
+    colors[seen] = np.round(colorSums[seen] / weightSums[seen][:,np.newaxis]).astype(np.uint8)
+    return colors
+
+
+class PointColorizer(object):
+
+    # chest cameras are only used near the image center
+    maxRadius = {'CAMERACHEST_LEFT' : np.sqrt(0.2), 'CAMERACHEST_RIGHT' : np.sqrt(0.2)}
+    defaultMaxRadius = np.sqrt(0.5)
+
+    def __init__(self, queue, cellSize=8, depthTolerance=0.05, maxCachedResults=8):
+        self.queue = queue
+        self.cellSize = cellSize
+        self.depthTolerance = depthTolerance
+        self.maxCachedResults = maxCachedResults
+        self.projections = {}
+        self.cameraImages = {}
+        self.results = collections.OrderedDict()
+
+    def getProjection(self, cameraName, width, height):
+        key = (cameraName, width, height)
+        if key not in self.projections:
+            self.projections[key] = computeQueueProjectionTable(self.queue, cameraName, width, height)
+        return self.projections[key]
+
+    def getCameraImage(self, cameraName):
+        '''
+        Returns the current rgb image of the camera with its utime,
+        localToCamera transform and projection table, or None if there is
+        no image or the camera pose at the image utime is not known.
+        '''
+        utime = self.queue.getCurrentImageTime(cameraName)
+        if not utime:
+            return None
+
+        cameraImage = self.cameraImages.get(cameraName)
+        if cameraImage is not None and cameraImage.utime == utime:
+            return cameraImage
+
+        image = vtk.vtkImageData()
+        utime = self.queue.getImage(cameraName, image)
+        width, height, _ = image.GetDimensions()
+        if not image.GetNumberOfPoints() or image.GetNumberOfScalarComponents() != 3:
+            return None
+
+        projection = self.getProjection(cameraName, width, height)
+        if projection is None:
+            return None
+
+        cameraToLocal = vtk.vtkTransform()
+        if not self.queue.getTransform(cameraName, 'local', utime, cameraToLocal):
+            return None
+
+        cameraImage = FieldContainer(name=cameraName, utime=utime,
+                                     image=vnp.getNumpyFromVtk(image, 'ImageScalars').reshape(height, width, 3),
+                                     localToCamera=np.linalg.inv(transformUtils.getNumpyFromTransform(cameraToLocal)),
+                                     projection=projection,
+                                     maxRadius=self.maxRadius.get(cameraName, self.defaultMaxRadius))
+        self.cameraImages[cameraName] = cameraImage
+        return cameraImage
+
+    def colorizePolyData(self, polyData, cameraNames):
+        '''
+        Adds an rgb array to polyData with the colors of the points in the
+        current images of the cameras.
+        '''
+        if not polyData.GetNumberOfPoints():
+            return
+
+        cameras = [camera for camera in (self.getCameraImage(name) for name in cameraNames) if camera is not None]
+        key = (vnp.getPointsCacheKey(polyData), tuple((camera.name, camera.utime) for camera in cameras))
+
+        colors = self.results.pop(key, None)
+        if colors is None:
+            points = vnp.getNumpyFromVtk(polyData, 'Points')
+            colors = computeColors(points, cameras, self.cellSize, self.depthTolerance)
+
+        self.results[key] = colors
+        while len(self.results) > self.maxCachedResults:
+            self.results.popitem(last=False)
+
+        polyData.GetPointData().RemoveArray('rgb')
+        vnp.addNumpyToVtk(polyData, colors, 'rgb')
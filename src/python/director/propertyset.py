@@ -327,5 +327,16 @@ class PropertyPanelConnector(object):
         self._blockSignals = False
 
     def _onPanelPropertyChanged(self, panelProperty):
-        if not self._blockSignals:
-            PropertyPanelHelper.setPropertyFromPanel(panelProperty, self.propertiesPanel, self.propertySet)
+        if self._blockSignals:
+            return
+
+        propertyName = panelProperty.propertyName()
+        if panelProperty.isSubProperty():
+            propertyName = propertyName[:propertyName.index('[')]
+
+        # edits of read-only properties are reverted in the panel
+        if self.propertySet.hasProperty(propertyName) and self.propertySet.getPropertyAttribute(propertyName, 'readOnly'):
+            self._onPropertyChanged(self.propertySet, propertyName)
+            return
+
+        PropertyPanelHelper.setPropertyFromPanel(panelProperty, self.propertiesPanel, self.propertySet)
@@ -0,0 +1,231 @@
+'''
+Bounded history of lidar revolutions.
+
+A RevolutionHistory keeps the points and intensities of the last
+revolutions in one preallocated ring buffer whose size is set by a byte
+budget, together with the time and the scan to local transform of every
+revolution.  Each revolution is stored contiguously; when a revolution does
+not fit before the end of the buffer it is written at the start, and the
+oldest revolutions whose points are overwritten are dropped.
+
+Queries return copies, so they stay valid when new revolutions arrive:
+
+    history.getPoints(seconds=3.0)          # points and intensity of the last 3 s
+    history.getPolyData(numberOfRevolutions=2)
+    history.getAccumulatedPolyData(seconds=3.0, leafSize=0.015)
+
+The accumulated polydata merges the revolutions of the time window on a
+voxel grid, so points seen in several revolutions are kept once.  It is
+cached until a new revolution is added.
+'''
+
+import threading
+import numpy as np
+
+from director import vtkNumpy as vnp
+from director import voxelpyramid
+from director.shallowCopy import shallowCopy
+from director.fieldcontainer import FieldContainer
+
+
+class RevolutionHistory(object):
+
+    def __init__(self, maxBytes=256*1024*1024, maxRevolutions=64):
+        '''
+        maxBytes bounds the point buffers, at 16 bytes per point.
+        '''
+        self.maxBytes = maxBytes
+        self.maxRevolutions = maxRevolutions
+        self.lock = threading.RLock()
+
+        self.capacity = max(maxBytes // 16, 1)
+        self.points = None
+        self.intensity = None
+
+        self.revolutionIds = np.zeros(maxRevolutions, dtype=np.int64)
+        self.utimes = np.zeros(maxRevolutions, dtype=np.int64)
+        self.starts = np.zeros(maxRevolutions, dtype=np.int64)
+        self.counts = np.zeros(maxRevolutions, dtype=np.int64)
+        self.transforms = np.zeros((maxRevolutions, 4, 4))
+        self.sequence = np.zeros(maxRevolutions, dtype=np.int64)
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.sequence.fill(-1)
+            self.counts.fill(0)
+            self.head = 0
+            self.numberOfRevolutionsAdded = 0
+            self._accumulatedCache = {}
+
+    def _allocate(self):
+        self.points = np.empty((self.capacity, 3), dtype=np.float32)
+        self.intensity = np.empty(self.capacity, dtype=np.float32)
+
+    def addRevolution(self, revolutionId, points, intensity=None, utime=0, scanToLocal=None):
+        '''
+        Adds the Nx3 points of a revolution with optional per point
+        intensity, the revolution time in microseconds and the scan to
+        local transform as a 4x4 matrix.  Revolutions larger than the buffer
+        keep their last points.  Adding the latest revolution again, as when
+        it is redisplayed with new filter settings, replaces its entry.
+        '''
+        points = np.asarray(points)
+        if len(points) > self.capacity:
+            points = points[-self.capacity:]
+            intensity = intensity[-self.capacity:] if intensity is not None else None
+        n = len(points)
+
+        with self.lock:
+
+            if self.points is None:
+                self._allocate()
+
+            latest = self._getSlots(numberOfRevolutions=1)
+            if len(latest) and self.revolutionIds[latest[0]] == revolutionId:
+                # the latest revolution always ends at the head, rewind over it
+                self.head = self.starts[latest[0]]
+                self.sequence[latest[0]] = -1
+                self.counts[latest[0]] = 0
+                self.numberOfRevolutionsAdded -= 1
+
+            if self.head + n > self.capacity:
+                self.head = 0
+            start = self.head
+
+            # drop the revolutions whose points are overwritten and the one in the reused slot
+            slot = self.numberOfRevolutionsAdded % self.maxRevolutions
+            overwritten = (self.starts < start + n) & (self.starts + self.counts > start)
+            overwritten[slot] = True
+            self.sequence[overwritten] = -1
+            self.counts[overwritten] = 0
+
+            self.points[start:start + n] = points
+            if intensity is not None:
+                self.intensity[start:start + n] = intensity
+            else:
+                self.intensity[start:start + n] = 0
+
+            self.revolutionIds[slot] = revolutionId
+            self.utimes[slot] = utime
+            self.starts[slot] = start
+            self.counts[slot] = n
+            self.transforms[slot] = np.eye(4) if scanToLocal is None else scanToLocal
+            self.sequence[slot] = self.numberOfRevolutionsAdded
+
+            self.numberOfRevolutionsAdded += 1
+            self.head = start + n
+            self._accumulatedCache = {}
+
+    def _getSlots(self, seconds=None, numberOfRevolutions=None):
+        '''
+        Returns the slots of the stored revolutions, oldest first, limited
+        to the last numberOfRevolutions and to the revolutions at most
+        seconds older than the latest one.
+        '''
+        slots = np.flatnonzero(self.sequence >= 0)
+        slots = slots[np.argsort(self.sequence[slots])]
+        if numberOfRevolutions is not None:
+            slots = slots[len(slots) - min(numberOfRevolutions, len(slots)):]
+        if seconds is not None and len(slots):
+            slots = slots[self.utimes[slots] >= self.utimes[slots[-1]] - seconds*1e6]
+        return slots
+
+    def getNumberOfRevolutions(self):
+        with self.lock:
+            return len(self._getSlots())
+
+    def getRevolutionIds(self):
+        '''
+        Returns the ids of the stored revolutions, oldest first.
+        '''
+        with self.lock:
+            return self.revolutionIds[self._getSlots()].tolist()
+
+    def getLatestUtime(self):
+        with self.lock:
+            slots = self._getSlots(numberOfRevolutions=1)
+            return int(self.utimes[slots[0]]) if len(slots) else None
+
+    def getNumberOfPoints(self):
+        with self.lock:
+            return int(self.counts[self._getSlots()].sum())
+
+    def getNumberOfBytes(self):
+        '''
+        Returns the size of the preallocated buffers.
+        '''
+        nbytes = self.points.nbytes + self.intensity.nbytes if self.points is not None else 0
+        return nbytes + sum(a.nbytes for a in (self.revolutionIds, self.utimes, self.starts, self.counts, self.transforms, self.sequence))
+
+    def getRevolutionInfo(self, revolutionId):
+        '''
+        Returns a FieldContainer with fields utime and scanToLocal for a
+        stored revolution, or None.  The points are not copied.
+        '''
+        with self.lock:
+            slots = self._getSlots()
+            slots = slots[self.revolutionIds[slots] == revolutionId]
+            if not len(slots):
+                return None
+            return FieldContainer(utime=int(self.utimes[slots[-1]]), scanToLocal=self.transforms[slots[-1]].copy())
+
+    def getRevolution(self, revolutionId):
+        '''
+        Returns a FieldContainer with fields points, intensity, utime and
+        scanToLocal for a stored revolution, or None.
+        '''
+        with self.lock:
+            slots = self._getSlots()
+            slots = slots[self.revolutionIds[slots] == revolutionId]
+            if not len(slots):
+                return None
+            slot = slots[-1]
+            start, end = self.starts[slot], self.starts[slot] + self.counts[slot]
+            return FieldContainer(points=self.points[start:end].copy(), intensity=self.intensity[start:end].copy(),
+                                  utime=int(self.utimes[slot]), scanToLocal=self.transforms[slot].copy())
+
+    def getPoints(self, seconds=None, numberOfRevolutions=None):
+        '''
+        Returns (points, intensity) of the revolutions in the time window,
+        see _getSlots.  All stored revolutions are returned by default.
+        '''
+        with self.lock:
+            slots = self._getSlots(seconds, numberOfRevolutions)
+            if not len(slots):
+                return np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+            # consecutive revolutions are usually adjacent in the buffer, so
+            # they are copied as a few large ranges
+            ranges = []
+            for slot in slots:
+                start, end = self.starts[slot], self.starts[slot] + self.counts[slot]
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1][1] = end
+                else:
+                    ranges.append([start, end])
+
+            points = np.concatenate([self.points[start:end] for start, end in ranges])
+            intensity = np.concatenate([self.intensity[start:end] for start, end in ranges])
+            return points, intensity
+
+    def getPolyData(self, seconds=None, numberOfRevolutions=None):
+        points, intensity = self.getPoints(seconds, numberOfRevolutions)
+        return vnp.numpyToPolyData(points, pointData={'intensity' : intensity}, copy=False)
+
+    def getAccumulatedPolyData(self, seconds=3.0, leafSize=0.015):
+        '''
+        Returns the revolutions of the last seconds merged on a voxel grid
+        with the given leaf size, one point per voxel with the mean
+        intensity.  The result is cached until a revolution is added.
+        '''
+        with self.lock:
+            key = (seconds, leafSize)
+            polyData = self._accumulatedCache.get(key)
+            if polyData is None:
+                polyData = self.getPolyData(seconds)
+                if polyData.GetNumberOfPoints():
+                    points = vnp.getNumpyFromVtk(polyData, 'Points')
+                    polyData = voxelpyramid.VoxelPyramid(points).getPolyData(polyData, leafSize)
+                self._accumulatedCache[key] = polyData
+            return shallowCopy(polyData)
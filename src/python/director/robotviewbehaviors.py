@@ -433,6 +433,9 @@ def getRobotActions(view, pickedObj, pickedPoint):
         aff = robotSystem.affordanceManager.newAffordanceFromDescription(desc)
         aff.getChildFrame().setProperty('Edit', True)
 
+    def onRefitAffordance():
+        segmentation.refitAffordance(affordanceObj)
+
     def onPromoteToAffordance():
         affObj = affordanceitems.MeshAffordanceItem.promotePolyDataItem(pickedObj)
         robotSystem.affordanceManager.registerAffordance(affObj)
@@ -447,6 +450,9 @@ def getRobotActions(view, pickedObj, pickedPoint):
             ('Add new frame', addNewFrame),
         ])
 
+        if om.findObjectByName('pointcloud snapshot'):
+            actions.append(('Refit to Point Cloud', onRefitAffordance))
+
     elif type(pickedObj) == vis.PolyDataItem:
         actions.extend([
             ('Promote to Affordance', onPromoteToAffordance),
@@ -4,6 +4,8 @@ import math
 import vtk
 import time
 import functools
+import collections
+import threading
 import traceback
 import PythonQt
 from PythonQt import QtCore, QtGui
@@ -19,10 +21,20 @@ from director.visualization import *
 from director.filterUtils import *
 from director.fieldcontainer import FieldContainer
 from director.segmentationroutines import *
+from director.cropregion import CropRegion
+from director import spatialindex
+from director import normalestimation
+from director import planeransac
+from director import icp
+from director import kmeans
+from director.binreducer import BinReducer
+from director import clusterdescriptors
+from director import boundingrectangle
+from director import segmentationcache
+from director import segmentationprofile
+from director import segmentationexecutor
 from director import cameraview
 
-from thirdparty import qhull_2d
-from thirdparty import min_bounding_rect
 
 import numpy as np
 import vtkNumpy
@@ -36,13 +48,6 @@ DRILL_TRIANGLE_BOTTOM_RIGHT = 'bottom right'
 DRILL_TRIANGLE_TOP_LEFT = 'top left'
 DRILL_TRIANGLE_TOP_RIGHT = 'top right'
 
-# prefer drc plane segmentation instead of PCL
-try:
-    planeSegmentationFilter = vtk.vtkPlaneSegmentation
-except AttributeError:
-    planeSegmentationFilter = vtk.vtkPCLSACSegmentationPlane
-
-
 _defaultSegmentationView = None
 def getSegmentationView():
     return _defaultSegmentationView or app.getViewManager().findView('Segmentation View')
@@ -68,14 +73,31 @@ def initAffordanceManager(view):
     affordanceManager = affordancemanager.AffordanceObjectModelManager(view)
 
 
+def _labelCropDistance(polyData, origin, axis=None, resultArrayName='dist_along_line'):
+    '''
+    Labels the cropped points with their distance along axis from origin,
+    or with their distance to origin if axis is None.  Empty crops get an
+    empty array, so the crops return the same arrays as labelling the input
+    and thresholding it.
+    '''
+    values = np.zeros(0)
+    if polyData.GetNumberOfPoints():
+        points = vtkNumpy.getNumpyFromVtk(polyData, 'Points') - origin
+        values = np.dot(points, axis) if axis is not None else np.sqrt(np.sum(points**2, axis=1))
+    polyData = shallowCopy(polyData)
+    vtkNumpy.addNumpyToVtk(polyData, values, resultArrayName)
+    return polyData
+
+
+@segmentationprofile.profiled
 def cropToLineSegment(polyData, point1, point2):
 
     line = np.array(point2) - np.array(point1)
     length = np.linalg.norm(line)
     axis = line / length
 
-    polyData = labelPointDistanceAlongAxis(polyData, axis, origin=point1, resultArrayName='dist_along_line')
-    return thresholdPoints(polyData, 'dist_along_line', [0.0, length])
+    polyData = CropRegion().addLineSegment(point1, point2).crop(polyData)
+    return _labelCropDistance(polyData, np.array(point1), axis)
 
 
 
@@ -230,6 +252,7 @@ class DisparityPointCloudItem(vis.PolyDataItem):
         self.lastUtime = utime
 
 
+@segmentationprofile.profiled
 def extractLargestCluster(polyData, **kwargs):
     '''
     Calls applyEuclideanClustering and then extracts the first (largest) cluster.
@@ -239,24 +262,57 @@ def extractLargestCluster(polyData, **kwargs):
     return thresholdPoints(polyData, 'cluster_labels', [1, 1])
 
 
-def segmentGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05):
+@segmentationprofile.profiled
+def segmentGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05, groundTracker=None):
     ''' A More complex ground removal algorithm. Works when plane isn't
-    preceisely flat. First clusters on z to find approx ground height, then fits a plane there
+    preceisely flat. First clusters on z to find approx ground height, then fits a plane there.
+    With a groundTracker, a groundtracker.GroundPlaneTracker kept by the caller for one sensor,
+    the plane comes from the tracker, which refines its previous estimate and only runs the
+    full fit when the ground changes.  Tracked calls update the tracker, so they are not memoized.
     '''
 
+    if groundTracker is None:
+        return _segmentGroundUntracked(polyData, groundThickness, sceneHeightFromGround)
+
+    polyData = shallowCopy(polyData)
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+
+    ground = groundTracker.update(points)
+    if ground is not None:
+        origin, normal = ground.origin, ground.normal
+    else:
+        origin, normal = _fitGroundPlane(polyData, points)
+
+    return _splitGround(polyData, points, origin, normal, groundThickness, sceneHeightFromGround)
+
+
+@segmentationcache.memoize
+def _segmentGroundUntracked(polyData, groundThickness, sceneHeightFromGround):
+    polyData = shallowCopy(polyData)
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+    origin, normal = _fitGroundPlane(polyData, points)
+    return _splitGround(polyData, points, origin, normal, groundThickness, sceneHeightFromGround)
+
+
+def _fitGroundPlane(polyData, points):
+
     searchRegionThickness = 0.5
 
-    zvalues = vtkNumpy.getNumpyFromVtk(polyData, 'Points')[:,2]
+    zvalues = points[:,2]
     groundHeight = np.percentile(zvalues, 5)
 
     vtkNumpy.addNumpyToVtk(polyData, zvalues.copy(), 'z')
     searchRegion = thresholdPoints(polyData, 'z', [groundHeight - searchRegionThickness/2.0, groundHeight + searchRegionThickness/2.0])
 
-    updatePolyData(searchRegion, 'ground search region', parent=getDebugFolder(), colorByName='z', visible=False)
+    if not segmentationexecutor.inWorker():
+        updatePolyData(searchRegion, 'ground search region', parent=getDebugFolder(), colorByName='z', visible=False)
 
     _, origin, normal = applyPlaneFit(searchRegion, distanceThreshold=0.02, expectedNormal=[0,0,1], perpendicularAxis=[0,0,1], returnOrigin=True)
+    return origin, normal
+
+
+def _splitGround(polyData, points, origin, normal, groundThickness, sceneHeightFromGround):
 
-    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
     dist = np.dot(points - origin, normal)
     vtkNumpy.addNumpyToVtk(polyData, dist, 'dist_to_plane')
 
@@ -272,20 +328,7 @@ def segmentGroundPlane():
     inputObj.setProperty('Visible', False)
     polyData = shallowCopy(inputObj.polyData)
 
-    zvalues = vtkNumpy.getNumpyFromVtk(polyData, 'Points')[:,2]
-    groundHeight = np.percentile(zvalues, 5)
-    searchRegion = thresholdPoints(polyData, 'z', [groundHeight - 0.3, groundHeight + 0.3])
-
-    updatePolyData(searchRegion, 'ground search region', parent=getDebugFolder(), colorByName='z', visible=False)
-
-    _, origin, normal = applyPlaneFit(searchRegion, distanceThreshold=0.02, expectedNormal=[0,0,1], perpendicularAxis=[0,0,1], returnOrigin=True)
-
-    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
-    dist = np.dot(points - origin, normal)
-    vtkNumpy.addNumpyToVtk(polyData, dist, 'dist_to_plane')
-
-    groundPoints = thresholdPoints(polyData, 'dist_to_plane', [-0.01, 0.01])
-    scenePoints = thresholdPoints(polyData, 'dist_to_plane', [0.05, 10])
+    _, _, groundPoints, scenePoints = segmentGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05)
 
     updatePolyData(groundPoints, 'ground points', alpha=0.3)
     updatePolyData(scenePoints, 'scene points', alpha=0.3)
@@ -294,6 +337,7 @@ def segmentGroundPlane():
     #updatePolyData(scenePoints, 'scene points', colorByName='cluster_labels')
 
 
+@segmentationprofile.profiled
 def applyLocalPlaneFit(polyData, searchPoint, searchRadius, searchRadiusEnd=None, removeGroundFirst=True):
 
     useVoxelGrid = True
@@ -328,11 +372,7 @@ def applyLocalPlaneFit(polyData, searchPoint, searchRadius, searchRadiusEnd=None
 
     normalEstimationSearchRadius = 0.065
 
-    f = vtk.vtkPCLNormalEstimation()
-    f.SetSearchRadius(normalEstimationSearchRadius)
-    f.SetInput(polyData)
-    f.Update()
-    scenePoints = shallowCopy(f.GetOutput())
+    scenePoints = normalEstimation(polyData, searchRadius=normalEstimationSearchRadius)
 
     normals = vtkNumpy.getNumpyFromVtk(scenePoints, 'normals')
     normalsDotPlaneNormal = np.abs(np.dot(normals, normal))
@@ -378,6 +418,7 @@ def orientToMajorPlane(polyData, pickedPoint):
     return polyData, planeFrame
 
 
+@segmentationprofile.profiled
 def getMajorPlanes(polyData, useVoxelGrid=True):
 
     voxelGridSize = 0.01
@@ -390,26 +431,16 @@ def getMajorPlanes(polyData, useVoxelGrid=True):
 
     minClusterSize = 100
 
-    while len(polyDataList) < 25:
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+    planes = planeransac.PlaneRansac(distanceToPlaneThreshold).fitPlanes(points, maxPlanes=25, minInliers=minClusterSize)
 
-        f = planeSegmentationFilter()
-        f.SetInput(polyData)
-        f.SetDistanceThreshold(distanceToPlaneThreshold)
-        f.Update()
-        polyData = shallowCopy(f.GetOutput())
+    for plane in planes:
 
-        outliers = thresholdPoints(polyData, 'ransac_labels', [0, 0])
-        inliers = thresholdPoints(polyData, 'ransac_labels', [1, 1])
+        inliers = extractPointsByMask(polyData, plane.inliers)
         largestCluster = extractLargestCluster(inliers)
 
-        #i = len(polyDataList)
-        #showPolyData(inliers, 'inliers %d' % i, color=getRandomColor(), parent='major planes')
-        #showPolyData(outliers, 'outliers %d' % i, color=getRandomColor(), parent='major planes')
-        #showPolyData(largestCluster, 'cluster %d' % i, color=getRandomColor(), parent='major planes')
-
         if largestCluster.GetNumberOfPoints() > minClusterSize:
             polyDataList.append(largestCluster)
-            polyData = outliers
         else:
             break
 
@@ -438,68 +469,80 @@ def showMajorPlanes(polyData=None):
         obj.setProperty('Point Size', 3)
 
 
+@segmentationprofile.profiled
 def cropToBox(polyData, transform, dimensions):
     '''
     dimensions is length 3 describing box dimensions
     '''
-    origin = np.array(transform.GetPosition())
-    axes = transformUtils.getAxesFromTransform(transform)
+    polyData = CropRegion().addBox(transform, dimensions).crop(polyData)
 
-    for axis, length in zip(axes, dimensions):
-        cropAxis = np.array(axis)*(length/2.0)
-        polyData = cropToLineSegment(polyData, origin - cropAxis, origin + cropAxis)
-
-    return polyData
+    # dist_along_line is labelled along the last axis, as cropping one axis at a time did
+    axis = np.array(transformUtils.getAxesFromTransform(transform)[2])
+    axis /= np.linalg.norm(axis)
+    return _labelCropDistance(polyData, np.array(transform.GetPosition()) - axis*dimensions[2]/2.0, axis)
 
+@segmentationprofile.profiled
 def cropToBounds(polyData, transform, bounds):
     '''
     bounds is a 2x3 containing the min/max values along the transform axes to use for cropping
     '''
-    origin = np.array(transform.GetPosition())
-    axes = transformUtils.getAxesFromTransform(transform)
+    polyData = CropRegion().addBounds(transform, bounds).crop(polyData)
 
-    for axis, bound in zip(axes, bounds):
-        axis = np.array(axis)/np.linalg.norm(axis)
-        polyData = cropToLineSegment(polyData, origin + axis*bound[0], origin + axis*bound[1])
-
-    return polyData
+    axis = np.array(transformUtils.getAxesFromTransform(transform)[2])
+    axis /= np.linalg.norm(axis)
+    return _labelCropDistance(polyData, np.array(transform.GetPosition()) + axis*bounds[2][0], axis)
 
 
+@segmentationprofile.profiled
 def cropToSphere(polyData, origin, radius):
-    polyData = labelDistanceToPoint(polyData, origin)
-    return thresholdPoints(polyData, 'distance_to_point', [0, radius])
+    index = spatialindex.getCachedSpatialIndex(polyData)
+    if index is not None:
+        polyData = extractPointsByMask(polyData, index.radiusMask(origin, radius))
+    else:
+        polyData = CropRegion().addSphere(origin, radius).crop(polyData)
+    return _labelCropDistance(polyData, np.array(origin), resultArrayName='distance_to_point')
 
 
+@segmentationprofile.profiled
+@segmentationcache.memoize
 def applyPlaneFit(polyData, distanceThreshold=0.02, expectedNormal=None, perpendicularAxis=None, angleEpsilon=0.2, returnOrigin=False, searchOrigin=None, searchRadius=None):
+    '''
+    Fits a plane and returns a copy of polyData with a dist_to_plane array,
+    and the plane normal, preceded by the plane origin if returnOrigin is
+    set.  If no plane is found, the origin and normal are zero vectors and
+    dist_to_plane is nan, so thresholding it selects no points.
+    '''
 
     expectedNormal = expectedNormal if expectedNormal is not None else [-1,0,0]
 
-    fitInput = polyData
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+
+    fitMask = None
     if searchOrigin is not None:
         assert searchRadius
-        fitInput = cropToSphere(fitInput, searchOrigin, searchRadius)
+        fitMask = CropRegion().addSphere(searchOrigin, searchRadius).computeMask(points)
 
     # perform plane segmentation
-    f = planeSegmentationFilter()
-    f.SetInput(fitInput)
-    f.SetDistanceThreshold(distanceThreshold)
-    if perpendicularAxis is not None:
-        f.SetPerpendicularConstraintEnabled(True)
-        f.SetPerpendicularAxis(perpendicularAxis)
-        f.SetAngleEpsilon(angleEpsilon)
-    f.Update()
-    origin = f.GetPlaneOrigin()
-    normal = np.array(f.GetPlaneNormal())
+    plane = planeransac.fitPlane(points, distanceThreshold, perpendicularAxis=perpendicularAxis, angleEpsilon=angleEpsilon, mask=fitMask)
 
-    # flip the normal if needed
-    if np.dot(normal, expectedNormal) < 0:
-        normal = -normal
+    polyData = shallowCopy(polyData)
 
-    # for each point, compute signed distance to plane
+    if plane is None:
+        origin = np.zeros(3)
+        normal = np.zeros(3)
+        dist = np.empty(len(points))
+        dist.fill(np.nan)
+    else:
+        origin = plane.origin
+        normal = np.array(plane.normal)
+
+        # flip the normal if needed
+        if np.dot(normal, expectedNormal) < 0:
+            normal = -normal
+
+        # for each point, compute signed distance to plane
+        dist = np.dot(points - origin, normal)
 
-    polyData = shallowCopy(polyData)
-    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
-    dist = np.dot(points - origin, normal)
     vtkNumpy.addNumpyToVtk(polyData, dist, 'dist_to_plane')
 
     if returnOrigin:
@@ -513,17 +556,27 @@ def flipNormalsWithViewDirection(polyData, viewDirection):
     normals[np.dot(normals, viewDirection) > 0] *= -1
 
 
-def normalEstimation(dataObj, searchCloud=None, searchRadius=0.05, useVoxelGrid=False, voxelGridLeafSize=0.05):
+@segmentationprofile.profiled
+def normalEstimation(dataObj, searchCloud=None, searchRadius=0.05, useVoxelGrid=False, voxelGridLeafSize=0.05, viewDirection=None, processes=None):
+    '''
+    Returns a copy of dataObj with 'normals' and 'curvature' point data
+    arrays.  Neighbourhoods of searchRadius are taken from searchCloud, or
+    from a voxel grid of dataObj if useVoxelGrid is set.  Normals face the
+    origin, or point against viewDirection if given.  See
+    normalestimation.NormalEstimator.
+    '''
 
-    f = vtk.vtkPCLNormalEstimation()
-    f.SetSearchRadius(searchRadius)
-    f.SetInput(dataObj)
-    if searchCloud:
-        f.SetInput(1, searchCloud)
-    elif useVoxelGrid:
-        f.SetInput(1, applyVoxelGrid(dataObj, voxelGridLeafSize))
-    f.Update()
-    dataObj = shallowCopy(f.GetOutput())
+    # the voxel grid is a temporary cloud, its index is not worth caching
+    temporarySearchCloud = searchCloud is None and useVoxelGrid
+    if temporarySearchCloud:
+        searchCloud = applyVoxelGrid(dataObj, voxelGridLeafSize)
+
+    normals, curvature = normalestimation.computeNormals(dataObj, searchCloud, searchRadius, viewDirection=viewDirection,
+                                                         cacheIndex=not temporarySearchCloud, processes=processes)
+
+    dataObj = shallowCopy(dataObj)
+    vtkNumpy.addNumpyToVtk(dataObj, normals.astype(np.float32), 'normals')
+    vtkNumpy.addNumpyToVtk(dataObj, curvature.astype(np.float32), 'curvature')
     dataObj.GetPointData().SetNormals(dataObj.GetPointData().GetArray('normals'))
 
     return dataObj
@@ -591,6 +644,20 @@ def getCurrentRevolutionData(useVoxelGrid=False):
     return addCoordArraysToPolyData(revPolyData)
 
 
+def getAccumulatedRevolutionData(seconds=3.0, leafSize=0.015):
+    '''
+    Returns the multisense revolutions of the last seconds merged on a
+    voxel grid, see revolutionhistory.RevolutionHistory.  Falls back to
+    getCurrentRevolutionData if no revolution has been recorded.
+    '''
+    from director import perception
+    history = perception._multisenseItem.model.revolutionHistory
+    if not history.getNumberOfRevolutions():
+        return getCurrentRevolutionData(useVoxelGrid=True)
+
+    return addCoordArraysToPolyData(history.getAccumulatedPolyData(seconds, leafSize))
+
+
 def getDisparityPointCloud(decimation=4, removeOutliers=True, removeSize=0, rangeThreshold=-1, imagesChannel='MULTISENSE_CAMERA', cameraName='CAMERA_LEFT'):
 
     p = cameraview.getStereoPointCloud(decimation, imagesChannel=imagesChannel, cameraName=cameraName, removeSize=removeSize, rangeThreshold=rangeThreshold)
@@ -661,6 +728,7 @@ def segmentGroundPlanes():
     updatePolyData(d.getPolyData(), 'normals')
 
 
+@segmentationprofile.profiled
 def extractCircle(polyData, distanceThreshold=0.04, radiusLimit=None):
 
     circleFit = vtk.vtkPCLSACSegmentationCircle()
@@ -675,18 +743,27 @@ def extractCircle(polyData, distanceThreshold=0.04, radiusLimit=None):
     return polyData, circleFit
 
 
+@segmentationprofile.profiled
+@segmentationcache.memoize
 def removeMajorPlane(polyData, distanceThreshold=0.02):
+    '''
+    Returns the points that are not inliers of the largest plane, and the
+    plane fit result from planeransac.PlaneRansac.fit.
+    '''
 
     # perform plane segmentation
-    f = planeSegmentationFilter()
-    f.SetInput(polyData)
-    f.SetDistanceThreshold(distanceThreshold)
-    f.Update()
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+    plane = planeransac.fitPlane(points, distanceThreshold)
+    if plane is None:
+        return shallowCopy(polyData), plane
 
-    polyData = thresholdPoints(f.GetOutput(), 'ransac_labels', [0.0, 0.0])
-    return polyData, f
+    polyData = shallowCopy(polyData)
+    vtkNumpy.addNumpyToVtk(polyData, plane.inliers.astype(np.int32), 'ransac_labels')
+    polyData = thresholdPoints(polyData, 'ransac_labels', [0.0, 0.0])
+    return polyData, plane
 
 
+@segmentationprofile.profiled
 def removeGroundSimple(polyData, groundThickness=0.02, sceneHeightFromGround=0.05):
     ''' Simple ground plane removal algorithm. Uses ground height
         and does simple z distance filtering.
@@ -707,8 +784,9 @@ def removeGroundSimple(polyData, groundThickness=0.02, sceneHeightFromGround=0.0
     return groundPoints, scenePoints
 
 
-def removeGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05):
-    origin, normal, groundPoints, scenePoints = segmentGround(polyData, groundThickness, sceneHeightFromGround)
+@segmentationprofile.profiled
+def removeGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05, groundTracker=None):
+    origin, normal, groundPoints, scenePoints = segmentGround(polyData, groundThickness, sceneHeightFromGround, groundTracker)
     return groundPoints, scenePoints
 
 
@@ -1043,6 +1121,7 @@ def refitValveAffordance(aff, point1, origin, normal):
     aff.updateParamsFromActorTransform()
 
 
+@segmentationprofile.profiled
 def segmentValve(expectedValveRadius, point1, point2):
 
     inputObj = om.findObjectByName('pointcloud snapshot')
@@ -1098,6 +1177,7 @@ def segmentValve(expectedValveRadius, point1, point2):
     frameObj.addToView(app.getDRCView())
 
 
+@segmentationprofile.profiled
 def segmentValveByBoundingBox(polyData, searchPoint):
 
     viewDirection = SegmentationContext.getGlobalInstance().getViewDirection()
@@ -1162,6 +1242,7 @@ def segmentValveByBoundingBox(polyData, searchPoint):
     return obj
 
 
+@segmentationprofile.profiled
 def segmentDoorPlane(polyData, doorPoint, stanceFrame):
 
     doorPoint = np.array(doorPoint)
@@ -1195,6 +1276,7 @@ def segmentDoorPlane(polyData, doorPoint, stanceFrame):
     return t
 
 
+@segmentationprofile.profiled
 def segmentValveByRim(polyData, rimPoint1, rimPoint2):
 
     viewDirection = SegmentationContext.getGlobalInstance().getViewDirection()
@@ -1280,6 +1362,7 @@ def segmentValveByRim(polyData, rimPoint1, rimPoint2):
     return obj
 
 
+@segmentationprofile.profiled
 def segmentValveByWallPlane(expectedValveRadius, point1, point2):
 
 
@@ -1399,12 +1482,27 @@ def segmentValveByWallPlane(expectedValveRadius, point1, point2):
 
 
 
+def computeHistogram(polyData, arrayName, numberOfBins=100, valueRange=None):
+    '''
+    Returns (counts, binEdges) of the histogram of the finite values of a point data array.
+    '''
+    values = vnp.getNumpyFromVtk(polyData, arrayName)
+    return np.histogram(values[np.isfinite(values)], bins=numberOfBins, range=valueRange)
+
+
+def getHistogramPeak(polyData, arrayName, numberOfBins=100):
+    '''
+    Returns the center of the most populated histogram bin of a point data array.
+    '''
+    hist, bins = computeHistogram(polyData, arrayName, numberOfBins)
+    return bins[np.argmax(hist)] + (bins[1] - bins[0])/2.0
+
+
 def showHistogram(polyData, arrayName, numberOfBins=100):
 
     import matplotlib.pyplot as plt
 
-    x = vnp.getNumpyFromVtk(polyData, arrayName)
-    hist, bins = np.histogram(x, bins=numberOfBins)
+    hist, bins = computeHistogram(polyData, arrayName, numberOfBins)
     width = 0.7 * (bins[1] - bins[0])
     center = (bins[:-1] + bins[1:]) / 2
     plt.bar(center, hist, align='center', width=width)
@@ -1426,15 +1524,44 @@ def showTable(table, parent):
     tableBox.actor.SetUserTransform(table.frame)
 
 
-def applyKmeansLabel(polyData, arrayName, numberOfClusters, whiten=False):
+_kmeansWarmStarts = collections.OrderedDict()
+_maxKmeansWarmStarts = 16
+# also used by segmentation executor worker threads
+_kmeansWarmStartsLock = threading.Lock()
+
 
-    import scipy.cluster
-    ar = vnp.getNumpyFromVtk(polyData, arrayName).copy()
+@segmentationprofile.profiled
+def applyKmeansLabel(polyData, arrayName, numberOfClusters, whiten=False, warmStart=True):
+    '''
+    Returns a copy of polyData with a '<arrayName>_kmeans_label' array from
+    mini-batch k-means clustering of the array values.  With warmStart the
+    centroids of the previous labelling of the same cloud, array and number
+    of clusters seed the clustering, which is faster when the same object is
+    relabelled.  Warm starts are keyed by the polydata fingerprint, see
+    segmentationcache, and the least recently used ones are dropped.
+    '''
+    ar = vnp.getNumpyFromVtk(polyData, arrayName)
 
+    scale = None
     if whiten:
-        scipy.cluster.vq.whiten(ar)
+        scale = np.atleast_1d(np.nanstd(ar, axis=0))
+        scale[scale == 0] = 1.0
+        if ar.ndim == 1:
+            scale = scale[0]
+        ar = ar / scale
 
-    codes, disturbances = scipy.cluster.vq.kmeans(ar, numberOfClusters)
+    warmStartKey = (segmentationcache.getPolyDataFingerprint(polyData), arrayName, numberOfClusters, whiten)
+    with _kmeansWarmStartsLock:
+        initialCentroids = _kmeansWarmStarts.pop(warmStartKey, None) if warmStart else None
+    code, codes = kmeans.computeLabels(ar, numberOfClusters, initialCentroids=initialCentroids)
+
+    with _kmeansWarmStartsLock:
+        _kmeansWarmStarts[warmStartKey] = codes.copy()
+        while len(_kmeansWarmStarts) > _maxKmeansWarmStarts:
+            _kmeansWarmStarts.popitem(last=False)
+
+    if scale is not None:
+        codes = codes * scale
 
     if arrayName == 'normals' and numberOfClusters == 2:
         v1 = codes[0]
@@ -1444,8 +1571,6 @@ def applyKmeansLabel(polyData, arrayName, numberOfClusters, whiten=False):
         angle = np.arccos(np.dot(v1, v2))
         print 'angle between normals:', np.degrees(angle)
 
-    code, distance = scipy.cluster.vq.vq(ar, codes)
-
     polyData = shallowCopy(polyData)
     vnp.addNumpyToVtk(polyData, code, '%s_kmeans_label' % arrayName)
     return polyData
@@ -1476,6 +1601,7 @@ def findValveSpokeAngle(points):
 
 
 
+@segmentationprofile.profiled
 def findWallCenter(polyData, removeGroundMethod=removeGround):
     '''
     Find a frame at the center of the valve wall
@@ -1526,6 +1652,7 @@ def findWallCenter(polyData, removeGroundMethod=removeGround):
     return t
 
 
+@segmentationprofile.profiled
 def segmentValveWallAuto(expectedValveRadius=.195, mode='both', removeGroundMethod=removeGround ):
     '''
     Automatically segment a valve hanging in front of the wall at the center
@@ -1571,6 +1698,7 @@ def segmentValveWallAuto(expectedValveRadius=.195, mode='both', removeGroundMeth
 
 
 
+@segmentationprofile.profiled
 def segmentLeverByWallPlane(point1, point2):
     '''
     determine the position (including rotation of a lever near a wall
@@ -1694,16 +1822,29 @@ def segmentLeverByWallPlane(point1, point2):
 
 
 
-def applyICP(source, target):
+@segmentationprofile.profiled
+def applyICP(source, target, **kwargs):
+    '''
+    Returns a vtkTransform that aligns source to the points of target.
+    The keyword arguments are passed to icp.PointToPlaneICP.
+    '''
+    return icp.registerPolyData(source, target, **kwargs).transform
 
-    icp = vtk.vtkIterativeClosestPointTransform()
-    icp.SetSource(source)
-    icp.SetTarget(target)
-    icp.GetLandmarkTransform().SetModeToRigidBody()
-    icp.Update()
-    t = vtk.vtkTransform()
-    t.SetMatrix(icp.GetMatrix())
-    return t
+
+def refitAffordance(affordanceObj, polyData=None, **kwargs):
+    '''
+    Refits the pose of an affordance by registering its mesh to the point
+    cloud with ICP, starting from the current pose.  Uses the pointcloud
+    snapshot if polyData is None.  Returns the icp result, which holds the
+    residual and timing of every iteration.
+    '''
+    if polyData is None:
+        polyData = om.findObjectByName('pointcloud snapshot').polyData
+
+    frame = affordanceObj.getChildFrame()
+    result = icp.registerPolyData(affordanceObj.polyData, polyData, initialTransform=frame.transform, **kwargs)
+    frame.copyFrame(result.transform)
+    return result
 
 
 def applyDiskGlyphs(polyData, computeNormals=True):
@@ -1754,9 +1895,9 @@ def applyArrowGlyphs(polyData, computeNormals=True, voxelGridLeafSize=0.03, norm
     if computeNormals:
         polyData = applyVoxelGrid(polyData, leafSize=0.02)
         voxelData = applyVoxelGrid(polyData, leafSize=voxelGridLeafSize)
-        polyData = normalEstimation(polyData, searchRadius=normalEstimationSearchRadius, searchCloud=voxelData)
+        polyData = normalEstimation(polyData, searchRadius=normalEstimationSearchRadius, searchCloud=voxelData,
+                                    viewDirection=SegmentationContext.getGlobalInstance().getViewDirection())
         polyData = removeNonFinitePoints(polyData, 'normals')
-        flipNormalsWithViewDirection(polyData, SegmentationContext.getGlobalInstance().getViewDirection())
 
     assert polyData.GetPointData().GetNormals()
 
@@ -2009,6 +2150,7 @@ def segmentHoseNozzle(point1):
     obj.updateParamsFromActorTransform()
 
 
+@segmentationprofile.profiled
 def segmentDrillWall(point1, point2, point3):
 
 
@@ -2292,6 +2434,7 @@ def getDrillBarrelMesh():
     return ioUtils.readPolyData(os.path.join(app.getDRCBase(), 'software/models/otdf/dewalt.ply'), computeNormals=True)
 
 
+@segmentationprofile.profiled
 def segmentDrill(point1, point2, point3):
 
 
@@ -2378,6 +2521,32 @@ def makePolyDataFields(pd):
     return FieldContainer(points=pd, box=wireframe, mesh=mesh, frame=t, dims=edgeLengths, axes=axes)
 
 
+def makePolyDataFieldsFromDescriptors(pd, descriptors, i):
+    '''
+    Like makePolyDataFields, but the frame and box of the cluster pd are
+    taken from record i of its clusterdescriptors.ClusterDescriptors
+    instead of an oriented bounding box of its mesh.
+    '''
+    mesh = computeDelaunay3D(pd)
+
+    if not mesh.GetNumberOfPoints():
+        return None
+
+    dims = descriptors['dims'][i]
+    axes = list(descriptors['axes'][i])
+    t = transformUtils.copyFrame(descriptors.getTransform(i))
+
+    wf = vtk.vtkOutlineSource()
+    wf.SetBounds([-dims[0]/2, dims[0]/2, -dims[1]/2, dims[1]/2, -dims[2]/2, dims[2]/2])
+    wf.Update()
+    wireframe = shallowCopy(wf.GetOutput())
+
+    pd = transformPolyData(pd, t.GetLinearInverse())
+    mesh = transformPolyData(mesh, t.GetLinearInverse())
+
+    return FieldContainer(points=pd, box=wireframe, mesh=mesh, frame=t, dims=list(dims), axes=axes)
+
+
 def makeMovable(obj, initialTransform=None):
     '''
     Adds a child frame to the given PolyDataItem.  If initialTransform is not
@@ -2409,6 +2578,7 @@ def makeMovable(obj, initialTransform=None):
         obj.actor.SetUserTransform(t)
 
 
+@segmentationprofile.profiled
 def segmentTable(polyData, searchPoint):
     '''
     NB: If you wish to use the table frame use segmentTableAndFrame instead 
@@ -2442,26 +2612,46 @@ def segmentTable(polyData, searchPoint):
     return polyData, tablePoints, origin, normal
 
 
-def filterClusterObjects(clusters):
-
-    result = []
-    for cluster in clusters:
+def getUprightClusterMask(axes, dims):
+    '''
+    Given Kx3x3 box axes and Kx3 box dimensions of K clusters, returns a
+    mask of the clusters whose z axis is within 60 degrees of vertical and
+    that are at least 10cm tall.
+    '''
+    axes = np.asarray(axes).reshape(-1, 3, 3)
+    dims = np.asarray(dims).reshape(-1, 3)
+    return (np.abs(axes[:,2,2]) >= 0.5) & (dims[:,2] >= 0.1)
 
-        if np.abs(np.dot(cluster.axes[2], [0,0,1])) < 0.5:
-            continue
 
-        if cluster.dims[2] < 0.1:
-            continue
+def filterClusterObjects(clusters):
+    '''
+    Filters a list of cluster FieldContainers from makePolyDataFields, or a
+    clusterdescriptors.ClusterDescriptors, using getUprightClusterMask.
+    '''
+    if isinstance(clusters, clusterdescriptors.ClusterDescriptors):
+        return clusters.select(getUprightClusterMask(clusters['axes'], clusters['dims']))
 
-        result.append(cluster)
-    return result
+    if not clusters:
+        return []
 
+    mask = getUprightClusterMask([cluster.axes for cluster in clusters], [cluster.dims for cluster in clusters])
+    return [cluster for cluster, keep in zip(clusters, mask) if keep]
 
 
+@segmentationprofile.profiled
 def segmentTableScene(polyData, searchPoint, filterClustering = True):
     objectClusters, tableData = segmentTableSceneClusters(polyData, searchPoint)
 
-    clusters = [makePolyDataFields(cluster) for cluster in objectClusters]
+    # the filter and the cluster frames both use the batched descriptors,
+    # so only the meshes of the kept clusters are built
+    descriptors = clusterdescriptors.computeClusterDescriptorsFromPolyData(objectClusters)
+    keep = np.array([cluster.GetNumberOfPoints() > 0 for cluster in objectClusters], dtype=bool)
+    if (filterClustering):
+        keep &= getUprightClusterMask(descriptors['axes'], descriptors['dims'])
+
+    clusters = [makePolyDataFieldsFromDescriptors(objectClusters[i], descriptors, i) for i in np.flatnonzero(keep)]
+    keep[keep] = [cluster is not None for cluster in clusters]
+    descriptors = descriptors.select(keep)
     clusters = [cluster for cluster in clusters if cluster is not None]
 
     # Add an additional frame to these objects which has z-axis aligned upwards
@@ -2479,12 +2669,10 @@ def segmentTableScene(polyData, searchPoint, filterClustering = True):
         orientedFrame = transformUtils.getTransformFromAxesAndOrigin(xaxis, yaxis, zaxis, cluster.frame.GetPosition() )
         cluster._add_fields(oriented_frame=orientedFrame)
 
-    if (filterClustering):
-        clusters = filterClusterObjects(clusters)
-
-    return FieldContainer(table=tableData, clusters=clusters)
+    return FieldContainer(table=tableData, clusters=clusters, descriptors=descriptors)
 
 
+@segmentationprofile.profiled
 def segmentTableSceneClusters(polyData, searchPoint, clusterInXY=False):
     ''' Given a point cloud of a table with some objects on it
         and a point on that table
@@ -2561,6 +2749,7 @@ def segmentTableAndFrame(polyData, searchPoint):
     return FieldContainer(points=tablePoints, box=wireframe, mesh=tableMesh, frame=t, dims=edgeLengths, axes=axes), polyData
 
 
+@segmentationprofile.profiled
 def segmentDrillAuto(point1, polyData=None):
 
     if polyData is None:
@@ -2652,6 +2841,7 @@ def segmentPointerTip(point1):
     frameObj.addToView(app.getDRCView())
 
 
+@segmentationprofile.profiled
 def fitGroundObject(polyData=None, expectedDimensionsMin=[0.2, 0.02], expectedDimensionsMax=[1.3, 0.1]):
 
     removeGroundFunc = removeGroundSimple
@@ -2695,36 +2885,31 @@ def fitGroundObject(polyData=None, expectedDimensionsMin=[0.2, 0.02], expectedDi
 
     return vis.showClusterObjects([obj], parent='segmentation')[0]
 
-def findHorizontalSurfaces(polyData, removeGroundFirst=False, normalEstimationSearchRadius=0.05,
-                          clusterTolerance=0.025, minClusterSize=150, distanceToPlaneThreshold=0.0025, normalsDotUpRange=[0.95, 1.0], showClusters=False):
+@segmentationprofile.profiled
+def computeHorizontalSurfaces(polyData, removeGroundFirst=False, normalEstimationSearchRadius=0.05,
+                          clusterTolerance=0.025, minClusterSize=150, distanceToPlaneThreshold=0.0025, normalsDotUpRange=[0.95, 1.0]):
     '''
-    Find the horizontal surfaces, tuned to work with walking terrain
+    Computes the horizontal surfaces without touching the object model, so
+    it can be run by a segmentation executor.  Returns a FieldContainer with
+    the intermediate clouds, the surface clusters and the plane cluster
+    objects, or None if there are no scene points.
     '''
 
     searchZ = [0.0, 2.0]
     voxelGridLeafSize = 0.01
-    verboseFlag = False
 
+    groundPoints = None
     if (removeGroundFirst):
         groundPoints, scenePoints =  removeGround(polyData, groundThickness=0.02, sceneHeightFromGround=0.05)
         scenePoints = thresholdPoints(scenePoints, 'dist_to_plane', searchZ)
-        updatePolyData(groundPoints, 'ground points', parent=getDebugFolder(), visible=verboseFlag)
     else:
         scenePoints = polyData
 
-
-
     if not scenePoints.GetNumberOfPoints():
-        return
-
-    f = vtk.vtkPCLNormalEstimation()
-    f.SetSearchRadius(normalEstimationSearchRadius)
-    f.SetInput(scenePoints)
-    f.SetInput(1, applyVoxelGrid(scenePoints, voxelGridLeafSize))
+        return None
 
-    # Duration 0.2 sec for V1 log:
-    f.Update()
-    scenePoints = shallowCopy(f.GetOutput())
+    scenePoints = normalEstimation(scenePoints, searchRadius=normalEstimationSearchRadius,
+                                   searchCloud=applyVoxelGrid(scenePoints, voxelGridLeafSize))
 
     normals = vtkNumpy.getNumpyFromVtk(scenePoints, 'normals')
     normalsDotUp = np.abs(np.dot(normals, [0,0,1]))
@@ -2732,19 +2917,12 @@ def findHorizontalSurfaces(polyData, removeGroundFirst=False, normalEstimationSe
     vtkNumpy.addNumpyToVtk(scenePoints, normalsDotUp, 'normals_dot_up')
     surfaces = thresholdPoints(scenePoints, 'normals_dot_up', normalsDotUpRange)
 
-    updatePolyData(scenePoints, 'scene points', parent=getDebugFolder(), colorByName='normals_dot_up', visible=verboseFlag)
-    updatePolyData(surfaces, 'surfaces points', parent=getDebugFolder(), colorByName='normals_dot_up', visible=verboseFlag)
-
     clusters = extractClusters(surfaces, clusterTolerance=clusterTolerance, minClusterSize=minClusterSize)
     planeClusters = []
     clustersLarge = []
 
-    om.removeFromObjectModel(om.findObjectByName('surface clusters'))
-    folder = om.getOrCreateContainer('surface clusters', parentObj=getDebugFolder())
-
-    for i, cluster in enumerate(clusters):
+    for cluster in clusters:
 
-        updatePolyData(cluster, 'surface cluster %d' % i, parent=folder, color=getRandomColor(), visible=verboseFlag)
         planePoints, _ = applyPlaneFit(cluster, distanceToPlaneThreshold)
         planePoints = thresholdPoints(planePoints, 'dist_to_plane', [-distanceToPlaneThreshold, distanceToPlaneThreshold])
 
@@ -2754,13 +2932,64 @@ def findHorizontalSurfaces(polyData, removeGroundFirst=False, normalEstimationSe
             if obj is not None:
                 planeClusters.append(obj)
 
+    return FieldContainer(groundPoints=groundPoints, scenePoints=scenePoints, surfaces=surfaces,
+                          clusters=clusters, clustersLarge=clustersLarge, planeClusters=planeClusters)
+
+
+def showHorizontalSurfaces(result, showClusters=False):
+
+    verboseFlag = False
+
+    if result.groundPoints is not None:
+        updatePolyData(result.groundPoints, 'ground points', parent=getDebugFolder(), visible=verboseFlag)
+
+    updatePolyData(result.scenePoints, 'scene points', parent=getDebugFolder(), colorByName='normals_dot_up', visible=verboseFlag)
+    updatePolyData(result.surfaces, 'surfaces points', parent=getDebugFolder(), colorByName='normals_dot_up', visible=verboseFlag)
+
+    om.removeFromObjectModel(om.findObjectByName('surface clusters'))
+    folder = om.getOrCreateContainer('surface clusters', parentObj=getDebugFolder())
+
+    for i, cluster in enumerate(result.clusters):
+        updatePolyData(cluster, 'surface cluster %d' % i, parent=folder, color=getRandomColor(), visible=verboseFlag)
+
     folder = om.getOrCreateContainer('surface objects', parentObj=getDebugFolder())
     if showClusters:
-        vis.showClusterObjects(planeClusters, parent=folder)
+        vis.showClusterObjects(result.planeClusters, parent=folder)
 
-    return clustersLarge
 
+def findHorizontalSurfaces(polyData, removeGroundFirst=False, normalEstimationSearchRadius=0.05,
+                          clusterTolerance=0.025, minClusterSize=150, distanceToPlaneThreshold=0.0025, normalsDotUpRange=[0.95, 1.0], showClusters=False):
+    '''
+    Find the horizontal surfaces, tuned to work with walking terrain
+    '''
 
+    result = computeHorizontalSurfaces(polyData, removeGroundFirst, normalEstimationSearchRadius,
+                                       clusterTolerance, minClusterSize, distanceToPlaneThreshold, normalsDotUpRange)
+    if result is None:
+        return
+
+    showHorizontalSurfaces(result, showClusters)
+    return result.clustersLarge
+
+
+def findHorizontalSurfacesAsync(polyData, onFinished=None, showClusters=False, **kwargs):
+    '''
+    Runs findHorizontalSurfaces in the segmentation executor.  The debug
+    objects are shown and onFinished(clustersLarge) is called on the main
+    thread when the fit completes.  clustersLarge is None if there were no
+    scene points.  Returns the SegmentationJob.
+    '''
+
+    def onJobFinished(result):
+        if result is not None:
+            showHorizontalSurfaces(result, showClusters)
+        if onFinished:
+            onFinished(result.clustersLarge if result is not None else None)
+
+    return segmentationexecutor.getExecutor().submit(computeHorizontalSurfaces, args=(polyData,), kwargs=kwargs, onFinished=onJobFinished)
+
+
+@segmentationprofile.profiled
 def fitVerticalPosts(polyData):
 
     groundPoints, scenePoints =  removeGround(polyData)
@@ -2840,6 +3069,7 @@ def fitVerticalPosts(polyData):
 
 
 
+@segmentationprofile.profiled
 def findAndFitDrillBarrel(polyData=None):
     ''' Find the horizontal surfaces
     on the horizontal surfaces, find all the drills
@@ -2857,11 +3087,7 @@ def findAndFitDrillBarrel(polyData=None):
 
     normalEstimationSearchRadius = 0.10
 
-    f = vtk.vtkPCLNormalEstimation()
-    f.SetSearchRadius(normalEstimationSearchRadius)
-    f.SetInput(scenePoints)
-    f.Update()
-    scenePoints = shallowCopy(f.GetOutput())
+    scenePoints = normalEstimation(scenePoints, searchRadius=normalEstimationSearchRadius)
 
     normals = vtkNumpy.getNumpyFromVtk(scenePoints, 'normals')
     normalsDotUp = np.abs(np.dot(normals, [0,0,1]))
@@ -2977,6 +3203,7 @@ def computeSignedAngleBetweenVectors(v1, v2, perpendicularVector):
     return math.atan2(np.dot(perpendicularVector, np.cross(v1, v2)), np.dot(v1, v2))
 
 
+@segmentationprofile.profiled
 def segmentDrillBarrelFrame(point1, polyData, forwardDirection):
 
     tableClusterSearchRadius = 0.4
@@ -3045,6 +3272,7 @@ def segmentDrillBarrel(point1):
 
 
 
+@segmentationprofile.profiled
 def segmentDrillAlignedWithTable(point, polyData = None):
     '''
     Yet Another Drill Fitting Algorithm [tm]
@@ -3397,6 +3625,7 @@ def distanceToLine(x0, x1, x2):
     return numerator / denom
 
 
+@segmentationprofile.profiled
 def labelDistanceToLine(polyData, linePoint1, linePoint2, resultArrayName='distance_to_line'):
 
     x0 = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
@@ -3413,6 +3642,7 @@ def labelDistanceToLine(polyData, linePoint1, linePoint2, resultArrayName='dista
     return polyData
 
 
+@segmentationprofile.profiled
 def labelDistanceToPoint(polyData, point, resultArrayName='distance_to_point'):
     assert polyData.GetNumberOfPoints()
     points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
@@ -3431,6 +3661,7 @@ def getPlaneEquationFromPolyData(polyData, expectedNormal):
 
 
 
+@segmentationprofile.profiled
 def computeEdge(polyData, edgeAxis, perpAxis, binWidth=0.03):
 
     polyData = labelPointDistanceAlongAxis(polyData, edgeAxis, resultArrayName='dist_along_edge')
@@ -3442,17 +3673,11 @@ def computeEdge(polyData, edgeAxis, perpAxis, binWidth=0.03):
     binLabels = vtkNumpy.getNumpyFromVtk(polyData, 'bin_labels')
     distToEdge = vtkNumpy.getNumpyFromVtk(polyData, 'dist_perp_to_edge')
 
-    numberOfBins = len(bins) - 1
-    edgePoints = []
-    for i in xrange(numberOfBins):
-        binPoints = points[binLabels == i]
-        binDists = distToEdge[binLabels == i]
-        if len(binDists):
-            edgePoints.append(binPoints[binDists.argmax()])
-
-    return np.array(edgePoints)
+    edgePointIds = BinReducer(binLabels, len(bins) - 1).argmax(distToEdge)
+    return points[edgePointIds[edgePointIds >= 0]]
 
 
+@segmentationprofile.profiled
 def computeCentroids(polyData, axis, binWidth=0.025):
 
     polyData = labelPointDistanceAlongAxis(polyData, axis, resultArrayName='dist_along_axis')
@@ -3461,32 +3686,19 @@ def computeCentroids(polyData, axis, binWidth=0.025):
     points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
     binLabels = vtkNumpy.getNumpyFromVtk(polyData, 'bin_labels')
 
-    numberOfBins = len(bins) - 1
-    centroids = []
-    for i in xrange(numberOfBins):
-        binPoints = points[binLabels == i]
-
-        if len(binPoints):
-            centroids.append(np.average(binPoints, axis=0))
-
-    return np.array(centroids)
+    reducer = BinReducer(binLabels, len(bins) - 1)
+    return reducer.mean(points)[reducer.getNonEmptyBins()]
 
 
+@segmentationprofile.profiled
 def computePointCountsAlongAxis(polyData, axis, binWidth=0.025):
 
     polyData = labelPointDistanceAlongAxis(polyData, axis, resultArrayName='dist_along_axis')
 
     polyData, bins = binByScalar(polyData, 'dist_along_axis', binWidth)
-    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
     binLabels = vtkNumpy.getNumpyFromVtk(polyData, 'bin_labels')
 
-    numberOfBins = len(bins) - 1
-    binCount = []
-    for i in xrange(numberOfBins):
-        binPoints = points[binLabels == i]
-        binCount.append(len(binPoints))
-
-    return np.array(binCount)
+    return BinReducer(binLabels, len(bins) - 1).getCounts()
 
 
 
@@ -3522,6 +3734,7 @@ def showObbs(polyData):
     showPolyData(f.GetOutput(), 'bboxes')
 
 
+@segmentationprofile.profiled
 def getOrientedBoundingBox(polyData):
     '''
     returns origin, edges, and outline wireframe
@@ -3551,6 +3764,7 @@ def getOrientedBoundingBox(polyData):
     return origin, edges, shallowCopy(f.GetOutput())
 
 
+@segmentationprofile.profiled
 def segmentBlockByAnnotation(blockDimensions, p1, p2, p3):
 
     segmentationObj = om.findObjectByName('pointcloud snapshot')
@@ -3723,6 +3937,7 @@ def createBlockAffordance(origin, xaxis, yaxis, zaxis, xwidth, ywidth, zwidth, n
     return obj
 
 
+@segmentationprofile.profiled
 def segmentBlockByTopPlane(polyData, blockDimensions, expectedNormal, expectedXAxis, edgeSign=1, name='block affordance'):
 
     polyData, planeOrigin, normal  = applyPlaneFit(polyData, distanceThreshold=0.05, expectedNormal=expectedNormal, returnOrigin=True)
@@ -3876,6 +4091,7 @@ def computeDebrisStanceFrame(aff):
         return stanceFrame
 
 
+@segmentationprofile.profiled
 def segmentBlockByPlanes(blockDimensions):
 
     planes = om.findObjectByName('selected planes').children()[:2]
@@ -4592,27 +4808,21 @@ def extractPointsAlongClickRay(position, ray, polyData=None, distanceToLineThres
     if not polyData or not polyData.GetNumberOfPoints():
         return None
 
-    polyData = labelDistanceToLine(polyData, position, position + ray)
-
-    # extract points near line
-    polyData = thresholdPoints(polyData, 'distance_to_line', [0.0, distanceToLineThreshold])
-    if not polyData.GetNumberOfPoints():
+    # extract points near the ray using the cached spatial index of the cloud
+    index = spatialindex.getSpatialIndex(polyData)
+    ids, distanceToLine, distanceAlongLine = index.rayCorridorSearch(position, ray, distanceToLineThreshold, minDistance=0.20)
+    if not len(ids):
         return None
 
-
-    polyData = labelPointDistanceAlongAxis(polyData, ray, origin=position, resultArrayName='distance_along_line')
-    polyData = thresholdPoints(polyData, 'distance_along_line', [0.20, 1e6])
-    if not polyData.GetNumberOfPoints():
-        return None
-
-    updatePolyData(polyData, 'ray points', colorByName='distance_to_line', visible=False, parent=getDebugFolder())
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')[ids]
+    rayPoints = vtkNumpy.numpyToPolyData(points, pointData=dict(distance_to_line=distanceToLine, distance_along_line=distanceAlongLine), copy=False)
+    updatePolyData(rayPoints, 'ray points', colorByName='distance_to_line', visible=False, parent=getDebugFolder())
 
     if nearestToCamera:
-        dists = vtkNumpy.getNumpyFromVtk(polyData, 'distance_along_line')
+        dists = distanceAlongLine
     else:
-        dists = vtkNumpy.getNumpyFromVtk(polyData, 'distance_to_line')
+        dists = distanceToLine
 
-    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
     intersectionPoint = points[dists.argmin()]
 
     d = DebugData()
@@ -4737,36 +4947,24 @@ def findFarRightCorner(polyData, linkFrame):
     return points[farRightIndex,:]
 
 
-def findMinimumBoundingRectangle(polyData, linkFrame):
+def _get2DAsPolyData(xy_points):
     '''
-    Find minimum bounding rectangle of a rectangular point cloud
-    The input is assumed to be a rectangular point cloud e.g. the top of a block or table
-    Returns transform of far right corner (pointing away from robot)
+    Convert a 2D numpy array to a 3D polydata by appending z=0
     '''
+    d = np.vstack((xy_points.T, np.zeros( xy_points.shape[0]) )).T
+    d2=d.copy()
+    return vtkNumpy.getVtkPolyDataFromNumpyPoints( d2 )
 
-    # Originally From: https://github.com/dbworth/minimum-area-bounding-rectangle
-    polyData = applyVoxelGrid(polyData, leafSize=0.02)
-
-    def get2DAsPolyData(xy_points):
-        '''
-        Convert a 2D numpy array to a 3D polydata by appending z=0
-        '''
-        d = np.vstack((xy_points.T, np.zeros( xy_points.shape[0]) )).T
-        d2=d.copy()
-        return vtkNumpy.getVtkPolyDataFromNumpyPoints( d2 )
 
-    pts =vtkNumpy.getNumpyFromVtk( polyData , 'Points' )
-    xy_points =  pts[:,[0,1]]
-    vis.updatePolyData( get2DAsPolyData(xy_points) , 'xy_points', parent=getDebugFolder(), visible=False)
-    hull_points = qhull_2d.qhull2D(xy_points)
-    vis.updatePolyData( get2DAsPolyData(hull_points) , 'hull_points', parent=getDebugFolder(), visible=False)
-    # Reverse order of points, to match output from other qhull implementations
-    hull_points = hull_points[::-1]
-    # print 'Convex hull points: \n', hull_points, "\n"
-
-    # Find minimum area bounding rectangle
-    (rot_angle, rectArea, rectDepth, rectWidth, center_point, corner_points_ground) = min_bounding_rect.minBoundingRect(hull_points)
-    vis.updatePolyData( get2DAsPolyData(corner_points_ground) , 'corner_points_ground', parent=getDebugFolder(), visible=False)
+def _getBoundingRectangleCornerFrame(polyData, rect, linkFrame):
+    '''
+    Returns (cornerTransform, rectDepth, rectWidth, rectArea) for a
+    rectangle from boundingrectangle, with the frame at the far right
+    corner pointing away from the robot.
+    '''
+    rot_angle, rectArea, rectDepth, rectWidth = rect.angle, rect.area, rect.width, rect.height
+    corner_points_ground = rect.corners
+    vis.updatePolyData( _get2DAsPolyData(corner_points_ground) , 'corner_points_ground', parent=getDebugFolder(), visible=False)
 
     polyDataCentroid = computeCentroid(polyData)
     cornerPoints = np.vstack((corner_points_ground.T, polyDataCentroid[2]*np.ones( corner_points_ground.shape[0]) )).T
@@ -4806,6 +5004,39 @@ def findMinimumBoundingRectangle(polyData, linkFrame):
     #print "Minimum area bounding box:"
     #print "Rotation angle:", rot_angle, "rad  (", rot_angle*(180/math.pi), "deg )"
     #print "rectDepth:", rectDepth, " rectWidth:", rectWidth, "  Area:", rectArea
-    #print "Center point: \n", center_point # numpy array
+    #print "Center point: \n", rect.center # numpy array
     #print "Corner points: \n", cornerPoints, "\n"  # numpy array
     return cornerTransform, rectDepth, rectWidth, rectArea
+
+
+@segmentationprofile.profiled
+def findMinimumBoundingRectangle(polyData, linkFrame):
+    '''
+    Find minimum bounding rectangle of a rectangular point cloud
+    The input is assumed to be a rectangular point cloud e.g. the top of a block or table
+    Returns transform of far right corner (pointing away from robot)
+    '''
+    polyData = applyVoxelGrid(polyData, leafSize=0.02)
+
+    pts =vtkNumpy.getNumpyFromVtk( polyData , 'Points' )
+    xy_points =  pts[:,[0,1]]
+    vis.updatePolyData( _get2DAsPolyData(xy_points) , 'xy_points', parent=getDebugFolder(), visible=False)
+
+    # Find minimum area bounding rectangle
+    rect = boundingrectangle.minimumAreaRectangle(xy_points)
+    vis.updatePolyData( _get2DAsPolyData(rect.hull) , 'hull_points', parent=getDebugFolder(), visible=False)
+
+    return _getBoundingRectangleCornerFrame(polyData, rect, linkFrame)
+
+
+@segmentationprofile.profiled
+def findMinimumBoundingRectangles(polyDataList, linkFrame):
+    '''
+    Batched version of findMinimumBoundingRectangle.  Returns a list of
+    (cornerTransform, rectDepth, rectWidth, rectArea), one per input cloud.
+    The rectangles of all clouds are searched in a single pass.
+    '''
+    polyDataList = [applyVoxelGrid(polyData, leafSize=0.02) for polyData in polyDataList]
+    xyPoints = [vtkNumpy.getNumpyFromVtk(polyData, 'Points')[:,:2] for polyData in polyDataList]
+    rects = boundingrectangle.minimumAreaRectangles(xyPoints)
+    return [_getBoundingRectangleCornerFrame(polyData, rect, linkFrame) for polyData, rect in zip(polyDataList, rects)]
@@ -0,0 +1,208 @@
+'''
+Memoization of pure segmentation routines.
+
+Results are keyed by a cheap fingerprint of every polydata argument (point
+count, bounds, array names and a hash of a strided sample of the points and
+point data arrays) together with the other call arguments.  The cache is
+bounded by an estimate of the result size in bytes and evicts the least
+recently used entries first.
+
+Use the memoize decorator on routines that have no side effects other than
+debug visualization.  Calls are keyed by their bound arguments, including
+defaults, so passing an argument by position or by keyword hits the same
+entry.  Cached polydata results are returned as shallow copies, so callers
+may add arrays to them, but must not modify their arrays in place.  numpy
+arrays, also inside FieldContainer, list and tuple results, are copied.
+
+From the console:
+
+    from director import segmentationcache
+    segmentationcache.getCache().printStats()
+    segmentationcache.getCache().clear()
+    segmentationcache.getCache().enabled = False
+'''
+
+import collections
+import functools
+import hashlib
+import inspect
+import threading
+import numpy as np
+
+import director.vtkAll as vtk
+from director import vtkNumpy as vnp
+from vtk.util import numpy_support
+from director.shallowCopy import shallowCopy
+from director.fieldcontainer import FieldContainer
+
+
+_fingerprintSampleSize = 1024
+
+
+def getPolyDataFingerprint(polyData):
+    '''
+    Returns a hashable fingerprint of the points and point data of polyData.
+    The hash covers a strided sample of about 1024 points, so it is cheap to
+    compute on large clouds.
+    '''
+    numberOfPoints = polyData.GetNumberOfPoints()
+    pointData = polyData.GetPointData()
+    arrayNames = tuple(pointData.GetArrayName(i) for i in xrange(pointData.GetNumberOfArrays()))
+
+    h = hashlib.md5()
+    if numberOfPoints:
+        stride = max(1, numberOfPoints // _fingerprintSampleSize)
+        h.update(np.ascontiguousarray(vnp.getNumpyFromVtk(polyData, 'Points')[::stride]).tobytes())
+        for i in xrange(pointData.GetNumberOfArrays()):
+            array = pointData.GetArray(i)
+            if array is not None and array.GetDataType() != vtk.VTK_BIT:
+                h.update(np.ascontiguousarray(numpy_support.vtk_to_numpy(array)[::stride]).tobytes())
+
+    return ('vtkPolyData', numberOfPoints, polyData.GetNumberOfCells(), tuple(polyData.GetBounds()), arrayNames, h.hexdigest())
+
+
+def _makeKey(value):
+    '''
+    Converts a call argument to a hashable key.  Raises TypeError for
+    arguments that cannot be keyed.
+    '''
+    if isinstance(value, vtk.vtkPolyData):
+        return getPolyDataFingerprint(value)
+    if isinstance(value, vtk.vtkTransform):
+        return ('vtkTransform', tuple(value.GetMatrix().GetElement(r, c) for r in xrange(4) for c in xrange(4)))
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, hashlib.md5(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_makeKey(v) for v in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((k, _makeKey(v)) for k, v in value.iteritems()))
+    if callable(value):
+        return ('callable', getattr(value, '__module__', None), getattr(value, '__name__', repr(value)))
+    hash(value)
+    return value
+
+
+def _getNumberOfBytes(value):
+    if isinstance(value, vtk.vtkDataObject):
+        return value.GetActualMemorySize() * 1024
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_getNumberOfBytes(v) for v in value)
+    if isinstance(value, FieldContainer):
+        return sum(_getNumberOfBytes(getattr(value, name)) for name in value._fields)
+    return 64
+
+
+def _copyResult(value):
+    if isinstance(value, vtk.vtkDataObject):
+        return shallowCopy(value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copyResult(v) for v in value)
+    if isinstance(value, list):
+        return [_copyResult(v) for v in value]
+    if type(value) is FieldContainer:
+        return FieldContainer(**dict((name, _copyResult(v)) for name, v in value))
+    return value
+
+
+class SegmentationCache(object):
+
+    def __init__(self, maxBytes=512*1024*1024):
+        self.maxBytes = maxBytes
+        self.enabled = True
+        self.entries = collections.OrderedDict()
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        # routines may be memoized in segmentation executor worker threads
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            return entry
+
+    def put(self, key, result):
+        numberOfBytes = _getNumberOfBytes(result)
+        if numberOfBytes > self.maxBytes:
+            return
+
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (result, numberOfBytes)
+            self.totalBytes += numberOfBytes
+
+            while self.totalBytes > self.maxBytes:
+                _, (_, evictedBytes) = self.entries.popitem(last=False)
+                self.totalBytes -= evictedBytes
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.totalBytes -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalBytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def getStats(self):
+        with self.lock:
+            functionCounts = collections.Counter(key[0] for key in self.entries)
+            return dict(entries=len(self.entries), totalBytes=self.totalBytes, maxBytes=self.maxBytes,
+                        hits=self.hits, misses=self.misses, functions=dict(functionCounts))
+
+    def printStats(self):
+        stats = self.getStats()
+        print('segmentation cache: %d entries, %.1f / %.1f MB, %d hits, %d misses' % (
+              stats['entries'], stats['totalBytes']/1e6, stats['maxBytes']/1e6, stats['hits'], stats['misses']))
+        for name, count in sorted(stats['functions'].items()):
+            print('    %s: %d' % (name, count))
+
+
+_cache = SegmentationCache()
+
+
+def getCache():
+    return _cache
+
+
+def memoize(func):
+    '''
+    Decorator that caches the results of func in the global segmentation cache.
+    Calls with arguments that cannot be keyed are passed through uncached.
+    '''
+    name = '%s.%s' % (func.__module__, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+
+        cache = getCache()
+        if not cache.enabled:
+            return func(*args, **kwargs)
+
+        try:
+            key = (name, _makeKey(inspect.getcallargs(func, *args, **kwargs)))
+        except TypeError:
+            return func(*args, **kwargs)
+
+        entry = cache.get(key)
+        if entry is None:
+            result = func(*args, **kwargs)
+            cache.put(key, result)
+            entry = (result, None)
+
+        return _copyResult(entry[0])
+
+    return wrapper
@@ -0,0 +1,307 @@
+'''
+Runs segmentation fits off the main thread.
+
+A SegmentationExecutor submits a fitting function to a thread pool, or
+optionally a process pool, so that the 3D view keeps rendering while a fit
+is running.  Polydata and transform arguments are serialized to numpy arrays
+before the job is queued, so the worker never sees objects that the main
+thread may modify, and the same serialization is used to bring results back.
+
+Completed jobs are delivered on the main thread by a TimerCallback that
+drains a completion queue and calls the job's onFinished or onFailed
+callback.  This is where affordance items and debug objects should be
+created, since the object model is not thread safe.  The timer does not
+sleep, the numpy and vtk routines of the fits release the interpreter lock.
+Jobs that do not complete within jobTimeout seconds are failed, so a job
+whose arguments cannot be sent to a process pool does not stay pending.
+
+Functions run by the executor must not touch the object model or the
+views.  Routines that show debug objects can check inWorker() to skip them.
+
+Example:
+
+    def onFinished(result):
+        vis.showClusterObjects(result.planeClusters, parent='segmentation')
+
+    job = segmentationexecutor.getExecutor().submit(segmentation.computeHorizontalSurfaces,
+              args=(polyData,), onFinished=onFinished)
+'''
+
+import Queue
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import threading
+import time
+import traceback
+import numpy as np
+
+import director.vtkAll as vtk
+from director import vtkNumpy as vnp
+from director.fieldcontainer import FieldContainer
+from director.timercallback import TimerCallback
+from vtk.util import numpy_support
+
+
+_workerState = threading.local()
+
+
+def inWorker():
+    '''
+    Returns True when called from a function run by a segmentation executor.
+    '''
+    return getattr(_workerState, 'inWorker', False)
+
+
+def _isPointCloud(polyData):
+    return (polyData.GetNumberOfVerts() == polyData.GetNumberOfCells() and
+            not polyData.GetNumberOfLines() and not polyData.GetNumberOfPolys() and not polyData.GetNumberOfStrips())
+
+
+def _encodePolyData(polyData):
+    '''
+    Point clouds are encoded as numpy arrays of the points and point data,
+    other polydata with the binary vtk legacy writer.
+    '''
+    if _isPointCloud(polyData):
+        pointData = polyData.GetPointData()
+        arrays = []
+        for i in xrange(pointData.GetNumberOfArrays()):
+            array = pointData.GetArray(i)
+            if array is not None and array.GetDataType() != vtk.VTK_BIT:
+                arrays.append((array.GetName(), numpy_support.vtk_to_numpy(array).copy()))
+        points = vnp.getNumpyFromVtk(polyData, 'Points').copy() if polyData.GetNumberOfPoints() else np.zeros((0, 3))
+        return ('pointcloud', points, arrays)
+
+    writer = vtk.vtkPolyDataWriter()
+    writer.SetFileTypeToBinary()
+    writer.WriteToOutputStringOn()
+    writer.SetInputData(polyData)
+    writer.Write()
+    return ('polydata', writer.GetOutputStdString())
+
+
+def _decodePolyData(encoded):
+
+    if encoded[0] == 'pointcloud':
+        _, points, arrays = encoded
+        polyData = vnp.numpyToPolyData(points, copy=False)
+        for name, values in arrays:
+            vnp.addNumpyToVtk(polyData, values, name)
+        return polyData
+
+    data = encoded[1]
+    reader = vtk.vtkPolyDataReader()
+    reader.ReadFromInputStringOn()
+    reader.SetBinaryInputString(data, len(data))
+    reader.Update()
+    polyData = vtk.vtkPolyData()
+    polyData.ShallowCopy(reader.GetOutput())
+    return polyData
+
+
+class _Encoded(object):
+
+    def __init__(self, kind, data):
+        self.kind = kind
+        self.data = data
+
+
+def encode(value):
+    '''
+    Converts polydata and transforms, also inside lists, tuples, dicts and
+    FieldContainers, to picklable objects.  See decode.
+    '''
+    if isinstance(value, vtk.vtkPolyData):
+        return _Encoded('vtkPolyData', _encodePolyData(value))
+    if isinstance(value, vtk.vtkTransform):
+        return _Encoded('vtkTransform', np.array([[value.GetMatrix().GetElement(r, c) for c in xrange(4)] for r in xrange(4)]))
+    if isinstance(value, FieldContainer):
+        return _Encoded('FieldContainer', dict((name, encode(getattr(value, name))) for name in value._fields))
+    if isinstance(value, tuple):
+        return tuple(encode(v) for v in value)
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return dict((k, encode(v)) for k, v in value.iteritems())
+    return value
+
+
+def decode(value):
+    if isinstance(value, _Encoded):
+        if value.kind == 'vtkPolyData':
+            return _decodePolyData(value.data)
+        if value.kind == 'vtkTransform':
+            t = vtk.vtkTransform()
+            t.SetMatrix(value.data.flatten().tolist())
+            return t
+        if value.kind == 'FieldContainer':
+            return FieldContainer(**dict((k, decode(v)) for k, v in value.data.iteritems()))
+    if isinstance(value, tuple):
+        return tuple(decode(v) for v in value)
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        return dict((k, decode(v)) for k, v in value.iteritems())
+    return value
+
+
+def _runJob(jobId, function, encodedArgs, encodedKwargs):
+    '''
+    Worker entry point.  This is a module function so that it can be used
+    with a process pool.  Returns (jobId, succeeded, encoded result or
+    formatted traceback).
+    '''
+    _workerState.inWorker = True
+    try:
+        result = function(*decode(encodedArgs), **decode(encodedKwargs))
+        return jobId, True, encode(result)
+    except Exception:
+        return jobId, False, traceback.format_exc()
+    finally:
+        _workerState.inWorker = False
+
+
+class SegmentationJob(object):
+
+    PENDING = 'pending'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    def __init__(self, jobId, name, onFinished=None, onFailed=None, deadline=None):
+        self.id = jobId
+        self.name = name
+        self.onFinished = onFinished
+        self.onFailed = onFailed
+        self.deadline = deadline
+        self.status = self.PENDING
+        self.result = None
+        self.error = None
+
+    def isDone(self):
+        return self.status != self.PENDING
+
+    def succeeded(self):
+        return self.status == self.FINISHED
+
+
+class SegmentationExecutor(object):
+
+    def __init__(self, numberOfWorkers=2, useProcesses=False, jobTimeout=120.0):
+        '''
+        Jobs run in a thread pool by default.  With useProcesses the jobs
+        run in a process pool, which avoids contention for the interpreter
+        lock, but the job functions must then be importable module functions.
+        Jobs still pending after jobTimeout seconds are failed.
+        '''
+        self.numberOfWorkers = numberOfWorkers
+        self.useProcesses = useProcesses
+        self.jobTimeout = jobTimeout
+        self.pool = None
+        self.jobs = {}
+        self.completionQueue = Queue.Queue()
+        self.jobIds = itertools.count()
+        self.timer = TimerCallback(targetFps=30, callback=self._processCompletedJobs)
+
+    def _getPool(self):
+        if self.pool is None:
+            if self.useProcesses:
+                self.pool = multiprocessing.Pool(self.numberOfWorkers)
+            else:
+                self.pool = multiprocessing.pool.ThreadPool(self.numberOfWorkers)
+        return self.pool
+
+    def submit(self, function, args=(), kwargs=None, onFinished=None, onFailed=None):
+        '''
+        Queues function(*args, **kwargs) and returns a SegmentationJob.
+        onFinished(result) or onFailed(job) is called on the main thread
+        when the job completes.  Failures without an onFailed callback
+        print the worker traceback.
+        '''
+        # encode first, so a job whose arguments cannot be encoded is never registered
+        encodedArgs, encodedKwargs = encode(tuple(args)), encode(kwargs or {})
+
+        job = SegmentationJob(next(self.jobIds), getattr(function, '__name__', repr(function)), onFinished, onFailed,
+                              deadline=time.time() + self.jobTimeout)
+        self._getPool().apply_async(_runJob, (job.id, function, encodedArgs, encodedKwargs),
+                                    callback=self.completionQueue.put)
+        self.jobs[job.id] = job
+
+        if not self.timer.isActive():
+            self.timer.start()
+        return job
+
+    def getNumberOfPendingJobs(self):
+        return len(self.jobs)
+
+    def _processCompletedJobs(self):
+
+        while True:
+            try:
+                jobId, succeeded, data = self.completionQueue.get_nowait()
+            except Queue.Empty:
+                break
+
+            job = self.jobs.pop(jobId, None)
+            if job is None:
+                continue
+            self._finishJob(job, succeeded, data)
+
+        # a process pool drops jobs whose arguments fail to pickle without calling back
+        now = time.time()
+        for job in [job for job in self.jobs.itervalues() if job.deadline < now]:
+            del self.jobs[job.id]
+            self._finishJob(job, False, 'timed out after %.1f seconds' % self.jobTimeout)
+
+        if not self.jobs:
+            # return false to stop the timer
+            return False
+
+    def _finishJob(self, job, succeeded, data):
+
+        if succeeded:
+            job.result = decode(data)
+            job.status = SegmentationJob.FINISHED
+            if job.onFinished:
+                job.onFinished(job.result)
+        else:
+            job.error = data
+            job.status = SegmentationJob.FAILED
+            if job.onFailed:
+                job.onFailed(job)
+            else:
+                print('segmentation job %s failed:\n%s' % (job.name, job.error))
+
+    def cancelAll(self):
+        '''
+        Drops the pending jobs and marks them failed.  Jobs that are already
+        running will finish, but their callbacks are not called.
+        '''
+        for job in self.jobs.itervalues():
+            job.status = SegmentationJob.FAILED
+            job.error = 'cancelled'
+        self.jobs.clear()
+
+    def waitForJob(self, job):
+        '''
+        Generator that yields until the job is done, for use in task
+        generators that are run by an AsyncTaskQueue.
+        '''
+        while not job.isDone():
+            yield
+
+    def close(self):
+        self.cancelAll()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+
+_executor = None
+
+
+def getExecutor():
+    global _executor
+    if _executor is None:
+        _executor = SegmentationExecutor()
+    return _executor
@@ -0,0 +1,340 @@
+'''
+Stage level profiling of segmentation routines.
+
+Routines decorated with profiled, and blocks wrapped in a stage context,
+record their wall time, the number of input and output points and the
+size in bytes of the output arrays.  Stages started while another stage is
+running on the same thread become its children, so every call of a top
+level routine produces one tree, or run.  The last runs are kept on the
+profile and can be printed or exported as JSON, or as a chrome trace that
+can be loaded in chrome://tracing.
+
+Profiling is disabled by default.  A disabled profiled routine costs one
+attribute lookup per call and a disabled stage returns a shared no-op
+context.
+
+From the console:
+
+    from director import segmentationprofile
+    segmentationprofile.enableProfiling()
+    segmentation.segmentDrillAuto(point1)
+    segmentationprofile.getProfile().printSummary()
+    segmentationprofile.getProfile().exportChromeTrace('segmentation.json')
+
+enableProfiling also adds a 'segmentation profile' object to the
+segmentation debug folder, with actions to print and export the runs.
+'''
+
+import collections
+import functools
+import json
+import threading
+import time
+import numpy as np
+
+import director.vtkAll as vtk
+from director import objectmodel as om
+from PythonQt import QtGui
+
+
+def getPointCount(value):
+    '''
+    Returns the number of points of polydata or of the rows of a numpy
+    array, or None for other values.
+    '''
+    if isinstance(value, vtk.vtkDataSet):
+        return value.GetNumberOfPoints()
+    if isinstance(value, np.ndarray):
+        return len(value) if value.ndim else 1
+    return None
+
+
+def getArrayBytes(value):
+    '''
+    Returns the size in bytes of the polydata and numpy arrays in value,
+    looking one level into tuples, lists and FieldContainers.
+    '''
+    if isinstance(value, vtk.vtkDataObject):
+        return value.GetActualMemorySize() * 1024
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        items = value
+    elif hasattr(value, '_fields'):
+        items = [getattr(value, name) for name in value._fields]
+    else:
+        return 0
+    return sum(item.GetActualMemorySize() * 1024 if isinstance(item, vtk.vtkDataObject)
+               else item.nbytes if isinstance(item, np.ndarray) else 0 for item in items)
+
+
+def _getTotalPointCount(value):
+    count = getPointCount(value)
+    if count is not None or not isinstance(value, (tuple, list)):
+        return count
+    counts = [c for c in (getPointCount(item) for item in value) if c is not None]
+    return sum(counts) if counts else None
+
+
+class ProfileStage(object):
+
+    __slots__ = ['name', 'threadId', 'startTime', 'elapsed', 'inputPoints', 'outputPoints', 'outputBytes', 'children']
+
+    def __init__(self, name, threadId):
+        self.name = name
+        self.threadId = threadId
+        self.startTime = time.time()
+        self.elapsed = None
+        self.inputPoints = None
+        self.outputPoints = None
+        self.outputBytes = None
+        self.children = []
+
+    def setInput(self, value):
+        self.inputPoints = getPointCount(value)
+
+    def setOutput(self, value):
+        self.outputPoints = _getTotalPointCount(value)
+        self.outputBytes = getArrayBytes(value)
+
+    def getSelfTime(self):
+        return self.elapsed - sum(child.elapsed for child in self.children)
+
+    def toDict(self):
+        return dict(name=self.name, thread=self.threadId, start=self.startTime, elapsed=self.elapsed,
+                    inputPoints=self.inputPoints, outputPoints=self.outputPoints, outputBytes=self.outputBytes,
+                    children=[child.toDict() for child in self.children])
+
+
+class _NullStage(object):
+    '''
+    The stage returned while profiling is disabled.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def setInput(self, value):
+        pass
+
+    def setOutput(self, value):
+        pass
+
+
+_nullStage = _NullStage()
+
+
+class _StageContext(object):
+
+    def __init__(self, profile, name, inputValue):
+        self.profile = profile
+        self.name = name
+        self.inputValue = inputValue
+
+    def __enter__(self):
+        self.stage = self.profile._begin(self.name)
+        if self.inputValue is not None:
+            self.stage.setInput(self.inputValue)
+        return self.stage
+
+    def __exit__(self, *args):
+        self.profile._end(self.stage)
+        return False
+
+
+class SegmentationProfile(object):
+
+    def __init__(self, maxRuns=50):
+        self.enabled = False
+        self.runs = collections.deque(maxlen=maxRuns)
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def _getStack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _begin(self, name):
+        stack = self._getStack()
+        stage = ProfileStage(name, threading.current_thread().ident)
+        if stack:
+            stack[-1].children.append(stage)
+        stack.append(stage)
+        return stage
+
+    def _end(self, stage):
+        stage.elapsed = time.time() - stage.startTime
+        stack = self._getStack()
+        stack.remove(stage)
+        if not stack:
+            with self.lock:
+                self.runs.append(stage)
+
+    def stage(self, name, inputValue=None):
+        '''
+        Returns a context manager that profiles the enclosed block as a stage
+        with the given name.  The context value has setInput and setOutput
+        methods to record the input and output of the stage.
+        '''
+        if not self.enabled:
+            return _nullStage
+        return _StageContext(self, name, inputValue)
+
+    def call(self, name, func, args, kwargs):
+        '''
+        Calls func as a stage.  The input points are counted from the first
+        polydata or numpy array argument.
+        '''
+        stage = self._begin(name)
+        try:
+            for value in args + tuple(kwargs.values()):
+                if getPointCount(value) is not None:
+                    stage.setInput(value)
+                    break
+            result = func(*args, **kwargs)
+            stage.setOutput(result)
+            return result
+        finally:
+            self._end(stage)
+
+    def clear(self):
+        with self.lock:
+            self.runs.clear()
+
+    def getRuns(self):
+        with self.lock:
+            return list(self.runs)
+
+    def toJson(self):
+        return json.dumps([run.toDict() for run in self.getRuns()], indent=2)
+
+    def toChromeTrace(self):
+        '''
+        Returns the runs in the chrome trace event format as a json string.
+        '''
+        events = []
+
+        def addEvents(stage):
+            args = dict(inputPoints=stage.inputPoints, outputPoints=stage.outputPoints, outputBytes=stage.outputBytes)
+            events.append(dict(name=stage.name, ph='X', pid=0, tid=stage.threadId,
+                               ts=stage.startTime*1e6, dur=stage.elapsed*1e6, args=args))
+            for child in stage.children:
+                addEvents(child)
+
+        for run in self.getRuns():
+            addEvents(run)
+        return json.dumps(dict(traceEvents=events, displayTimeUnit='ms'))
+
+    def exportJson(self, filename):
+        with open(filename, 'w') as f:
+            f.write(self.toJson())
+
+    def exportChromeTrace(self, filename):
+        with open(filename, 'w') as f:
+            f.write(self.toChromeTrace())
+
+    def printSummary(self, runIndex=-1):
+        '''
+        Prints the stage tree of a run, by default the last one.
+        '''
+        runs = self.getRuns()
+        if not runs:
+            print('segmentation profile: no runs')
+            return
+
+        def printStage(stage, depth):
+            points = '%s -> %s' % (stage.inputPoints, stage.outputPoints)
+            print('%s%-*s %8.1f ms %8.1f ms self  points %-20s %8.2f MB' % ('  '*depth, 40 - 2*depth, stage.name,
+                  stage.elapsed*1e3, stage.getSelfTime()*1e3, points, (stage.outputBytes or 0)/1e6))
+            for child in stage.children:
+                printStage(child, depth + 1)
+
+        printStage(runs[runIndex], 0)
+
+
+_profile = SegmentationProfile()
+
+
+def getProfile():
+    return _profile
+
+
+def stage(name, inputValue=None):
+    '''
+    Profiles a block of code as a stage of the current run:
+
+        with segmentationprofile.stage('fit plane', polyData) as s:
+            ...
+            s.setOutput(result)
+    '''
+    return _profile.stage(name, inputValue)
+
+
+def profiled(func):
+    '''
+    Decorator that profiles each call of func as a stage named after it.
+    '''
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profile.enabled:
+            return func(*args, **kwargs)
+        return _profile.call(name, func, args, kwargs)
+
+    return wrapper
+
+
+class SegmentationProfileItem(om.ObjectModelItem):
+
+    def __init__(self, profile):
+        om.ObjectModelItem.__init__(self, 'segmentation profile', om.Icons.Hammer)
+        self.profile = profile
+        self.addProperty('Enabled', profile.enabled)
+
+    def _onPropertyChanged(self, propertySet, propertyName):
+        om.ObjectModelItem._onPropertyChanged(self, propertySet, propertyName)
+        if propertyName == 'Enabled':
+            self.profile.enabled = self.getProperty(propertyName)
+
+    def getActionNames(self):
+        actions = ['Print Summary', 'Export JSON', 'Export Chrome Trace', 'Clear']
+        return om.ObjectModelItem.getActionNames(self) + actions
+
+    def onAction(self, action):
+        if action == 'Print Summary':
+            self.profile.printSummary()
+        elif action in ('Export JSON', 'Export Chrome Trace'):
+            filename = QtGui.QFileDialog.getSaveFileName(None, action, 'segmentation_profile.json', 'JSON (*.json)')
+            if filename:
+                if action == 'Export JSON':
+                    self.profile.exportJson(filename)
+                else:
+                    self.profile.exportChromeTrace(filename)
+        elif action == 'Clear':
+            self.profile.clear()
+        else:
+            om.ObjectModelItem.onAction(self, action)
+
+
+def getProfileObject():
+    '''
+    Returns the segmentation profile object of the debug folder, adding it
+    if needed.  Must be called on the main thread.
+    '''
+    from director import segmentationroutines
+
+    obj = om.findObjectByName('segmentation profile')
+    if obj is None:
+        obj = SegmentationProfileItem(_profile)
+        om.addToObjectModel(obj, segmentationroutines.getDebugFolder())
+    return obj
+
+
+def enableProfiling(enabled=True):
+    getProfileObject().setProperty('Enabled', enabled)
@@ -12,6 +12,10 @@ import director.visualization as vis
 from director import objectmodel as om
 from director.transformUtils import getTransformFromAxes
 from director import vtkAll as vtk
+from director import voxelpyramid
+from director import segmentationcache
+from director import segmentationprofile
+from director import euclideanclustering
 
 import vtkNumpy
 import numpy as np
@@ -166,6 +170,7 @@ def getDebugFolder():
     return obj
 
 
+@segmentationprofile.profiled
 def applyLineFit(dataObj, distanceThreshold=0.02):
 
     f = vtk.vtkPCLSACSegmentationLine()
@@ -209,6 +214,7 @@ def intersectLineWithPlane(line_point, line_ray, plane_point, plane_normal ):
     return intersection_point
 
 
+@segmentationprofile.profiled
 def labelPointDistanceAlongAxis(polyData, axis, origin=None, resultArrayName='distance_along_axis'):
 
     points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
@@ -222,57 +228,63 @@ def labelPointDistanceAlongAxis(polyData, axis, origin=None, resultArrayName='di
     return newData
 
 
-def applyEuclideanClustering(dataObj, clusterTolerance=0.05, minClusterSize=100, maxClusterSize=1e6):
+@segmentationprofile.profiled
+def computeEuclideanClusters(polyData, clusterTolerance=0.05, minClusterSize=100, maxClusterSize=1e6, clusterInXY=False):
+    '''
+    Returns a euclideanclustering.ClusterResult for the points of polyData.
+    '''
+    if not polyData.GetNumberOfPoints():
+        return euclideanclustering.clusterPoints(np.zeros((0, 3)))
+    points = vtkNumpy.getNumpyFromVtk(polyData, 'Points')
+    return euclideanclustering.clusterPoints(points, clusterTolerance, minClusterSize, maxClusterSize, clusterInXY)
 
-    f = vtk.vtkPCLEuclideanClusterExtraction()
-    f.SetInput(dataObj)
-    f.SetClusterTolerance(clusterTolerance)
-    f.SetMinClusterSize(int(minClusterSize))
-    f.SetMaxClusterSize(int(maxClusterSize))
-    f.Update()
-    return shallowCopy(f.GetOutput())
+
+@segmentationprofile.profiled
+@segmentationcache.memoize
+def applyEuclideanClustering(dataObj, clusterTolerance=0.05, minClusterSize=100, maxClusterSize=1e6, clusterInXY=False):
+    '''
+    Returns a copy of dataObj with a 'cluster_labels' point data array.
+    Clusters are labelled from 1 in decreasing size, points outside of the
+    cluster size limits have label 0.  See euclideanclustering.
+    '''
+    result = computeEuclideanClusters(dataObj, clusterTolerance, minClusterSize, maxClusterSize, clusterInXY)
+    dataObj = shallowCopy(dataObj)
+    vtkNumpy.addNumpyToVtk(dataObj, result.labels, 'cluster_labels')
+    return dataObj
 
 
+@segmentationprofile.profiled
 def extractClusters(polyData, clusterInXY=False, **kwargs):
     ''' Segment a single point cloud into smaller clusters
-        using Euclidean Clustering
+        using Euclidean Clustering.  Returns a list of polydata,
+        largest cluster first.
+        If clusterInXY is True, points that are only seperated in Z
+        belong to the same cluster.
      '''
 
     if not polyData.GetNumberOfPoints():
         return []
 
-    if (clusterInXY == True):
-        ''' If Points are seperated in X&Y, then cluster outside this '''
-        polyDataXY = vtk.vtkPolyData()
-        polyDataXY.DeepCopy(polyData)
-        points=vtkNumpy.getNumpyFromVtk(polyDataXY , 'Points') # shared memory
-        points[:,2] = 0.0
-        #showPolyData(polyDataXY, 'polyDataXY', visible=False, parent=getDebugFolder())
-        polyDataXY = applyEuclideanClustering(polyDataXY, **kwargs)
-        clusterLabels = vtkNumpy.getNumpyFromVtk(polyDataXY, 'cluster_labels')
-        vtkNumpy.addNumpyToVtk(polyData, clusterLabels, 'cluster_labels')
-
-    else:
-        polyData = applyEuclideanClustering(polyData, **kwargs)
-        clusterLabels = vtkNumpy.getNumpyFromVtk(polyData, 'cluster_labels')
-
+    result = computeEuclideanClusters(polyData, clusterInXY=clusterInXY, **kwargs)
 
-    clusters = []
-    for i in xrange(1, clusterLabels.max() + 1):
-        cluster = thresholdPoints(polyData, 'cluster_labels', [i, i])
-        clusters.append(cluster)
-    return clusters
+    polyData = shallowCopy(polyData)
+    vtkNumpy.addNumpyToVtk(polyData, result.labels, 'cluster_labels')
+    return [extractPointsByIds(polyData, ids) for ids in result.getClusterIndices()]
 
 
+@segmentationprofile.profiled
 def applyVoxelGrid(polyData, leafSize=0.01):
-
-    v = vtk.vtkPCLVoxelGrid()
-    v.SetLeafSize(leafSize, leafSize, leafSize)
-    v.SetInput(polyData)
-    v.Update()
-    return shallowCopy(v.GetOutput())
+    '''
+    Returns a copy of polyData downsampled to one point per voxel, placed at
+    the voxel centroid.  The voxel keys are cached per snapshot, so repeated
+    calls with different leaf sizes on the same cloud share work.  See
+    voxelpyramid.VoxelPyramid.
+    '''
+    return voxelpyramid.applyVoxelGrid(polyData, leafSize)
 
 
+@segmentationprofile.profiled
+@segmentationcache.memoize
 def labelOutliers(dataObj, searchRadius=0.03, neighborsInSearchRadius=10):
 
     f = vtk.vtkPCLRadiusOutlierRemoval()
@@ -283,13 +295,13 @@ def labelOutliers(dataObj, searchRadius=0.03, neighborsInSearchRadius=10):
     return shallowCopy(f.GetOutput())
 
 
+@segmentationprofile.profiled
 def sparsifyStereoCloud(polyData):
     ''' Take in a typical Stereo Camera Point Cloud
     Filter it down to about the density of a lidar point cloud
     and remove outliers
     '''
 
-    # >>> strips color out <<<
     polyData = applyVoxelGrid(polyData, leafSize=0.01)
 
     # remove outliers
@@ -298,6 +310,7 @@ def sparsifyStereoCloud(polyData):
     polyData = thresholdPoints(polyData, 'is_outlier', [0.0, 0.0])
     return polyData
 
+@segmentationprofile.profiled
 def fitDrillBarrel ( drillPoints, forwardDirection, plane_origin, plane_normal):
     ''' Given a point cloud which ONLY contains points from a barrell drill, standing upright
         and the equations of a table its resting on, and the general direction of the robot
@@ -0,0 +1,254 @@
+'''
+Spatial index for point cloud queries.
+
+A SpatialIndex wraps a k-d tree built over the points of a polydata and
+answers radius, k-nearest and ray corridor queries in O(log n + k) instead
+of computing distances to every point.  Indices are cached against the
+vtkPoints of the dataset and its modification time, so shallow copies of a
+snapshot that only add point data arrays reuse the same index.
+
+Note that modifying the points through a numpy view does not update the
+vtk modification time.  Call Modified() on the points after editing them
+in place, or call clearCache().
+'''
+
+import collections
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+
+from director import vtkNumpy as vnp
+
+
+class SpatialIndex(object):
+
+    def __init__(self, points):
+        '''
+        Builds the index over the given Nx3 points.  Non-finite points are
+        skipped, query results are indices into the original point array.
+        '''
+        self.numberOfPoints = len(points)
+        finite = np.isfinite(points).all(axis=1)
+        if finite.all():
+            self.pointIds = None
+            self.points = np.array(points, dtype=np.float64)
+        else:
+            self.pointIds = np.flatnonzero(finite)
+            self.points = np.array(points[finite], dtype=np.float64)
+
+        self.tree = None
+        if len(self.points):
+            self.tree = cKDTree(self.points)
+            self.bounds = self.points.min(axis=0), self.points.max(axis=0)
+
+    def _toPointIds(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids if self.pointIds is None else self.pointIds[ids]
+
+    def getNumberOfBytes(self):
+        nbytes = self.points.nbytes
+        if self.pointIds is not None:
+            nbytes += self.pointIds.nbytes
+        # the tree stores its own copy of the points and an index array
+        return 2*nbytes + 8*len(self.points)
+
+    def radiusSearch(self, point, radius):
+        '''
+        Returns the sorted indices of the points within radius of the given point.
+        '''
+        if not len(self.points):
+            return np.zeros(0, dtype=np.int64)
+        ids = self.tree.query_ball_point(np.asarray(point, dtype=np.float64), radius)
+        return np.sort(self._toPointIds(ids))
+
+    def radiusMask(self, point, radius):
+        '''
+        Returns a boolean mask over the original points, True within radius of the given point.
+        '''
+        mask = np.zeros(self.numberOfPoints, dtype=bool)
+        mask[self.radiusSearch(point, radius)] = True
+        return mask
+
+    def nearest(self, point, k=1):
+        '''
+        Returns (indices, distances) of the k nearest points sorted by distance.
+        '''
+        k = min(k, len(self.points))
+        if not k:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        dists, ids = self.tree.query(np.asarray(point, dtype=np.float64), k=k)
+        return self._toPointIds(np.atleast_1d(ids)), np.atleast_1d(dists)
+
+    def nearestBatch(self, points, k, maxDistance=np.inf):
+        '''
+        Returns (indices, distances) as MxK arrays of the k nearest points to
+        each of the M query points, sorted by distance.  Neighbors further
+        than maxDistance, and all neighbors of non-finite query points, are
+        returned with index -1 and distance inf.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        ids = -np.ones((len(points), k), dtype=np.int64)
+        dists = np.empty((len(points), k))
+        dists.fill(np.inf)
+
+        finite = np.isfinite(points).all(axis=1)
+        if not len(self.points) or not finite.any():
+            return ids, dists
+
+        numberOfQueries = min(k, len(self.points))
+        queryDists, queryIds = self.tree.query(points[finite], k=numberOfQueries, distance_upper_bound=maxDistance)
+        queryDists = queryDists.reshape(-1, numberOfQueries)
+        queryIds = queryIds.reshape(-1, numberOfQueries)
+
+        found = np.isfinite(queryDists)
+        queryIds = np.where(found, queryIds, 0)
+        queryIds = np.where(found, self._toPointIds(queryIds), -1)
+
+        ids[finite, :numberOfQueries] = queryIds
+        dists[finite, :numberOfQueries] = queryDists
+        return ids, dists
+
+    def rayCorridorSearch(self, origin, direction, radius, minDistance=0.0, maxDistance=np.inf):
+        '''
+        Returns (indices, distanceToRay, distanceAlongRay) for the points
+        within radius of the ray that starts at origin.  Only points whose
+        projection along the ray is between minDistance and maxDistance are
+        returned.  The ray is clipped to the bounds of the cloud and sampled
+        at intervals of radius, so the cost is proportional to the ray length
+        inside the cloud divided by radius, plus the number of points found.
+        '''
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        if not len(self.points):
+            return empty
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+
+        tmin, tmax = self._clipRayToBounds(origin, direction, radius)
+        tmin, tmax = max(tmin, minDistance), min(tmax, maxDistance)
+        if tmin > tmax:
+            return empty
+
+        # every point within radius of the segment between two samples spaced
+        # radius apart is within radius*sqrt(5)/2 of the nearest sample
+        numberOfSamples = int(np.ceil((tmax - tmin) / radius)) + 1
+        samples = origin + np.outer(np.linspace(tmin, tmax, numberOfSamples), direction)
+        candidates = self.tree.query_ball_point(samples, radius*np.sqrt(5.0)/2.0)
+        ids = np.unique(np.concatenate([np.asarray(c, dtype=np.int64) for c in candidates]))
+        if not len(ids):
+            return empty
+
+        delta = self.points[ids] - origin
+        distanceAlongRay = np.dot(delta, direction)
+        distanceToRay = np.linalg.norm(delta - np.outer(distanceAlongRay, direction), axis=1)
+
+        keep = (distanceToRay <= radius) & (distanceAlongRay >= minDistance) & (distanceAlongRay <= maxDistance)
+        return self._toPointIds(ids[keep]), distanceToRay[keep], distanceAlongRay[keep]
+
+    def _clipRayToBounds(self, origin, direction, padding):
+        '''
+        Returns the (tmin, tmax) interval where the ray is inside the padded bounds of the tree.
+        '''
+        lower = self.bounds[0] - padding
+        upper = self.bounds[1] + padding
+
+        tmin, tmax = 0.0, np.inf
+        for axis in xrange(3):
+            if abs(direction[axis]) < 1e-12:
+                if not lower[axis] <= origin[axis] <= upper[axis]:
+                    return 1.0, 0.0
+                continue
+            t1 = (lower[axis] - origin[axis]) / direction[axis]
+            t2 = (upper[axis] - origin[axis]) / direction[axis]
+            tmin = max(tmin, min(t1, t2))
+            tmax = min(tmax, max(t1, t2))
+
+        return tmin, tmax
+
+
+_indexCache = collections.OrderedDict()
+_maxCachedBytes = 256*1024*1024
+_cachedBytes = 0
+# indices are also requested from segmentation executor worker threads
+_cacheLock = threading.RLock()
+
+
+def getCachedSpatialIndex(polyData):
+    '''
+    Returns the cached spatial index for the points of polyData, or None
+    if one has not been built or the points have been modified since.
+    '''
+    key = vnp.getPointsCacheKey(polyData)
+    with _cacheLock:
+        index = _indexCache.pop(key, None)
+        if index is not None:
+            _indexCache[key] = index
+        return index
+
+
+def _removeCachedIndex(key):
+    global _cachedBytes
+    _cachedBytes -= _indexCache.pop(key).getNumberOfBytes()
+
+
+def getSpatialIndex(polyData, cache=True):
+    '''
+    Returns the spatial index for the points of polyData, building it on
+    first use.  The index is cached unless cache is False, which is meant
+    for temporary clouds.  The least recently used indices are dropped when
+    the cached indices exceed _maxCachedBytes.
+    '''
+    global _cachedBytes
+
+    index = getCachedSpatialIndex(polyData)
+    if index is not None:
+        return index
+
+    key = vnp.getPointsCacheKey(polyData)
+    if key is None:
+        return SpatialIndex(np.zeros((0, 3)))
+
+    # the tree is built without holding the lock
+    index = SpatialIndex(vnp.getNumpyFromVtk(polyData, 'Points'))
+    index.cacheKey = key
+    if not cache:
+        return index
+
+    with _cacheLock:
+        # another thread may have built the same index meanwhile
+        if key in _indexCache:
+            return getCachedSpatialIndex(polyData)
+
+        _indexCache[key] = index
+        _cachedBytes += index.getNumberOfBytes()
+
+        # keep the index just built even if it exceeds the budget alone
+        while len(_indexCache) > 1 and _cachedBytes > _maxCachedBytes:
+            _removeCachedIndex(next(iter(_indexCache)))
+    return index
+
+
+def isSpatialIndexCurrent(index, polyData):
+    '''
+    Returns True if index was built by getSpatialIndex from the current points of polyData.
+    '''
+    return getattr(index, 'cacheKey', None) == vnp.getPointsCacheKey(polyData)
+
+
+def discardSpatialIndex(index):
+    with _cacheLock:
+        for key, value in _indexCache.items():
+            if value is index:
+                _removeCachedIndex(key)
+
+
+def getCachedBytes():
+    return _cachedBytes
+
+
+def clearCache():
+    global _cachedBytes
+    with _cacheLock:
+        _indexCache.clear()
+        _cachedBytes = 0
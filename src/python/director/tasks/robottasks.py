@@ -1,5 +1,6 @@
 from director import asynctaskqueue as atq
 from director import segmentation
+from director import segmentationexecutor
 from director import visualization as vis
 import director.objectmodel as om
 from director import propertyset
@@ -305,6 +306,21 @@ class PointCloudAlgorithmBase(AsyncTask):
         else:
             return SnapshotSelectedPointcloud().getPointCloud()
 
+    def submitFit(self, function, *args, **kwargs):
+        '''
+        Runs function(*args, **kwargs) in the segmentation executor and
+        returns the SegmentationJob.  Use waitForFit in the task generator
+        to wait for the result without blocking rendering.
+        '''
+        return segmentationexecutor.getExecutor().submit(function, args=args, kwargs=kwargs)
+
+    def waitForFit(self, job):
+        self.statusMessage = 'Waiting for %s...' % job.name
+        for _ in segmentationexecutor.getExecutor().waitForJob(job):
+            yield
+        if not job.succeeded():
+            self.fail('%s failed: %s' % (job.name, job.error))
+
 
 class FitDrill(PointCloudAlgorithmBase):
 
@@ -655,9 +671,8 @@ class FindHorizontalSurfaces(PointCloudAlgorithmBase):
 
     def run(self):
         polyData = self.getPointCloud()
-        segmentation.findHorizontalSurfaces(polyData,
+        job = self.submitFit(segmentation.computeHorizontalSurfaces, polyData,
           removeGroundFirst=True,
-          showClusters=True,
           normalEstimationSearchRadius=self.properties.getProperty('Normal estimation search radius'),
           clusterTolerance=self.properties.getProperty('Cluster tolerance'),
           minClusterSize=self.properties.getProperty('Min cluster size'),
@@ -665,6 +680,12 @@ class FindHorizontalSurfaces(PointCloudAlgorithmBase):
           normalsDotUpRange=self.properties.getProperty('Normals dot up range')
           )
 
+        for _ in self.waitForFit(job):
+            yield
+
+        if job.result is not None:
+            segmentation.showHorizontalSurfaces(job.result, showClusters=True)
+
 
 class SetNeckPitch(AsyncTask):
 
@@ -24,6 +24,7 @@ from director import affordanceitems
 from director import robotstate
 from director import robotplanlistener
 from director import segmentation
+from director import groundtracker
 from director import planplayback
 from director import affordanceupdater
 from director import segmentationpanel
@@ -70,6 +71,7 @@ class TerrainTask(object):
         self.useTextures = False
         self.constrainBlockSize = True
         self.blockFitAlgo = 1
+        self.groundTracker = groundtracker.GroundPlaneTracker()
 
         self.timer = TimerCallback(targetFps=10)
         self.timer.callback = self.updateBlockState
@@ -131,7 +133,7 @@ class TerrainTask(object):
     def spawnGroundAffordance(self):
 
         polyData = segmentation.getCurrentRevolutionData()
-        groundOrigin, normal, groundPoints, _ = segmentation.segmentGround(polyData)
+        groundOrigin, normal, groundPoints, _ = segmentation.segmentGround(polyData, groundTracker=self.groundTracker)
 
         stanceFrame = FootstepRequestGenerator.getRobotStanceFrame(self.robotSystem.robotStateModel)
         origin = np.array(stanceFrame.GetPosition())
@@ -6,6 +6,10 @@ from director import filterUtils
 from director import transformUtils
 from director import callbacks
 from director import frameupdater
+from director import spatialindex
+from director import voxelpyramid
+from director import segmentationexecutor
+from director import vtkNumpy as vnp
 from director.fieldcontainer import FieldContainer
 from PythonQt import QtCore, QtGui
 import numpy as np
@@ -13,10 +17,52 @@ import os
 import colorsys
 import weakref
 import itertools
+import functools
+
+
+def computeLevelsOfDetail(points, arrays, leafSizes, minimumReduction=0.5):
+    '''
+    Returns voxel grid downsampled copies of the point cloud with the given
+    Nx3 points and list of (name, values) point data arrays, finest first,
+    as a list of (points, arrays) in the same form.  Levels that do not
+    reduce the number of points of the previous level by minimumReduction
+    are skipped.  The leaf sizes should be integer multiples of each other
+    so that coarse levels are aggregated from the finer ones, see
+    voxelpyramid.  Only numpy arrays are used, so the function can run in a
+    segmentation executor worker and the levels are returned without being
+    encoded, see makeLevelOfDetailPolyData.
+    '''
+    pyramid = voxelpyramid.VoxelPyramid(points)
+    levels = []
+    numberOfPoints = len(points)
+    for leafSize in sorted(leafSizes):
+        level = pyramid.getLevel(leafSize)
+        if level.getNumberOfVoxels() <= minimumReduction * numberOfPoints:
+            levelPoints = np.ascontiguousarray(level.getCentroids().astype(points.dtype))
+            levels.append((levelPoints, [(name, pyramid.reduceValues(level, values)) for name, values in arrays]))
+            numberOfPoints = level.getNumberOfVoxels()
+    return levels
+
+
+def makeLevelOfDetailPolyData(points, arrays):
+    '''
+    Returns a point cloud that shares the arrays of a level returned by
+    computeLevelsOfDetail.
+    '''
+    polyData = vnp.numpyToPolyData(points, copy=False)
+    for name, values in arrays:
+        vnp.addNumpyToVtk(polyData, values, name)
+    return polyData
 
 
 class PolyDataItem(om.ObjectModelItem):
 
+    # voxel sizes of the level of detail point clouds
+    lodLeafSizes = (0.01, 0.02, 0.04, 0.08, 0.16)
+
+    # point clouds with fewer points are always rendered at full resolution
+    lodMinimumPoints = 100000
+
     defaultScalarRangeMap = {
         # 'intensity' : (400, 4000),
         'spindle_angle' : (0, 360),
@@ -39,6 +85,11 @@ class PolyDataItem(om.ObjectModelItem):
         self.shadowActor = None
         self.scalarBarWidget = None
         self.extraViewRenderers = {}
+        self._spatialIndex = None
+        self._renderObservers = {}
+        self._lodLevels = []
+        self._lodLevelIndex = None
+        self._lodInteractiveLevelIndex = 0
 
         self.rangeMap = dict(PolyDataItem.defaultScalarRangeMap)
 
@@ -57,6 +108,9 @@ class PolyDataItem(om.ObjectModelItem):
 
         self.addProperty('Color', [1.0, 1.0, 1.0])
         self.addProperty('Show Scalar Bar', False)
+        self.addProperty('Level Of Detail', False)
+        self.addProperty('LOD Target FPS', 20.0,
+                         attributes=om.PropertyAttributes(decimals=0, minimum=1, maximum=120, singleStep=1, hidden=True))
 
         self._updateSurfaceProperty()
         self._updateColorByProperty()
@@ -69,12 +123,14 @@ class PolyDataItem(om.ObjectModelItem):
             view.render()
 
     def hasDataSet(self, dataSet):
-        return dataSet == self.polyData
+        return dataSet == self.polyData or dataSet in self._lodLevels
 
     def setPolyData(self, polyData):
 
         self.polyData = polyData
         self.mapper.SetInputData(polyData)
+        self._dropSpatialIndex()
+        self._updateLevelsOfDetail()
 
         self._updateSurfaceProperty()
         self._updateColorByProperty()
@@ -83,6 +139,100 @@ class PolyDataItem(om.ObjectModelItem):
         if self.getProperty('Visible'):
             self._renderAllViews()
 
+    def getSpatialIndex(self):
+        '''
+        Returns a spatial index over the points of this item, built on first
+        use and rebuilt if the points are modified.  See spatialindex.SpatialIndex.
+        '''
+        if self._spatialIndex is not None and not spatialindex.isSpatialIndexCurrent(self._spatialIndex, self.polyData):
+            self._dropSpatialIndex()
+        if self._spatialIndex is None:
+            self._spatialIndex = spatialindex.getSpatialIndex(self.polyData)
+        return self._spatialIndex
+
+    def _dropSpatialIndex(self):
+        if self._spatialIndex is not None:
+            spatialindex.discardSpatialIndex(self._spatialIndex)
+            self._spatialIndex = None
+
+    def _updateLevelsOfDetail(self):
+        '''
+        Drops the level of detail point clouds and, if level of detail is
+        enabled for a large point cloud, computes new ones in the background.
+        The point arrays are passed to the worker without a copy; the levels
+        are discarded if the polydata is replaced before they are done.
+        '''
+        self._setLevelOfDetail(None)
+        self._lodLevels = []
+
+        if not (self.getProperty('Level Of Detail') and self._isPointCloud()
+                and self.polyData.GetNumberOfPoints() >= self.lodMinimumPoints):
+            return
+
+        pointData = self.polyData.GetPointData()
+        arrays = [pointData.GetArray(i) for i in xrange(pointData.GetNumberOfArrays())]
+        arrays = [(array.GetName(), vnp.getNumpyFromVtk(self.polyData, array.GetName()))
+                  for array in arrays if array is not None and array.GetDataType() != vtk.VTK_BIT]
+        points = vnp.getNumpyFromVtk(self.polyData, 'Points')
+
+        segmentationexecutor.getExecutor().submit(computeLevelsOfDetail, args=(points, arrays, self.lodLeafSizes),
+            onFinished=functools.partial(self._onLevelsOfDetailComputed, self.polyData))
+
+    def _onLevelsOfDetailComputed(self, polyData, levels):
+        if polyData is not self.polyData or not self.getProperty('Level Of Detail'):
+            return
+        self._lodLevels = [makeLevelOfDetailPolyData(points, arrays) for points, arrays in levels]
+        self._lodInteractiveLevelIndex = 0
+
+    def _setLevelOfDetail(self, levelIndex):
+        '''
+        Sets the mapper input to the level of detail with the given index,
+        or to the full resolution polydata if levelIndex is None.
+        '''
+        if levelIndex == self._lodLevelIndex:
+            return
+        self._lodLevelIndex = levelIndex
+
+        if levelIndex is None:
+            self.mapper.SetInputData(self.polyData)
+            return
+
+        level = self._lodLevels[levelIndex]
+        scalars = self.polyData.GetPointData().GetScalars()
+        level.GetPointData().SetActiveScalars(scalars.GetName() if scalars else None)
+        self.mapper.SetInputData(level)
+
+    def _onRenderStart(self, renderer, event):
+        '''
+        Picks the level of detail before each render.  Interactor styles
+        raise the desired update rate of the render window while the camera
+        is moving and lower it to the still update rate for the final
+        render, which is done at full resolution.  While moving, a coarser
+        level is used when the last frame took longer than the target frame
+        time and a finer one when it took less than half of it.
+        '''
+        if not self._lodLevels:
+            return
+
+        renderWindow = renderer.GetRenderWindow()
+        interactor = renderWindow.GetInteractor()
+        stillUpdateRate = interactor.GetStillUpdateRate() if interactor else 0.0001
+        if renderWindow.GetDesiredUpdateRate() <= stillUpdateRate:
+            self._setLevelOfDetail(None)
+            return
+
+        levelIndex = self._lodInteractiveLevelIndex
+        if self._lodLevelIndex is not None:
+            frameTime = renderer.GetLastRenderTimeInSeconds()
+            targetFrameTime = 1.0 / self.getProperty('LOD Target FPS')
+            if frameTime > targetFrameTime:
+                levelIndex = min(levelIndex + 1, len(self._lodLevels) - 1)
+            elif frameTime < 0.5 * targetFrameTime:
+                levelIndex = max(levelIndex - 1, 0)
+
+        self._lodInteractiveLevelIndex = levelIndex
+        self._setLevelOfDetail(levelIndex)
+
     def setRangeMap(self, key, value):
         self.rangeMap[key] = value
 
@@ -138,8 +288,21 @@ class PolyDataItem(om.ObjectModelItem):
         view.renderer().AddActor(self.actor)
         if self.shadowActor:
             view.renderer().AddActor(self.shadowActor)
+        self._updateRenderObservers()
         view.render()
 
+    def _updateRenderObservers(self):
+        '''
+        Observes the render start of every view while level of detail is
+        enabled, so items without it add no Python callback to each render.
+        '''
+        enabled = self.getProperty('Level Of Detail')
+        for view in self.views:
+            if enabled and view not in self._renderObservers:
+                self._renderObservers[view] = view.renderer().AddObserver('StartEvent', self._onRenderStart)
+            elif not enabled and view in self._renderObservers:
+                view.renderer().RemoveObserver(self._renderObservers.pop(view))
+
     def _onPropertyChanged(self, propertySet, propertyName):
         om.ObjectModelItem._onPropertyChanged(self, propertySet, propertyName)
 
@@ -180,6 +343,11 @@ class PolyDataItem(om.ObjectModelItem):
         elif propertyName == 'Show Scalar Bar':
             self._updateScalarBar()
 
+        elif propertyName == 'Level Of Detail':
+            self.properties.setPropertyAttribute('LOD Target FPS', 'hidden', not self.getProperty(propertyName))
+            self._updateRenderObservers()
+            self._updateLevelsOfDetail()
+
         self._renderAllViews()
 
     def setScalarRange(self, rangeMin, rangeMax):
@@ -326,6 +494,8 @@ class PolyDataItem(om.ObjectModelItem):
         assert view in self.views
         self.views.remove(view)
         view.renderer().RemoveActor(self.actor)
+        if view in self._renderObservers:
+            view.renderer().RemoveObserver(self._renderObservers.pop(view))
         if self.shadowActor:
             view.renderer().RemoveActor(self.shadowActor)
         for renderer in self.extraViewRenderers.get(view, []):
@@ -0,0 +1,433 @@
+'''
+Fusion of successive point clouds into a sparse voxel map.
+
+A VoxelMap keeps one entry per occupied voxel of a fixed size grid in the
+local frame.  Each voxel stores the running mean position and color of the
+points that fell in it, a hit count and the time of its last hit.  The
+voxels live in slots of preallocated numpy arrays and a dict maps the packed
+64 bit voxel key of each voxel to its slot, so an insert costs O(cloud
+size): new voxels take free slots or are appended, evicted voxels return
+their slots to a free list, and the arrays only grow by doubling their
+capacity.  Each slot records the revision of the map that last changed it,
+so a VoxelMapItem copies only the changed slots into its polydata.
+
+When a half life is set the hit counts decay with time, so the mean of a
+voxel follows recent observations and voxels that are not seen again fade
+out and are dropped once their weight is below minimumWeight.  Voxels
+further than radius from the robot are dropped after every insert and
+maxVoxels bounds the map size, dropping the lowest weights first.
+
+    voxelMap = voxelmap.VoxelMap(leafSize=0.05, radius=8.0, halfLife=30.0)
+    voxelMap.insertPolyData(polyData, sensorToLocal, utime)
+    snapshot = voxelMap.getSnapshot()      # numpy arrays for segmentation
+    voxelmap.showVoxelMap(voxelMap)        # PolyDataItem refreshed on change
+
+The map is locked during inserts and queries, so clouds can be inserted
+from worker threads while the item is refreshed on the main thread.
+'''
+
+import threading
+import numpy as np
+
+import director.vtkAll as vtk
+from director import vtkNumpy as vnp
+from director import transformUtils
+from director import visualization as vis
+from director import objectmodel as om
+from director.fieldcontainer import FieldContainer
+from director.timercallback import TimerCallback
+
+
+_keyBits = 21
+_keyOffset = 1 << (_keyBits - 1)
+_keyMask = (1 << _keyBits) - 1
+
+
+def packVoxelKeys(keys):
+    '''
+    Packs Nx3 integer voxel coordinates in the range [-2**20, 2**20) into
+    int64 keys.  The key order is the lexicographic order of the coordinates.
+    '''
+    keys = np.asarray(keys, dtype=np.int64) + _keyOffset
+    return (keys[:,0] << (2*_keyBits)) | (keys[:,1] << _keyBits) | keys[:,2]
+
+
+def unpackVoxelKeys(packed):
+    packed = np.asarray(packed, dtype=np.int64)
+    keys = np.column_stack([(packed >> (2*_keyBits)) & _keyMask, (packed >> _keyBits) & _keyMask, packed & _keyMask])
+    return keys - _keyOffset
+
+
+def _getTransformMatrix(transform):
+    if transform is None:
+        return np.eye(4)
+    if isinstance(transform, vtk.vtkTransform):
+        return transformUtils.getNumpyFromTransform(transform)
+    return np.asarray(transform, dtype=np.float64)
+
+
+class VoxelMap(object):
+
+    def __init__(self, leafSize=0.05, radius=10.0, halfLife=None, minimumWeight=0.1, maxVoxels=2000000):
+        '''
+        halfLife is in seconds, None disables the decay.  radius is in
+        meters, None disables the radius eviction.
+        '''
+        self.leafSize = leafSize
+        self.radius = radius
+        self.halfLife = halfLife
+        self.minimumWeight = minimumWeight
+        self.maxVoxels = maxVoxels
+        self.lock = threading.RLock()
+        self.revision = 0
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.slotIds = {}
+            self.freeSlots = []
+            self.numberOfSlots = 0
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.positions = np.zeros((0, 3))
+            self.colors = np.zeros((0, 3), dtype=np.float32)
+            self.weights = np.zeros(0)
+            self.hits = np.zeros(0, dtype=np.int64)
+            self.utimes = np.zeros(0, dtype=np.int64)
+            self.slotRevisions = np.zeros(0, dtype=np.int64)
+            self.lastUtime = None
+            self.revision += 1
+            self.clearRevision = self.revision
+
+    def getNumberOfVoxels(self):
+        return len(self.slotIds)
+
+    def getNumberOfSlots(self):
+        '''
+        Returns the number of slots in use or on the free list.  The voxel
+        arrays have at least this many entries.
+        '''
+        return self.numberOfSlots
+
+    def getCapacity(self):
+        return len(self.keys)
+
+    def getNumberOfBytes(self):
+        return sum(a.nbytes for a in (self.keys, self.positions, self.colors, self.weights, self.hits, self.utimes, self.slotRevisions))
+
+    def getVoxelSlots(self, minimumWeight=None):
+        '''
+        Returns the slots of the voxels with at least minimumWeight.
+        '''
+        occupied = self.keys[:self.numberOfSlots] >= 0
+        if minimumWeight is not None:
+            occupied &= self.weights[:self.numberOfSlots] >= minimumWeight
+        return np.flatnonzero(occupied)
+
+    def getChangedSlots(self, revision):
+        '''
+        Returns the slots that were added, updated or evicted after the given revision.
+        '''
+        return np.flatnonzero(self.slotRevisions[:self.numberOfSlots] > revision)
+
+    def _reserve(self, numberOfSlots):
+        '''
+        Grows the voxel arrays, doubling their capacity, to hold numberOfSlots slots.
+        Unused slots have key -1 and nan positions.
+        '''
+        capacity = len(self.keys)
+        if numberOfSlots <= capacity:
+            return
+        capacity = max(2*capacity, 1024)
+        while capacity < numberOfSlots:
+            capacity *= 2
+
+        def grow(array, fill):
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            grown[len(array):] = fill
+            return grown
+
+        self.keys = grow(self.keys, -1)
+        self.positions = grow(self.positions, np.nan)
+        self.colors = grow(self.colors, 255.0)
+        self.weights = grow(self.weights, 0.0)
+        self.hits = grow(self.hits, 0)
+        self.utimes = grow(self.utimes, 0)
+        self.slotRevisions = grow(self.slotRevisions, 0)
+
+    def _allocateSlots(self, count):
+        '''
+        Returns count slots for new voxels, taking free slots first.
+        '''
+        reused = min(count, len(self.freeSlots))
+        slots = self.freeSlots[len(self.freeSlots) - reused:]
+        del self.freeSlots[len(self.freeSlots) - reused:]
+
+        appended = count - reused
+        self._reserve(self.numberOfSlots + appended)
+        slots = np.concatenate([np.array(slots, dtype=np.intp), np.arange(self.numberOfSlots, self.numberOfSlots + appended)])
+        self.numberOfSlots += appended
+        return slots
+
+    def _evict(self, slots, revision):
+        if not len(slots):
+            return
+        for key in self.keys[slots].tolist():
+            del self.slotIds[key]
+        self.keys[slots] = -1
+        self.positions[slots] = np.nan
+        self.weights[slots] = 0.0
+        self.hits[slots] = 0
+        self.slotRevisions[slots] = revision
+        self.freeSlots.extend(slots.tolist())
+
+    def _decay(self, utime):
+        if self.halfLife and self.lastUtime is not None and utime > self.lastUtime:
+            self.weights[:self.numberOfSlots] *= 0.5 ** ((utime - self.lastUtime) * 1e-6 / self.halfLife)
+
+    def insertPoints(self, points, sensorToLocal=None, colors=None, utime=0, robotPosition=None):
+        '''
+        Inserts Nx3 points given in the sensor frame.  sensorToLocal is a
+        vtkTransform or a 4x4 array, colors are optional Nx3 rgb values in
+        [0, 255].  Points without colors leave the color of existing voxels
+        unchanged and new voxels are white.  Voxels further than radius from
+        robotPosition, by default the sensor origin, are evicted.
+        '''
+        matrix = _getTransformMatrix(sensorToLocal)
+        points = np.asarray(points, dtype=np.float64)
+        points = np.dot(points, matrix[:3,:3].T) + matrix[:3,3]
+        if robotPosition is None:
+            robotPosition = matrix[:3,3]
+
+        voxelCoords = np.floor(points / self.leafSize)
+        valid = np.isfinite(voxelCoords).all(axis=1) & (np.abs(voxelCoords) < _keyOffset).all(axis=1)
+        if not valid.all():
+            points, voxelCoords = points[valid], voxelCoords[valid]
+            colors = colors[valid] if colors is not None else None
+
+        with self.lock:
+
+            revision = self.revision + 1
+            self._decay(utime)
+
+            if len(points):
+                self._merge(packVoxelKeys(voxelCoords), points, colors, utime, revision)
+
+            slots = self.getVoxelSlots()
+            keep = self.weights[slots] >= self.minimumWeight
+            if self.radius is not None:
+                keep &= ((self.positions[slots] - robotPosition)**2).sum(axis=1) <= self.radius**2
+            self._evict(slots[~keep], revision)
+
+            excess = len(self.slotIds) - self.maxVoxels
+            if excess > 0:
+                slots = self.getVoxelSlots()
+                self._evict(slots[np.argpartition(self.weights[slots], excess)[:excess]], revision)
+
+            self.lastUtime = utime if self.lastUtime is None else max(self.lastUtime, utime)
+            self.revision = revision
+
+    def _merge(self, packedKeys, points, colors, utime, revision):
+
+        newKeys, inverse = np.unique(packedKeys, return_inverse=True)
+        counts = np.bincount(inverse).astype(np.float64)
+        pointSums = np.column_stack([np.bincount(inverse, weights=points[:,i]) for i in xrange(3)])
+        if colors is not None:
+            colors = np.asarray(colors, dtype=np.float64)
+            colorSums = np.column_stack([np.bincount(inverse, weights=colors[:,i]) for i in xrange(3)])
+
+        getSlot = self.slotIds.get
+        slots = np.fromiter((getSlot(key, -1) for key in newKeys.tolist()), dtype=np.intp, count=len(newKeys))
+        found = slots >= 0
+
+        # update the running means of the voxels that are already in the map
+        ids = slots[found]
+        w = self.weights[ids]
+        n = counts[found]
+        total = w + n
+        self.positions[ids] = (self.positions[ids] * w[:,np.newaxis] + pointSums[found]) / total[:,np.newaxis]
+        if colors is not None:
+            self.colors[ids] = (self.colors[ids] * w[:,np.newaxis] + colorSums[found]) / total[:,np.newaxis]
+        self.weights[ids] = total
+        self.hits[ids] += n.astype(np.int64)
+        self.utimes[ids] = utime
+        self.slotRevisions[ids] = revision
+
+        # new voxels take free slots or are appended
+        new = ~found
+        if new.any():
+            n = counts[new]
+            ids = self._allocateSlots(len(n))
+            self.slotIds.update(zip(newKeys[new].tolist(), ids.tolist()))
+            self.keys[ids] = newKeys[new]
+            self.positions[ids] = pointSums[new] / n[:,np.newaxis]
+            self.colors[ids] = colorSums[new] / n[:,np.newaxis] if colors is not None else 255.0
+            self.weights[ids] = n
+            self.hits[ids] = n.astype(np.int64)
+            self.utimes[ids] = utime
+            self.slotRevisions[ids] = revision
+
+    def insertPolyData(self, polyData, sensorToLocal=None, utime=0, robotPosition=None):
+        '''
+        Inserts the points of polyData, with its rgb_colors array if present.
+        '''
+        if not polyData.GetNumberOfPoints():
+            return
+        points = vnp.getNumpyFromVtk(polyData, 'Points')
+        colors = None
+        if polyData.GetPointData().GetArray('rgb_colors'):
+            colors = vnp.getNumpyFromVtk(polyData, 'rgb_colors')
+        self.insertPoints(points, sensorToLocal, colors, utime, robotPosition)
+
+    def evictOutsideRadius(self, robotPosition, radius=None):
+        radius = self.radius if radius is None else radius
+        with self.lock:
+            slots = self.getVoxelSlots()
+            outside = ((self.positions[slots] - np.asarray(robotPosition))**2).sum(axis=1) > radius**2
+            if outside.any():
+                self.revision += 1
+                self._evict(slots[outside], self.revision)
+
+    def getSnapshot(self, minimumWeight=None):
+        '''
+        Returns a FieldContainer with copies of the voxel arrays: keys,
+        points, colors (uint8), weights, hits and utimes, limited to the
+        voxels with at least minimumWeight.  The voxels are in slot order.
+        '''
+        with self.lock:
+            slots = self.getVoxelSlots(minimumWeight)
+            return FieldContainer(keys=self.keys[slots],
+                                  points=self.positions[slots],
+                                  colors=np.clip(np.round(self.colors[slots]), 0, 255).astype(np.uint8),
+                                  weights=self.weights[slots],
+                                  hits=self.hits[slots],
+                                  utimes=self.utimes[slots],
+                                  revision=self.revision)
+
+    def getPolyData(self, minimumWeight=None):
+        '''
+        Returns the voxel means as polydata with rgb_colors, weight and hits arrays.
+        '''
+        snapshot = self.getSnapshot(minimumWeight)
+        return vnp.numpyToPolyData(snapshot.points, pointData={'rgb_colors' : snapshot.colors,
+                                                               'weight' : snapshot.weights,
+                                                               'hits' : snapshot.hits}, copy=False)
+
+
+class VoxelMapItem(vis.PolyDataItem):
+    '''
+    Displays a VoxelMap.  The polydata has one point per slot of the map
+    and a vertex cell per voxel with at least the Min Weight, its arrays
+    are owned by the item.  A refresh, at most at the target fps and only
+    when the map has changed, copies the changed slots into the arrays in
+    place and rebuilds the vertex cells if the displayed voxels changed.
+    The polydata is only replaced when the map is cleared, when its
+    capacity grows beyond the arrays of the item or when Min Weight is set.
+    '''
+
+    def __init__(self, name, polyData, view):
+        vis.PolyDataItem.__init__(self, name, polyData, view)
+        self.voxelMap = None
+        self.lastRevision = None
+        self.displayedSlots = None
+        self.addProperty('Min Weight', 0.0, attributes=om.PropertyAttributes(decimals=2, minimum=0.0, maximum=1000.0, singleStep=0.5))
+        self.addProperty('Target FPS', 5.0, attributes=om.PropertyAttributes(decimals=1, minimum=0.1, maximum=30.0, singleStep=0.5))
+        self.timer = TimerCallback(targetFps=self.getProperty('Target FPS'))
+        self.timer.callback = self.update
+
+    def setVoxelMap(self, voxelMap):
+        self.voxelMap = voxelMap
+        self.lastRevision = None
+        self.update()
+        self.timer.start()
+
+    def _onPropertyChanged(self, propertySet, propertyName):
+        vis.PolyDataItem._onPropertyChanged(self, propertySet, propertyName)
+
+        if propertyName == 'Min Weight':
+            self.lastRevision = None
+        elif propertyName == 'Target FPS':
+            self.timer.targetFps = self.getProperty(propertyName)
+
+    def getActionNames(self):
+        return vis.PolyDataItem.getActionNames(self) + ['Clear Map']
+
+    def onAction(self, action):
+        if action == 'Clear Map':
+            if self.voxelMap:
+                self.voxelMap.clear()
+        else:
+            vis.PolyDataItem.onAction(self, action)
+
+    def onRemoveFromObjectModel(self):
+        vis.PolyDataItem.onRemoveFromObjectModel(self)
+        self.timer.stop()
+
+    def update(self):
+        voxelMap = self.voxelMap
+        if voxelMap is None or voxelMap.revision == self.lastRevision:
+            return
+
+        with voxelMap.lock:
+            if (self.lastRevision is None or self.lastRevision < voxelMap.clearRevision
+                    or voxelMap.getNumberOfSlots() > self.polyData.GetNumberOfPoints()):
+                polyData = self._createPolyData(voxelMap.getCapacity())
+                self._copySlots(voxelMap, np.arange(voxelMap.getNumberOfSlots()), polyData)
+                changed = None
+            else:
+                polyData = self.polyData
+                self._copySlots(voxelMap, voxelMap.getChangedSlots(self.lastRevision), polyData)
+                if voxelMap.halfLife:
+                    # the decay changes the weights of all voxels
+                    numberOfSlots = voxelMap.getNumberOfSlots()
+                    vnp.getNumpyFromVtk(polyData, 'weight')[:numberOfSlots] = voxelMap.weights[:numberOfSlots]
+                changed = polyData
+
+            slots = voxelMap.getVoxelSlots(self.getProperty('Min Weight') or None)
+            self.lastRevision = voxelMap.revision
+
+        if changed is None or not np.array_equal(slots, self.displayedSlots):
+            polyData.SetVerts(vnp.getVtkVertexCellsFromIds(slots))
+            self.displayedSlots = slots
+
+        if changed is None:
+            self.setPolyData(polyData)
+            return
+
+        polyData.GetPoints().Modified()
+        for name in ('rgb_colors', 'weight', 'hits'):
+            polyData.GetPointData().GetArray(name).Modified()
+        polyData.Modified()
+
+        self._updateLevelsOfDetail()
+        self._updateColorBy(retainColorMap=True)
+        if self.getProperty('Visible'):
+            self._renderAllViews()
+
+    def _createPolyData(self, capacity):
+        '''
+        Returns polydata with capacity points at nan, for the slots of a map.
+        '''
+        points = np.empty((capacity, 3), dtype=np.float32)
+        points.fill(np.nan)
+        colors = np.empty((capacity, 3), dtype=np.uint8)
+        colors.fill(255)
+        return vnp.numpyToPolyData(points, pointData={'rgb_colors' : colors,
+                                                      'weight' : np.zeros(capacity),
+                                                      'hits' : np.zeros(capacity, dtype=np.int64)},
+                                   createVertexCells=False, copy=False)
+
+    def _copySlots(self, voxelMap, slots, polyData):
+        vnp.getNumpyFromVtk(polyData, 'Points')[slots] = voxelMap.positions[slots]
+        vnp.getNumpyFromVtk(polyData, 'rgb_colors')[slots] = np.clip(np.round(voxelMap.colors[slots]), 0, 255)
+        vnp.getNumpyFromVtk(polyData, 'weight')[slots] = voxelMap.weights[slots]
+        vnp.getNumpyFromVtk(polyData, 'hits')[slots] = voxelMap.hits[slots]
+
+
+def showVoxelMap(voxelMap, name='voxel map', view=None, parent='segmentation'):
+    '''
+    Returns a VoxelMapItem that displays voxelMap colored by rgb_colors.
+    '''
+    item = vis.showPolyData(voxelMap.getPolyData(), name, colorByName='rgb_colors', view=view, parent=parent, cls=VoxelMapItem)
+    item.setVoxelMap(voxelMap)
+    return item
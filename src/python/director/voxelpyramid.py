@@ -0,0 +1,241 @@
+'''
+Voxel grid downsampling with cached levels.
+
+A VoxelPyramid computes integer voxel keys for a point cloud with numpy and
+produces centroid downsampled clouds at several leaf sizes.  When a leaf
+size is an integer multiple of a level that was already computed, the new
+level is aggregated from the voxels of the finer level instead of from the
+points, so requesting 0.01, 0.03 and 0.05 m grids only touches the full
+point array once.  Voxels are anchored at the origin, like the PCL voxel grid.
+
+Pyramids are cached against the points of the dataset, see getVoxelPyramid.
+Point data arrays are reduced per voxel: floating point arrays such as
+intensity or z are averaged, other arrays such as rgb colors or labels are
+picked from the first point of the voxel, so all picked arrays come from
+the same point.
+'''
+
+import collections
+import threading
+import numpy as np
+
+from director import vtkNumpy as vnp
+from vtk.util import numpy_support
+from director.shallowCopy import shallowCopy
+
+
+class VoxelLevel(object):
+
+    def __init__(self, leafSize, voxelKeys, pointToVoxel, counts, pointSums, firstPointIds):
+        self.leafSize = leafSize
+        self.voxelKeys = voxelKeys
+        self.pointToVoxel = pointToVoxel
+        self.counts = counts
+        self.pointSums = pointSums
+        self.firstPointIds = firstPointIds
+
+    def getNumberOfVoxels(self):
+        return len(self.voxelKeys)
+
+    def getCentroids(self):
+        return self.pointSums / self.counts[:,np.newaxis]
+
+
+def _uniqueRows(keys):
+    '''
+    Returns (uniqueKeys, firstIndex, inverse) for the rows of an Nx3 integer array.
+    '''
+    keyMin = keys.min(axis=0)
+    shifted = keys - keyMin
+    extent = shifted.max(axis=0) + 1
+    packed = (shifted[:,0] * extent[1] + shifted[:,1]) * extent[2] + shifted[:,2]
+    _, firstIndex, inverse = np.unique(packed, return_index=True, return_inverse=True)
+    return keys[firstIndex], firstIndex, inverse
+
+
+class VoxelPyramid(object):
+
+    def __init__(self, points):
+        self.numberOfPoints = len(points)
+        self.finitePointIds = np.flatnonzero(np.isfinite(points).all(axis=1))
+        self.points = np.asarray(points)[self.finitePointIds].astype(np.float64)
+        self.pointsDataType = points.dtype
+        self.levels = {}
+        self.outputCache = collections.OrderedDict()
+        self.outputBytes = 0
+        self.maxOutputBytes = 64*1024*1024
+        # cached pyramids are shared with segmentation executor worker threads
+        self.lock = threading.RLock()
+
+    def _levelKey(self, leafSize):
+        return round(leafSize, 9)
+
+    def getLevel(self, leafSize):
+        '''
+        Returns the VoxelLevel for the given leaf size, computing it from
+        the nearest finer level with an integer leaf size ratio if possible.
+        '''
+        key = self._levelKey(leafSize)
+        with self.lock:
+            level = self.levels.get(key)
+            if level is None:
+                finerLevel = self._findFinerLevel(leafSize)
+                if finerLevel is not None:
+                    level = self._computeLevelFromLevel(leafSize, finerLevel)
+                else:
+                    level = self._computeLevelFromPoints(leafSize)
+                self.levels[key] = level
+            return level
+
+    def _findFinerLevel(self, leafSize):
+        candidates = []
+        for level in self.levels.itervalues():
+            ratio = leafSize / level.leafSize
+            if ratio > 1.5 and abs(ratio - round(ratio)) < 1e-6:
+                candidates.append(level)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda x: x.getNumberOfVoxels())
+
+    def _computeLevelFromPoints(self, leafSize):
+
+        if not len(self.points):
+            empty = np.zeros(0, dtype=np.int64)
+            return VoxelLevel(leafSize, np.zeros((0, 3), dtype=np.int64), empty, empty, np.zeros((0, 3)), empty)
+
+        keys = np.floor(self.points / leafSize).astype(np.int64)
+        voxelKeys, firstIndex, inverse = _uniqueRows(keys)
+
+        numberOfVoxels = len(voxelKeys)
+        counts = np.bincount(inverse, minlength=numberOfVoxels)
+        pointSums = np.column_stack([np.bincount(inverse, weights=self.points[:,i], minlength=numberOfVoxels) for i in xrange(3)])
+        return VoxelLevel(leafSize, voxelKeys, inverse, counts, pointSums, self.finitePointIds[firstIndex])
+
+    def _computeLevelFromLevel(self, leafSize, finerLevel):
+
+        if not finerLevel.getNumberOfVoxels():
+            return self._computeLevelFromPoints(leafSize)
+
+        ratio = int(round(leafSize / finerLevel.leafSize))
+
+        # floor(floor(x/a)/k) == floor(x/(a*k)) for integer k, so coarse keys
+        # can be computed from the fine voxel keys
+        keys = np.floor_divide(finerLevel.voxelKeys, ratio)
+        voxelKeys, firstIndex, inverse = _uniqueRows(keys)
+
+        numberOfVoxels = len(voxelKeys)
+        counts = np.bincount(inverse, weights=finerLevel.counts, minlength=numberOfVoxels).astype(np.int64)
+        pointSums = np.column_stack([np.bincount(inverse, weights=finerLevel.pointSums[:,i], minlength=numberOfVoxels) for i in xrange(3)])
+
+        firstPointIds = np.empty(numberOfVoxels, dtype=np.int64)
+        firstPointIds.fill(np.iinfo(np.int64).max)
+        np.minimum.at(firstPointIds, inverse, finerLevel.firstPointIds)
+
+        return VoxelLevel(leafSize, voxelKeys, inverse[finerLevel.pointToVoxel], counts, pointSums, firstPointIds)
+
+    def getPolyData(self, polyData, leafSize):
+        '''
+        Returns a downsampled copy of polyData with one point per voxel
+        at the voxel centroid.  polyData must have the points that this
+        pyramid was built from.  Results are cached per leaf size and the
+        modification times of the point data arrays.
+        '''
+        pointData = polyData.GetPointData()
+        arrays = [pointData.GetArray(i) for i in xrange(pointData.GetNumberOfArrays())]
+        arrays = [array for array in arrays if array is not None]
+
+        cacheKey = (self._levelKey(leafSize), tuple((array.GetName(), array.GetMTime()) for array in arrays))
+        with self.lock:
+            entry = self.outputCache.pop(cacheKey, None)
+            if entry is None:
+                entry = self._computePolyData(self.getLevel(leafSize), arrays)
+                self.outputBytes += entry[1]
+            self.outputCache[cacheKey] = entry
+
+            # keep the output just requested even if it exceeds the budget alone
+            while len(self.outputCache) > 1 and self.outputBytes > self.maxOutputBytes:
+                _, (_, nbytes) = self.outputCache.popitem(last=False)
+                self.outputBytes -= nbytes
+
+            return shallowCopy(entry[0])
+
+    def _computePolyData(self, level, arrays):
+        '''
+        Returns the downsampled polydata and its size in bytes.
+        '''
+        centroids = level.getCentroids().astype(self.pointsDataType)
+        output = vnp.numpyToPolyData(centroids, copy=False)
+        nbytes = centroids.nbytes
+
+        for array in arrays:
+            reduced = self.reduceValues(level, numpy_support.vtk_to_numpy(array))
+            vnp.addNumpyToVtk(output, reduced, array.GetName())
+            nbytes += reduced.nbytes
+
+        return output, nbytes
+
+    def reduceValues(self, level, values):
+        '''
+        Returns the per voxel values of a point data array of the points
+        this pyramid was built from, see the module docstring.
+        '''
+        numberOfVoxels = level.getNumberOfVoxels()
+        if np.issubdtype(values.dtype, np.floating):
+            values = values[self.finitePointIds]
+            if values.ndim == 1:
+                reduced = np.bincount(level.pointToVoxel, weights=values, minlength=numberOfVoxels) / level.counts
+            else:
+                reduced = np.column_stack([np.bincount(level.pointToVoxel, weights=values[:,i], minlength=numberOfVoxels)
+                                           for i in xrange(values.shape[1])]) / level.counts[:,np.newaxis]
+            reduced = reduced.astype(values.dtype)
+        else:
+            reduced = values[level.firstPointIds]
+
+        return np.ascontiguousarray(reduced)
+
+    def getNumberOfBytes(self):
+        with self.lock:
+            nbytes = self.points.nbytes + self.finitePointIds.nbytes + self.outputBytes
+            for level in self.levels.itervalues():
+                nbytes += level.voxelKeys.nbytes + level.pointToVoxel.nbytes + level.counts.nbytes + level.pointSums.nbytes + level.firstPointIds.nbytes
+            return nbytes
+
+
+_pyramidCache = collections.OrderedDict()
+_maxCachedBytes = 256*1024*1024
+# pyramids are also requested from segmentation executor worker threads
+_cacheLock = threading.RLock()
+
+
+def getVoxelPyramid(polyData):
+    '''
+    Returns the voxel pyramid for the points of polyData, building and
+    caching it on first use.  Shallow copies of a snapshot share the pyramid.
+    The least recently used pyramids are dropped when the cached pyramids,
+    with their levels and outputs, exceed _maxCachedBytes.
+    '''
+    key = vnp.getPointsCacheKey(polyData)
+    if key is None:
+        return VoxelPyramid(np.zeros((0, 3)))
+
+    with _cacheLock:
+        pyramid = _pyramidCache.pop(key, None)
+        if pyramid is None:
+            pyramid = VoxelPyramid(vnp.getNumpyFromVtk(polyData, 'Points'))
+        _pyramidCache[key] = pyramid
+
+        # pyramids grow as levels are added, so their sizes are summed on each call
+        totalBytes = sum(p.getNumberOfBytes() for p in _pyramidCache.itervalues())
+        while len(_pyramidCache) > 1 and totalBytes > _maxCachedBytes:
+            _, evicted = _pyramidCache.popitem(last=False)
+            totalBytes -= evicted.getNumberOfBytes()
+        return pyramid
+
+
+def applyVoxelGrid(polyData, leafSize=0.01):
+    return getVoxelPyramid(polyData).getPolyData(polyData, leafSize)
+
+
+def clearCache():
+    with _cacheLock:
+        _pyramidCache.clear()
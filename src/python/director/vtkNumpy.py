@@ -4,24 +4,73 @@ from vtk.util import numpy_support
 import numpy as np
 
 
-def numpyToPolyData(pts, pointData=None, createVertexCells=True):
+def numpyToPolyData(pts, pointData=None, createVertexCells=True, copy=True):
+    '''
+    Returns a vtkPolyData with the given Nx3 points and optional dict of
+    point data arrays.  When copy is False, contiguous float32/float64 input
+    buffers are wrapped directly instead of being copied, so the caller must
+    not resize them while the polydata is in use.  The wrapped numpy arrays
+    are kept alive by the vtk arrays that reference them.
+    '''
 
     pd = vtk.vtkPolyData()
-    pd.SetPoints(getVtkPointsFromNumpy(pts.copy()))
+    if not copy and pts.dtype not in (np.float32, np.float64):
+        pts = pts.astype(np.float64)
+
+    pd.SetPoints(getVtkPointsFromNumpy(_asVtkCompatibleArray(pts, copy)))
 
     if pointData is not None:
         for key, value in pointData.iteritems():
-            addNumpyToVtk(pd, value.copy(), key)
+            addNumpyToVtk(pd, _asVtkCompatibleArray(value, copy), key)
 
     if createVertexCells:
-        f = vtk.vtkVertexGlyphFilter()
-        f.SetInputData(pd)
-        f.Update()
-        pd = shallowCopy(f.GetOutput())
+        pd.SetVerts(getVtkVertexCellsFromNumpy(pd.GetNumberOfPoints()))
 
     return pd
 
 
+def _asVtkCompatibleArray(numpyArray, copy=True):
+    '''
+    Returns an array that numpy_support can wrap.  If copy is False the input
+    is returned unchanged when it is already contiguous.
+    '''
+    if copy:
+        return numpyArray.copy()
+
+    return np.ascontiguousarray(numpyArray)
+
+
+def getVtkVertexCellsFromNumpy(numberOfPoints):
+    '''
+    Returns a vtkCellArray with one vertex cell per point.  This is the
+    same cell layout produced by vtkVertexGlyphFilter, but the connectivity
+    is built with numpy instead of iterating over the points.
+    '''
+    return getVtkVertexCellsFromIds(np.arange(numberOfPoints))
+
+
+def getVtkVertexCellsFromIds(pointIds):
+    '''
+    Returns a vtkCellArray with one vertex cell for each of the given point ids.
+    '''
+    cells = vtk.vtkCellArray()
+    ids = np.asarray(pointIds, dtype=numpy_support.ID_TYPE_CODE)
+    numberOfCells = len(ids)
+
+    if hasattr(cells, 'SetData'):
+        # vtk 9 stores separate offsets and connectivity arrays
+        offsets = np.arange(numberOfCells + 1, dtype=numpy_support.ID_TYPE_CODE)
+        cells.SetData(getVtkIdTypeArrayFromNumpy(offsets), getVtkIdTypeArrayFromNumpy(ids))
+    else:
+        # legacy layout is [npts, id, npts, id, ...]
+        connectivity = np.empty((numberOfCells, 2), dtype=numpy_support.ID_TYPE_CODE)
+        connectivity[:,0] = 1
+        connectivity[:,1] = ids
+        cells.SetCells(numberOfCells, getVtkIdTypeArrayFromNumpy(connectivity.reshape(-1)))
+
+    return cells
+
+
 def numpyToImageData(img, flip=True, vtktype=vtk.VTK_UNSIGNED_CHAR):
     if flip:
         img = np.flipud(img)
@@ -53,6 +102,19 @@ def getNumpyFromVtk(dataObj, arrayName='Points', arrayType='points'):
     return numpy_support.vtk_to_numpy(vtkArray)
 
 
+def getPointsCacheKey(dataObj):
+    '''
+    Returns a key that identifies the current points of dataObj.  The key
+    changes when the points are replaced or modified through vtk, but it
+    is shared by shallow copies.  Returns None if there are no points.
+    '''
+    points = dataObj.GetPoints()
+    if points is None:
+        return None
+    data = points.GetData()
+    return (data.__this__, points.GetMTime(), data.GetMTime())
+
+
 def getVtkPointsFromNumpy(numpyArray):
 
     points = vtk.vtkPoints()
@@ -64,18 +126,27 @@ def getVtkPolyDataFromNumpyPoints(points):
     return numpyToPolyData(points)
 
 
-def getVtkFromNumpy(numpyArray):
+def _keepNumpyAlive(vtkArray, numpyArray):
 
     def MakeCallback(numpyArray):
         def Closure(caller, event):
             closureArray = numpyArray
         return Closure
 
-    vtkArray = numpy_support.numpy_to_vtk(numpyArray)
     vtkArray.AddObserver('DeleteEvent', MakeCallback(numpyArray))
     return vtkArray
 
 
+def getVtkFromNumpy(numpyArray):
+    vtkArray = numpy_support.numpy_to_vtk(numpyArray)
+    return _keepNumpyAlive(vtkArray, numpyArray)
+
+
+def getVtkIdTypeArrayFromNumpy(numpyArray):
+    vtkArray = numpy_support.numpy_to_vtkIdTypeArray(numpyArray)
+    return _keepNumpyAlive(vtkArray, numpyArray)
+
+
 def addNumpyToVtk(dataObj, numpyArray, arrayName, arrayType='points'):
     assert arrayType in ('points', 'cells')
     vtkArray = getVtkFromNumpy(numpyArray)
@@ -0,0 +1,79 @@
+from director.consoleapp import ConsoleApp
+from director import depthscanner
+import director.vtkAll as vtk
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+def makeGround():
+    plane = vtk.vtkPlaneSource()
+    plane.SetOrigin(-5.0, -5.0, 0.0)
+    plane.SetPoint1(5.0, -5.0, 0.0)
+    plane.SetPoint2(-5.0, 5.0, 0.0)
+    plane.SetResolution(10, 10)
+    plane.Update()
+    return plane.GetOutput()
+
+
+def testScan():
+
+    scanner = depthscanner.BatchDepthScanner()
+    scanner.addPolyData(makeGround(), color=[1.0, 0.0, 0.0])
+
+    intrinsics = [depthscanner.CameraIntrinsics(160, 120, 100.0),
+                  depthscanner.CameraIntrinsics(160, 120, 100.0, cx=60.0, cy=70.0),
+                  depthscanner.CameraIntrinsics(64, 48, 40.0, cx=32.0, cy=24.0)]
+    poses = [depthscanner.getCameraPose([0.0, 0.0, 3.0], [0.0, 0.0, 0.0], up=[0.0, 1.0, 0.0]),
+             depthscanner.getCameraPose([0.0, 0.0, 3.0], [0.0, 0.0, 0.0], up=[0.0, 1.0, 0.0]),
+             depthscanner.getCameraPose([2.0, -2.0, 1.5], [0.0, 0.0, 0.0])]
+
+    scans = list(scanner.scan(poses, intrinsics))
+    assert len(scans) == 3
+
+    for scan, intr, pose in zip(scans, intrinsics, poses):
+        assert scan.depth.shape == (intr.height, intr.width)
+        assert scan.rgb.shape == (intr.height, intr.width, 3)
+        assert np.allclose(scan.cameraToLocal, pose)
+        assert scan.polyData.GetNumberOfPoints() == len(scan.points) > 0
+
+        # every unprojected point lies on the ground plane
+        assert np.abs(scan.points[:,2]).max() < 0.01, np.abs(scan.points[:,2]).max()
+        assert (scan.colors[:,0] >= scan.colors[:,1]).all() and scan.colors[:,0].mean() > 50
+
+        # the pixel at the principal point sees the target
+        row, col = int(round(intr.cy)), int(round(intr.cx))
+        assert abs(scan.depth[row, col] - np.linalg.norm(pose[:3,3])) < 0.05
+
+    # the camera above the ground sees it in every pixel
+    assert np.isfinite(scans[0].depth).all()
+    assert abs(scans[0].depth.min() - 3.0) < 0.01
+
+    # the tilted camera sees the sky in the top rows
+    assert np.isnan(scans[2].depth[0]).all()
+    assert np.isfinite(scans[2].depth[-1]).all()
+
+
+def testWriteScans():
+
+    scanner = depthscanner.BatchDepthScanner()
+    scanner.addPolyData(makeGround())
+    intrinsics = depthscanner.CameraIntrinsics(80, 60, 50.0)
+    poses = [depthscanner.getCameraPose([x, 0.0, 2.0], [x, 1.0, 0.0]) for x in np.linspace(-1.0, 1.0, 5)]
+
+    outputDir = tempfile.mkdtemp()
+    try:
+        filenames = scanner.writeScans(poses, intrinsics, outputDir, writePolyData=True)
+        assert len(filenames) == 5
+        assert os.path.isfile(filenames[-1].replace('.npz', '.vtp'))
+        data = np.load(filenames[2])
+        assert data['depth'].shape == (60, 80)
+        assert np.allclose(data['cameraToLocal'], poses[2])
+    finally:
+        shutil.rmtree(outputDir)
+
+
+app = ConsoleApp()
+testScan()
+testWriteScans()
@@ -0,0 +1,97 @@
+from director.binreducer import BinReducer
+import numpy as np
+import time
+import os
+
+
+def loopCounts(labels, numberOfBins):
+    return np.array([np.count_nonzero(labels == i) for i in xrange(numberOfBins)])
+
+
+def loopCentroids(points, labels, numberOfBins):
+    centroids = []
+    for i in xrange(numberOfBins):
+        binPoints = points[labels == i]
+        if len(binPoints):
+            centroids.append(np.average(binPoints, axis=0))
+    return np.array(centroids)
+
+
+def loopEdge(points, labels, dists, numberOfBins):
+    edgePoints = []
+    for i in xrange(numberOfBins):
+        binPoints = points[labels == i]
+        binDists = dists[labels == i]
+        if len(binDists):
+            edgePoints.append(binPoints[binDists.argmax()])
+    return np.array(edgePoints)
+
+
+def makeWall(numberOfPoints, binWidth):
+    '''
+    Returns points on a 4m x 2m wall and bin labels along the wall.
+    '''
+    points = np.random.random((numberOfPoints, 3)) * [4.0, 0.02, 2.0]
+    bins = np.arange(points[:,0].min(), points[:,0].max() + binWidth, binWidth)
+    labels = np.digitize(points[:,0], bins) - 1
+    return points, labels, len(bins) - 1
+
+
+def testReductions():
+
+    points, labels, numberOfBins = makeWall(20000, 0.01)
+
+    # leave some bins empty and add some duplicate maxima
+    points = points[(labels % 7) != 3]
+    labels = labels[(labels % 7) != 3]
+    dists = np.round(points[:,2], 2)
+
+    reducer = BinReducer(labels, numberOfBins)
+    assert np.array_equal(reducer.getCounts(), loopCounts(labels, numberOfBins))
+    assert np.allclose(reducer.mean(points)[reducer.getNonEmptyBins()], loopCentroids(points, labels, numberOfBins))
+
+    edgeIds = reducer.argmax(dists)
+    assert np.array_equal(points[edgeIds[edgeIds >= 0]], loopEdge(points, labels, dists, numberOfBins))
+
+    binMin = reducer.min(points)
+    binMax = reducer.max(dists)
+    for i in reducer.getNonEmptyBins():
+        assert np.array_equal(binMin[i], points[labels == i].min(axis=0))
+        assert binMax[i] == dists[labels == i].max()
+    assert np.isnan(binMax[reducer.getCounts() == 0]).all()
+
+    minIds = reducer.argmin(dists)
+    for i in reducer.getNonEmptyBins():
+        binIds = np.flatnonzero(labels == i)
+        assert minIds[i] == binIds[dists[binIds].argmin()]
+    assert (minIds[reducer.getCounts() == 0] == -1).all()
+
+
+def benchmark():
+
+    print('%10s %10s %10s %12s %12s' % ('points', 'bin width', 'bins', 'loops', 'reducer'))
+
+    for numberOfPoints in (100000, 1000000):
+        for binWidth in (0.025, 0.005):
+
+            points, labels, numberOfBins = makeWall(numberOfPoints, binWidth)
+            dists = points[:,1]
+
+            t0 = time.time()
+            loopCentroids(points, labels, numberOfBins)
+            loopEdge(points, labels, dists, numberOfBins)
+            loopTime = time.time() - t0
+
+            t0 = time.time()
+            reducer = BinReducer(labels, numberOfBins)
+            reducer.mean(points)
+            reducer.argmax(dists)
+            reducerTime = time.time() - t0
+
+            print('%10d %10.3f %10d %12.4f %12.4f' % (numberOfPoints, binWidth, numberOfBins, loopTime, reducerTime))
+
+
+testReductions()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,109 @@
+from director import boundingrectangle
+from director.thirdparty import qhull_2d
+from director.thirdparty import min_bounding_rect
+import numpy as np
+import time
+import os
+
+
+def makeBlockTop(width, depth, yaw, center, leafSize=0.02):
+    '''
+    Returns the XY points of a noisy rectangular block top sampled on a
+    grid of leafSize, like a voxelized terrain block cluster.
+    '''
+    x, y = np.meshgrid(np.arange(-width/2.0, width/2.0, leafSize), np.arange(-depth/2.0, depth/2.0, leafSize))
+    points = np.column_stack([x.flatten(), y.flatten()]) + np.random.normal(scale=0.003, size=(x.size, 2))
+    c, s = np.cos(yaw), np.sin(yaw)
+    return np.dot(points, [[c, s], [-s, c]]) + center
+
+
+def getReferenceRectangle(points):
+    hull = qhull_2d.qhull2D(points)[::-1]
+    return min_bounding_rect.minBoundingRect(hull)
+
+
+def assertMatchesReference(rect, points):
+    angle, area, width, height, center, corners = getReferenceRectangle(points)
+    assert np.isclose(rect.angle, angle)
+    assert np.isclose(rect.area, area)
+    assert np.isclose(rect.width, width)
+    assert np.isclose(rect.height, height)
+    assert np.allclose(rect.center, center)
+    assert np.allclose(rect.corners, corners)
+
+
+def testConvexHull():
+
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0.5, 0], [0.5, 0.5], [1, 1]], dtype=float)
+    hull = boundingrectangle.convexHull(square)
+    assert np.array_equal(hull, [[0, 0], [1, 0], [1, 1], [0, 1]])
+
+    points = np.random.random((1000, 2))
+    hull = boundingrectangle.convexHull(points)
+    reference = qhull_2d.qhull2D(points)
+    assert set(map(tuple, hull)) == set(map(tuple, reference))
+
+    # counter clockwise
+    edges = np.roll(hull, -1, axis=0) - hull
+    assert (edges[:,0]*np.roll(edges, -1, axis=0)[:,1] - edges[:,1]*np.roll(edges, -1, axis=0)[:,0] > 0).all()
+
+    assert len(boundingrectangle.convexHull(np.array([[1.0, 2.0]]))) == 1
+
+
+def testMinimumAreaRectangle():
+
+    for i in xrange(20):
+        points = makeBlockTop(0.39, 0.39 + 0.1*np.random.random(), np.random.random()*np.pi, np.random.random(2))
+        rect = boundingrectangle.minimumAreaRectangle(points)
+        assertMatchesReference(rect, points)
+
+    points = makeBlockTop(1.0, 0.5, np.radians(30), [2.0, 1.0], leafSize=0.01)
+    rect = boundingrectangle.minimumAreaRectangle(points)
+    assert np.isclose(np.degrees(rect.angle), 30, atol=1.0)
+    assert np.allclose([rect.width, rect.height], [1.0, 0.5], atol=0.03)
+    assert np.allclose(rect.center, [2.0, 1.0], atol=0.02)
+
+
+def testMinimumAreaRectangles():
+
+    clusters = [makeBlockTop(0.39, 0.29, np.random.random()*np.pi, [i, 0]) for i in xrange(10)]
+    clusters.append(np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]]))
+    rects = boundingrectangle.minimumAreaRectangles(clusters)
+    assert len(rects) == len(clusters)
+
+    for rect, points in zip(rects[:-1], clusters[:-1]):
+        assertMatchesReference(rect, points)
+
+    # collinear points give a degenerate rectangle
+    assert np.isclose(rects[-1].area, 0.0)
+    assert np.isclose(rects[-1].width, np.sqrt(8.0))
+
+    assert boundingrectangle.minimumAreaRectangles([]) == []
+
+
+def benchmark():
+
+    clusters = [makeBlockTop(0.39, 0.39, np.random.random()*np.pi, [i % 10, i // 10]) for i in xrange(100)]
+
+    t0 = time.time()
+    for points in clusters:
+        getReferenceRectangle(points)
+    t1 = time.time()
+    for points in clusters:
+        boundingrectangle.minimumAreaRectangle(points)
+    t2 = time.time()
+    boundingrectangle.minimumAreaRectangles(clusters)
+    t3 = time.time()
+
+    print('%d block clusters' % len(clusters))
+    print('qhull2D + minBoundingRect: %.3f s' % (t1 - t0))
+    print('minimumAreaRectangle:      %.3f s' % (t2 - t1))
+    print('minimumAreaRectangles:     %.3f s' % (t3 - t2))
+
+
+testConvexHull()
+testMinimumAreaRectangle()
+testMinimumAreaRectangles()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,78 @@
+from director import clusterdescriptors
+from director import transformUtils
+from director import vtkNumpy as vnp
+import numpy as np
+import time
+import os
+
+
+def makeBox(dims, yaw, center, numberOfPoints=4000):
+    points = (np.random.random((numberOfPoints, 3)) - 0.5) * dims
+    t = transformUtils.frameFromPositionAndRPY(center, [0, 0, yaw])
+    return np.array([t.TransformPoint(p) for p in points])
+
+
+def testDescriptors():
+
+    flat = makeBox([1.0, 0.5, 0.2], 30, [0, 0, 0])
+    upright = makeBox([0.3, 0.2, 1.0], -10, [3, 0, 0])
+    points = np.vstack([flat, upright, [[np.nan, 0, 0]]])
+    labels = np.concatenate([np.repeat(2, len(flat)), np.repeat(5, len(upright)), [2]])
+
+    descriptors = clusterdescriptors.computeClusterDescriptors(points, labels)
+    assert len(descriptors) == 2
+    assert np.array_equal(descriptors['label'], [2, 5])
+    assert np.array_equal(descriptors['numberOfPoints'], [4000, 4000])
+
+    assert np.allclose(descriptors['dims'], [[1.0, 0.5, 0.2], [0.3, 0.2, 1.0]], atol=0.02)
+    assert np.allclose(descriptors['center'], [[0, 0, 0], [3, 0, 0]], atol=0.02)
+    assert np.allclose(descriptors['axes'][:,2], [0, 0, 1], atol=0.05)
+    assert np.allclose([np.linalg.det(axes) for axes in descriptors['axes']], 1.0)
+
+    assert np.allclose(descriptors['rectDims'], [[1.0, 0.5], [0.2, 0.3]], atol=0.02)
+    assert np.allclose(np.degrees(descriptors['rectAngle']), [30, 80], atol=1.0)
+    assert np.allclose(descriptors['rectCenter'], [[0, 0], [3, 0]], atol=0.02)
+
+    t = descriptors.getTransform(1)
+    assert t is descriptors.getTransform(1)
+    assert np.allclose(t.GetPosition(), descriptors['center'][1])
+
+    upright = descriptors.select(descriptors['dims'][:,2] >= 0.5)
+    assert np.array_equal(upright['label'], [5])
+
+
+def testFromPolyData():
+
+    clusters = [vnp.numpyToPolyData(makeBox([0.1, 0.1, 0.1], 0, [i, 0, 0], 100)) for i in xrange(3)]
+    descriptors = clusterdescriptors.computeClusterDescriptorsFromPolyData(clusters)
+    assert np.array_equal(descriptors['label'], [1, 2, 3])
+    assert np.allclose(descriptors['centroid'][:,0], [0, 1, 2], atol=0.02)
+
+    assert len(clusterdescriptors.computeClusterDescriptorsFromPolyData([])) == 0
+
+    # empty clusters keep their record so the descriptors align with the input list
+    clusters.insert(1, vnp.numpyToPolyData(np.zeros((0, 3))))
+    descriptors = clusterdescriptors.computeClusterDescriptorsFromPolyData(clusters)
+    assert np.array_equal(descriptors['label'], [1, 2, 3, 4])
+    assert np.array_equal(descriptors['numberOfPoints'], [100, 0, 100, 100])
+    assert np.allclose(descriptors['centroid'][[0, 2, 3],0], [0, 1, 2], atol=0.02)
+    assert not descriptors['dims'][1].any()
+
+
+def benchmark():
+
+    numberOfClusters = 2000
+    points = np.random.random((numberOfClusters*200, 3)) * 0.2
+    labels = np.repeat(np.arange(1, numberOfClusters + 1), 200)
+    points[:,0] += labels
+
+    t0 = time.time()
+    clusterdescriptors.computeClusterDescriptors(points, labels)
+    print('%d clusters: %.3f s' % (numberOfClusters, time.time() - t0))
+
+
+testDescriptors()
+testFromPolyData()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,99 @@
+from director.consoleapp import ConsoleApp
+from director import segmentation
+from director import transformUtils
+from director import vtkNumpy as vnp
+from director.cropregion import CropRegion
+from director.filterUtils import thresholdPoints
+from director.segmentationroutines import labelPointDistanceAlongAxis
+import numpy as np
+
+
+def makeTestCloud(numberOfPoints=20000):
+    pts = np.random.randn(numberOfPoints, 3)
+    pts[::101] = np.nan
+    return vnp.numpyToPolyData(pts, pointData=dict(intensity=np.random.random(numberOfPoints).astype(np.float32)))
+
+
+def cropToLineSegmentReference(polyData, point1, point2):
+    line = np.array(point2) - np.array(point1)
+    length = np.linalg.norm(line)
+    polyData = labelPointDistanceAlongAxis(polyData, line / length, origin=point1, resultArrayName='dist_along_line')
+    return thresholdPoints(polyData, 'dist_along_line', [0.0, length])
+
+
+def cropToBoundsReference(polyData, transform, bounds):
+    origin = np.array(transform.GetPosition())
+    axes = transformUtils.getAxesFromTransform(transform)
+    for axis, bound in zip(axes, bounds):
+        axis = np.array(axis)/np.linalg.norm(axis)
+        polyData = cropToLineSegmentReference(polyData, origin + axis*bound[0], origin + axis*bound[1])
+    return polyData
+
+
+def cropToSphereReference(polyData, origin, radius):
+    polyData = segmentation.labelDistanceToPoint(polyData, origin)
+    return thresholdPoints(polyData, 'distance_to_point', [0, radius])
+
+
+def cropToHalfSpaceReference(polyData, origin, normal, offset):
+    polyData = labelPointDistanceAlongAxis(polyData, normal / np.linalg.norm(normal), origin=origin, resultArrayName='dist_to_plane')
+    polyData = thresholdPoints(polyData, 'dist_to_plane', [offset, 1e30])
+    polyData.GetPointData().RemoveArray('dist_to_plane')
+    return polyData
+
+
+def assertCropEqual(polyData, expected):
+
+    assert polyData.GetNumberOfPoints() == expected.GetNumberOfPoints()
+    assert polyData.GetNumberOfVerts() == expected.GetNumberOfVerts()
+
+    arrayNames = [expected.GetPointData().GetArrayName(i) for i in xrange(expected.GetPointData().GetNumberOfArrays())]
+    assert arrayNames == [polyData.GetPointData().GetArrayName(i) for i in xrange(polyData.GetPointData().GetNumberOfArrays())]
+
+    if not expected.GetNumberOfPoints():
+        return
+
+    assert np.allclose(vnp.getNumpyFromVtk(polyData, 'Points'), vnp.getNumpyFromVtk(expected, 'Points'))
+    for name in arrayNames:
+        assert np.allclose(vnp.getNumpyFromVtk(polyData, name), vnp.getNumpyFromVtk(expected, name))
+
+
+def testCrops():
+
+    polyData = makeTestCloud()
+    transform = transformUtils.frameFromPositionAndRPY([0.2, -0.1, 0.3], [10, 20, 30])
+
+    dimensions = [1.0, 0.5, 1.5]
+    assertCropEqual(segmentation.cropToBox(polyData, transform, dimensions),
+                    cropToBoundsReference(polyData, transform, [[-d/2.0, d/2.0] for d in dimensions]))
+
+    bounds = [[-0.5, 1.0], [0.0, 2.0], [-1.0, 0.2]]
+    assertCropEqual(segmentation.cropToBounds(polyData, transform, bounds),
+                    cropToBoundsReference(polyData, transform, bounds))
+
+    assertCropEqual(segmentation.cropToSphere(polyData, [0.5, 0.5, 0.0], 1.2),
+                    cropToSphereReference(polyData, [0.5, 0.5, 0.0], 1.2))
+
+    assertCropEqual(segmentation.cropToLineSegment(polyData, [0.0, 0.0, -1.0], [1.0, 1.0, 1.0]),
+                    cropToLineSegmentReference(polyData, [0.0, 0.0, -1.0], [1.0, 1.0, 1.0]))
+
+    origin, normal = np.array([0.1, 0.2, 0.3]), np.array([1.0, -1.0, 2.0])
+    assertCropEqual(CropRegion().addHalfSpace(origin, normal, offset=0.25).crop(polyData),
+                    cropToHalfSpaceReference(polyData, origin, normal, 0.25))
+
+
+def testEmptyCrops():
+
+    polyData = makeTestCloud()
+    transform = transformUtils.frameFromPositionAndRPY([100.0, 0.0, 0.0], [0, 0, 0])
+
+    # empty crops keep the distance arrays
+    assertCropEqual(segmentation.cropToSphere(polyData, [100.0, 0.0, 0.0], 1.0),
+                    cropToSphereReference(polyData, [100.0, 0.0, 0.0], 1.0))
+    assertCropEqual(segmentation.cropToBox(polyData, transform, [1.0, 1.0, 1.0]),
+                    cropToBoundsReference(polyData, transform, [[-0.5, 0.5]]*3))
+
+
+app = ConsoleApp()
+testCrops()
+testEmptyCrops()
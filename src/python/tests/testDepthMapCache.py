@@ -0,0 +1,112 @@
+from director.consoleapp import ConsoleApp
+from director import depthimageprovider
+from director import vtkAll as vtk
+from director import vtkNumpy as vnp
+import numpy as np
+
+
+class FakeMapSource(object):
+    '''
+    Stands in for a vtkMapServerSource, serving depth maps from numpy arrays
+    and counting the maps it decodes.
+    '''
+
+    def __init__(self):
+        self.maps = {}
+        self.currentMapIds = {}
+        self.numberOfReads = 0
+
+    def addMap(self, viewId, mapId, depth, position):
+        self.maps[(viewId, mapId)] = (depth, position)
+        self.currentMapIds[viewId] = mapId
+
+    def GetCurrentMapId(self, viewId):
+        return self.currentMapIds.get(viewId, -1)
+
+    def GetDataForMapId(self, viewId, mapId, depthImage, transform):
+        self.numberOfReads += 1
+        if (viewId, mapId) not in self.maps:
+            return
+        depth, position = self.maps[(viewId, mapId)]
+        depthImage.DeepCopy(vnp.numpyToImageData(depth[:,:,np.newaxis], flip=False, vtktype=vtk.VTK_FLOAT))
+        transform.Translate(position)
+
+
+def makeDepth(value):
+    return np.arange(12, dtype=np.float32).reshape(3, 4) + value
+
+
+def testCacheHits():
+
+    source = FakeMapSource()
+    source.addMap(1, 10, makeDepth(0.0), [1.0, 2.0, 3.0])
+    cache = depthimageprovider.DepthMapCache(source)
+
+    depth, transform = cache.getDepthMapData(1)
+    assert np.array_equal(depth, makeDepth(0.0))
+    assert np.allclose(transform[:3,3], [1.0, 2.0, 3.0])
+    assert source.numberOfReads == 1
+
+    # the current map is decoded once and the cached arrays are shared
+    cachedDepth, cachedTransform = cache.getDepthMapData(1, 10)
+    assert cachedDepth is depth and cachedTransform is transform
+    assert source.numberOfReads == 1
+
+    # a new map id of the view is decoded
+    source.addMap(1, 11, makeDepth(1.0), [0.0, 0.0, 0.0])
+    depth, transform = cache.getDepthMapData(1)
+    assert np.array_equal(depth, makeDepth(1.0))
+    assert source.numberOfReads == 2
+
+    # missing maps are not cached
+    assert cache.getDepthMapData(2) == (None, None)
+    assert cache.getDepthMapData(1, 12) == (None, None)
+    assert cache.getDepthMapData(1, 12) == (None, None)
+    assert source.numberOfReads == 4
+    assert len(cache.entries) == 2
+
+
+def testReadOnly():
+
+    source = FakeMapSource()
+    source.addMap(1, 10, makeDepth(0.0), [1.0, 2.0, 3.0])
+    depth, transform = depthimageprovider.DepthMapCache(source).getDepthMapData(1)
+
+    for array in (depth, transform):
+        assert not array.flags.writeable
+        try:
+            array[0, 0] = 5.0
+        except ValueError:
+            pass
+        else:
+            assert False, 'cached arrays should be read-only'
+
+
+def testBound():
+
+    source = FakeMapSource()
+    for mapId in xrange(3):
+        source.addMap(1, mapId, makeDepth(mapId), [0.0, 0.0, 0.0])
+    cache = depthimageprovider.DepthMapCache(source, maxEntries=2)
+
+    cache.getDepthMapData(1, 0)
+    cache.getDepthMapData(1, 1)
+    cache.getDepthMapData(1, 0)
+    cache.getDepthMapData(1, 2)
+    assert source.numberOfReads == 3
+
+    # map 1 was the least recently used and is evicted
+    assert sorted(cache.entries.keys()) == [(1, 0), (1, 2)]
+    cache.getDepthMapData(1, 0)
+    assert source.numberOfReads == 3
+    cache.getDepthMapData(1, 1)
+    assert source.numberOfReads == 4
+
+    cache.clear()
+    assert not cache.entries
+
+
+app = ConsoleApp()
+testCacheHits()
+testReadOnly()
+testBound()
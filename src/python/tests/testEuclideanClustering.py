@@ -0,0 +1,143 @@
+from director import euclideanclustering
+from director import segmentationroutines
+from director import vtkNumpy as vnp
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+import numpy as np
+import time
+import os
+
+
+def makeBlobs(numberOfBlobs, pointsPerBlob, spacing=1.0, blobSize=0.2):
+    '''
+    Returns points of cubic blobs on a grid, with blob i having
+    pointsPerBlob + i points so that the cluster sizes are distinct.
+    '''
+    points = []
+    for i in xrange(numberOfBlobs):
+        center = np.array([i % 10, i // 10, 0.0]) * spacing
+        points.append(center + np.random.random((pointsPerBlob + i, 3)) * blobSize)
+    return np.vstack(points)
+
+
+def testSeparatedBlobs():
+
+    points = makeBlobs(20, 200)
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=0.1, minClusterSize=1)
+
+    assert result.getNumberOfClusters() == 20
+    assert np.array_equal(result.clusterSizes, np.arange(219, 199, -1))
+
+    # the largest blob is the last one and gets label 1
+    assert (result.labels[-219:] == 1).all()
+
+    indices = result.getClusterIndices()
+    assert len(indices) == 20
+    for label, ids in enumerate(indices, 1):
+        assert np.array_equal(ids, np.flatnonzero(result.labels == label))
+
+
+def testNeighborsShareCluster():
+
+    points = np.random.random((5000, 3))
+    tolerance = 0.02
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=tolerance, minClusterSize=1)
+
+    pairs = np.array(list(cKDTree(points).query_pairs(tolerance)))
+    assert (result.labels[pairs[:,0]] == result.labels[pairs[:,1]]).all()
+    assert (result.labels > 0).all()
+
+
+def testMatchesPointGraph():
+
+    # clusters are the connected components of the graph linking points within the tolerance
+    points = np.random.random((3000, 3)) * [1.0, 1.0, 0.1]
+    tolerance = 0.03
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=tolerance, minClusterSize=1)
+
+    pairs = np.array(list(cKDTree(points).query_pairs(tolerance))).reshape(-1, 2)
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:,0], pairs[:,1])), shape=(len(points), len(points)))
+    numberOfComponents, components = connected_components(graph, directed=False)
+
+    assert result.getNumberOfClusters() == numberOfComponents
+    assert np.array_equal(np.sort(result.clusterSizes), np.sort(np.bincount(components)))
+    labelsOfComponents = np.zeros(numberOfComponents, dtype=np.int32)
+    labelsOfComponents[components] = result.labels
+    assert np.array_equal(labelsOfComponents[components], result.labels)
+
+
+def testCloseClustersStaySeparate():
+
+    # two grids 1.5 tolerances apart, along an axis and along the voxel diagonal
+    tolerance = 0.05
+    st = np.mgrid[0:25, 0:25].reshape(2, -1).T * 0.02
+    for direction in ([1.0, 0.0, 0.0], [1.0, 1.0, 1.0]):
+        direction = np.array(direction) / np.linalg.norm(direction)
+        u = np.cross(direction, [0.0, 0.0, 1.0] if abs(direction[2]) < 0.9 else [1.0, 0.0, 0.0])
+        u /= np.linalg.norm(u)
+        v = np.cross(direction, u)
+        first = np.outer(st[:,0], u) + np.outer(st[:,1], v) + [0.013, 0.027, 0.041]
+        second = first + direction*1.5*tolerance
+
+        result = euclideanclustering.clusterPoints(np.vstack([first, second]), clusterTolerance=tolerance, minClusterSize=1)
+        assert np.array_equal(result.clusterSizes, [625, 625])
+        assert len(np.unique(result.labels[:625])) == 1
+        assert len(np.unique(result.labels[625:])) == 1
+        assert result.labels[0] != result.labels[-1]
+
+
+def testSizeLimits():
+
+    points = makeBlobs(10, 100)
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=0.1, minClusterSize=103, maxClusterSize=106)
+    assert np.array_equal(result.clusterSizes, [106, 105, 104, 103])
+    assert np.count_nonzero(result.labels) == 106 + 105 + 104 + 103
+
+
+def testClusterInXY():
+
+    bottom = np.random.random((500, 3)) * [0.2, 0.2, 0.05]
+    top = bottom + [0.0, 0.0, 1.0]
+    points = np.vstack([bottom, top, [[np.nan, 0.0, 0.0]]])
+
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=0.05, minClusterSize=1)
+    assert result.getNumberOfClusters() == 2
+    assert result.labels[-1] == 0
+
+    result = euclideanclustering.clusterPoints(points, clusterTolerance=0.05, minClusterSize=1, clusterInXY=True)
+    assert result.getNumberOfClusters() == 1
+    assert (result.labels[:-1] == 1).all()
+
+
+def testExtractClusters():
+
+    polyData = vnp.numpyToPolyData(makeBlobs(5, 100), pointData={'intensity' : np.arange(510.0)})
+    clusters = segmentationroutines.extractClusters(polyData, clusterTolerance=0.1, minClusterSize=1)
+
+    assert [cluster.GetNumberOfPoints() for cluster in clusters] == [104, 103, 102, 101, 100]
+    assert np.array_equal(vnp.getNumpyFromVtk(clusters[-1], 'intensity'), np.arange(100.0))
+    assert (vnp.getNumpyFromVtk(clusters[0], 'cluster_labels') == 1).all()
+    assert not polyData.GetPointData().HasArray('cluster_labels')
+
+
+def benchmark():
+
+    for numberOfBlobs in (100, 5000):
+        centers = np.column_stack([np.arange(numberOfBlobs) % 100, np.arange(numberOfBlobs) // 100, np.zeros(numberOfBlobs)]) * 0.5
+        points = (centers[:,np.newaxis,:] + np.random.random((numberOfBlobs, 20, 3)) * 0.05).reshape(-1, 3)
+        t0 = time.time()
+        result = euclideanclustering.clusterPoints(points, clusterTolerance=0.02, minClusterSize=1)
+        print('%d points, %d clusters: %.3f s' % (len(points), result.getNumberOfClusters(), time.time() - t0))
+
+
+testSeparatedBlobs()
+testNeighborsShareCluster()
+testMatchesPointGraph()
+testCloseClustersStaySeparate()
+testSizeLimits()
+testClusterInXY()
+testExtractClusters()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,71 @@
+from director.consoleapp import ConsoleApp
+from director import framestatistics
+from director import objectmodel as om
+
+
+def testFrameStatistics():
+
+    stats = framestatistics.FrameStatistics(alpha=0.5)
+
+    assert stats.addFrame(1000000, frameCount=5)
+    assert not stats.addFrame(1000000, frameCount=5)
+    assert stats.framesReceived == 1 and stats.framesDropped == 0
+
+    # the queue received three frames since the last poll, two were replaced
+    assert stats.addFrame(1300000, frameCount=8)
+    assert stats.framesReceived == 4
+    assert stats.framesDropped == 2
+
+    # frames received while the source is not polling are not dropped
+    stats.skipFrames()
+    assert stats.addFrame(1800000, frameCount=20)
+    assert stats.framesReceived == 5 and stats.framesDropped == 2
+
+    # without a frame count every new frame counts once
+    stats.addFrame(2000000)
+    assert stats.framesReceived == 6 and stats.framesDropped == 2
+
+    stats.addConversion(2000000, nowUtime=2100000)
+    assert abs(stats.averageLatency - 0.1) < 1e-9
+    stats.addConversion(2000000, nowUtime=2300000)
+    assert abs(stats.averageLatency - 0.2) < 1e-9
+    assert stats.framesConverted == 2
+
+
+def testAdaptiveRate():
+
+    rate = framestatistics.AdaptiveRate(minimumFps=2.0, maximumFps=30.0, budget=0.5, alpha=1.0)
+    assert rate.getFps() == 30.0
+
+    rate.addCost(0.001)
+    assert rate.getFps() == 30.0
+
+    rate.addCost(0.05)
+    assert abs(rate.getFps() - 10.0) < 1e-9
+
+    rate.addCost(1.0)
+    assert rate.getFps() == 2.0
+
+
+def testStatisticsProperties():
+
+    obj = om.ObjectModelItem('source')
+    framestatistics.addStatisticsProperties(obj)
+    for name in framestatistics.statisticsPropertyNames:
+        assert obj.getPropertyAttribute(name, 'readOnly')
+
+    stats = framestatistics.FrameStatistics()
+    stats.addFrame(1000000)
+    stats.addConversion(1000000, nowUtime=1025000)
+    framestatistics.updateStatisticsProperties(obj, stats, 12.5)
+
+    assert obj.getProperty('Frames Received') == 1
+    assert obj.getProperty('Frames Converted') == 1
+    assert obj.getProperty('Average Latency (ms)') == 25.0
+    assert obj.getProperty('Poll Rate') == 12.5
+
+
+app = ConsoleApp()
+testFrameStatistics()
+testAdaptiveRate()
+testStatisticsProperties()
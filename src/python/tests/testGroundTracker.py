@@ -0,0 +1,85 @@
+from director import groundtracker
+import numpy as np
+import time
+import os
+
+
+def makeScene(groundHeight=0.0, tilt=0.0, numberOfPoints=20000):
+    '''
+    Returns points of a ground plane at groundHeight, tilted by tilt radians
+    about the x axis, with a box standing on it and some points above.
+    '''
+    xy = np.random.uniform(-5, 5, size=(numberOfPoints, 2))
+    ground = np.column_stack([xy, groundHeight + np.tan(tilt)*xy[:,1] + np.random.normal(scale=0.005, size=len(xy))])
+    box = np.random.uniform([1, 1, 0], [2, 2, 1], size=(numberOfPoints//4, 3)) + [0, 0, groundHeight]
+    clutter = np.random.uniform([-5, -5, groundHeight + 0.5], [5, 5, groundHeight + 3], size=(numberOfPoints//4, 3))
+    return np.vstack([ground, box, clutter])
+
+
+def getTilt(normal):
+    return np.arccos(np.clip(normal[2], -1, 1))
+
+
+def testTracking():
+
+    tracker = groundtracker.GroundPlaneTracker()
+    assert not tracker.hasEstimate()
+
+    ground = tracker.update(makeScene())
+    assert ground.refit
+    assert np.allclose(ground.normal, [0, 0, 1], atol=0.01)
+    assert abs(ground.origin[2]) < 0.01
+
+    # small changes are tracked without a new ransac fit
+    for i in xrange(5):
+        ground = tracker.update(makeScene(groundHeight=0.01*i, tilt=np.radians(0.5*i)))
+        assert not ground.refit
+        assert abs(getTilt(ground.normal) - np.radians(0.5*i)) < np.radians(0.2)
+        assert abs(np.dot(ground.origin - [0, 0, 0.01*i], ground.normal)) < 0.01
+
+    assert tracker.numberOfUpdates == 6
+    assert tracker.numberOfRefits == 1
+
+    # stepping onto a different level falls back to ransac
+    ground = tracker.update(makeScene(groundHeight=0.4))
+    assert ground.refit
+    assert abs(ground.origin[2] - 0.4) < 0.01
+    assert tracker.numberOfRefits == 2
+
+
+def testNoGround():
+
+    tracker = groundtracker.GroundPlaneTracker()
+    assert tracker.update(np.zeros((2, 3))) is None
+    assert tracker.update(np.random.random((1000, 3)) * [1, 1, 0]) is not None
+
+    # a vertical wall is not accepted as ground
+    tracker.reset()
+    wall = np.random.random((1000, 3)) * [0, 2, 2]
+    assert tracker.update(wall) is None
+    assert not tracker.hasEstimate()
+
+
+def benchmark():
+
+    scenes = [makeScene(tilt=np.radians(0.1*i), numberOfPoints=200000) for i in xrange(5)]
+    tracker = groundtracker.GroundPlaneTracker()
+
+    t0 = time.time()
+    for points in scenes:
+        tracker.reset()
+        tracker.update(points)
+    t1 = time.time()
+    for points in scenes:
+        tracker.update(points)
+    t2 = time.time()
+
+    print('ransac per cloud: %.3f s' % ((t1 - t0) / len(scenes)))
+    print('tracked update:   %.3f s' % ((t2 - t1) / len(scenes)))
+
+
+testTracking()
+testNoGround()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,99 @@
+from director import icp
+from director import spatialindex
+from director import transformUtils
+from director import vtkNumpy as vnp
+import vtk
+import numpy as np
+
+
+def makeBoxSurface(dims, spacing, random):
+    '''
+    Returns (points, normals) sampled on the faces of a box centered at the origin.
+    '''
+    points, normals = [], []
+    for axis in xrange(3):
+        for sign in (-1, 1):
+            faceArea = np.prod([dims[i] for i in xrange(3) if i != axis])
+            p = (random.random_sample((int(faceArea / spacing**2), 3)) - 0.5) * dims
+            p[:,axis] = sign * dims[axis] / 2.0
+            n = np.zeros_like(p)
+            n[:,axis] = sign
+            points.append(p)
+            normals.append(n)
+    return np.vstack(points), np.vstack(normals)
+
+
+def makeScene(random):
+    '''
+    Returns a partial view of a box standing on a ground plane.
+    '''
+    dims = np.array([0.5, 0.4, 0.3])
+    box, _ = makeBoxSurface(dims, 0.005, random)
+    box = box[box[:,0] < 0.2]
+    ground = (random.random_sample((20000, 3)) - 0.5) * [3, 3, 0] - [0, 0, dims[2]/2.0]
+    return np.vstack([box, ground]), dims
+
+
+def getPerturbation():
+    return transformUtils.getNumpyFromTransform(transformUtils.frameFromPositionAndRPY([0.02, -0.02, 0.01], [1, -1, 3]))
+
+
+def checkResult(result, tolerance=0.002):
+    assert result.converged
+    assert np.allclose(result.matrix, np.eye(4), atol=tolerance), result.matrix
+    assert result.residual < 0.001
+    assert len(result.iterations)
+    for leafSize, numberOfCorrespondences, residual, elapsed in result.iterations:
+        assert numberOfCorrespondences >= 10
+        assert elapsed >= 0
+
+
+def testRegisterPoints():
+
+    random = np.random.RandomState(1)
+    target, dims = makeScene(random)
+    targetIndex = spatialindex.SpatialIndex(target)
+    source, sourceNormals = makeBoxSurface(dims, 0.01, random)
+
+    # normals estimated on the target
+    result = icp.PointToPlaneICP().register(source, target, targetIndex, getPerturbation())
+    checkResult(result)
+
+    # normals of the source surface
+    result = icp.PointToPlaneICP().register(source, target, targetIndex, getPerturbation(), sourceNormals=sourceNormals)
+    checkResult(result)
+
+    # no correspondences within range
+    result = icp.PointToPlaneICP().register(source + [10, 0, 0], target, targetIndex)
+    assert not result.converged
+    assert result.fitness == 0.0
+
+
+def testRegisterPolyData():
+
+    random = np.random.RandomState(2)
+    points, dims = makeScene(random)
+    target = vnp.numpyToPolyData(points)
+
+    cube = vtk.vtkCubeSource()
+    cube.SetXLength(dims[0])
+    cube.SetYLength(dims[1])
+    cube.SetZLength(dims[2])
+    cube.Update()
+
+    initialTransform = transformUtils.getTransformFromNumpy(getPerturbation())
+    result = icp.registerPolyData(cube.GetOutput(), target, initialTransform=initialTransform)
+    checkResult(result)
+    assert np.allclose(result.transform.GetPosition(), [0, 0, 0], atol=0.002)
+
+    # the spatial index of the target is cached for the next refit
+    assert spatialindex.getCachedSpatialIndex(target) is not None
+
+    # a second refit from the result runs against the cached index
+    result = icp.registerPolyData(cube.GetOutput(), target, initialTransform=result.transform)
+    checkResult(result)
+    print('refit from converged pose: %d iterations, %.1f ms' % (len(result.iterations), result.elapsed*1000))
+
+
+testRegisterPoints()
+testRegisterPolyData()
@@ -0,0 +1,87 @@
+from director.consoleapp import ConsoleApp
+from director import imagehistory
+import director.vtkAll as vtk
+
+
+def makeImage(width=64, height=48):
+    image = vtk.vtkImageData()
+    image.SetDimensions(width, height, 1)
+    image.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 3)
+    return image
+
+
+def testHistory():
+
+    history = imagehistory.ImageHistory(maxImages=4)
+    assert history.getNearest(0) == (None, None)
+    assert history.getBracket(0) is None
+
+    images = {}
+    for utime in [100, 300, 200, 400]:
+        images[utime] = makeImage()
+        history.addImage(utime, images[utime])
+    assert history.getUtimes() == [100, 200, 300, 400]
+
+    assert history.getNearest(240) == (200, images[200])
+    assert history.getNearest(260) == (300, images[300])
+    assert history.getNearest(0) == (100, images[100])
+    assert history.getNearest(1000) == (400, images[400])
+    assert history.getNearest(1000, maxDelta=100) == (None, None)
+
+    bracket = history.getBracket(225)
+    assert (bracket.utime0, bracket.utime1) == (200, 300)
+    assert bracket.image0 is images[200] and bracket.image1 is images[300]
+    assert abs(bracket.alpha - 0.25) < 1e-9
+    assert history.getBracket(300).image0 is images[300]
+    assert history.getBracket(50) is None
+    assert history.getBracket(450) is None
+
+    # the oldest image is dropped
+    history.addImage(500, makeImage())
+    assert history.getUtimes() == [200, 300, 400, 500]
+    assert history.getImage(100) is None
+
+    # replacing an image keeps one image per utime
+    image = makeImage()
+    history.addImage(300, image)
+    assert history.getUtimes() == [200, 300, 400, 500]
+    assert history.getImage(300) is image
+
+
+def testByteBudget():
+
+    imageBytes = imagehistory.getImageBytes(makeImage(640, 480))
+    history = imagehistory.ImageHistory(maxImages=100, maxBytes=int(imageBytes * 3.5))
+    for utime in xrange(10):
+        history.addImage(utime, makeImage(640, 480))
+    assert history.getUtimes() == [7, 8, 9]
+    assert history.getNumberOfBytes() == 3 * imageBytes
+
+    # the newest image is kept even if it exceeds the budget
+    history.addImage(10, makeImage(2048, 2048))
+    assert history.getUtimes() == [10]
+
+
+def testTextureCache():
+
+    images = [makeImage(640, 480) for i in xrange(4)]
+    imageBytes = imagehistory.getImageBytes(images[0])
+    cache = imagehistory.TextureCache(maxBytes=imageBytes * 2)
+
+    tex0 = cache.getTexture(('camera', 0), images[0])
+    assert tex0.GetInput() is images[0]
+    assert cache.getTexture(('camera', 0), images[0]) is tex0
+
+    cache.getTexture(('camera', 1), images[1])
+    cache.getTexture(('camera', 0), images[0])
+    cache.getTexture(('camera', 2), images[2])
+
+    # the least recently used texture is evicted
+    assert cache.textures.keys() == [('camera', 0), ('camera', 2)]
+    assert cache.numberOfBytes == 2 * imageBytes
+
+
+app = ConsoleApp()
+testHistory()
+testByteBudget()
+testTextureCache()
@@ -0,0 +1,86 @@
+from director import kmeans
+import numpy as np
+import time
+import os
+
+
+def makeBlobs(centers, numberOfPoints, sigma=0.1, seed=0):
+    random = np.random.RandomState(seed)
+    truth = random.randint(0, len(centers), numberOfPoints)
+    points = np.asarray(centers)[truth] + random.normal(scale=sigma, size=(numberOfPoints, len(centers[0])))
+    return points, truth
+
+
+def getAccuracy(labels, truth, numberOfClusters):
+    '''
+    Returns the fraction of points whose label is the majority label of their true cluster.
+    '''
+    mapping = np.array([np.bincount(labels[truth == i], minlength=numberOfClusters).argmax() for i in xrange(numberOfClusters)])
+    return (mapping[truth] == labels).mean()
+
+
+def testClusters():
+
+    centers = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    points, truth = makeBlobs(centers, 100000)
+    points[:5] = np.nan
+
+    labels, centroids = kmeans.computeLabels(points, 4)
+    assert labels.dtype == np.int32
+    assert (labels[:5] == -1).all()
+    assert getAccuracy(labels[5:], truth[5:], 4) > 0.999
+
+    order = np.lexsort(centroids.T[::-1])
+    assert np.allclose(centroids[order], sorted(centers), atol=0.01)
+
+    # 1D values
+    values, truth = makeBlobs([[0.0], [5.0]], 10000, sigma=0.5)
+    labels, centroids = kmeans.computeLabels(values[:,0], 2)
+    assert getAccuracy(labels, truth, 2) > 0.99
+
+
+def testWarmStart():
+
+    centers = [[0, 0], [1, 0], [0, 1]]
+    points, truth = makeBlobs(centers, 100000)
+    model = kmeans.MiniBatchKMeans(3)
+    centroids = model.fit(points)
+    coldIterations = model.iterations
+
+    shifted, _ = makeBlobs(centers, 100000, seed=1)
+    model = kmeans.MiniBatchKMeans(3)
+    warmCentroids = model.fit(shifted + 0.01, initialCentroids=centroids)
+    assert model.iterations <= coldIterations
+    assert np.allclose(warmCentroids, centroids + 0.01, atol=0.01)
+
+    # a warm start with the wrong shape is ignored
+    model = kmeans.MiniBatchKMeans(3)
+    model.fit(points, initialCentroids=np.zeros((2, 2)))
+    assert model.centroids.shape == (3, 2)
+
+
+def benchmark():
+
+    points, truth = makeBlobs([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], 5000000)
+    points = points.astype(np.float32)
+
+    t0 = time.time()
+    model = kmeans.MiniBatchKMeans(4)
+    centroids = model.fit(points)
+    coldIterations = model.iterations
+    t1 = time.time()
+    labels, _ = model.predict(points)
+    t2 = time.time()
+    model.fit(points, initialCentroids=centroids)
+    t3 = time.time()
+
+    print('%d points: fit %.3f s (%d batches), assign %.3f s, warm start fit %.3f s (%d batches)' % (
+          len(points), t1 - t0, coldIterations, t2 - t1, t3 - t2, model.iterations))
+    assert getAccuracy(labels, truth, 4) > 0.999
+
+
+testClusters()
+testWarmStart()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
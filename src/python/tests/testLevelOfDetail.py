@@ -0,0 +1,94 @@
+from director.consoleapp import ConsoleApp
+from director import visualization as vis
+from director import segmentationexecutor
+from director import vtkNumpy as vnp
+from director.timercallback import TimerCallback
+import numpy as np
+import time
+
+
+def makeCloud(numberOfPoints):
+    points = np.random.random((numberOfPoints, 3)) * [4.0, 4.0, 1.0]
+    return vnp.numpyToPolyData(points, pointData={'z' : points[:,2].copy()})
+
+
+def waitForJobs():
+    executor = segmentationexecutor.getExecutor()
+
+    def onTick():
+        if not executor.getNumberOfPendingJobs():
+            ConsoleApp.quit()
+
+    timer = TimerCallback(targetFps=60, callback=onTick)
+    timer.start()
+    ConsoleApp.startQuitTimer(30.0)
+    ConsoleApp.start(enableAutomaticQuit=False)
+    timer.stop()
+
+
+def testComputeLevels():
+
+    polyData = makeCloud(200000)
+    points = vnp.getNumpyFromVtk(polyData, 'Points')
+    arrays = [('z', vnp.getNumpyFromVtk(polyData, 'z'))]
+
+    t0 = time.time()
+    levels = vis.computeLevelsOfDetail(points, arrays, vis.PolyDataItem.lodLeafSizes)
+    print('levels of detail of %d points: %s, %.3f s' % (len(points), [len(levelPoints) for levelPoints, _ in levels], time.time() - t0))
+
+    counts = [len(points)] + [len(levelPoints) for levelPoints, _ in levels]
+    assert len(levels) >= 2
+    assert all(coarse <= 0.5*fine for fine, coarse in zip(counts, counts[1:]))
+    assert all([name for name, _ in levelArrays] == ['z'] for _, levelArrays in levels)
+
+    # the levels pass through the executor encoding unchanged
+    assert segmentationexecutor.encode(levels[0])[0] is levels[0][0]
+
+    level = vis.makeLevelOfDetailPolyData(*levels[0])
+    assert level.GetNumberOfPoints() == counts[1]
+    assert np.array_equal(vnp.getNumpyFromVtk(level, 'z'), levels[0][1][0][1])
+
+
+def testInteraction(view):
+
+    obj = vis.showPolyData(makeCloud(200000), 'cloud', colorByName='z', view=view)
+    assert view not in obj._renderObservers
+    obj.setProperty('Level Of Detail', True)
+    assert view in obj._renderObservers
+    waitForJobs()
+    assert obj.mapper.GetInput() is obj.polyData
+
+    # while the camera moves the render window asks for a high update rate
+    renderWindow = view.renderWindow()
+    renderWindow.SetDesiredUpdateRate(15.0)
+    view.forceRender()
+    assert obj.mapper.GetInput().GetNumberOfPoints() < obj.polyData.GetNumberOfPoints()
+    assert obj.mapper.GetInput().GetPointData().GetScalars().GetName() == 'z'
+
+    # the still render restores the full resolution
+    renderWindow.SetDesiredUpdateRate(0.0001)
+    view.forceRender()
+    assert obj.mapper.GetInput() is obj.polyData
+
+    # new data drops the levels until they are recomputed
+    obj.setPolyData(makeCloud(200000))
+    renderWindow.SetDesiredUpdateRate(15.0)
+    view.forceRender()
+    assert obj.mapper.GetInput() is obj.polyData
+    waitForJobs()
+    view.forceRender()
+    assert obj.mapper.GetInput().GetNumberOfPoints() < obj.polyData.GetNumberOfPoints()
+
+    renderWindow.SetDesiredUpdateRate(0.0001)
+    obj.setProperty('Level Of Detail', False)
+    view.forceRender()
+    assert obj.mapper.GetInput() is obj.polyData
+    assert view not in obj._renderObservers
+
+
+app = ConsoleApp()
+view = app.createView()
+view.show()
+
+testComputeLevels()
+testInteraction(view)
@@ -0,0 +1,96 @@
+from director import normalestimation
+from director import vtkNumpy as vnp
+import numpy as np
+import time
+import os
+
+
+def makePlane(numberOfPoints, normal, noise=0.0):
+    normal = np.asarray(normal, dtype=float)
+    normal /= np.linalg.norm(normal)
+    u = np.cross(normal, [0.0, 0.0, 1.0] if abs(normal[2]) < 0.9 else [1.0, 0.0, 0.0])
+    u /= np.linalg.norm(u)
+    v = np.cross(normal, u)
+    coords = np.random.random((numberOfPoints, 2)) * 2.0 - 1.0
+    points = np.outer(coords[:,0], u) + np.outer(coords[:,1], v) + [0.0, 0.0, 2.0]
+    return points + np.random.normal(scale=noise, size=points.shape) if noise else points
+
+
+def testPlane():
+
+    normal = np.array([0.2, -0.1, 1.0])
+    normal /= np.linalg.norm(normal)
+    points = makePlane(20000, normal)
+    points[::500] = np.nan
+    polyData = vnp.numpyToPolyData(points)
+
+    for k in (None, 20):
+        normals, curvature = normalestimation.computeNormals(polyData, searchRadius=0.05, k=k)
+        finite = np.isfinite(points).all(axis=1)
+
+        assert np.isnan(normals[~finite]).all()
+        assert np.allclose(np.abs(np.dot(normals[finite], normal)), 1.0, atol=1e-6)
+        assert np.nanmax(curvature) < 1e-6
+
+        # points are above the origin, so normals face down toward it
+        assert (np.dot(normals[finite], normal) < 0).all()
+
+    normals, _ = normalestimation.computeNormals(polyData, searchRadius=0.05, viewDirection=-normal)
+    assert (np.dot(normals[finite], normal) > 0).all()
+
+
+def testSphere():
+
+    points = np.random.normal(size=(20000, 3))
+    points /= np.linalg.norm(points, axis=1)[:,np.newaxis]
+    polyData = vnp.numpyToPolyData(points)
+
+    normals, curvature = normalestimation.computeNormals(polyData, searchRadius=0.1)
+    assert np.allclose(np.abs(np.einsum('ij,ij->i', normals, points)), 1.0, atol=0.01)
+    assert (curvature > 0).all()
+
+    # normals face the view point at the center of the sphere
+    assert (np.einsum('ij,ij->i', normals, points) < 0).all()
+
+
+def testSearchCloud():
+
+    points = makePlane(5000, [0, 0, 1])
+    searchPolyData = vnp.numpyToPolyData(makePlane(5000, [0, 0, 1]))
+
+    sparse = vnp.numpyToPolyData(points[:10])
+    normals, curvature = normalestimation.computeNormals(sparse, searchPolyData, searchRadius=0.1)
+    assert np.allclose(np.abs(normals[:,2]), 1.0)
+
+    isolated = vnp.numpyToPolyData(np.array([[10.0, 10.0, 10.0]]))
+    normals, curvature = normalestimation.computeNormals(isolated, searchPolyData, searchRadius=0.1)
+    assert np.isnan(normals).all() and np.isnan(curvature).all()
+
+
+def testParallel():
+
+    polyData = vnp.numpyToPolyData(makePlane(50000, [0, 1, 1], noise=0.002))
+
+    serial = normalestimation.computeNormals(polyData, searchRadius=0.05, chunkSize=5000)
+    parallel = normalestimation.computeNormals(polyData, searchRadius=0.05, chunkSize=5000, processes=4)
+    assert np.array_equal(serial[0], parallel[0])
+    assert np.array_equal(serial[1], parallel[1])
+
+
+def benchmark():
+
+    for numberOfPoints in (100000, 500000):
+        polyData = vnp.numpyToPolyData(makePlane(numberOfPoints, [0, 0, 1], noise=0.002))
+        for processes in (None, 4):
+            t0 = time.time()
+            normalestimation.computeNormals(polyData, searchRadius=0.03, processes=processes)
+            print('%d points, processes=%s: %.3f s' % (numberOfPoints, processes, time.time() - t0))
+
+
+testPlane()
+testSphere()
+testSearchCloud()
+testParallel()
+
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
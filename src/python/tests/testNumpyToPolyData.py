@@ -0,0 +1,96 @@
+from director import vtkNumpy as vnp
+from director import vtkAll as vtk
+from director.shallowCopy import shallowCopy
+import numpy as np
+import time
+import os
+
+
+def numpyToPolyDataWithGlyphFilter(pts, pointData):
+    '''
+    Reference implementation using vtkVertexGlyphFilter to create the vertex cells.
+    '''
+    pd = vtk.vtkPolyData()
+    pd.SetPoints(vnp.getVtkPointsFromNumpy(pts.copy()))
+    for key, value in pointData.iteritems():
+        vnp.addNumpyToVtk(pd, value.copy(), key)
+
+    f = vtk.vtkVertexGlyphFilter()
+    f.SetInputData(pd)
+    f.Update()
+    return shallowCopy(f.GetOutput())
+
+
+def getVertexIds(polyData):
+    ids = vtk.vtkIdList()
+    verts = polyData.GetVerts()
+    verts.InitTraversal()
+    result = []
+    while verts.GetNextCell(ids):
+        assert ids.GetNumberOfIds() == 1
+        result.append(ids.GetId(0))
+    return result
+
+
+def testVertexCells():
+
+    pts = np.random.random((1000, 3))
+    intensity = np.random.random(1000).astype(np.float32)
+
+    expected = numpyToPolyDataWithGlyphFilter(pts, dict(intensity=intensity))
+
+    for copy in (True, False):
+        polyData = vnp.numpyToPolyData(pts, pointData=dict(intensity=intensity), copy=copy)
+
+        assert polyData.GetNumberOfPoints() == expected.GetNumberOfPoints()
+        assert polyData.GetNumberOfVerts() == expected.GetNumberOfVerts()
+        assert getVertexIds(polyData) == getVertexIds(expected)
+        assert np.allclose(vnp.getNumpyFromVtk(polyData, 'Points'), pts)
+        assert np.allclose(vnp.getNumpyFromVtk(polyData, 'intensity'), intensity)
+
+
+def testNoCopy():
+
+    pts = np.random.random((100, 3)).astype(np.float32)
+    polyData = vnp.numpyToPolyData(pts, copy=False)
+
+    # the polydata should share memory with the input buffer
+    pts[0] = [1.0, 2.0, 3.0]
+    assert np.allclose(polyData.GetPoint(0), [1.0, 2.0, 3.0])
+
+    # the polydata should keep the buffer alive after the caller releases it
+    del pts
+    assert np.allclose(vnp.getNumpyFromVtk(polyData, 'Points')[0], [1.0, 2.0, 3.0])
+
+    # non-contiguous input falls back to a copy
+    pts = np.random.random((100, 6))[:,:3]
+    polyData = vnp.numpyToPolyData(pts, copy=False)
+    assert np.allclose(vnp.getNumpyFromVtk(polyData, 'Points'), pts)
+
+
+def benchmark():
+
+    print('%12s %12s %12s %12s' % ('points', 'glyph filter', 'copy', 'no copy'))
+
+    for numberOfPoints in (10000, 1000000, 10000000):
+
+        pts = np.random.random((numberOfPoints, 3)).astype(np.float32)
+        pointData = dict(intensity=np.random.random(numberOfPoints).astype(np.float32))
+
+        timings = []
+        for func in (lambda: numpyToPolyDataWithGlyphFilter(pts, pointData),
+                     lambda: vnp.numpyToPolyData(pts, pointData, copy=True),
+                     lambda: vnp.numpyToPolyData(pts, pointData, copy=False)):
+            t0 = time.time()
+            func()
+            timings.append(time.time() - t0)
+
+        print('%12d %12.4f %12.4f %12.4f' % tuple([numberOfPoints] + timings))
+
+
+testVertexCells()
+testNoCopy()
+
+# the benchmark builds clouds of up to 10M points, run it on request only
+if os.environ.get('DIRECTOR_BENCHMARK'):
+    benchmark()
@@ -0,0 +1,88 @@
+from director import planeransac
+import numpy as np
+
+
+def makeNoisyPlane(normal, offset, numberOfPoints=5000, noise=0.005, numberOfOutliers=2000, random=np.random):
+    '''
+    Returns (points, isInlier) for points on the plane dot(normal, p) = offset
+    with gaussian noise along the normal, followed by uniform outliers.
+    '''
+    normal = np.asarray(normal, dtype=float)
+    normal /= np.linalg.norm(normal)
+    u = np.cross(normal, [1.0, 0.0, 0.0] if abs(normal[0]) < 0.9 else [0.0, 1.0, 0.0])
+    u /= np.linalg.norm(u)
+    v = np.cross(normal, u)
+
+    st = random.uniform(-1.0, 1.0, size=(numberOfPoints, 2))
+    planePoints = normal*offset + st[:,:1]*u + st[:,1:]*v + random.normal(0.0, noise, size=(numberOfPoints, 1))*normal
+    outliers = random.uniform(-1.0, 1.0, size=(numberOfOutliers, 3))
+
+    points = np.vstack([planePoints, outliers])
+    isInlier = np.zeros(len(points), dtype=bool)
+    isInlier[:numberOfPoints] = True
+    return points, isInlier
+
+
+def testFitPlane():
+
+    random = np.random.RandomState(0)
+    normal = np.array([0.2, -0.3, 1.0])
+    normal /= np.linalg.norm(normal)
+    points, isInlier = makeNoisyPlane(normal, 0.4, random=random)
+    points[::97] = np.nan
+
+    plane = planeransac.fitPlane(points, distanceThreshold=0.02, seed=1)
+    assert plane is not None
+
+    assert abs(np.dot(plane.normal, normal)) > np.cos(np.radians(1.0))
+    assert abs(np.dot(plane.normal, plane.origin) - np.dot(plane.normal, normal*0.4)) < 0.005
+
+    # nearly all plane points are inliers, and few outliers are
+    finite = np.isfinite(points).all(axis=1)
+    assert not plane.inliers[~finite].any()
+    assert np.count_nonzero(plane.inliers & isInlier) > 0.98 * np.count_nonzero(isInlier & finite)
+    assert np.count_nonzero(plane.inliers & ~isInlier) < 0.05 * np.count_nonzero(~isInlier)
+    assert plane.numberOfInliers == np.count_nonzero(plane.inliers)
+
+    # the recomputed inlier distances are within the threshold
+    dists = np.abs(np.dot(points[plane.inliers] - plane.origin, plane.normal))
+    assert dists.max() <= 0.02 + 1e-9
+
+
+def testPerpendicularAxis():
+
+    random = np.random.RandomState(2)
+    floor, floorInliers = makeNoisyPlane([0.0, 0.0, 1.0], 0.0, numberOfPoints=6000, numberOfOutliers=0, random=random)
+    wall, wallInliers = makeNoisyPlane([1.0, 0.0, 0.0], 0.5, numberOfPoints=2000, numberOfOutliers=500, random=random)
+    points = np.vstack([floor, wall])
+
+    # the constraint selects the smaller plane with a normal near the x axis
+    plane = planeransac.fitPlane(points, 0.02, perpendicularAxis=[1.0, 0.0, 0.0], angleEpsilon=0.1, seed=3)
+    assert abs(plane.normal[0]) > np.cos(0.1)
+    assert abs(abs(np.dot(plane.normal, plane.origin)) - 0.5) < 0.01
+
+
+def testFitPlanes():
+
+    random = np.random.RandomState(4)
+    floor, _ = makeNoisyPlane([0.0, 0.0, 1.0], 0.0, numberOfPoints=6000, numberOfOutliers=0, random=random)
+    wall, _ = makeNoisyPlane([1.0, 0.0, 0.0], 0.5, numberOfPoints=3000, numberOfOutliers=300, random=random)
+    points = np.vstack([floor, wall])
+
+    planes = planeransac.PlaneRansac(0.02, seed=5).fitPlanes(points, maxPlanes=5, minInliers=500)
+    assert len(planes) == 2
+    assert abs(planes[0].normal[2]) > 0.99
+    assert abs(planes[1].normal[0]) > 0.99
+    assert not (planes[0].inliers & planes[1].inliers).any()
+
+
+def testNoPlane():
+
+    assert planeransac.fitPlane(np.zeros((2, 3))) is None
+    assert planeransac.fitPlane(np.random.random((100, 3)), perpendicularAxis=[0, 0, 1], angleEpsilon=0.0) is None
+
+
+testFitPlane()
+testPerpendicularAxis()
+testFitPlanes()
+testNoPlane()
@@ -0,0 +1,172 @@
+from director.consoleapp import ConsoleApp
+from director import pointcolorizer
+from director import vtkNumpy as vnp
+from director.fieldcontainer import FieldContainer
+import numpy as np
+
+
+width, height = 640, 480
+fx, fy, cx, cy = 500.0, 500.0, 320.0, 240.0
+k1, k2 = -0.2, 0.05
+
+
+def projectPoints(points):
+    '''
+    Pinhole projection with radial distortion.
+    '''
+    x = points[:,0] / points[:,2]
+    y = points[:,1] / points[:,2]
+    r2 = x**2 + y**2
+    d = 1 + k1*r2 + k2*r2**2
+    pixels = np.column_stack([fx*x*d + cx, fy*y*d + cy])
+    return pixels, points[:,2] > 0
+
+
+def makeProjection():
+    return pointcolorizer.computeProjectionTable(projectPoints, width, height, (-0.7, 0.7), (-0.55, 0.55))
+
+
+def makeCamera(color, localToCamera, maxRadius=np.sqrt(0.5)):
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = color
+    return FieldContainer(image=image, localToCamera=localToCamera, projection=makeProjection(), maxRadius=maxRadius)
+
+
+def testProjectionTable():
+
+    table = makeProjection()
+    points = np.random.random((10000, 3)) * [1.2, 1.0, 0.0] + [-0.6, -0.5, 1.0]
+    u, v, valid = table.project(points[:,0], points[:,1])
+    expected, _ = projectPoints(points)
+    assert valid.all()
+    error = np.abs(np.column_stack([u, v]) - expected).max()
+    print('max projection table error: %.4f px' % error)
+    assert error < 0.1
+
+    u, v, valid = table.project(np.array([2.0, 0.0]), np.array([0.0, 0.0]))
+    assert not valid[0] and valid[1]
+
+
+def testOcclusion():
+
+    # a small near square in front of a far wall, seen by a camera at the origin
+    wall = np.random.random((50000, 3)) * [2.0, 2.0, 0.0] + [-1.0, -1.0, 4.0]
+    square = np.random.random((5000, 3)) * [0.4, 0.4, 0.0] + [-0.2, -0.2, 2.0]
+    behind = np.array([[0.0, 0.0, 4.0], [0.0, 0.0, -1.0]])
+    points = np.vstack([wall, square, behind])
+
+    camera = makeCamera([255, 0, 0], np.eye(4))
+    colors = pointcolorizer.computeColors(points, [camera])
+
+    assert (colors[len(wall):len(wall) + len(square)] == [255, 0, 0]).all()
+    assert (colors[-2] == 255).all() and (colors[-1] == 255).all()
+
+    # wall points behind the square are hidden, the others are colored
+    hidden = (np.abs(wall[:,:2]) < 0.3).all(axis=1)
+    outside = (np.abs(wall[:,:2]) > 0.5).any(axis=1) & (np.abs(wall[:,:2]) < 0.8).all(axis=1)
+    assert (colors[:len(wall)][hidden] == 255).all()
+    assert (colors[:len(wall)][outside] == [255, 0, 0]).all()
+
+
+def testBlending():
+
+    points = np.array([[0.0, 0.0, 2.0], [0.5, 0.0, 2.0]])
+
+    # the second camera is shifted 0.5 m to the right
+    shifted = np.eye(4)
+    shifted[0,3] = -0.5
+    cameras = [makeCamera([200, 0, 0], np.eye(4)), makeCamera([0, 0, 200], shifted)]
+    colors = pointcolorizer.computeColors(points, cameras)
+
+    # each point is at the center of one image and off center in the other
+    assert colors[0,0] > colors[0,2] > 0
+    assert colors[1,2] > colors[1,0] > 0
+
+    # a small max radius limits the cameras to the image center
+    for camera in cameras:
+        camera.maxRadius = 0.05
+    colors = pointcolorizer.computeColors(points, cameras)
+    assert (colors[0] == [200, 0, 0]).all()
+    assert (colors[1] == [0, 0, 200]).all()
+
+
+class FakeImageQueue(object):
+    '''
+    Stands in for a ddBotImageQueue with one uniformly colored image per camera.
+    '''
+
+    def __init__(self):
+        self.images = {}
+        self.knownPoses = True
+
+    def setImage(self, cameraName, utime, color):
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = color
+        self.images[cameraName] = (utime, image)
+
+    def getCurrentImageTime(self, cameraName):
+        return self.images[cameraName][0] if cameraName in self.images else 0
+
+    def getImage(self, cameraName, image):
+        utime, values = self.images[cameraName]
+        image.DeepCopy(vnp.numpyToImageData(values, flip=False))
+        return utime
+
+    def getTransform(self, fromFrame, toFrame, utime, transform):
+        return 1 if self.knownPoses else 0
+
+
+def testColorizeCache():
+
+    queue = FakeImageQueue()
+    queue.setImage('CAMERA_LEFT', 1000, [255, 0, 0])
+    colorizer = pointcolorizer.PointColorizer(queue)
+    colorizer.projections[('CAMERA_LEFT', width, height)] = makeProjection()
+
+    points = np.random.random((1000, 3)) * [0.4, 0.4, 0.0] + [-0.2, -0.2, 2.0]
+    polyData = vnp.numpyToPolyData(points)
+
+    calls = []
+    computeColors = pointcolorizer.computeColors
+    def countingComputeColors(*args, **kwargs):
+        calls.append(args[0])
+        return computeColors(*args, **kwargs)
+    pointcolorizer.computeColors = countingComputeColors
+
+    try:
+        colorizer.colorizePolyData(polyData, ['CAMERA_LEFT'])
+        assert len(calls) == 1
+        assert (vnp.getNumpyFromVtk(polyData, 'rgb') == [255, 0, 0]).all()
+
+        # the same cloud and image are not projected again
+        colorizer.colorizePolyData(polyData, ['CAMERA_LEFT'])
+        assert len(calls) == 1
+
+        # a new image is
+        queue.setImage('CAMERA_LEFT', 2000, [0, 255, 0])
+        colorizer.colorizePolyData(polyData, ['CAMERA_LEFT'])
+        assert len(calls) == 2
+        assert (vnp.getNumpyFromVtk(polyData, 'rgb') == [0, 255, 0]).all()
+
+        # and so are modified points
+        vnp.getNumpyFromVtk(polyData, 'Points')[:,2] = 3.0
+        polyData.GetPoints().Modified()
+        colorizer.colorizePolyData(polyData, ['CAMERA_LEFT'])
+        assert len(calls) == 3
+        assert np.allclose(calls[-1][:,2], 3.0)
+
+        # a camera without a known pose at the image utime is skipped
+        queue.knownPoses = False
+        queue.setImage('CAMERA_LEFT', 3000, [0, 0, 255])
+        colorizer.colorizePolyData(polyData, ['CAMERA_LEFT'])
+        assert len(calls) == 4
+        assert (vnp.getNumpyFromVtk(polyData, 'rgb') == 255).all()
+    finally:
+        pointcolorizer.computeColors = computeColors
+
+
+app = ConsoleApp()
+testProjectionTable()
+testOcclusion()
+testBlending()
+testColorizeCache()
@@ -0,0 +1,101 @@
+from director.consoleapp import ConsoleApp
+from director import revolutionhistory
+from director import vtkNumpy as vnp
+import numpy as np
+import time
+
+
+def makeRevolution(numberOfPoints, offset):
+    points = np.random.random((numberOfPoints, 3)).astype(np.float32) + offset
+    intensity = np.arange(numberOfPoints, dtype=np.float32)
+    return points, intensity
+
+
+def testRingBuffer():
+
+    # room for 2500 points
+    history = revolutionhistory.RevolutionHistory(maxBytes=2500*16, maxRevolutions=4)
+    revolutions = [makeRevolution(1000, i) for i in xrange(5)]
+
+    for i, (points, intensity) in enumerate(revolutions[:2]):
+        history.addRevolution(i, points, intensity, utime=i*1000000)
+    assert history.getRevolutionIds() == [0, 1]
+
+    # the third revolution does not fit after the second and overwrites the first
+    history.addRevolution(2, *revolutions[2], utime=2000000)
+    assert history.getRevolutionIds() == [1, 2]
+    assert history.getRevolution(0) is None
+    assert np.array_equal(history.getRevolution(1).points, revolutions[1][0])
+    assert np.array_equal(history.getRevolution(2).intensity, revolutions[2][1])
+    assert history.getLatestUtime() == 2000000
+
+    points, intensity = history.getPoints()
+    assert np.array_equal(points, np.vstack([revolutions[1][0], revolutions[2][0]]))
+
+    points, intensity = history.getPoints(seconds=0.5)
+    assert np.array_equal(points, revolutions[2][0])
+    points, intensity = history.getPoints(numberOfRevolutions=1)
+    assert np.array_equal(points, revolutions[2][0])
+
+    history.addRevolution(3, *revolutions[3], utime=3000000)
+    history.addRevolution(4, *revolutions[4], utime=4000000)
+    assert history.getRevolutionIds() == [3, 4]
+    assert history.getNumberOfPoints() == 2000
+
+    # revolutions larger than the buffer keep their last points
+    points, intensity = makeRevolution(3000, 0)
+    history.addRevolution(5, points, intensity, utime=5000000)
+    assert history.getRevolutionIds() == [5]
+    assert np.array_equal(history.getRevolution(5).points, points[-2500:])
+
+
+def testReplaceLatest():
+
+    history = revolutionhistory.RevolutionHistory(maxBytes=2500*16, maxRevolutions=4)
+    revolutions = [makeRevolution(1000, i) for i in xrange(2)] + [makeRevolution(700, 2)]
+    history.addRevolution(0, *revolutions[0], utime=1000000)
+    history.addRevolution(1, *revolutions[1], utime=2000000)
+
+    # a redisplayed revolution replaces its entry instead of adding a copy
+    info = history.getRevolutionInfo(1)
+    points, intensity = makeRevolution(800, 1)
+    history.addRevolution(1, points, intensity, utime=info.utime, scanToLocal=info.scanToLocal)
+    assert history.getRevolutionIds() == [0, 1]
+    assert history.getNumberOfPoints() == 1800
+    assert np.array_equal(history.getRevolution(1).points, points)
+    assert history.getLatestUtime() == 2000000
+
+    # the freed space is reused, so the next revolution fits after it
+    history.addRevolution(2, *revolutions[2], utime=3000000)
+    assert history.getRevolutionIds() == [0, 1, 2]
+    assert np.array_equal(history.getRevolution(0).points, revolutions[0][0])
+    assert np.array_equal(history.getRevolution(2).points, revolutions[2][0])
+    assert history.getRevolutionInfo(0).utime == 1000000
+
+
+def testAccumulation():
+
+    history = revolutionhistory.RevolutionHistory(maxBytes=64*1024*1024)
+    points = (np.random.random((200000, 3)) * [2.0, 2.0, 0.5]).astype(np.float32)
+    for i in xrange(10):
+        noise = np.random.normal(scale=0.002, size=points.shape).astype(np.float32)
+        history.addRevolution(i, points + noise, np.ones(len(points), dtype=np.float32), utime=i*1000000)
+
+    t0 = time.time()
+    accumulated = history.getAccumulatedPolyData(seconds=3.0, leafSize=0.05)
+    t1 = time.time()
+    cached = history.getAccumulatedPolyData(seconds=3.0, leafSize=0.05)
+    t2 = time.time()
+    print('accumulated %d points of 4 revolutions to %d: %.3f s, cached: %.5f s' % (
+          4*len(points), accumulated.GetNumberOfPoints(), t1 - t0, t2 - t1))
+    print('history buffers: %.1f MB' % (history.getNumberOfBytes() / 1e6))
+
+    assert accumulated.GetNumberOfPoints() < len(points)
+    assert cached.GetNumberOfPoints() == accumulated.GetNumberOfPoints()
+    assert np.allclose(vnp.getNumpyFromVtk(accumulated, 'intensity'), 1.0)
+
+
+app = ConsoleApp()
+testRingBuffer()
+testReplaceLatest()
+testAccumulation()
@@ -0,0 +1,143 @@
+from director.consoleapp import ConsoleApp
+from director import segmentation
+from director import segmentationcache
+from director import groundtracker
+from director import vtkNumpy as vnp
+from director.shallowCopy import shallowCopy
+from director.fieldcontainer import FieldContainer
+import numpy as np
+
+
+def makeScene(numberOfPoints):
+    '''
+    Returns a ground plane at z=0 with a box standing on it.
+    '''
+    ground = np.random.random((numberOfPoints, 3)) * [10.0, 10.0, 0.005]
+    box = np.random.random((numberOfPoints // 10, 3)) * [0.5, 0.5, 1.0] + [2.0, 2.0, 0.1]
+    return vnp.numpyToPolyData(np.vstack([ground, box]))
+
+
+def testFingerprint():
+
+    polyData = makeScene(10000)
+    fingerprint = segmentationcache.getPolyDataFingerprint(polyData)
+
+    assert segmentationcache.getPolyDataFingerprint(shallowCopy(polyData)) == fingerprint
+
+    other = shallowCopy(polyData)
+    vnp.addNumpyToVtk(other, np.zeros(other.GetNumberOfPoints()), 'z')
+    assert segmentationcache.getPolyDataFingerprint(other) != fingerprint
+
+    points = vnp.getNumpyFromVtk(polyData, 'Points').copy()
+    points[0] += 1.0
+    assert segmentationcache.getPolyDataFingerprint(vnp.numpyToPolyData(points)) != fingerprint
+
+
+def testMemoize():
+
+    cache = segmentationcache.getCache()
+    cache.clear()
+    calls = []
+
+    @segmentationcache.memoize
+    def addOffset(polyData, offset):
+        calls.append(offset)
+        points = vnp.getNumpyFromVtk(polyData, 'Points') + offset
+        return vnp.numpyToPolyData(points)
+
+    polyData = makeScene(1000)
+    first = addOffset(polyData, 1.0)
+    second = addOffset(shallowCopy(polyData), 1.0)
+    addOffset(polyData, 2.0)
+
+    assert calls == [1.0, 2.0]
+    assert first is not second
+    assert np.array_equal(vnp.getNumpyFromVtk(first, 'Points'), vnp.getNumpyFromVtk(second, 'Points'))
+    assert cache.getStats()['hits'] == 1
+
+    # entries are evicted least recently used first when over the byte budget
+    cache.maxBytes = cache.totalBytes
+    addOffset(polyData, 3.0)
+    assert cache.totalBytes <= cache.maxBytes
+    addOffset(polyData, 1.0)
+    assert calls[-1] == 1.0
+
+    cache.maxBytes = 512*1024*1024
+    cache.printStats()
+    cache.clear()
+
+
+def testArguments():
+
+    cache = segmentationcache.getCache()
+    cache.clear()
+    calls = []
+
+    @segmentationcache.memoize
+    def fitOffset(polyData, distanceThreshold=0.02, axis=None):
+        calls.append(distanceThreshold)
+        return FieldContainer(inliers=np.zeros(polyData.GetNumberOfPoints(), dtype=bool), threshold=distanceThreshold)
+
+    polyData = makeScene(1000)
+
+    # positional, keyword and default arguments share an entry
+    first = fitOffset(polyData, 0.02)
+    fitOffset(polyData, distanceThreshold=0.02)
+    fitOffset(polyData)
+    fitOffset(polyData, axis=None)
+    assert calls == [0.02]
+    assert cache.hits == 3
+
+    # numpy fields of cached FieldContainer results are copies
+    first.inliers[:] = True
+    assert not fitOffset(polyData).inliers.any()
+    cache.clear()
+
+
+def testRemoveGround():
+
+    cache = segmentationcache.getCache()
+    cache.clear()
+    polyData = makeScene(200000)
+
+    groundPoints, scenePoints = segmentation.removeGround(polyData)
+    hits = cache.hits
+    cachedGroundPoints, cachedScenePoints = segmentation.removeGround(shallowCopy(polyData))
+
+    assert cache.hits > hits
+    assert cachedGroundPoints.GetNumberOfPoints() == groundPoints.GetNumberOfPoints()
+    assert cachedScenePoints.GetNumberOfPoints() == scenePoints.GetNumberOfPoints()
+    assert not polyData.GetPointData().HasArray('dist_to_plane')
+
+
+def testTrackedGround():
+
+    cache = segmentationcache.getCache()
+    cache.clear()
+    polyData = makeScene(200000)
+    tracker = groundtracker.GroundPlaneTracker()
+
+    # tracked calls are not memoized, each one updates the tracker
+    segmentation.segmentGround(polyData, groundTracker=tracker)
+    assert tracker.numberOfUpdates == 1 and tracker.numberOfRefits == 1
+    origin, normal, groundPoints, scenePoints = segmentation.segmentGround(polyData, groundTracker=tracker)
+    assert tracker.numberOfUpdates == 2 and tracker.numberOfRefits == 1
+    assert cache.hits == 0 and cache.getStats()['entries'] == 0
+
+    assert np.allclose(normal, [0.0, 0.0, 1.0], atol=0.01)
+    assert groundPoints.GetNumberOfPoints() and scenePoints.GetNumberOfPoints()
+
+    # untracked calls leave the tracker alone
+    segmentation.segmentGround(polyData)
+    segmentation.segmentGround(polyData)
+    assert tracker.numberOfUpdates == 2
+    assert cache.hits == 1
+    cache.clear()
+
+
+app = ConsoleApp()
+testFingerprint()
+testMemoize()
+testArguments()
+testRemoveGround()
+testTrackedGround()
@@ -0,0 +1,106 @@
+from director.consoleapp import ConsoleApp
+from director import segmentationexecutor
+from director import vtkNumpy as vnp
+from director import transformUtils
+from director.fieldcontainer import FieldContainer
+from director.timercallback import TimerCallback
+import numpy as np
+import time
+
+
+def computeCentroid(polyData, transform):
+    if not polyData.GetNumberOfPoints():
+        raise ValueError('empty input')
+    assert segmentationexecutor.inWorker()
+    points = vnp.getNumpyFromVtk(polyData, 'Points')
+    centroid = np.array(transform.TransformPoint(points.mean(axis=0)))
+    return FieldContainer(centroid=centroid, frame=transformUtils.frameFromPositionAndRPY(centroid, [0, 0, 0]), points=polyData)
+
+
+def testEncoding():
+
+    points = np.random.random((1000, 3))
+    polyData = vnp.numpyToPolyData(points, pointData={'intensity' : np.arange(1000.0)})
+    transform = transformUtils.frameFromPositionAndRPY([1, 2, 3], [0, 0, 90])
+
+    decoded = segmentationexecutor.decode(segmentationexecutor.encode([polyData, {'frame' : transform}]))
+    assert np.array_equal(vnp.getNumpyFromVtk(decoded[0], 'Points'), points)
+    assert np.array_equal(vnp.getNumpyFromVtk(decoded[0], 'intensity'), np.arange(1000.0))
+    assert np.allclose(transformUtils.getNumpyFromTransform(decoded[1]['frame']), transformUtils.getNumpyFromTransform(transform))
+
+
+def testExecutor():
+
+    executor = segmentationexecutor.SegmentationExecutor()
+    points = np.random.random((100000, 3))
+    polyData = vnp.numpyToPolyData(points, copy=False)
+    transform = transformUtils.frameFromPositionAndRPY([1, 0, 0], [0, 0, 0])
+
+    results = []
+    failures = []
+    job = executor.submit(computeCentroid, args=(polyData, transform), onFinished=results.append)
+    failedJob = executor.submit(computeCentroid, args=(vnp.numpyToPolyData(np.zeros((0, 3))), transform), onFailed=failures.append)
+
+    # modifying the input after submitting must not affect the job
+    points[:] = 0.0
+
+    ticks = []
+    def onTick():
+        ticks.append(time.time())
+        if job.isDone() and failedJob.isDone():
+            ConsoleApp.quit()
+
+    timer = TimerCallback(targetFps=60, callback=onTick)
+    timer.start()
+    ConsoleApp.startQuitTimer(10.0)
+    ConsoleApp.start(enableAutomaticQuit=False)
+
+    assert job.succeeded()
+    assert len(results) == 1
+    assert np.allclose(results[0].centroid, [1.5, 0.5, 0.5], atol=0.01)
+    assert results[0].points.GetNumberOfPoints() == 100000
+    assert failures == [failedJob] and 'empty input' in failedJob.error
+    assert not segmentationexecutor.inWorker()
+    print('main thread ticked %d times while the jobs ran' % len(ticks))
+
+    executor.close()
+
+
+def testFailedSubmit():
+
+    executor = segmentationexecutor.SegmentationExecutor()
+
+    # arguments that cannot be encoded leave no pending job
+    try:
+        executor.submit(computeCentroid, args=5)
+    except TypeError:
+        pass
+    else:
+        assert False, 'submit should raise'
+    assert executor.getNumberOfPendingJobs() == 0
+    assert not executor.timer.isActive()
+
+    # a job that does not complete in time is failed
+    executor.jobTimeout = 0.2
+    failures = []
+    job = executor.submit(time.sleep, args=(1.0,), onFailed=failures.append)
+
+    def onTick():
+        if job.isDone():
+            ConsoleApp.quit()
+
+    timer = TimerCallback(targetFps=60, callback=onTick)
+    timer.start()
+    ConsoleApp.startQuitTimer(10.0)
+    ConsoleApp.start(enableAutomaticQuit=False)
+
+    assert failures == [job] and 'timed out' in job.error
+    assert executor.getNumberOfPendingJobs() == 0
+
+    executor.close()
+
+
+app = ConsoleApp()
+testEncoding()
+testExecutor()
+testFailedSubmit()
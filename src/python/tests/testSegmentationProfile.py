@@ -0,0 +1,92 @@
+from director.consoleapp import ConsoleApp
+from director import segmentation
+from director import segmentationprofile
+from director import vtkNumpy as vnp
+import numpy as np
+import json
+import time
+
+
+def makeScene(numberOfPoints):
+    '''
+    Returns a ground plane at z=0 with a box standing on it.
+    '''
+    ground = np.random.random((numberOfPoints, 3)) * [10.0, 10.0, 0.005]
+    box = np.random.random((numberOfPoints // 10, 3)) * [0.5, 0.5, 1.0] + [2.0, 2.0, 0.1]
+    return vnp.numpyToPolyData(np.vstack([ground, box]))
+
+
+@segmentationprofile.profiled
+def downsampleAndCluster(polyData):
+    polyData = segmentation.applyVoxelGrid(polyData, leafSize=0.05)
+    with segmentationprofile.stage('select points', polyData) as stage:
+        points = vnp.getNumpyFromVtk(polyData, 'Points')
+        points = points[points[:,2] > 0.05]
+        stage.setOutput(points)
+    return segmentation.extractLargestCluster(vnp.numpyToPolyData(points), minClusterSize=10)
+
+
+def testDisabled():
+
+    profile = segmentationprofile.getProfile()
+    profile.enabled = False
+    profile.clear()
+
+    downsampleAndCluster(makeScene(1000))
+    assert not profile.getRuns()
+
+    # overhead of a disabled stage call
+    def identity(x):
+        return x
+    profiledIdentity = segmentationprofile.profiled(identity)
+    t0 = time.time()
+    for i in xrange(100000):
+        identity(i)
+    t1 = time.time()
+    for i in xrange(100000):
+        profiledIdentity(i)
+    t2 = time.time()
+    print('disabled profiling overhead: %.3f us per call' % ((t2 - t1 - (t1 - t0)) / 100000 * 1e6))
+
+
+def testStageTree():
+
+    profile = segmentationprofile.getProfile()
+    profile.enabled = True
+    profile.clear()
+
+    polyData = makeScene(20000)
+    result = downsampleAndCluster(polyData)
+    profile.enabled = False
+
+    runs = profile.getRuns()
+    assert len(runs) == 1
+    run = runs[0]
+    assert run.name == 'downsampleAndCluster'
+    assert run.inputPoints == polyData.GetNumberOfPoints()
+    assert run.outputPoints == result.GetNumberOfPoints()
+    assert run.outputBytes > 0
+
+    names = [child.name for child in run.children]
+    assert names == ['applyVoxelGrid', 'select points', 'extractLargestCluster'], names
+    assert run.children[1].outputPoints < run.children[0].outputPoints
+    assert run.children[1].outputBytes > 0
+    assert [child.name for child in run.children[2].children] == ['applyEuclideanClustering']
+    assert [child.name for child in run.children[2].children[0].children] == ['computeEuclideanClusters']
+    assert run.elapsed >= sum(child.elapsed for child in run.children)
+
+    profile.printSummary()
+
+    exported = json.loads(profile.toJson())
+    assert exported[0]['children'][0]['name'] == 'applyVoxelGrid'
+
+    events = json.loads(profile.toChromeTrace())['traceEvents']
+    assert len(events) == 6
+    assert all(event['ph'] == 'X' for event in events)
+
+    profile.clear()
+
+
+app = ConsoleApp()
+testDisabled()
+testStageTree()
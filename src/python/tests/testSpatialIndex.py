@@ -0,0 +1,85 @@
+from director import spatialindex
+from director import vtkNumpy as vnp
+from director.shallowCopy import shallowCopy
+import numpy as np
+
+
+def testQueries():
+
+    pts = np.random.random((20000, 3))
+    pts[::101] = np.nan
+    index = spatialindex.SpatialIndex(pts)
+    finite = np.isfinite(pts).all(axis=1)
+
+    point = np.array([0.5, 0.5, 0.5])
+    dists = np.linalg.norm(pts - point, axis=1)
+
+    ids = index.radiusSearch(point, 0.1)
+    assert np.array_equal(ids, np.flatnonzero(finite & (dists <= 0.1)))
+
+    ids, nearestDists = index.nearest(point, k=10)
+    expectedIds = np.flatnonzero(finite)[np.argsort(dists[finite])[:10]]
+    assert np.array_equal(ids, expectedIds)
+    assert np.allclose(nearestDists, dists[expectedIds])
+
+    origin = np.array([-1.0, 0.2, 0.3])
+    direction = np.array([1.0, 0.5, 0.2])
+    direction /= np.linalg.norm(direction)
+    ids, distanceToRay, distanceAlongRay = index.rayCorridorSearch(origin, direction, 0.02, minDistance=1.2)
+
+    delta = pts - origin
+    along = np.dot(delta, direction)
+    perp = np.linalg.norm(delta - np.outer(along, direction), axis=1)
+    expectedIds = np.flatnonzero(finite & (perp <= 0.02) & (along >= 1.2))
+    order = np.argsort(ids)
+    assert np.array_equal(ids[order], expectedIds)
+    assert np.allclose(distanceToRay[order], perp[expectedIds])
+    assert np.allclose(distanceAlongRay[order], along[expectedIds])
+
+
+def testCache():
+
+    spatialindex.clearCache()
+    polyData = vnp.numpyToPolyData(np.random.random((1000, 3)))
+    assert spatialindex.getCachedSpatialIndex(polyData) is None
+
+    index = spatialindex.getSpatialIndex(polyData)
+    assert spatialindex.getSpatialIndex(polyData) is index
+
+    # shallow copies that only add arrays share the index
+    polyDataCopy = shallowCopy(polyData)
+    vnp.addNumpyToVtk(polyDataCopy, np.zeros(1000), 'zeros')
+    assert spatialindex.getCachedSpatialIndex(polyDataCopy) is index
+
+    # modifying the points invalidates the index
+    polyData.GetPoints().Modified()
+    assert spatialindex.getCachedSpatialIndex(polyData) is None
+    assert not spatialindex.isSpatialIndexCurrent(index, polyData)
+
+
+def testCacheBudget():
+
+    spatialindex.clearCache()
+    clouds = [vnp.numpyToPolyData(np.random.random((1000, 3))) for i in xrange(3)]
+
+    # temporary clouds are not cached
+    index = spatialindex.getSpatialIndex(clouds[0], cache=False)
+    assert spatialindex.getCachedSpatialIndex(clouds[0]) is None
+    assert spatialindex.getCachedBytes() == 0
+
+    maxCachedBytes = spatialindex._maxCachedBytes
+    spatialindex._maxCachedBytes = 2*index.getNumberOfBytes()
+    try:
+        indices = [spatialindex.getSpatialIndex(polyData) for polyData in clouds]
+        assert spatialindex.getCachedSpatialIndex(clouds[0]) is None
+        assert spatialindex.getCachedSpatialIndex(clouds[1]) is indices[1]
+        assert spatialindex.getCachedSpatialIndex(clouds[2]) is indices[2]
+        assert spatialindex.getCachedBytes() == 2*index.getNumberOfBytes()
+    finally:
+        spatialindex._maxCachedBytes = maxCachedBytes
+        spatialindex.clearCache()
+
+
+testQueries()
+testCache()
+testCacheBudget()
@@ -0,0 +1,96 @@
+from director import filterUtils
+from director import vtkNumpy as vnp
+from director import vtkAll as vtk
+import numpy as np
+
+
+def makeTestCloud(numberOfPoints=10000):
+
+    pts = np.random.randn(numberOfPoints, 3)
+    pts[::97] = np.nan
+
+    polyData = vnp.numpyToPolyData(pts, pointData=dict(
+                            intensity=np.random.random(numberOfPoints).astype(np.float32),
+                            labels=np.random.randint(0, 5, numberOfPoints).astype(np.int32)))
+
+    normals = np.random.randn(numberOfPoints, 3)
+    vnp.addNumpyToVtk(polyData, normals, 'normals')
+    polyData.GetPointData().SetNormals(polyData.GetPointData().GetArray('normals'))
+
+    vnp.addNumpyToVtk(polyData, np.arange(numberOfPoints, dtype=np.float64), 'cell_ids', arrayType='cells')
+    return polyData
+
+
+def assertAttributesEqual(attributes, expectedAttributes):
+
+    assert attributes.GetNumberOfArrays() == expectedAttributes.GetNumberOfArrays()
+
+    for i in xrange(expectedAttributes.GetNumberOfArrays()):
+        expectedArray = expectedAttributes.GetArray(i)
+        array = attributes.GetArray(i)
+        assert array.GetName() == expectedArray.GetName()
+        assert array.GetDataType() == expectedArray.GetDataType()
+        assert array.GetNumberOfComponents() == expectedArray.GetNumberOfComponents()
+        assert attributes.IsArrayAnAttribute(i) == expectedAttributes.IsArrayAnAttribute(i)
+        assert np.array_equal(vnp.numpy_support.vtk_to_numpy(array), vnp.numpy_support.vtk_to_numpy(expectedArray))
+
+
+def assertPolyDataEqual(polyData, expected):
+
+    assert polyData.GetNumberOfPoints() == expected.GetNumberOfPoints()
+    assert polyData.GetNumberOfVerts() == expected.GetNumberOfVerts()
+    assert polyData.GetNumberOfCells() == expected.GetNumberOfCells()
+
+    if expected.GetNumberOfPoints():
+        assert polyData.GetPoints().GetDataType() == expected.GetPoints().GetDataType()
+        assert np.array_equal(vnp.getNumpyFromVtk(polyData, 'Points'), vnp.getNumpyFromVtk(expected, 'Points'))
+
+    assertAttributesEqual(polyData.GetPointData(), expected.GetPointData())
+    assertAttributesEqual(polyData.GetCellData(), expected.GetCellData())
+
+
+def testThresholdPoints():
+
+    polyData = makeTestCloud()
+    polyData.GetCellData().RemoveArray('cell_ids')
+
+    for arrayName, thresholdRange in [('intensity', [0.2, 0.6]),
+                                      ('intensity', [2.0, 3.0]),
+                                      ('labels', [1, 1]),
+                                      ('labels', [0, 4])]:
+
+        assert filterUtils._canUseNumpyThreshold(polyData, polyData.GetPointData(), arrayName)
+        result = filterUtils._thresholdPointsNumpy(polyData, arrayName, thresholdRange)
+        expected = filterUtils._thresholdPointsVtk(polyData, arrayName, thresholdRange)
+        assertPolyDataEqual(result, expected)
+
+
+def testThresholdCells():
+
+    polyData = makeTestCloud()
+    assert filterUtils._hasOneVertexPerPoint(polyData)
+
+    for arrayName, thresholdRange, arrayType in [('cell_ids', [100, 5000], 'cells'),
+                                                 ('intensity', [0.2, 0.6], 'points'),
+                                                 ('labels', [3, 4], 'points')]:
+
+        result = filterUtils._thresholdCellsNumpy(polyData, arrayName, thresholdRange, arrayType)
+        expected = filterUtils._thresholdCellsVtk(polyData, arrayName, thresholdRange, arrayType)
+        assertPolyDataEqual(result, expected)
+
+
+def testMeshFallback():
+
+    sphere = vtk.vtkSphereSource()
+    sphere.Update()
+    polyData = sphere.GetOutput()
+    vnp.addNumpyToVtk(polyData, vnp.getNumpyFromVtk(polyData, 'Points')[:,2].copy(), 'z')
+
+    assert not filterUtils._canUseNumpyThreshold(polyData, polyData.GetPointData(), 'z')
+    result = filterUtils.thresholdPoints(polyData, 'z', [0.0, 1.0])
+    assert result.GetNumberOfPoints() == np.count_nonzero(vnp.getNumpyFromVtk(polyData, 'z') >= 0.0)
+
+
+testThresholdPoints()
+testThresholdCells()
+testMeshFallback()
@@ -0,0 +1,122 @@
+from director.consoleapp import ConsoleApp
+from director import voxelmap
+from director import transformUtils
+import numpy as np
+
+
+def makeWall(numberOfPoints, x=2.0):
+    '''
+    Returns points on a 2x2 m wall at distance x in front of the sensor.
+    '''
+    points = np.random.random((numberOfPoints, 3)) * [0.0, 2.0, 2.0] + [x, -1.0, 0.0]
+    return points
+
+
+def testKeys():
+
+    keys = np.array([[0, 0, 0], [-1, 2, -3], [1000, -1000, 7], [-2**20, 2**20 - 1, 0]])
+    assert np.array_equal(voxelmap.unpackVoxelKeys(voxelmap.packVoxelKeys(keys)), keys)
+
+    packed = voxelmap.packVoxelKeys(keys)
+    order = np.lexsort(keys.T[::-1])
+    assert np.array_equal(np.argsort(packed), order)
+
+
+def testFusion():
+
+    voxelMap = voxelmap.VoxelMap(leafSize=0.1, radius=None)
+
+    points = makeWall(20000)
+    voxelMap.insertPoints(points, utime=0)
+    numberOfVoxels = voxelMap.getNumberOfVoxels()
+    assert 300 <= numberOfVoxels <= 441
+    assert voxelMap.getNumberOfSlots() == numberOfVoxels
+    assert len(np.unique(voxelMap.getSnapshot().keys)) == numberOfVoxels
+    assert voxelMap.getSnapshot().hits.sum() == len(points)
+
+    # the same wall seen from a sensor moved 1 m back lands in the same voxels
+    sensorToLocal = transformUtils.frameFromPositionAndRPY([-1.0, 0.0, 0.0], [0.0, 0.0, 0.0])
+    voxelMap.insertPoints(makeWall(20000, x=3.0), sensorToLocal, colors=np.tile([255, 0, 0], (20000, 1)), utime=1000000)
+    assert voxelMap.getNumberOfVoxels() <= 441
+    assert voxelMap.getSnapshot().hits.sum() == 40000
+
+    snapshot = voxelMap.getSnapshot()
+    assert np.allclose(snapshot.points[:,0], 2.0)
+    assert snapshot.colors.dtype == np.uint8
+    assert (snapshot.colors[:,1] < 255).all()
+
+    # voxel means stay inside their voxels
+    keys = voxelmap.unpackVoxelKeys(snapshot.keys)
+    assert (np.floor(snapshot.points / 0.1 + 1e-9) == keys).all()
+
+    polyData = voxelMap.getPolyData(minimumWeight=100)
+    assert 0 < polyData.GetNumberOfPoints() < voxelMap.getNumberOfVoxels()
+    assert polyData.GetPointData().GetArray('rgb_colors')
+
+
+def testEviction():
+
+    voxelMap = voxelmap.VoxelMap(leafSize=0.1, radius=3.0, halfLife=1.0, minimumWeight=0.5)
+
+    voxelMap.insertPoints(makeWall(5000, x=2.0), utime=0)
+    voxelMap.insertPoints(makeWall(5000, x=-2.0), utime=0)
+    wallVoxels = voxelMap.getNumberOfVoxels()
+
+    # moving the robot 4 m forward drops the wall behind it
+    voxelMap.insertPoints(makeWall(100, x=4.0), robotPosition=[4.0, 0.0, 0.0], utime=0)
+    assert (voxelMap.getSnapshot().points[:,0] > 0).all()
+    assert voxelMap.getNumberOfVoxels() < wallVoxels
+
+    # evicted slots are reused before the arrays grow
+    numberOfSlots = voxelMap.getNumberOfSlots()
+    numberOfVoxels = voxelMap.getNumberOfVoxels()
+    freeSlots = numberOfSlots - numberOfVoxels
+    assert freeSlots > 0
+    voxelMap.insertPoints(makeWall(5000, x=3.0), robotPosition=[4.0, 0.0, 0.0], utime=0)
+    newVoxels = voxelMap.getNumberOfVoxels() - numberOfVoxels
+    assert voxelMap.getNumberOfSlots() == numberOfSlots + max(newVoxels - freeSlots, 0)
+
+    # after 10 half lives only voxels with more than 512 hits would survive
+    revision = voxelMap.revision
+    voxelMap.insertPoints(np.zeros((0, 3)), utime=10000000)
+    assert voxelMap.getNumberOfVoxels() == 0
+    assert voxelMap.revision > revision
+
+    bounded = voxelmap.VoxelMap(leafSize=0.01, radius=None, maxVoxels=1000)
+    bounded.insertPoints(makeWall(50000))
+    assert bounded.getNumberOfVoxels() == 1000
+
+
+def testItem():
+
+    voxelMap = voxelmap.VoxelMap(leafSize=0.05)
+    voxelMap.insertPoints(makeWall(10000))
+    obj = voxelmap.showVoxelMap(voxelMap, view=view)
+    assert obj.polyData.GetNumberOfVerts() == voxelMap.getNumberOfVoxels()
+    assert obj.polyData.GetNumberOfPoints() == voxelMap.getCapacity()
+
+    # new voxels are written into the existing polydata while they fit
+    polyData = obj.polyData
+    voxelMap.insertPoints(makeWall(200, x=2.5))
+    assert voxelMap.getNumberOfSlots() <= polyData.GetNumberOfPoints()
+    obj.update()
+    assert obj.polyData is polyData
+    assert obj.polyData.GetNumberOfVerts() == voxelMap.getNumberOfVoxels()
+
+    snapshot = voxelMap.getSnapshot()
+    slots = voxelMap.getVoxelSlots()
+    points = voxelmap.vnp.getNumpyFromVtk(obj.polyData, 'Points')
+    assert np.allclose(points[slots], snapshot.points, atol=1e-5)
+
+    obj.onAction('Clear Map')
+    obj.update()
+    assert obj.polyData is not polyData
+    assert obj.polyData.GetNumberOfVerts() == 0
+
+
+app = ConsoleApp()
+view = app.createView()
+testKeys()
+testFusion()
+testEviction()
+testItem()
@@ -0,0 +1,111 @@
+from director import voxelpyramid
+from director import vtkNumpy as vnp
+import numpy as np
+
+
+def makeTestCloud(numberOfPoints=5000):
+    points = np.random.random((numberOfPoints, 3)) * [0.5, 0.4, 0.3] - [0.2, 0.1, 0.0]
+    points[::53] = np.nan
+    intensity = np.random.random(numberOfPoints).astype(np.float32)
+    labels = np.random.randint(0, 10, numberOfPoints).astype(np.int32)
+    return points, intensity, labels
+
+
+def computeVoxelGridReference(points, leafSize, intensity, labels):
+    '''
+    Returns {voxelKey : (count, centroid, mean intensity, label of the first point)}.
+    '''
+    voxels = {}
+    for pointId, point in enumerate(points):
+        if not np.isfinite(point).all():
+            continue
+        key = tuple(np.floor(point / leafSize).astype(np.int64))
+        voxels.setdefault(key, []).append(pointId)
+
+    return dict((key, (len(ids), points[ids].mean(axis=0), intensity[ids].mean(), labels[ids[0]]))
+                for key, ids in voxels.iteritems())
+
+
+def assertLevelEqual(level, expected):
+    assert level.getNumberOfVoxels() == len(expected)
+    centroids = level.getCentroids()
+    for i, key in enumerate(map(tuple, level.voxelKeys)):
+        count, centroid, _, _ = expected[key]
+        assert level.counts[i] == count
+        assert np.allclose(centroids[i], centroid)
+
+
+def testLevels():
+
+    points, intensity, labels = makeTestCloud()
+
+    for leafSize in (0.01, 0.03, 0.05):
+        pyramid = voxelpyramid.VoxelPyramid(points)
+        assertLevelEqual(pyramid.getLevel(leafSize), computeVoxelGridReference(points, leafSize, intensity, labels))
+
+
+def testLevelFromFinerLevel():
+
+    points, intensity, labels = makeTestCloud()
+
+    pyramid = voxelpyramid.VoxelPyramid(points)
+    pyramid.getLevel(0.01)
+    assert pyramid._findFinerLevel(0.03) is not None
+    level = pyramid.getLevel(0.03)
+
+    direct = voxelpyramid.VoxelPyramid(points).getLevel(0.03)
+
+    order = np.lexsort(level.voxelKeys.T)
+    directOrder = np.lexsort(direct.voxelKeys.T)
+    assert np.array_equal(level.voxelKeys[order], direct.voxelKeys[directOrder])
+    assert np.array_equal(level.counts[order], direct.counts[directOrder])
+    assert np.allclose(level.pointSums[order], direct.pointSums[directOrder])
+    assert np.array_equal(level.firstPointIds[order], direct.firstPointIds[directOrder])
+
+    # the point to voxel map must agree with the voxel of each point
+    assert np.array_equal(level.voxelKeys[level.pointToVoxel], direct.voxelKeys[direct.pointToVoxel])
+
+
+def testPolyData():
+
+    points, intensity, labels = makeTestCloud()
+    polyData = vnp.numpyToPolyData(points, pointData=dict(intensity=intensity, labels=labels))
+    voxelpyramid.clearCache()
+
+    for leafSize in (0.01, 0.03):
+        expected = computeVoxelGridReference(points, leafSize, intensity, labels)
+        output = voxelpyramid.applyVoxelGrid(polyData, leafSize)
+        assert output.GetNumberOfPoints() == len(expected)
+
+        outputPoints = vnp.getNumpyFromVtk(output, 'Points')
+        outputIntensity = vnp.getNumpyFromVtk(output, 'intensity')
+        outputLabels = vnp.getNumpyFromVtk(output, 'labels')
+        assert outputIntensity.dtype == np.float32 and outputLabels.dtype == np.int32
+
+        keys = np.floor(outputPoints / leafSize).astype(np.int64)
+        for key, point, value, label in zip(map(tuple, keys), outputPoints, outputIntensity, outputLabels):
+            _, centroid, meanIntensity, firstLabel = expected[key]
+            assert np.allclose(point, centroid)
+            assert np.isclose(value, meanIntensity, atol=1e-5)
+            assert label == firstLabel
+
+
+def testOutputCacheBudget():
+
+    points, intensity, labels = makeTestCloud()
+    polyData = vnp.numpyToPolyData(points, pointData=dict(intensity=intensity))
+    pyramid = voxelpyramid.VoxelPyramid(vnp.getNumpyFromVtk(polyData, 'Points'))
+
+    pyramid.getPolyData(polyData, 0.01)
+    pyramid.maxOutputBytes = pyramid.outputBytes
+    pyramid.getPolyData(polyData, 0.02)
+    pyramid.getPolyData(polyData, 0.04)
+
+    assert len(pyramid.outputCache) < 3
+    assert pyramid.outputBytes == sum(nbytes for _, nbytes in pyramid.outputCache.itervalues())
+
+
+testLevels()
+testLevelFromFinerLevel()
+testPolyData()
+testOutputCacheBudget()
@@ -51,6 +51,8 @@
 #include <maps/ScanBundleView.hpp>
 
 #include <sys/select.h>
+#include <fcntl.h>
+#include <unistd.h>
 #include <map>
 #include <deque>
 #include <mutex>
@@ -251,6 +253,28 @@ public:
     this->LCMHandle->subscribe( "MAP_CLOUD", &LCMListener::cloudHandler, this);
     this->LCMHandle->subscribe( "MAP_OCTREE", &LCMListener::octreeHandler, this);
     this->LCMHandle->subscribe( "MAP_SCANS", &LCMListener::scanBundleHandler, this);
+
+    // a byte is written to the pipe for each new map, so the main thread
+    // can watch the read end instead of polling
+    if (pipe(this->NotificationPipe) == 0)
+    {
+      fcntl(this->NotificationPipe[0], F_SETFL, O_NONBLOCK);
+      fcntl(this->NotificationPipe[1], F_SETFL, O_NONBLOCK);
+    }
+    else
+    {
+      std::cerr << "ERROR: could not create the map notification pipe" << std::endl;
+      this->NotificationPipe[0] = this->NotificationPipe[1] = -1;
+    }
+  }
+
+  ~LCMListener()
+  {
+    if (this->NotificationPipe[0] >= 0)
+    {
+      close(this->NotificationPipe[0]);
+      close(this->NotificationPipe[1]);
+    }
   }
 
 
@@ -296,6 +320,37 @@ public:
     return this->EdgeAngleThreshold;
   }
 
+  int GetNotificationFileDescriptor()
+  {
+    return this->NotificationPipe[0];
+  }
+
+  void ClearNotifications()
+  {
+    if (this->NotificationPipe[0] < 0)
+    {
+      return;
+    }
+
+    char buffer[64];
+    while (read(this->NotificationPipe[0], buffer, sizeof(buffer)) > 0)
+    {
+      continue;
+    }
+  }
+
+  void NotifyNewData()
+  {
+    // the write fails with EAGAIN when the pipe is full, then a
+    // notification is already pending
+    if (this->NotificationPipe[1] >= 0)
+    {
+      char byte = 1;
+      ssize_t written = write(this->NotificationPipe[1], &byte, 1);
+      (void)written;
+    }
+  }
+
   bool CheckForNewData()
   {
     std::lock_guard<std::mutex> lock(this->Mutex);
@@ -614,6 +669,7 @@ protected:
     datasets.push_back(mapData);
     this->UpdateDequeSize(datasets);
     this->NewData = true;
+    this->NotifyNewData();
   }
 
   void HandleNewData(const maps::cloud_t* msg)
@@ -636,6 +692,7 @@ protected:
     datasets.push_back(mapData);
     this->UpdateDequeSize(datasets);
     this->NewData = true;
+    this->NotifyNewData();
   }
 
   void HandleNewData(const maps::octree_t* msg)
@@ -659,6 +716,7 @@ protected:
     datasets.push_back(mapData);
     this->UpdateDequeSize(datasets);
     this->NewData = true;
+    this->NotifyNewData();
   }
 
   void HandleNewData(const maps::scans_t* msg)
@@ -712,10 +770,12 @@ protected:
     datasets.push_back(mapData);
     this->UpdateDequeSize(datasets);
     this->NewData = true;
+    this->NotifyNewData();
   }
 
   bool NewData;
   bool ShouldStop;
+  int NotificationPipe[2];
   int MaxNumberOfDatasets;
   vtkIdType CurrentMapId;
   vtkSmartPointer<vtkIntArray> ViewIds;
@@ -793,6 +853,18 @@ void vtkMapServerSource::Stop()
   this->Internal->Listener->Stop();
 }
 
+//----------------------------------------------------------------------------
+int vtkMapServerSource::GetNotificationFileDescriptor()
+{
+  return this->Internal->Listener->GetNotificationFileDescriptor();
+}
+
+//----------------------------------------------------------------------------
+void vtkMapServerSource::ClearNotifications()
+{
+  this->Internal->Listener->ClearNotifications();
+}
+
 //----------------------------------------------------------------------------
 void vtkMapServerSource::Poll()
 {
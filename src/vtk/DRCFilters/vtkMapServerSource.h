@@ -40,6 +40,13 @@ public:
   void Start();
   void Stop();
 
+  // Description:
+  // Returns a file descriptor that becomes readable when a new map has been
+  // stored, for use with a QSocketNotifier.  Call ClearNotifications() when
+  // it becomes readable.
+  int GetNotificationFileDescriptor();
+  void ClearNotifications();
+
   vtkGetVector2Macro(DistanceRange, double);
   vtkSetVector2Macro(DistanceRange, double);
 